@@ -2363,8 +2363,14 @@ struct CMUXCLI {
         if subcommand == "screenshot" {
             let sid = try requireSurface()
             let (outPathOpt, _) = parseOption(subArgs, name: "--out")
-            let payload = try client.sendV2(method: "browser.screenshot", params: ["surface_id": sid])
+            var params: [String: Any] = ["surface_id": sid]
+            if let outPathOpt {
+                // The app writes the file itself; older builds ignore out_path and send base64.
+                params["out_path"] = URL(fileURLWithPath: outPathOpt).standardizedFileURL.path
+            }
+            let payload = try client.sendV2(method: "browser.screenshot", params: params)
             if let outPathOpt,
+               payload["path"] == nil,
                let b64 = payload["png_base64"] as? String,
                let data = Data(base64Encoded: b64) {
                 try data.write(to: URL(fileURLWithPath: outPathOpt))
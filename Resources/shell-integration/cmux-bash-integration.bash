@@ -1,7 +1,62 @@
 # cmux shell integration for bash
 
+# Optional per-session relay (cmux-shell-relay.py, opt-in via CMUX_SHELL_RELAY=1).
+# When it is running, sidebar updates are written to its FIFO instead of
+# exec'ing ncat/socat/nc and connecting to the socket per update.
+_CMUX_RELAY_FIFO="${_CMUX_RELAY_FIFO:-}"
+_CMUX_RELAY_CHECKED="${_CMUX_RELAY_CHECKED:-0}"
+
+_cmux_relay_start_once() {
+    (( _CMUX_RELAY_CHECKED )) && return 0
+    _CMUX_RELAY_CHECKED=1
+    [[ "${CMUX_SHELL_RELAY:-0}" == "1" ]] || return 0
+    local relay="${CMUX_SHELL_INTEGRATION_DIR:-}/cmux-shell-relay.py"
+    [[ -f "$relay" ]] || return 0
+    # Same private per-user path the relay derives from the socket path.
+    _CMUX_RELAY_FIFO="${TMPDIR:-/tmp}/cmux-relay-$UID/${CMUX_SOCKET_PATH//\//_}.fifo"
+    # Another shell in this session already started it. A FIFO left by a
+    # killed relay doesn't count: the new relay replaces it.
+    _cmux_relay_alive && return 0
+    local py="${CMUX_SHELL_RELAY_PYTHON:-}"
+    [[ -n "$py" ]] || py="$(command -v python3 2>/dev/null)"
+    [[ -n "$py" ]] || return 0
+    # Not `( ... & )`: that reparents the relay away from cmux, which then
+    # refuses its connection. disown keeps this shell as the parent without a
+    # job entry (and the braces swallow the job-start notice).
+    { "$py" "$relay" --socket "$CMUX_SOCKET_PATH" --daemon >/dev/null 2>&1 & disown; } 2>/dev/null
+}
+
+# Only write to a FIFO we own in a directory we own: anyone can create files
+# under /tmp, and whoever reads the FIFO sees every path and branch we report.
+_cmux_relay_trusted() {
+    local dir="${_CMUX_RELAY_FIFO%/*}"
+    [[ -n "$_CMUX_RELAY_FIFO" && -d "$dir" && ! -L "$dir" && -O "$dir" ]] || return 1
+    [[ -p "$_CMUX_RELAY_FIFO" && ! -L "$_CMUX_RELAY_FIFO" && -O "$_CMUX_RELAY_FIFO" ]]
+}
+
+_cmux_relay_alive() {
+    _cmux_relay_trusted || return 1
+    local pid=""
+    read -r pid 2>/dev/null < "${_CMUX_RELAY_FIFO%.fifo}.pid" || return 1
+    [[ -n "$pid" ]] && kill -0 "$pid" 2>/dev/null
+}
+
+_cmux_relay_write() {
+    local payload="$1"
+    # FIFO writes are only atomic up to PIPE_BUF (512 bytes on macOS); longer
+    # lines could interleave with other shells, so send those the slow way.
+    # Count bytes, not characters: paths and branches may be multibyte.
+    local LC_ALL=C
+    (( ${#payload} < 500 )) || return 1
+    # Bash can't open a FIFO non-blocking, so only write while the relay is
+    # alive. Callers already run in background jobs, never on the prompt path.
+    _cmux_relay_alive || return 1
+    printf '%s\n' "$payload" > "$_CMUX_RELAY_FIFO"
+}
+
 _cmux_send() {
     local payload="$1"
+    _cmux_relay_write "$payload" && return 0
     if command -v ncat >/dev/null 2>&1; then
         printf '%s\n' "$payload" | ncat -U "$CMUX_SOCKET_PATH" --send-only
     elif command -v socat >/dev/null 2>&1; then
@@ -75,6 +130,7 @@ _cmux_prompt_command() {
         [[ "$t" != "not a tty" ]] && _CMUX_TTY_NAME="$t"
     fi
 
+    _cmux_relay_start_once
     _cmux_report_tty_once
 
     # CWD: keep the app in sync with the actual shell directory.
@@ -101,6 +157,10 @@ _cmux_prompt_command() {
         _CMUX_GIT_LAST_PWD="$pwd"
         _CMUX_GIT_LAST_RUN=$now
         {
+            # The relay keeps one branch/dirty cache per repo for all panels;
+            # only probe git ourselves when it isn't running.
+            local qgpwd="${pwd//\"/\\\"}"
+            _cmux_relay_write "git_refresh \"${qgpwd}\" --tab=$CMUX_TAB_ID --panel=$CMUX_PANEL_ID" && exit 0
             local branch dirty_opt=""
             branch=$(git branch --show-current 2>/dev/null)
             if [[ -n "$branch" ]]; then
@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+"""cmux shell-integration relay
+
+One relay runs per cmux socket. Shell integrations write their v1 sidebar
+commands (`report_pwd`, `report_tty`, `ports_kick`, `report_git_branch`,
+`clear_git_branch`) as lines into a FIFO instead of forking `ncat`/`socat`/`nc`
+for every prompt. The relay coalesces redundant updates per panel and forwards
+what is left over one persistent connection to cmux. Those report commands are
+all it forwards: anything else written to the FIFO is dropped, so the FIFO is
+never a way to run arbitrary commands on the relay's connection.
+
+Shells also send the relay-local hint `git_refresh "<pwd>" --tab=.. --panel=..
+[--force]` on each prompt instead of probing git themselves; the relay answers
+it from a per-repository cache (cmux_git_state.py) and forwards
+`report_git_branch` / `clear_git_branch` only when a panel's state changes.
+
+Paths live in a private per-user directory, ${TMPDIR:-/tmp}/cmux-relay-<uid>
+(mode 0700), named after the cmux socket path with `/` replaced by `_`:
+    <name>.fifo   shells write newline-terminated commands here
+    <name>.pid    pid + single-instance lock
+    <name>.stats  JSON counters, written on SIGUSR1 and on exit
+The relay refuses to start if that directory, or a file it opens there, is a
+symlink, belongs to another user, or is open to group or others.
+
+Usage:
+    python3 cmux-shell-relay.py --socket "$CMUX_SOCKET_PATH" [--daemon]
+
+The relay exits (and removes its FIFO) on SIGTERM/SIGINT/SIGHUP, once the
+cmux socket has been gone for --orphan-timeout seconds, or when cmux refuses
+its connection. In the default `cmuxOnly` socket mode cmux only accepts
+processes it started, so `--daemon` does not fork or setsid: the relay stays a
+child of the shell that launched it and connects right away. If a later
+reconnect is refused anyway (the launching shell exited, then the connection
+dropped), removing the FIFO sends shells back to their direct socket path and
+the next new shell starts a fresh relay. A FIFO left behind by a killed relay
+is replaced by the next relay to start; shells only trust a FIFO whose pid
+file names a live process.
+"""
+
+import argparse
+import collections
+import fcntl
+import json
+import os
+import selectors
+import shlex
+import signal
+import socket
+import stat
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+# This directory ships inside the signed app bundle; don't drop __pycache__
+# next to cmux_git_state.py.
+sys.dont_write_bytecode = True
+from cmux_git_state import GitStateService  # noqa: E402
+
+
+# Commands whose latest value per panel is all that matters. Lines for the
+# same (group, tab, panel) key inside one coalescing window collapse to the
+# newest one.
+_COALESCE_GROUPS = {
+    "report_pwd": "pwd",
+    "report_tty": "tty",
+    "ports_kick": "ports",
+    "report_git_branch": "git",
+    "clear_git_branch": "git",
+}
+
+# Groups that are also skipped when identical to what was last forwarded.
+# `ports_kick` is a trigger, not state, so it is never deduplicated.
+_DEDUPE_GROUPS = {"pwd", "tty", "git"}
+
+# cmux's replies when it rejects a connection (TerminalController.handleClient).
+_DENIED_PREFIXES = (b"ERROR: Access denied", b"ERROR: Unable to verify client process")
+
+
+def relay_dir() -> str:
+    return os.path.join(os.environ.get("TMPDIR") or "/tmp", f"cmux-relay-{os.getuid()}")
+
+
+def relay_paths(socket_path: str) -> Dict[str, str]:
+    base = os.path.join(relay_dir(), socket_path.replace("/", "_"))
+    return {"dir": relay_dir(), "fifo": f"{base}.fifo", "pid": f"{base}.pid", "stats": f"{base}.stats"}
+
+
+def _check_private(st: os.stat_result, path: str, kind: str, is_kind) -> None:
+    if not is_kind(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError(f"{path}: expected a {kind} owned by uid {os.getuid()} with no group/other access")
+
+
+def _private_dir(path: str) -> None:
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    # lstat: a symlink planted in a shared /tmp is not our directory.
+    _check_private(os.lstat(path), path, "directory", stat.S_ISDIR)
+
+
+def _option(tokens: List[str], name: str) -> str:
+    prefix = f"--{name}="
+    for token in tokens:
+        if token.startswith(prefix):
+            return token[len(prefix):]
+    return ""
+
+
+def coalesce_key(line: str) -> Optional[Tuple[str, str, str]]:
+    """Return the (group, tab, panel) key for a coalescible line, else None."""
+    cmd, _, _ = line.partition(" ")
+    group = _COALESCE_GROUPS.get(cmd)
+    if group is None:
+        return None
+    # Option values in these commands never contain spaces; the quoted pwd
+    # argument may, but it is positional and never starts with `--`.
+    tokens = line.split()
+    tab = _option(tokens, "tab")
+    panel = _option(tokens, "panel")
+    if not tab or not panel:
+        return None
+    return (group, tab, panel)
+
+
+class ShellRelay:
+    def __init__(
+        self,
+        socket_path: str,
+        coalesce_s: float = 0.05,
+        dedupe_ttl_s: float = 60.0,
+        orphan_timeout_s: float = 30.0,
+        git_interval_s: float = 3.0,
+    ):
+        self.socket_path = socket_path
+        self.paths = relay_paths(socket_path)
+        self.coalesce_s = coalesce_s
+        self.dedupe_ttl_s = dedupe_ttl_s
+        self.orphan_timeout_s = orphan_timeout_s
+
+        self._selector = selectors.DefaultSelector()
+        self._fifo_fd: Optional[int] = None
+        self._fifo_keepalive_fd: Optional[int] = None
+        self._fifo_buf = b""
+        self._lock_fd: Optional[int] = None
+
+        self._upstream: Optional[socket.socket] = None
+        self._upstream_buf = b""
+        self._retry_at = 0.0
+
+        # key -> newest line for that key, in arrival order.
+        self._pending: "collections.OrderedDict[Tuple[str, str, str], str]" = collections.OrderedDict()
+        self._pending_since = 0.0
+        # key -> (line, forwarded_at)
+        self._last_sent: Dict[Tuple[str, str, str], Tuple[str, float]] = {}
+
+        self.git = GitStateService(min_interval_s=git_interval_s)
+
+        self._running = True
+        self.denied = False
+        self._socket_missing_since: Optional[float] = None
+        self.stats = {
+            "received": 0,
+            "coalesced": 0,
+            "deduped": 0,
+            "forwarded": 0,
+            "deferred": 0,
+            "rejected": 0,
+            "upstream_connects": 0,
+            "upstream_errors": 0,
+            "error_responses": 0,
+            "denied": 0,
+            "git_hints": 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def acquire(self) -> bool:
+        """Take the per-socket lock. Returns False if another relay owns it.
+
+        Raises PermissionError if the relay directory or pid file is not private.
+        """
+        _private_dir(self.paths["dir"])
+        fd = os.open(self.paths["pid"], os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        try:
+            _check_private(os.fstat(fd), self.paths["pid"], "regular file", stat.S_ISREG)
+        except PermissionError:
+            os.close(fd)
+            raise
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._lock_fd = fd
+        return True
+
+    def open_fifo(self) -> None:
+        path = self.paths["fifo"]
+        # We hold the lock, so whatever is here was left by a relay that died.
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        os.mkfifo(path, 0o600)
+        self._fifo_fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK | os.O_NOFOLLOW)
+        _check_private(os.fstat(self._fifo_fd), path, "FIFO", stat.S_ISFIFO)
+        # Hold a writer open ourselves so reads never see EOF when the last
+        # shell closes its end.
+        self._fifo_keepalive_fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+        self._selector.register(self._fifo_fd, selectors.EVENT_READ, "fifo")
+
+    def cleanup(self) -> None:
+        self._flush()
+        self.write_stats()
+        if self._fifo_fd is not None:
+            try:
+                os.unlink(self.paths["fifo"])
+            except OSError:
+                pass
+            for fd in (self._fifo_fd, self._fifo_keepalive_fd):
+                try:
+                    os.close(fd)
+                except (OSError, TypeError):
+                    pass
+            self._fifo_fd = None
+            self._fifo_keepalive_fd = None
+        self._disconnect()
+        self.git.shutdown()
+        if self._lock_fd is not None:
+            try:
+                os.unlink(self.paths["pid"])
+            except OSError:
+                pass
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def stop(self, *_args) -> None:
+        self._running = False
+
+    def write_stats(self, *_args) -> None:
+        try:
+            tmp = self.paths["stats"] + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({**self.stats, "git_runs": self.git.git_runs}, f, sort_keys=True)
+            os.replace(tmp, self.paths["stats"])
+        except OSError:
+            pass
+
+    def run(self) -> None:
+        # Connect while our launching shell (a cmux descendant) is still our parent.
+        self._connect()
+        while self._running:
+            timeout = 1.0
+            if self.git.busy:
+                timeout = 0.05
+            if self._pending:
+                timeout = min(timeout, max(0.0, self._pending_since + self.coalesce_s - time.monotonic()))
+            for key, _ in self._selector.select(timeout):
+                if key.data == "fifo":
+                    self._read_fifo()
+                elif key.data == "upstream":
+                    self._read_upstream()
+            for line in self.git.poll():
+                self.submit(line)
+            if self._pending and time.monotonic() - self._pending_since >= self.coalesce_s:
+                self._flush()
+            self._check_orphaned()
+
+    # ------------------------------------------------------------------
+    # Input
+    # ------------------------------------------------------------------
+
+    def _read_fifo(self) -> None:
+        while True:
+            try:
+                chunk = os.read(self._fifo_fd, 65536)
+            except BlockingIOError:
+                break
+            except InterruptedError:
+                continue
+            if not chunk:
+                break
+            self._fifo_buf += chunk
+        *lines, self._fifo_buf = self._fifo_buf.split(b"\n")
+        for raw in lines:
+            line = raw.decode("utf-8", errors="replace").strip()
+            if line:
+                self.submit(line)
+
+    def submit(self, line: str) -> None:
+        self.stats["received"] += 1
+        if line.startswith("git_refresh "):
+            self._git_refresh(line)
+            return
+        key = coalesce_key(line)
+        if key is None:
+            # Not a per-panel report: the relay has no business forwarding it.
+            self.stats["rejected"] += 1
+            return
+        if not self._pending:
+            self._pending_since = time.monotonic()
+        if key in self._pending:
+            self.stats["coalesced"] += 1
+            del self._pending[key]
+        self._pending[key] = line
+
+    def _git_refresh(self, line: str) -> None:
+        try:
+            tokens = shlex.split(line)
+        except ValueError:
+            return
+        args = [t for t in tokens[1:] if not t.startswith("--")]
+        tab = _option(tokens, "tab")
+        panel = _option(tokens, "panel")
+        if not args or not tab or not panel:
+            return
+        self.stats["git_hints"] += 1
+        self.git.update_panel(tab, panel, args[0], force="--force" in tokens)
+
+    # ------------------------------------------------------------------
+    # Output
+    # ------------------------------------------------------------------
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        now = time.monotonic()
+        batch: List[Tuple[Tuple[str, str, str], str]] = []
+        for key, line in self._pending.items():
+            if key[0] in _DEDUPE_GROUPS:
+                last = self._last_sent.get(key)
+                if last is not None and last[0] == line and now - last[1] < self.dedupe_ttl_s:
+                    self.stats["deduped"] += 1
+                    continue
+            batch.append((key, line))
+        self._pending.clear()
+        if not batch:
+            return
+
+        sock = self._connect()
+        if sock is None:
+            self._defer(batch)
+            return
+        payload = "".join(line + "\n" for _, line in batch).encode("utf-8")
+        try:
+            sock.setblocking(True)
+            sock.settimeout(2.0)
+            sock.sendall(payload)
+            sock.setblocking(False)
+        except OSError:
+            self.stats["upstream_errors"] += 1
+            # cmux may have rejected us and closed; pick up its reply first.
+            self._read_upstream()
+            self._disconnect()
+            self._defer(batch)
+            return
+        self.stats["forwarded"] += len(batch)
+        for key, line in batch:
+            if key[0] in _DEDUPE_GROUPS:
+                self._last_sent[key] = (line, now)
+
+    def _defer(self, batch: List[Tuple[Tuple[str, str, str], str]]) -> None:
+        """Keep undelivered reports for the next connection; newer lines for a key still win."""
+        if self.denied:
+            return
+        self.stats["deferred"] += len(batch)
+        for key, line in reversed(batch):
+            if key not in self._pending:
+                self._pending[key] = line
+                self._pending.move_to_end(key, last=False)
+        # Retry when the reconnect backoff is over, not every coalescing window.
+        self._pending_since = max(time.monotonic(), self._retry_at) - self.coalesce_s
+
+    def _connect(self) -> Optional[socket.socket]:
+        if self._upstream is not None:
+            return self._upstream
+        if self.denied:
+            return None
+        now = time.monotonic()
+        if now < self._retry_at:
+            return None
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            s.settimeout(1.0)
+            s.connect(self.socket_path)
+        except OSError:
+            s.close()
+            self.stats["upstream_errors"] += 1
+            self._retry_at = now + 0.5
+            return None
+        s.setblocking(False)
+        self._upstream = s
+        self._upstream_buf = b""
+        self.stats["upstream_connects"] += 1
+        self._selector.register(s, selectors.EVENT_READ, "upstream")
+        return s
+
+    def _disconnect(self) -> None:
+        if self._upstream is None:
+            return
+        try:
+            self._selector.unregister(self._upstream)
+        except (KeyError, ValueError):
+            pass
+        try:
+            self._upstream.close()
+        except OSError:
+            pass
+        self._upstream = None
+        # A new connection may be talking to a restarted app; resend state.
+        self._last_sent.clear()
+        self.git.resend_all()
+
+    def _read_upstream(self) -> None:
+        # Responses are only drained (so the server never blocks on write)
+        # and counted; shells never waited for them either.
+        if self._upstream is None:
+            return
+        try:
+            chunk = self._upstream.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            chunk = b""
+        if not chunk:
+            self.stats["upstream_errors"] += 1
+            self._disconnect()
+            return
+        self._upstream_buf += chunk
+        *lines, self._upstream_buf = self._upstream_buf.split(b"\n")
+        self.stats["error_responses"] += sum(1 for line in lines if line.startswith(b"ERROR"))
+        if any(line.startswith(_DENIED_PREFIXES) for line in lines):
+            self._on_denied()
+
+    def _on_denied(self) -> None:
+        """cmux refused this relay (not its descendant): hand shells back their direct path and exit."""
+        self.denied = True
+        self.stats["denied"] += 1
+        self._pending.clear()
+        try:
+            os.unlink(self.paths["fifo"])
+        except OSError:
+            pass
+        self._running = False
+
+    def _check_orphaned(self) -> None:
+        if self.orphan_timeout_s <= 0:
+            return
+        if os.path.exists(self.socket_path):
+            self._socket_missing_since = None
+            return
+        now = time.monotonic()
+        if self._socket_missing_since is None:
+            self._socket_missing_since = now
+        elif now - self._socket_missing_since >= self.orphan_timeout_s:
+            self._running = False
+
+
+def _detach() -> None:
+    """Drop the launching shell's stdio and ignore its hangups.
+
+    No fork or setsid: cmux only accepts connections from its descendants, so
+    the relay has to stay a child of the shell that started it.
+    """
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    if devnull > 2:
+        os.close(devnull)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="cmux shell-integration relay")
+    parser.add_argument("--socket", default=os.environ.get("CMUX_SOCKET_PATH"), help="cmux socket path")
+    parser.add_argument("--daemon", action="store_true", help="detach from the launching shell's stdio and hangups")
+    parser.add_argument("--coalesce-ms", type=float, default=50.0, help="coalescing window")
+    parser.add_argument("--dedupe-ttl", type=float, default=60.0, help="resend identical state after N seconds")
+    parser.add_argument("--git-interval", type=float, default=3.0, help="minimum seconds between git status scans per repo")
+    parser.add_argument("--orphan-timeout", type=float, default=30.0, help="exit after the socket is gone this long (0 = never)")
+    args = parser.parse_args()
+
+    if not args.socket:
+        print("cmux-shell-relay: no socket (pass --socket or set CMUX_SOCKET_PATH)", file=sys.stderr)
+        return 2
+
+    relay = ShellRelay(
+        args.socket,
+        coalesce_s=args.coalesce_ms / 1000.0,
+        dedupe_ttl_s=args.dedupe_ttl,
+        orphan_timeout_s=args.orphan_timeout,
+        git_interval_s=args.git_interval,
+    )
+    try:
+        if not relay.acquire():
+            # Another shell already started the relay for this socket.
+            return 0
+    except PermissionError as e:
+        print(f"cmux-shell-relay: {e}", file=sys.stderr)
+        return 1
+
+    for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+        signal.signal(sig, relay.stop)
+    if args.daemon:
+        _detach()
+    signal.signal(signal.SIGUSR1, relay.write_stats)
+
+    try:
+        relay.open_fifo()
+        relay.run()
+    finally:
+        relay.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+"""Shared git branch/dirty state for the shell-integration relay.
+
+Without the relay, every panel's prompt launches `git branch --show-current`
+and `git status --porcelain -uno` on its own, so ten panes in one monorepo run
+ten identical status scans. GitStateService keys state by repository root
+instead:
+
+- the branch is read straight from HEAD (no git process at all);
+- `git status` runs at most once per repository when HEAD/index change, when a
+  prompt asks with --force (after a `git ...` command), or when a prompt asks
+  and the cached result is older than `min_interval_s`;
+- the result is shared by every panel in the repository, and a
+  `report_git_branch` / `clear_git_branch` line is produced for a panel only
+  when what it shows would change.
+
+Used by cmux-shell-relay.py, which feeds it `git_refresh` hints from shells.
+"""
+
+import concurrent.futures
+import os
+import subprocess
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+PanelKey = Tuple[str, str]  # (tab, panel)
+
+# How long a pwd -> repository lookup is trusted before walking up again.
+# Cheaper checks catch `git init` in the pwd itself and a removed `.git`.
+REPO_LOOKUP_TTL_S = 5.0
+
+
+def find_repo(path: str) -> Optional[Tuple[str, str]]:
+    """Return (worktree root, git dir) for `path`, without invoking git.
+
+    Mirrors _cmux_git_resolve_head_path in cmux-zsh-integration.zsh, including
+    `.git` files that point at a worktree's gitdir.
+    """
+    d = os.path.abspath(path or "/")
+    while True:
+        dot_git = os.path.join(d, ".git")
+        if os.path.isdir(dot_git):
+            return d, dot_git
+        if os.path.isfile(dot_git):
+            try:
+                with open(dot_git, "r", encoding="utf-8") as f:
+                    line = f.readline().strip()
+            except OSError:
+                line = ""
+            if line.startswith("gitdir:"):
+                gitdir = line[len("gitdir:"):].strip()
+                if gitdir:
+                    if not os.path.isabs(gitdir):
+                        gitdir = os.path.normpath(os.path.join(d, gitdir))
+                    return d, gitdir
+        parent = os.path.dirname(d)
+        if parent == d:
+            return None
+        d = parent
+
+
+def read_branch(git_dir: str) -> str:
+    """Branch name from HEAD, or "" when detached (like `git branch --show-current`)."""
+    try:
+        with open(os.path.join(git_dir, "HEAD"), "r", encoding="utf-8") as f:
+            head = f.read().strip()
+    except OSError:
+        return ""
+    prefix = "ref: refs/heads/"
+    return head[len(prefix):] if head.startswith(prefix) else ""
+
+
+def _mtime_ns(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def git_is_dirty(root: str) -> bool:
+    # --no-optional-locks keeps status from rewriting the index, which would
+    # bump its mtime and retrigger our own watch.
+    result = subprocess.run(
+        ["git", "--no-optional-locks", "-C", root, "status", "--porcelain", "-uno"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        timeout=30,
+    )
+    return bool(result.stdout.strip())
+
+
+class _Repo:
+    __slots__ = (
+        "root", "git_dir", "panels", "signature", "branch", "dirty",
+        "computed_at", "refresh_requested", "force_requested", "future",
+    )
+
+    def __init__(self, root: str, git_dir: str):
+        self.root = root
+        self.git_dir = git_dir
+        self.panels: Set[PanelKey] = set()
+        self.signature: Tuple[int, int] = (0, 0)
+        self.branch: Optional[str] = None  # None until first computed
+        self.dirty = False
+        self.computed_at = 0.0
+        self.refresh_requested = True
+        self.force_requested = True
+        self.future: Optional[concurrent.futures.Future] = None
+
+    def current_signature(self) -> Tuple[int, int]:
+        return (
+            _mtime_ns(os.path.join(self.git_dir, "HEAD")),
+            _mtime_ns(os.path.join(self.git_dir, "index")),
+        )
+
+
+class GitStateService:
+    """Per-repository git state shared across panels."""
+
+    def __init__(
+        self,
+        min_interval_s: float = 3.0,
+        max_workers: int = 2,
+        panel_ttl_s: float = 3600.0,
+        dirty_check: Callable[[str], bool] = git_is_dirty,
+    ):
+        self.min_interval_s = min_interval_s
+        self.panel_ttl_s = panel_ttl_s
+        self._dirty_check = dirty_check
+        # max_workers=0 computes inline (handy for tests and benchmarks).
+        self._executor = (
+            concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cmux-git")
+            if max_workers > 0 else None
+        )
+
+        self._repos: Dict[str, _Repo] = {}
+        self._panel_repo: Dict[PanelKey, Optional[str]] = {}
+        self._panel_pwd: Dict[PanelKey, str] = {}
+        self._panel_seen: Dict[PanelKey, float] = {}
+        self._pushed: Dict[PanelKey, str] = {}
+        # pwd -> (find_repo result, monotonic time it was looked up)
+        self._repo_cache: Dict[str, Tuple[Optional[Tuple[str, str]], float]] = {}
+
+        self.git_runs = 0
+        self.pushes = 0
+
+    @property
+    def busy(self) -> bool:
+        return any(repo.future is not None for repo in self._repos.values())
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def update_panel(self, tab: str, panel: str, pwd: str, force: bool = False) -> None:
+        """Record a prompt in `pwd` for a panel (a `git_refresh` hint)."""
+        key = (tab, panel)
+        self._panel_seen[key] = time.monotonic()
+        self._panel_pwd[key] = pwd
+        # Looked up on every hint, not only when pwd changes: the same
+        # directory can gain or lose a repository (git init/clone, rm -rf .git).
+        found = self._lookup_repo(pwd)
+        if key not in self._panel_repo or self._panel_repo[key] != (found[0] if found else None):
+            self._move_panel(key, found)
+        root = self._panel_repo.get(key)
+        if root is None:
+            return
+        repo = self._repos[root]
+        repo.refresh_requested = True
+        repo.force_requested = repo.force_requested or force
+
+    def resend_all(self) -> None:
+        """Forget what the app was told: the connection to it was lost.
+
+        Panels keep their entries (with a placeholder) so a pending clear is
+        still sent; the next poll() returns every panel's current line.
+        """
+        for key in self._pushed:
+            self._pushed[key] = ""
+
+    def poll(self) -> List[str]:
+        """Start due computations, collect finished ones; return lines to send."""
+        now = time.monotonic()
+        self._prune(now)
+        for repo in list(self._repos.values()):
+            if repo.future is not None:
+                if not repo.future.done():
+                    continue
+                self._finish(repo, repo.future)
+            signature = repo.current_signature()
+            changed = signature != repo.signature
+            stale = repo.refresh_requested and now - repo.computed_at >= self.min_interval_s
+            if changed or repo.force_requested or stale:
+                repo.signature = signature
+                repo.refresh_requested = False
+                repo.force_requested = False
+                self._start(repo, now)
+        return self._pending_lines()
+
+    # ------------------------------------------------------------------
+
+    def _lookup_repo(self, pwd: str) -> Optional[Tuple[str, str]]:
+        now = time.monotonic()
+        cached = self._repo_cache.get(pwd)
+        if cached is not None:
+            found, looked_up = cached
+            root = found[0] if found else None
+            if (
+                now - looked_up < REPO_LOOKUP_TTL_S
+                and (root is None or os.path.lexists(os.path.join(root, ".git")))
+                and (root == os.path.abspath(pwd) or not os.path.lexists(os.path.join(pwd, ".git")))
+            ):
+                return found
+        if len(self._repo_cache) > 4096:
+            self._repo_cache.clear()
+        found = find_repo(pwd)
+        self._repo_cache[pwd] = (found, now)
+        return found
+
+    def _move_panel(self, key: PanelKey, found: Optional[Tuple[str, str]]) -> None:
+        old_root = self._panel_repo.get(key)
+        if old_root is not None and old_root in self._repos:
+            self._repos[old_root].panels.discard(key)
+        if found is None:
+            self._panel_repo[key] = None
+            return
+        root, git_dir = found
+        repo = self._repos.get(root)
+        if repo is None:
+            repo = self._repos[root] = _Repo(root, git_dir)
+        repo.panels.add(key)
+        self._panel_repo[key] = root
+
+    def _start(self, repo: _Repo, now: float) -> None:
+        self.git_runs += 1
+        repo.computed_at = now
+        if self._executor is None:
+            future: concurrent.futures.Future = concurrent.futures.Future()
+            try:
+                future.set_result(self._compute(repo.root, repo.git_dir))
+            except Exception as e:
+                future.set_exception(e)
+            self._finish(repo, future)
+        else:
+            repo.future = self._executor.submit(self._compute, repo.root, repo.git_dir)
+
+    def _compute(self, root: str, git_dir: str) -> Tuple[str, bool]:
+        branch = read_branch(git_dir)
+        # Detached HEAD clears the sidebar entry, so skip the status scan.
+        return branch, (self._dirty_check(root) if branch else False)
+
+    def _finish(self, repo: _Repo, future: concurrent.futures.Future) -> None:
+        repo.future = None
+        try:
+            repo.branch, repo.dirty = future.result()
+        except Exception:
+            # Keep the previous state; the next hint retries.
+            repo.refresh_requested = True
+
+    def _pending_lines(self) -> List[str]:
+        lines: List[str] = []
+        for key, root in self._panel_repo.items():
+            if root is None:
+                line = f"clear_git_branch --tab={key[0]} --panel={key[1]}"
+                if key not in self._pushed:
+                    # Never told the app anything for this panel; nothing to clear.
+                    continue
+            else:
+                repo = self._repos[root]
+                if repo.branch is None:
+                    continue
+                if repo.branch:
+                    status = " --status=dirty" if repo.dirty else ""
+                    line = f"report_git_branch {repo.branch}{status} --tab={key[0]} --panel={key[1]}"
+                else:
+                    line = f"clear_git_branch --tab={key[0]} --panel={key[1]}"
+            if self._pushed.get(key) != line:
+                self._pushed[key] = line
+                lines.append(line)
+        self.pushes += len(lines)
+        return lines
+
+    def _prune(self, now: float) -> None:
+        if self.panel_ttl_s <= 0:
+            return
+        for key, seen in list(self._panel_seen.items()):
+            if now - seen < self.panel_ttl_s:
+                continue
+            self._move_panel(key, None)
+            for table in (self._panel_repo, self._panel_pwd, self._panel_seen, self._pushed):
+                table.pop(key, None)
+        for root, repo in list(self._repos.items()):
+            if not repo.panels and repo.future is None:
+                del self._repos[root]
@@ -1957,7 +1957,7 @@ class TerminalController {
         }
 
         var newId: UUID?
-        let shouldFocus = v2FocusAllowed()
+        let shouldFocus = v2FocusAllowed(requested: v2Bool(params, "focus") ?? true)
         #if DEBUG
         let startedAt = ProcessInfo.processInfo.systemUptime
         #endif
@@ -5624,6 +5624,12 @@ class TerminalController {
     }
 
     private func v2BrowserScreenshot(params: [String: Any]) -> V2CallResult {
+        // With out_path the PNG is written there and only the path comes back, so large
+        // captures are not base64-encoded into the response and decoded by the client.
+        let outPath = v2String(params, "out_path")
+        if let outPath, !outPath.hasPrefix("/") {
+            return .err(code: "invalid_params", message: "out_path must be absolute", data: ["out_path": outPath])
+        }
         return v2BrowserWithPanel(params: params) { _, ws, surfaceId, browserPanel in
             var done = false
             var imageData: Data?
@@ -5644,13 +5650,27 @@ class TerminalController {
                 return .err(code: "internal_error", message: "Failed to capture snapshot", data: nil)
             }
 
-            return .ok([
+            var payload: [String: Any] = [
                 "workspace_id": ws.id.uuidString,
                 "workspace_ref": v2Ref(kind: .workspace, uuid: ws.id),
                 "surface_id": surfaceId.uuidString,
-                "surface_ref": v2Ref(kind: .surface, uuid: surfaceId),
-                "png_base64": imageData.base64EncodedString()
-            ])
+                "surface_ref": v2Ref(kind: .surface, uuid: surfaceId)
+            ]
+            if let outPath {
+                do {
+                    try imageData.write(to: URL(fileURLWithPath: outPath), options: .atomic)
+                } catch {
+                    return .err(code: "internal_error", message: "Failed to write screenshot", data: [
+                        "out_path": outPath,
+                        "error": error.localizedDescription
+                    ])
+                }
+                payload["path"] = outPath
+                payload["byte_count"] = imageData.count
+            } else {
+                payload["png_base64"] = imageData.base64EncodedString()
+            }
+            return .ok(payload)
         }
     }
 
@@ -7960,19 +7980,25 @@ class TerminalController {
         }
         let label = v2String(params, "label") ?? ""
         let args = label.isEmpty ? surfaceId : "\(surfaceId) \(label)"
-        let resp = panelSnapshot(args)
+        let writeRaw = v2Bool(params, "raw") ?? false
+        let resp = panelSnapshot(args, writeRaw: writeRaw)
         guard resp.hasPrefix("OK ") else { return .err(code: "internal_error", message: resp, data: nil) }
         let payload = String(resp.dropFirst(3)).trimmingCharacters(in: .whitespacesAndNewlines)
         let parts = payload.split(separator: " ", maxSplits: 4).map(String.init)
         guard parts.count == 5 else {
             return .err(code: "internal_error", message: "panel_snapshot parse failed", data: ["payload": payload])
         }
+        let rawPath = (parts[4] as NSString).deletingPathExtension + ".rgba"
+        let rawWritten = writeRaw && FileManager.default.fileExists(atPath: rawPath)
         return .ok([
             "surface_id": parts[0],
             "changed_pixels": Int(parts[1]) ?? -1,
             "width": Int(parts[2]) ?? 0,
             "height": Int(parts[3]) ?? 0,
-            "path": parts[4]
+            "path": parts[4],
+            "raw_path": v2OrNull(rawWritten ? rawPath : nil),
+            "raw_alpha": v2OrNull(rawWritten ? "premultiplied" : nil),
+            "bytes_per_row": (Int(parts[2]) ?? 0) * 4
         ])
     }
 
@@ -9658,7 +9684,9 @@ class TerminalController {
         return changed
     }
 
-    private func panelSnapshot(_ args: String) -> String {
+    /// `writeRaw` also saves the pixels as `<name>.rgba` next to the PNG: RGBA8, rows of width * 4 bytes,
+    /// premultiplied alpha (the PNG stores straight alpha, so the two differ wherever alpha < 255).
+    private func panelSnapshot(_ args: String, writeRaw: Bool = false) -> String {
         guard let tabManager = tabManager else { return "ERROR: TabManager not available" }
         let trimmed = args.trimmingCharacters(in: .whitespacesAndNewlines)
         guard !trimmed.isEmpty else { return "ERROR: Usage: panel_snapshot <panel_id|idx> [label]" }
@@ -9681,6 +9709,7 @@ class TerminalController {
         let outputPath = outputDir.appendingPathComponent(filename)
 
         var result = "ERROR: No tab selected"
+        var rawPixels: Data?
         DispatchQueue.main.sync {
             guard let tabId = tabManager.selectedTabId,
                   let tab = tabManager.tabs.first(where: { $0.id == tabId }) else {
@@ -9732,10 +9761,19 @@ class TerminalController {
                 result = "ERROR: Failed to write file: \(error.localizedDescription)"
                 return
             }
+            if writeRaw {
+                rawPixels = current.rgba
+            }
 
             result = "OK \(panelId.uuidString) \(changedPixels) \(current.width) \(current.height) \(outputPath.path)"
         }
 
+        // Raw RGBA next to the PNG so test clients can memory-map pixels instead of decoding.
+        // Written off the main thread; only when asked for, since most callers only read changed_pixels.
+        if let rawPixels {
+            try? rawPixels.write(to: outputPath.deletingPathExtension().appendingPathExtension("rgba"))
+        }
+
         return result
     }
 #endif
@@ -206,9 +206,10 @@ struct SwiftTermView: NSViewRepresentable {
     }
 
     func updateNSView(_ nsView: FocusableTerminalView, context: Context) {
-        // When this view becomes visible (tab switch), make it first responder
+        // When this view becomes visible (tab switch), make it first responder.
+        // updateNSView runs on every SwiftUI update, so only ask when it isn't already.
         DispatchQueue.main.async {
-            if let terminalView = nsView.terminalView {
+            if let terminalView = nsView.terminalView, nsView.window?.firstResponder !== terminalView {
                 nsView.window?.makeFirstResponder(terminalView)
             }
         }
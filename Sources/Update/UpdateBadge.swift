@@ -57,7 +57,7 @@ fileprivate struct BrowserStyleLoadingSpinner: View {
     let color: Color
 
     var body: some View {
-        TimelineView(.animation) { context in
+        TimelineView(.animation) { context in  // cmux-lint: disable=unpaused-timeline-view (only on screen while an update check runs)
             let t = context.date.timeIntervalSinceReferenceDate
             let angle = (t.truncatingRemainder(dividingBy: 0.9) / 0.9) * 360.0
 
@@ -0,0 +1,338 @@
+"""Lint rules for the Swift sources, run by scripts/cmux_swift_scan.py.
+
+Each rule gets a parsed SourceFile (see cmux_swift_scan) and yields Findings.
+Use `src.code_lines` to match code only; comments are already blanked out.
+Severity: "error" for patterns that are always wrong, "warning" for ones
+that need a reason to stay (suppress them in the Swift source), "note" for
+things worth a look that never fail the lint.
+"""
+
+import ast
+import operator
+import re
+from typing import Dict, Iterator, List, Optional
+
+from cmux_swift_scan import Finding, SourceFile, rule
+
+AUTOUPDATING_TEXT_STYLES = (".time", ".timer", ".relative", ".offset")
+
+
+@rule("autoupdating-text-style", needles=("style:",), severity="error")
+def autoupdating_text_style(src: SourceFile) -> Iterator[Finding]:
+    """Text(_:style:) with a date style that keeps re-rendering the view.
+
+    Text(date, style: .time/.timer/.relative/.offset) updates continuously and
+    can lead to high CPU usage. Use static formatting instead:
+    Text(date.formatted(date: .omitted, time: .shortened)).
+    """
+    for line_num, line in enumerate(src.code_lines, start=1):
+        compact = line.replace(" ", "")
+        if any(f"style:{style}" in compact and not compact.split(f"style:{style}", 1)[1][:1].isalnum()
+               for style in AUTOUPDATING_TEXT_STYLES):
+            yield Finding("autoupdating-text-style", src.path, line_num,
+                          "auto-updating Text date style", src.lines[line_num - 1].strip())
+
+
+# ---------------------------------------------------------------------------
+# CPU-burn catalogue: patterns that keep the main thread or the render loop busy
+# ---------------------------------------------------------------------------
+
+UPDATE_FUNCS = re.compile(
+    r"func (updateNSView|updateUIView|layout|viewDidLayout|layoutSubviews)\("
+)
+BODY = re.compile(r"\bvar body\s*:\s*some View\b")
+BODY_ALLOCATIONS = re.compile(
+    r"\b(DateFormatter|NumberFormatter|ISO8601DateFormatter|DateComponentsFormatter|"
+    r"ByteCountFormatter|NSRegularExpression|JSONDecoder|JSONEncoder)\s*\("
+)
+REPEATING_TIMER = re.compile(r"\bTimer\s*(\.scheduledTimer)?\s*\(.*\brepeats:\s*true\b")
+TIMER_INTERVAL = re.compile(r"\b(?:withTimeInterval|timeInterval|every):\s*([\d.\s*/+()-]+?)\s*[,)]")
+LAYOUT_NOTIFICATIONS = re.compile(r"\b(frameDidChangeNotification|boundsDidChangeNotification)\b")
+# Property wrappers whose writes invalidate a SwiftUI view.
+STATE_DECL = re.compile(r"@(?:State|Binding|Published|AppStorage|SceneStorage|FocusState)\b[^{=]*?\bvar\s+(\w+)")
+# Statements that cause another update/layout pass by themselves.
+LOOP_EFFECTS = re.compile(
+    r"\bmakeFirstResponder\(|\binvalidateIntrinsicContentSize\(\)|\b(?:needsLayout|needsUpdateConstraints)\s*=\s*true\b"
+    r"|\bobjectWillChange\.send\(\)|\.wrappedValue\s*=(?!=)"
+)
+CONDITION = re.compile(r"\s*(?:\}\s*)?(?:else\s+)?(?:if|guard|while)\b")
+GUARD = re.compile(r"\s*guard\b")
+COMPARISON = re.compile(r"[!=]==?|(?<!-)[<>]|\babs\(")
+IDENT = re.compile(r"\b[A-Za-z_]\w*\b")
+SWIFT_KEYWORDS = {"if", "guard", "else", "let", "var", "true", "false", "nil", "self", "return", "while", "is", "as"}
+HIGH_FREQUENCY_INTERVAL_S = 0.1
+# onReceive subscribers run on the main thread and usually write view state, so
+# their publishers are held to a stricter bar than plain callbacks.
+ON_RECEIVE_TIMER_INTERVAL_S = 1.0
+ON_RECEIVE_TIMER = re.compile(r"\bTimer\.publish\s*\(\s*every:\s*([^,)]+)")
+ON_RECEIVE_GEOMETRY = re.compile(
+    r"\bpublisher\s*\(\s*for:\s*\\\.(frame|bounds|visibleRect|documentVisibleRect|contentOffset|contentSize)\b"
+)
+# Notifications that fire per frame, per scroll step or per event-loop pass.
+ON_RECEIVE_FIREHOSES = re.compile(
+    r"\b(frameDidChangeNotification|boundsDidChangeNotification|globalFrameDidChangeNotification|"
+    r"didLiveScrollNotification|didUpdateNotification|didResizeNotification|didMoveNotification|"
+    r"didChangeSelectionNotification|didProcessEditingNotification)\b"
+)
+ON_RECEIVE_RATE_LIMITS = re.compile(r"\.(throttle|debounce|removeDuplicates)\s*\(")
+_ARITHMETIC = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv}
+
+
+def _code(src: SourceFile, n: int) -> str:
+    """Code of 1-based line `n` with string literals emptied, so their braces don't count."""
+    return re.sub(r'"(?:\\.|[^"\\])*"', '""', src.code_lines[n - 1])
+
+
+def _open_blocks(src: SourceFile, first: int, last: int) -> Dict[int, List[int]]:
+    """For each line in first..last, the lines whose `{` blocks are still open where it starts."""
+    stack: List[int] = []
+    out: Dict[int, List[int]] = {}
+    for n in range(first, last + 1):
+        out[n] = list(stack)
+        for ch in _code(src, n):
+            if ch == "{":
+                stack.append(n)
+            elif ch == "}" and stack:
+                stack.pop()
+    return out
+
+
+def _condition(src: SourceFile, line: int) -> str:
+    """The if/guard/while condition whose block opens on `line` (it may span a few lines), or ""."""
+    for k in range(line, max(0, line - 5), -1):
+        if CONDITION.match(_code(src, k)):
+            return " ".join(_code(src, n) for n in range(k, line + 1))
+        if k != line and ("{" in _code(src, k) or "}" in _code(src, k)):
+            break
+    return ""
+
+
+def _closure_end(src: SourceFile, line: int, col: int, last: int) -> int:
+    """Last line of the closure passed to the hop that starts at `col` on `line`."""
+    depth, opened = 0, False
+    for n in range(line, last + 1):
+        code = _code(src, n)[col:] if n == line else _code(src, n)
+        depth += code.count("{") - code.count("}")
+        opened = opened or "{" in code
+        if opened and depth <= 0:
+            return n
+    return last
+
+
+def _call_text(src: SourceFile, line: int, col: int, limit: int = 8) -> str:
+    """Text of the call whose `(` is the first one at or after `col` on `line`, through its `)`."""
+    depth, out = 0, []
+    for n in range(line, min(line + limit, len(src.code_lines) + 1)):
+        code = _code(src, n)[col:] if n == line else _code(src, n)
+        for i, ch in enumerate(code):
+            if ch == "(":
+                depth += 1
+            elif ch == ")" and depth:
+                depth -= 1
+                if depth == 0:
+                    out.append(code[:i + 1])
+                    return " ".join(out)
+        out.append(code)
+    return " ".join(out)
+
+
+def _interval(expr: str) -> Optional[float]:
+    """Value of a literal interval such as `1.0 / 60.0`; None if it is not numbers and + - * / only."""
+    try:
+        tree = ast.parse(expr.strip(), mode="eval")
+    except SyntaxError:
+        return None
+
+    def value(node: ast.AST) -> float:
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            return float(node.value)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+            operand = value(node.operand)
+            return operand if isinstance(node.op, ast.UAdd) else -operand
+        if isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC:
+            return _ARITHMETIC[type(node.op)](value(node.left), value(node.right))
+        raise ValueError(ast.dump(node))
+
+    try:
+        return value(tree.body)
+    except (ValueError, ZeroDivisionError, OverflowError, RecursionError):
+        return None
+
+
+@rule("unguarded-main-async-in-update", needles=("DispatchQueue.main.async",))
+def unguarded_main_async_in_update(src: SourceFile) -> Iterator[Finding]:
+    """DispatchQueue.main.async from updateNSView/layout with no re-dispatch guard.
+
+    SwiftUI calls updateNSView (and AppKit calls layout) whenever anything
+    upstream changes. A hop whose closure writes view state, moves the first
+    responder or invalidates layout schedules another update, which
+    schedules another hop: the view re-renders forever at idle (the omnibar
+    bug). An `if` around the hop doesn't help when it reads state that only
+    the closure changes. Guard the hop with a pending flag tested and set
+    before dispatching (see BrowserPanelView's pendingFocusRequest), or make
+    the closure compare before it writes so the loop settles.
+    """
+    state = set(STATE_DECL.findall("\n".join(src.code_lines)))
+    writes_state = re.compile(r"\b(?:%s)\s*[-+*/]?=(?!=)" % "|".join(sorted(state))) if state else None
+
+    def effects(text: str) -> Iterator[int]:
+        """Columns in `text` of statements that can trigger another update."""
+        for m in LOOP_EFFECTS.finditer(text):
+            yield m.start()
+        if writes_state is not None:
+            for m in writes_state.finditer(text):
+                yield m.start()
+
+    def compares(text: str) -> bool:
+        m = re.search(r"\b(?:if|guard|while)\b(.*)", text)
+        return m is not None and COMPARISON.search(m.group(1)) is not None
+
+    def enclosing(open_blocks: Dict[int, List[int]], n: int, after: int) -> List[str]:
+        """Conditions in force at line n from blocks opened after line `after`, plus earlier guards."""
+        conditions = [_condition(src, o) for o in open_blocks[n] if o > after]
+        for g in range(after + 1, n):
+            if GUARD.match(_code(src, g)) and open_blocks[n][:len(open_blocks[g])] == open_blocks[g]:
+                conditions.append(_condition(src, g) or _code(src, g))
+        return [c for c in conditions if c]
+
+    for first, last in src.blocks(UPDATE_FUNCS):
+        open_blocks = _open_blocks(src, first, last)
+        for n in range(first + 1, last + 1):
+            col = _code(src, n).find("DispatchQueue.main.async")
+            if col < 0:
+                continue
+            end = _closure_end(src, n, col, last)
+
+            # Does the closure do anything that feeds back into another update, unchecked?
+            unchecked = False
+            for c in range(n, end + 1):
+                text = _code(src, c)[col:] if c == n else _code(src, c)
+                for at in effects(text):
+                    inside = [cond for cond in enclosing(open_blocks, c, n) if cond]
+                    if not (compares(text[:at]) or any(compares(cond) for cond in inside)):
+                        unchecked = True
+            if not unchecked:
+                continue
+
+            # Pending-flag guard: a name tested before the hop and assigned before dispatching.
+            before = _code(src, n)[:col]
+            names = set()
+            for cond in enclosing(open_blocks, n, first) + [before]:
+                names.update(IDENT.findall(cond))
+            assigned = " ".join(re.sub(r"\b(?:let|var)\s+\w+\s*=", "", _code(src, k)) for k in range(first + 1, n))
+            assigned += " " + before
+            if any(re.search(r"\b%s\s*=(?!=)" % name, assigned) for name in names - SWIFT_KEYWORDS):
+                continue
+            yield Finding("unguarded-main-async-in-update", src.path, n,
+                          "main-queue hop in an update/layout pass without a re-dispatch guard",
+                          src.lines[n - 1].strip())
+
+
+@rule("body-allocation", needles=("var body",))
+def body_allocation(src: SourceFile) -> Iterator[Finding]:
+    """Formatter, regex or coder constructed inside a SwiftUI body.
+
+    These are expensive to create and body runs on every render. Hoist them
+    into a static let or a cached property.
+    """
+    for first, last in src.blocks(BODY):
+        for n in range(first, last + 1):
+            m = BODY_ALLOCATIONS.search(src.code_lines[n - 1])
+            if m:
+                yield Finding("body-allocation", src.path, n,
+                              f"{m.group(1)} created on every render", src.lines[n - 1].strip())
+
+
+@rule("timer-without-invalidate", needles=("repeats: true", "CVDisplayLinkStart", "CADisplayLink("))
+def timer_without_invalidate(src: SourceFile) -> Iterator[Finding]:
+    """Repeating timer or display link in a file that never stops one.
+
+    A repeating Timer keeps firing (and keeps its target alive) until it is
+    invalidated; a display link fires every frame until it is stopped.
+    """
+    code = "\n".join(src.code_lines)
+    for n, line in enumerate(src.code_lines, start=1):
+        if REPEATING_TIMER.search(line) or "CADisplayLink(" in line:
+            stop = ".invalidate()"
+        elif "CVDisplayLinkStart(" in line:
+            stop = "CVDisplayLinkStop("
+        else:
+            continue
+        if stop not in code:
+            yield Finding("timer-without-invalidate", src.path, n,
+                          f"repeating timer is never stopped (no {stop.strip('.(')} in this file)",
+                          src.lines[n - 1].strip())
+
+
+@rule("high-frequency-callback", needles=("Interval:", "every:", "DidChangeNotification"), severity="note")
+def high_frequency_callback(src: SourceFile) -> Iterator[Finding]:
+    """Timer faster than 10Hz, or an observer of per-frame layout notifications.
+
+    Fine while a gesture is in flight; make sure it stops when the gesture
+    ends and never runs at idle.
+    """
+    for n, line in enumerate(src.code_lines, start=1):
+        if "Timer" in line:
+            m = TIMER_INTERVAL.search(line)
+            seconds = _interval(m.group(1)) if m else None
+            if seconds is not None and seconds < HIGH_FREQUENCY_INTERVAL_S:
+                yield Finding("high-frequency-callback", src.path, n,
+                              f"timer fires every {seconds * 1000:.0f}ms", src.lines[n - 1].strip())
+        m = LAYOUT_NOTIFICATIONS.search(line)
+        if m:
+            yield Finding("high-frequency-callback", src.path, n,
+                          f"observes {m.group(1)}", src.lines[n - 1].strip())
+
+
+@rule("high-frequency-on-receive", needles=("onReceive",))
+def high_frequency_on_receive(src: SourceFile) -> Iterator[Finding]:
+    """.onReceive of a publisher that fires continuously, with no throttle or debounce.
+
+    The closure runs on the main thread for every value, and a state write in
+    it re-renders the view: a sub-second Timer.publish, a KVO publisher on
+    frame/bounds/scroll geometry, or a per-frame notification (frame/bounds
+    changes, live scroll, window/app didUpdate) keeps the view busy while
+    nothing visible changes. Add .throttle/.debounce (or .removeDuplicates for
+    geometry) to the chain, or observe the event that actually matters.
+    """
+    for n in range(1, len(src.code_lines) + 1):
+        col = _code(src, n).find(".onReceive(")
+        if col < 0:
+            continue
+        publisher = _call_text(src, n, col)
+        if ON_RECEIVE_RATE_LIMITS.search(publisher):
+            continue
+        what = None
+        m = ON_RECEIVE_TIMER.search(publisher)
+        if m:
+            seconds = _interval(m.group(1))
+            if seconds is not None and seconds < ON_RECEIVE_TIMER_INTERVAL_S:
+                what = f"a timer every {seconds * 1000:.0f}ms"
+        m = ON_RECEIVE_GEOMETRY.search(publisher) or ON_RECEIVE_FIREHOSES.search(publisher)
+        if m:
+            what = m.group(1)
+        if what:
+            yield Finding("high-frequency-on-receive", src.path, n,
+                          f"onReceive of {what} without throttle/debounce", src.lines[n - 1].strip())
+
+
+@rule("unpaused-timeline-view", needles=("TimelineView",))
+def unpaused_timeline_view(src: SourceFile) -> Iterator[Finding]:
+    """TimelineView(.animation) without `paused:` redraws every frame while on screen.
+
+    Use .animation(minimumInterval:paused:) tied to the state that needs it,
+    or a periodic schedule.
+    """
+    for n, line in enumerate(src.code_lines, start=1):
+        if re.search(r"\bTimelineView\s*\(\s*\.animation\b(?!\s*\([^)]*paused:)", line):
+            yield Finding("unpaused-timeline-view", src.path, n,
+                          "TimelineView(.animation) never pauses", src.lines[n - 1].strip())
+
+
+@rule("repeat-forever-animation", needles=("repeatForever",))
+def repeat_forever_animation(src: SourceFile) -> Iterator[Finding]:
+    """.repeatForever animations keep Core Animation committing frames until the view goes away."""
+    for n, line in enumerate(src.code_lines, start=1):
+        if ".repeatForever(" in line:
+            yield Finding("repeat-forever-animation", src.path, n,
+                          "animation repeats forever", src.lines[n - 1].strip())
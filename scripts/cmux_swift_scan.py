@@ -0,0 +1,513 @@
+#!/usr/bin/env python3
+"""Cached, parallel scanner for the Swift sources, shared by the lint tests.
+
+Each Sources/ file is lexed once into lines, comment-free code lines and an
+identifier set. The result is cached on disk, keyed by mtime/size and
+content hash. Rule findings are cached per (file hash, rule fingerprint), so
+a run after a one-file edit lexes and checks only that file. New or changed
+files are processed in a process pool once there are enough of them to pay
+for it.
+
+Rules are plain functions registered with @rule in an importable module
+(default: cmux_swift_rules). Workers import the same modules, so a rule is
+just:
+
+    @rule("autoupdating-text-style", needles=("style:",))
+    def autoupdating_text_style(src: SourceFile) -> Iterator[Finding]:
+        for n, line in enumerate(src.code_lines, start=1):
+            ...
+
+`needles` lets the scanner skip files that can't match without calling the
+rule. A rule's fingerprint is a hash of its source, so editing a rule
+invalidates just its cached findings.
+
+Every rule has a severity (error, warning or note). A finding can be
+suppressed in the Swift source, preferably with a reason:
+
+    foo()  // cmux-lint: disable=rule-id (why this is fine)
+    // cmux-lint: disable=rule-id,other-rule       <- applies to the next line
+    // cmux-lint: disable-file=rule-id             <- anywhere in the file
+
+Usage:
+    from cmux_swift_scan import SwiftScanner
+
+    scanner = SwiftScanner(repo_root)
+    findings = scanner.run()                  # every registered rule
+    timing = scanner.file("Sources/Update/UpdateTiming.swift").constants()
+
+    # or from a shell (text, json or sarif; exit 1 on errors/warnings):
+    python3 scripts/cmux_swift_scan.py [--rules ID] [--format sarif --output lint.sarif]
+"""
+
+import argparse
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import pickle
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+CACHE_VERSION = 2
+DEFAULT_RULE_MODULES = ("cmux_swift_rules",)
+
+# Below this many files to (re)scan, a process pool costs more than it saves.
+PARALLEL_THRESHOLD = 16
+
+SEVERITIES = ("error", "warning", "note")
+
+_IDENT_RE = re.compile(r"[A-Za-z_]\w*")
+_SUPPRESS_RE = re.compile(r"//\s*cmux-lint:\s*(disable|disable-file)=([\w*,-]+)")
+_STRING_RE = re.compile(r'"(?:\\.|[^"\\])*"')
+_CONSTANT_RE = re.compile(r"\b(?:static\s+)?let\s+(\w+)\s*(?::\s*[\w.<>?\[\]]+)?\s*=\s*(-?[0-9][0-9_.]*|\"[^\"]*\"|true|false)")
+
+
+@dataclass
+class Finding:
+    rule: str
+    path: str
+    line: int
+    message: str
+    snippet: str = ""
+    severity: str = ""  # filled in from the rule when empty
+
+
+@dataclass
+class SourceFile:
+    path: str  # relative to the scanned root
+    sha1: str
+    text: str
+    lines: List[str]
+    code_lines: List[str]  # comments blanked out, columns preserved
+    identifiers: Set[str] = field(default_factory=set)
+
+    def suppressed(self, rule_id: str, line: int) -> bool:
+        """True if a cmux-lint comment disables `rule_id` for this 1-based line."""
+        if "cmux-lint:" not in self.text:
+            return False
+        for n, raw in enumerate(self.lines, start=1):
+            for m in _SUPPRESS_RE.finditer(raw):
+                ids = m.group(2).split(",")
+                if rule_id not in ids and "*" not in ids:
+                    continue
+                if m.group(1) == "disable-file":
+                    return True
+                own_line = bool(raw[:m.start()].strip())
+                if n == line or (not own_line and n == line - 1):
+                    return True
+        return False
+
+    def blocks(self, header: "re.Pattern[str]") -> List[Tuple[int, int]]:
+        """(first, last) 1-based lines of each `{ ... }` block opened on a line matching `header`."""
+        out: List[Tuple[int, int]] = []
+        for i, line in enumerate(self.code_lines):
+            if not header.search(line):
+                continue
+            depth, opened = 0, False
+            for j in range(i, len(self.code_lines)):
+                code = _STRING_RE.sub('""', self.code_lines[j])
+                if j == i:
+                    code = code[header.search(code).start():] if header.search(code) else code
+                depth += code.count("{") - code.count("}")
+                opened = opened or "{" in code
+                if opened and depth <= 0:
+                    out.append((i + 1, j + 1))
+                    break
+        return out
+
+    def constants(self) -> Dict[str, object]:
+        """`[static] let name[: Type] = <number | "string" | bool>` declarations."""
+        out: Dict[str, object] = {}
+        for line in self.code_lines:
+            for m in _CONSTANT_RE.finditer(line):
+                raw = m.group(2)
+                if raw.startswith('"'):
+                    out[m.group(1)] = raw[1:-1]
+                elif raw in ("true", "false"):
+                    out[m.group(1)] = raw == "true"
+                else:
+                    num = raw.replace("_", "")
+                    out[m.group(1)] = float(num) if "." in num else int(num)
+        return out
+
+
+_LEX_RE = re.compile(r'//|/\*|\*/|"""|"|\\.|\n', re.S)
+
+
+def strip_comments(text: str) -> str:
+    """Blank out // and (nested) /* */ comments, keeping string literals and layout."""
+    out: List[str] = []
+    pos = 0  # start of text not yet copied
+    depth = 0  # block comment nesting
+    in_string: Optional[str] = None  # '"' or '"""'
+    comment_start = 0
+    skip_until = 0
+    for m in _LEX_RE.finditer(text):
+        tok, at = m.group(), m.start()
+        if at < skip_until:
+            continue
+        if depth:
+            if tok == "/*":
+                depth += 1
+            elif tok == "*/":
+                depth -= 1
+                if not depth:
+                    out.append(re.sub(r"[^\n]", " ", text[comment_start:m.end()]))
+                    pos = m.end()
+            continue
+        if in_string:
+            if tok == in_string:
+                in_string = None
+            elif tok == "\n" and in_string == '"':
+                in_string = None  # unterminated single-line string; resync
+            continue
+        if tok == "//":
+            end = text.find("\n", at)
+            end = len(text) if end < 0 else end
+            out.append(text[pos:at])
+            out.append(" " * (end - at))
+            pos = skip_until = end
+        elif tok == "/*":
+            out.append(text[pos:at])
+            depth, comment_start = 1, at
+        elif tok in ('"""', '"'):
+            in_string = tok
+    if depth:
+        out.append(re.sub(r"[^\n]", " ", text[comment_start:]))
+    else:
+        out.append(text[pos:])
+    return "".join(out)
+
+
+def parse_source(path: str, text: str) -> SourceFile:
+    code = strip_comments(text)
+    return SourceFile(
+        path=path,
+        sha1=hashlib.sha1(text.encode("utf-8", errors="replace")).hexdigest(),
+        text=text,
+        lines=text.split("\n"),
+        code_lines=code.split("\n"),
+        identifiers=set(_IDENT_RE.findall(code)),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Rules
+# ---------------------------------------------------------------------------
+
+
+class Rule:
+    def __init__(self, rule_id: str, fn: Callable[[SourceFile], Iterable[Finding]], needles: Sequence[str] = (),
+                 severity: str = "warning"):
+        if severity not in SEVERITIES:
+            raise ValueError(f"{rule_id}: unknown severity {severity!r}")
+        self.id = rule_id
+        self.fn = fn
+        self.needles = tuple(needles)
+        self.severity = severity
+        doc = inspect.getdoc(fn) or rule_id
+        self.description = doc.split("\n\n", 1)[0].replace("\n", " ")
+        self.help = doc
+        try:
+            source = inspect.getsource(fn)
+        except (OSError, TypeError):
+            source = fn.__qualname__
+        self.fingerprint = hashlib.sha1(f"{rule_id}\0{self.needles}\0{severity}\0{source}".encode()).hexdigest()[:16]
+
+    def applies_to(self, src: SourceFile) -> bool:
+        return not self.needles or any(needle in src.text for needle in self.needles)
+
+    def check(self, src: SourceFile) -> List[Finding]:
+        if not self.applies_to(src):
+            return []
+        out: List[Finding] = []
+        for finding in self.fn(src):
+            if src.suppressed(self.id, finding.line):
+                continue
+            finding.severity = finding.severity or self.severity
+            out.append(finding)
+        return out
+
+
+RULES: Dict[str, Rule] = {}
+
+
+def rule(rule_id: str, needles: Sequence[str] = (), severity: str = "warning"):
+    """Register a rule function under `rule_id`. Its docstring is the rule's help text."""
+    def register(fn: Callable[[SourceFile], Iterable[Finding]]):
+        RULES[rule_id] = Rule(rule_id, fn, needles, severity)
+        return fn
+    return register
+
+
+def load_rules(modules: Sequence[str]) -> Dict[str, Rule]:
+    for name in modules:
+        importlib.import_module(name)
+    return RULES
+
+
+# ---------------------------------------------------------------------------
+# Scanner
+# ---------------------------------------------------------------------------
+
+
+def _default_cache_path(root: str) -> str:
+    override = os.environ.get("CMUX_SWIFT_SCAN_CACHE")
+    if override:
+        return override
+    key = hashlib.sha1(os.path.abspath(root).encode()).hexdigest()[:12]
+    return os.path.join(os.path.expanduser("~"), ".cache", "cmux", f"swift-scan-{key}.pickle")
+
+
+def _scan_worker(args: Tuple[str, str, Sequence[str], Sequence[str], Optional[SourceFile]]):
+    """Process-pool entry point: parse one file (unless given) and run rules on it."""
+    root, rel, modules, rule_ids, parsed = args
+    if parsed is None:
+        with open(os.path.join(root, rel), encoding="utf-8", errors="replace") as f:
+            parsed = parse_source(rel, f.read())
+    rules = load_rules(modules)
+    findings = {rid: rules[rid].check(parsed) for rid in rule_ids}
+    return parsed, findings
+
+
+class SwiftScanner:
+    """Scans `<root>/<subdir>/**/*.swift` with on-disk caching and a process pool."""
+
+    def __init__(self, root: str, subdir: str = "Sources", cache_path: Optional[str] = None, use_cache: bool = True,
+                 rule_modules: Sequence[str] = DEFAULT_RULE_MODULES, jobs: Optional[int] = None):
+        self.root = os.path.abspath(root)
+        self.subdir = subdir
+        self.cache_path = cache_path or _default_cache_path(self.root)
+        self.use_cache = use_cache
+        self.rule_modules = tuple(rule_modules)
+        self.jobs = jobs or min(8, os.cpu_count() or 1)
+        self.stats = {"files": 0, "parsed": 0, "checked": 0, "cached": 0}
+        # rel -> (mtime_ns, size, SourceFile)
+        self._files: Dict[str, Tuple[int, int, SourceFile]] = {}
+        # (sha1, rule fingerprint) -> findings
+        self._findings: Dict[Tuple[str, str], List[Finding]] = {}
+        self._loaded = False
+
+    # -- cache ---------------------------------------------------------
+
+    def _load_cache(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.use_cache:
+            return
+        try:
+            with open(self.cache_path, "rb") as f:
+                data = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return
+        if not isinstance(data, dict) or data.get("version") != CACHE_VERSION or data.get("root") != self.root:
+            return
+        self._files = data["files"]
+        self._findings = data["findings"]
+
+    def _save_cache(self) -> None:
+        if not self.use_cache:
+            return
+        live = {entry[2].sha1 for entry in self._files.values()}
+        findings = {k: v for k, v in self._findings.items() if k[0] in live}
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump({"version": CACHE_VERSION, "root": self.root, "files": self._files, "findings": findings}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.cache_path)
+
+    # -- files ---------------------------------------------------------
+
+    def paths(self) -> List[str]:
+        base = os.path.join(self.root, self.subdir)
+        out: List[str] = []
+        for dirpath, dirnames, filenames in os.walk(base):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if name.endswith(".swift"):
+                    out.append(os.path.relpath(os.path.join(dirpath, name), self.root))
+        return out
+
+    def _stat(self, rel: str) -> Tuple[int, int]:
+        st = os.stat(os.path.join(self.root, rel))
+        return st.st_mtime_ns, st.st_size
+
+    def _fresh(self, rel: str) -> Optional[SourceFile]:
+        """Cached parse if the file is unchanged; re-hashes when only mtime moved."""
+        entry = self._files.get(rel)
+        if entry is None:
+            return None
+        mtime, size = self._stat(rel)
+        if (mtime, size) == entry[:2]:
+            return entry[2]
+        if size != entry[1]:
+            return None
+        with open(os.path.join(self.root, rel), "rb") as f:
+            sha1 = hashlib.sha1(f.read()).hexdigest()
+        if sha1 != entry[2].sha1:
+            return None
+        self._files[rel] = (mtime, size, entry[2])  # touched, not changed
+        return entry[2]
+
+    def file(self, rel: str) -> SourceFile:
+        """Parsed file (from cache when unchanged). Works for any path under root."""
+        self._load_cache()
+        src = self._fresh(rel)
+        if src is None:
+            with open(os.path.join(self.root, rel), encoding="utf-8", errors="replace") as f:
+                src = parse_source(rel, f.read())
+            self._files[rel] = (*self._stat(rel), src)
+            self.stats["parsed"] += 1
+        return src
+
+    def files(self) -> List[SourceFile]:
+        self._load_cache()
+        return [self.file(rel) for rel in self.paths()]
+
+    # -- rules ---------------------------------------------------------
+
+    def run(self, rule_ids: Optional[Sequence[str]] = None) -> List[Finding]:
+        """Run rules over every file; only new/changed (file, rule) pairs are executed."""
+        self._load_cache()
+        rules = load_rules(self.rule_modules)
+        selected = [rules[rid] for rid in (rule_ids or sorted(rules))]
+        paths = self.paths()
+        self.stats["files"] = len(paths)
+        fresh = {rel: self._fresh(rel) for rel in paths}
+
+        work: List[Tuple[str, Optional[SourceFile], List[str]]] = []
+        for rel in paths:
+            src = fresh[rel]
+            missing = [r.id for r in selected if src is None or (src.sha1, r.fingerprint) not in self._findings]
+            if src is None or missing:
+                work.append((rel, src, missing if src is not None else [r.id for r in selected]))
+
+        args = [(self.root, rel, self.rule_modules, ids, src) for rel, src, ids in work]
+        if len(args) >= PARALLEL_THRESHOLD and self.jobs > 1:
+            with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+                results = list(pool.map(_scan_worker, args, chunksize=max(1, len(args) // (self.jobs * 4))))
+        else:
+            results = [_scan_worker(a) for a in args]
+
+        for (rel, src, ids), (parsed, findings) in zip(work, results):
+            if src is None:
+                self._files[rel] = (*self._stat(rel), parsed)
+                self.stats["parsed"] += 1
+            for rid, found in findings.items():
+                self._findings[(parsed.sha1, rules[rid].fingerprint)] = found
+            self.stats["checked"] += 1
+        self.stats["cached"] = len(paths) - len(work)
+        # Forget files that no longer exist.
+        for rel in set(self._files) - set(paths):
+            if rel.startswith(self.subdir + os.sep):
+                del self._files[rel]
+        self._save_cache()
+
+        out: List[Finding] = []
+        for rel in paths:
+            sha1 = self._files[rel][2].sha1
+            for r in selected:
+                out.extend(self._findings[(sha1, r.fingerprint)])
+        return out
+
+
+# ---------------------------------------------------------------------------
+# Reports
+# ---------------------------------------------------------------------------
+
+
+def to_json(findings: Sequence[Finding]) -> dict:
+    return {
+        "findings": [
+            {"rule": f.rule, "severity": f.severity, "path": f.path, "line": f.line,
+             "message": f.message, "snippet": f.snippet}
+            for f in findings
+        ],
+        "counts": {sev: sum(1 for f in findings if f.severity == sev) for sev in SEVERITIES},
+    }
+
+
+def to_sarif(findings: Sequence[Finding], rules: Dict[str, Rule]) -> dict:
+    """SARIF 2.1.0, for code-scanning UIs."""
+    used = sorted({f.rule for f in findings} | set(rules))
+    index = {rid: i for i, rid in enumerate(used)}
+    return {
+        "$schema": "https://json.schemastore.org/sarif-2.1.0.json",
+        "version": "2.1.0",
+        "runs": [{
+            "tool": {"driver": {
+                "name": "cmux-swift-lint",
+                "informationUri": "https://github.com/manaflow-ai/cmux",
+                "rules": [
+                    {
+                        "id": rid,
+                        "shortDescription": {"text": rules[rid].description if rid in rules else rid},
+                        "fullDescription": {"text": rules[rid].help if rid in rules else rid},
+                        "defaultConfiguration": {"level": rules[rid].severity if rid in rules else "warning"},
+                    }
+                    for rid in used
+                ],
+            }},
+            "results": [
+                {
+                    "ruleId": f.rule,
+                    "ruleIndex": index[f.rule],
+                    "level": f.severity,
+                    "message": {"text": f.message},
+                    "locations": [{"physicalLocation": {
+                        "artifactLocation": {"uri": f.path.replace(os.sep, "/"), "uriBaseId": "%SRCROOT%"},
+                        "region": {"startLine": f.line, "snippet": {"text": f.snippet}},
+                    }}],
+                }
+                for f in findings
+            ],
+        }],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Scan Swift sources with the lint rules")
+    parser.add_argument("--root", default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    parser.add_argument("--rules", action="append", help="rule id to run (repeatable; default: all)")
+    parser.add_argument("--format", choices=("text", "json", "sarif"), default="text")
+    parser.add_argument("--output", help="write the report here instead of stdout")
+    parser.add_argument("--fail-on", choices=SEVERITIES, default="warning",
+                        help="exit 1 when a finding is at least this severe")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--jobs", type=int)
+    args = parser.parse_args(argv)
+
+    scanner = SwiftScanner(args.root, use_cache=not args.no_cache, jobs=args.jobs)
+    findings = scanner.run(args.rules)
+    if args.format == "text":
+        report = "".join(
+            f"{f.path}:{f.line}: {f.severity}: [{f.rule}] {f.message}\n" + (f"    {f.snippet}\n" if f.snippet else "")
+            for f in findings
+        )
+    else:
+        rules = load_rules(scanner.rule_modules)
+        data = to_json(findings) if args.format == "json" else to_sarif(findings, rules)
+        report = json.dumps(data, indent=2) + "\n"
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+    else:
+        sys.stdout.write(report)
+    s = scanner.stats
+    print(f"{s['files']} files: {s['checked']} checked, {s['cached']} from cache; {len(findings)} findings",
+          file=sys.stderr)
+    threshold = SEVERITIES.index(args.fail_on)
+    return 1 if any(SEVERITIES.index(f.severity) <= threshold for f in findings) else 0
+
+
+if __name__ == "__main__":
+    # Go through the importable module so rule registrations and pickled cache
+    # entries refer to cmux_swift_scan rather than __main__.
+    import cmux_swift_scan
+    sys.exit(cmux_swift_scan.main())
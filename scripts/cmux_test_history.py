@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""Local SQLite history of test runs: durations, outcomes, retries.
+
+The runners (run-tests-v1.sh, run-tests-v2.sh, run_tests_sharded.py) record
+every attempt here. The data then drives:
+- scheduling: `estimate()` / `order()` (longest-first for shards, recently
+  failing first for the serial fail-fast runners);
+- retries: `retry_budget()` only spends the full relaunch+retry budget on
+  tests that have actually been flaky (or that we know too little about);
+  tests with a long clean record get a single retry;
+- non-blocking failures: `is_known_flake()` replaces hand-maintained lists of
+  flaky scenarios (see test_visual_screenshots.py). Only failures that have
+  gone away on retry in earlier runs qualify.
+
+Database: $CMUX_TEST_HISTORY_DB, default ~/.cache/cmux/test-history.sqlite3.
+
+CLI:
+    cmux_test_history.py start-run [--build B] [--suite S]        -> prints run id
+    cmux_test_history.py record RUN TEST ATTEMPT SECONDS pass|fail|timeout [--error E]
+    cmux_test_history.py exec RUN TEST ATTEMPT -- CMD...           -> runs CMD, records it, exits with its code
+    cmux_test_history.py order [--strategy longest|recent-failures] TEST...
+    cmux_test_history.py retries TEST [--max N]
+    cmux_test_history.py slowest|flaky [--limit N]
+    cmux_test_history.py regressions --build B [--threshold 1.25]
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_DB = os.path.join(os.path.expanduser("~"), ".cache", "cmux", "test-history.sqlite3")
+
+OUTCOMES = ("pass", "fail", "timeout")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at REAL NOT NULL,
+    build TEXT NOT NULL DEFAULT '',
+    suite TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS attempts (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    test TEXT NOT NULL,
+    attempt INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    outcome TEXT NOT NULL,
+    error_signature TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (run_id, test, attempt)
+);
+CREATE INDEX IF NOT EXISTS attempts_test ON attempts(test, run_id);
+"""
+
+_UUID_RE = re.compile(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}")
+_NUM_RE = re.compile(r"0x[0-9a-fA-F]+|\d+(\.\d+)?")
+
+
+def error_signature(error: str) -> str:
+    """Normalize an error message so the same failure matches across runs."""
+    sig = _UUID_RE.sub("<id>", error or "")
+    sig = _NUM_RE.sub("#", sig)
+    return " ".join(sig.split())[:160]
+
+
+class TestHistory:
+    # Not a test class, despite the name (keeps pytest collection quiet).
+    __test__ = False
+
+    def __init__(self, path: Optional[str] = None, window: int = 30):
+        self.path = path or os.environ.get("CMUX_TEST_HISTORY_DB") or DEFAULT_DB
+        self.window = window
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Shard workers share one connection from threads; callers serialize.
+        self._db = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._db.close()
+
+    # ------------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------------
+
+    def start_run(self, build: str = "", suite: str = "") -> int:
+        cur = self._db.execute(
+            "INSERT INTO runs (started_at, build, suite) VALUES (?, ?, ?)", (time.time(), build, suite)
+        )
+        return int(cur.lastrowid)
+
+    def record(self, run_id: int, test: str, attempt: int, duration: float, outcome: str, error: str = "") -> None:
+        if outcome not in OUTCOMES:
+            raise ValueError(f"outcome must be one of {OUTCOMES}, got {outcome!r}")
+        self._db.execute(
+            "INSERT OR REPLACE INTO attempts (run_id, test, attempt, duration, outcome, error_signature) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (run_id, test, attempt, float(duration), outcome, error_signature(error) if outcome != "pass" else ""),
+        )
+
+    # ------------------------------------------------------------------
+    # Per-test history
+    # ------------------------------------------------------------------
+
+    def _recent_runs(self, test: str) -> List[Tuple[int, List[Tuple[str, float, str]]]]:
+        """[(run_id, [(outcome, duration, signature) per attempt])], newest first."""
+        rows = self._db.execute(
+            "SELECT run_id, outcome, duration, error_signature FROM attempts "
+            "WHERE test = ? AND run_id IN ("
+            "  SELECT DISTINCT run_id FROM attempts WHERE test = ? ORDER BY run_id DESC LIMIT ?"
+            ") ORDER BY run_id DESC, attempt",
+            (test, test, self.window),
+        ).fetchall()
+        runs: Dict[int, List[Tuple[str, float, str]]] = {}
+        for run_id, outcome, duration, sig in rows:
+            runs.setdefault(run_id, []).append((outcome, duration, sig))
+        return sorted(runs.items(), reverse=True)
+
+    def estimate(self, test: str) -> Optional[float]:
+        """Median duration of recent passing attempts, or None if never passed."""
+        passes = [d for _, attempts in self._recent_runs(test) for outcome, d, _ in attempts if outcome == "pass"]
+        return statistics.median(passes) if passes else None
+
+    def flake_rate(self, test: str) -> Tuple[float, int]:
+        """(fraction of recent runs that failed then passed on retry, runs considered)."""
+        runs = self._recent_runs(test)
+        if not runs:
+            return 0.0, 0
+        flaky = sum(
+            1 for _, attempts in runs
+            if attempts[-1][0] == "pass" and any(o != "pass" for o, _, _ in attempts[:-1])
+        )
+        return flaky / len(runs), len(runs)
+
+    def retry_budget(self, test: str, max_attempts: int = 3, min_history: int = 5) -> int:
+        """Attempts to allow: the full budget for tests that have been flaky or that we barely know.
+
+        A test with a long, clean record gets one retry (2 attempts): a failure
+        is most likely real, so it doesn't get the whole relaunch budget, but a
+        test that has just started flaking still gets the chance to pass on
+        retry, which is the evidence `is_known_flake()` needs.
+        """
+        rate, runs = self.flake_rate(test)
+        if runs < min_history or rate > 0:
+            return max_attempts
+        return min(2, max_attempts)
+
+    def is_known_flake(self, test: str, error: str, min_occurrences: int = 2) -> bool:
+        """True if this failure signature has gone away on retry in at least `min_occurrences` recent runs.
+
+        Only runs where the signature failed and a later attempt in the same
+        run passed count, so a failure that never passes on retry is never a
+        flake however often it recurs. A first-seen signature blocks, and so
+        does any failure right after a run that ended failing.
+        """
+        runs = self._recent_runs(test)
+        if not runs or runs[0][1][-1][0] != "pass":
+            return False
+        sig = error_signature(error)
+        retried = sum(
+            1 for _, attempts in runs
+            if attempts[-1][0] == "pass" and any(o != "pass" and s == sig for o, _, s in attempts[:-1])
+        )
+        return retried >= min_occurrences
+
+    def order(self, tests: Sequence[str], strategy: str = "longest") -> List[str]:
+        if strategy == "longest":
+            known = {t: self.estimate(t) for t in tests}
+            durations = sorted(d for d in known.values() if d is not None)
+            # Unknown tests go in the middle of the pack rather than last, so a
+            # slow new test doesn't end up as the long tail.
+            fallback = durations[len(durations) // 2] if durations else 0.0
+            return sorted(tests, key=lambda t: (-(known[t] if known[t] is not None else fallback), t))
+        if strategy == "recent-failures":
+            # Fail-fast runners: surface likely failures first.
+            def last_failed(t: str) -> int:
+                runs = self._recent_runs(t)
+                return 0 if runs and runs[0][1][-1][0] != "pass" else 1
+            return sorted(tests, key=lambda t: (last_failed(t), t))
+        raise ValueError(f"unknown strategy {strategy!r}")
+
+    # ------------------------------------------------------------------
+    # Suite-wide queries
+    # ------------------------------------------------------------------
+
+    def _tests(self) -> List[str]:
+        return [row[0] for row in self._db.execute("SELECT DISTINCT test FROM attempts ORDER BY test")]
+
+    def slowest(self, limit: int = 10) -> List[Tuple[str, float]]:
+        rows = [(t, self.estimate(t)) for t in self._tests()]
+        return sorted(((t, d) for t, d in rows if d is not None), key=lambda r: -r[1])[:limit]
+
+    def flakiest(self, limit: int = 10) -> List[Tuple[str, float, int]]:
+        rows = [(t, *self.flake_rate(t)) for t in self._tests()]
+        return sorted((r for r in rows if r[1] > 0), key=lambda r: (-r[1], r[0]))[:limit]
+
+    def regressions(self, build: str, threshold: float = 1.25, min_seconds: float = 0.5) -> List[Tuple[str, float, float]]:
+        """Tests whose median passing time in `build` exceeds earlier builds' by `threshold`x."""
+        rows = self._db.execute(
+            "SELECT a.test, r.build = ?, a.duration FROM attempts a JOIN runs r ON r.id = a.run_id "
+            "WHERE a.outcome = 'pass' AND r.id <= (SELECT MAX(id) FROM runs WHERE build = ?) "
+            "ORDER BY a.run_id",
+            (build, build),
+        ).fetchall()
+        current: Dict[str, List[float]] = {}
+        before: Dict[str, List[float]] = {}
+        for test, is_current, duration in rows:
+            (current if is_current else before).setdefault(test, []).append(duration)
+        out = []
+        for test, durations in current.items():
+            if test not in before:
+                continue
+            now, then = statistics.median(durations), statistics.median(before[test][-self.window:])
+            if now >= min_seconds and now > then * threshold:
+                out.append((test, then, now))
+        return sorted(out, key=lambda r: -(r[2] / max(r[1], 1e-9)))
+
+
+def _exec_and_record(history: TestHistory, run_id: int, test: str, attempt: int, command: List[str]) -> int:
+    # Stream output through unchanged; keep the last line as the error
+    # signature (tests print their failure reason last).
+    started = time.time()
+    last_line = ""
+    proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    assert proc.stdout is not None
+    for raw in proc.stdout:
+        sys.stdout.buffer.write(raw)
+        sys.stdout.buffer.flush()
+        if raw.strip():
+            last_line = raw.decode("utf-8", errors="replace").strip()
+    code = proc.wait()
+    outcome = "pass" if code == 0 else "fail"
+    try:
+        history.record(run_id, test, attempt, time.time() - started, outcome, last_line if code else "")
+    except sqlite3.Error as e:
+        # A broken history database must not change the test's result.
+        print(f"cmux_test_history: could not record {test}: {e}", file=sys.stderr)
+    return code
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="cmux test history database")
+    parser.add_argument("--db", help=f"database path (default: $CMUX_TEST_HISTORY_DB or {DEFAULT_DB})")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("start-run")
+    p.add_argument("--build", default="")
+    p.add_argument("--suite", default="")
+
+    p = sub.add_parser("record")
+    p.add_argument("run_id", type=int)
+    p.add_argument("test")
+    p.add_argument("attempt", type=int)
+    p.add_argument("seconds", type=float)
+    p.add_argument("outcome", choices=OUTCOMES)
+    p.add_argument("--error", default="")
+
+    p = sub.add_parser("exec")
+    p.add_argument("run_id", type=int)
+    p.add_argument("test")
+    p.add_argument("attempt", type=int)
+    p.add_argument("command", nargs=argparse.REMAINDER)
+
+    p = sub.add_parser("order")
+    p.add_argument("--strategy", choices=("longest", "recent-failures"), default="longest")
+    p.add_argument("tests", nargs="*")
+
+    p = sub.add_parser("retries")
+    p.add_argument("test")
+    p.add_argument("--max", type=int, default=3)
+
+    for name in ("slowest", "flaky"):
+        p = sub.add_parser(name)
+        p.add_argument("--limit", type=int, default=10)
+
+    p = sub.add_parser("regressions")
+    p.add_argument("--build", required=True)
+    p.add_argument("--threshold", type=float, default=1.25)
+
+    args = parser.parse_args(argv)
+    history = TestHistory(args.db)
+    try:
+        if args.cmd == "start-run":
+            print(history.start_run(args.build, args.suite))
+        elif args.cmd == "record":
+            history.record(args.run_id, args.test, args.attempt, args.seconds, args.outcome, args.error)
+        elif args.cmd == "exec":
+            command = args.command[1:] if args.command[:1] == ["--"] else args.command
+            if not command:
+                parser.error("exec needs a command after --")
+            return _exec_and_record(history, args.run_id, args.test, args.attempt, command)
+        elif args.cmd == "order":
+            for test in history.order(args.tests, args.strategy):
+                print(test)
+        elif args.cmd == "retries":
+            print(history.retry_budget(args.test, args.max))
+        elif args.cmd == "slowest":
+            for test, seconds in history.slowest(args.limit):
+                print(f"{seconds:8.2f}s  {test}")
+        elif args.cmd == "flaky":
+            for test, rate, runs in history.flakiest(args.limit):
+                print(f"{rate * 100:5.1f}% of {runs:3d} runs  {test}")
+        elif args.cmd == "regressions":
+            for test, then, now in history.regressions(args.build, args.threshold):
+                print(f"{then:8.2f}s -> {now:8.2f}s  {test}")
+    finally:
+        history.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""Pick the v2 socket tests a change can affect.
+
+Builds two static maps and joins them on v2 method names:
+
+- Swift -> methods. The dispatch switch in Sources/TerminalController.swift
+  names a handler for every method (`case "workspace.create": ...
+  v2WorkspaceCreate`). A handler's reach is its own body plus every
+  TerminalController function it calls, transitively. An edit inside
+  TerminalController maps to the methods whose reach contains the edited
+  function. An edit to any other Sources/ file maps to the methods whose
+  reach names a type declared in that file (`TabManager` or `tabManager`).
+- tests -> methods. Each tests_v2/test_*.py calls methods through
+  `_call("...")`, through client helpers in tests_v2/cmux.py (resolved
+  transitively through their own `_call`s), through the tests_v2/cmux_*.py
+  helper modules it imports, or names them as string literals (matrix
+  tests). Tests that drive the `cmux` CLI also depend on CLI/ and on every
+  method the CLI sends.
+
+A test is selected when it shares a method with the change, when the test
+itself changed, or when the test references the changed path directly
+(imports it, or names it or one of its parent directories). SMOKE runs
+whenever the change touches the app (Sources/, CLI/, assets). Changes the
+maps can't reason about (the shared client, build settings, ghostty,
+unknown paths) select the whole suite. Documentation and website changes
+select nothing, and a change to tests or scripts alone selects only the
+tests that are or reference the changed files.
+
+Examples:
+    # Tests affected by this branch:
+    ./scripts/cmux_test_impact.py select --base origin/main
+
+    # Why each one was picked:
+    ./scripts/cmux_test_impact.py select --base origin/main --explain
+
+    # The method maps themselves:
+    ./scripts/cmux_test_impact.py map
+"""
+
+import argparse
+import ast
+import json
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONTROLLER = "Sources/TerminalController.swift"
+CLIENT = "tests_v2/cmux.py"
+
+# Cheap end-to-end coverage that runs for every change touching the app.
+# test_cpu_usage calls no methods but catches runaway redraws from any view.
+SMOKE = [
+    "tests_v2/test_ctrl_socket.py",
+    "tests_v2/test_cpu_usage.py",
+    "tests_v2/test_initial_terminal_interactive_and_rendering.py",
+    "tests_v2/test_windows_api.py",
+]
+
+# Nothing in the app or the tests reads these.
+IGNORED_PREFIXES = ("docs/", "web/", "skills/", "homebrew-cmux/", "tests/", "cmuxTests/", "cmuxUITests/")
+IGNORED_SUFFIXES = (".md",)
+
+# Changes here can affect anything; run everything.
+EVERYTHING_PREFIXES = (
+    CLIENT,
+    "GhosttyTabs.xcodeproj/",
+    "Package.swift",
+    "Package.resolved",
+    "ghostty",
+    "vendor/",
+    "Resources/",
+    "cmux-Bridging-Header.h",
+    "cmux.entitlements",
+)
+
+_METHOD_RE = re.compile(r'"([a-z][a-z0-9_]*(?:\.[a-z0-9_]+)+)"')
+_CASE_RE = re.compile(r'^\s*case\s+("[a-z][^:]*"):')
+_HANDLER_RE = re.compile(r"\bself\.(v2\w+)\(")
+_FUNC_RE = re.compile(r"\bfunc\s+(\w+)")
+_TYPE_RE = re.compile(
+    r"^\s*(?:(?:public|private|fileprivate|internal|final|open|@MainActor|@objc)\s+)*"
+    r"(?:class|struct|enum|protocol|actor|extension)\s+([A-Z]\w*)",
+    re.M,
+)
+_IDENT_RE = re.compile(r"\b[A-Za-z_]\w*\b")
+_HUNK_RE = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@")
+
+
+def _read(path: str, repo: str = REPO) -> str:
+    with open(os.path.join(repo, path), encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+def _lower_first(name: str) -> str:
+    return name[:1].lower() + name[1:]
+
+
+# ---------------------------------------------------------------------------
+# Swift side
+# ---------------------------------------------------------------------------
+
+
+def _function_spans(lines: List[str]) -> List[Tuple[str, int, int]]:
+    """(name, first line, last line) for every `func`, 1-based, by brace matching."""
+    spans: List[Tuple[str, int, int]] = []
+    for i, line in enumerate(lines):
+        m = _FUNC_RE.search(line.split("//", 1)[0])
+        if not m:
+            continue
+        depth = 0
+        opened = False
+        end = i
+        for j in range(i, len(lines)):
+            code = re.sub(r'"(?:\\.|[^"\\])*"', '""', lines[j].split("//", 1)[0])
+            depth += code.count("{") - code.count("}")
+            opened = opened or "{" in code
+            if opened and depth <= 0:
+                end = j
+                break
+            if not opened and j > i + 10:
+                break  # protocol requirement or other bodiless declaration
+        if opened:
+            spans.append((m.group(1), i + 1, end + 1))
+    return spans
+
+
+class SwiftIndex:
+    """Which v2 methods each Sources/ file (and TerminalController function) can affect."""
+
+    def __init__(self, repo: str = REPO):
+        self.repo = repo
+        source = _read(CONTROLLER, repo)
+        self._lines = source.splitlines()
+        self.spans = _function_spans(self._lines)
+        self._case_lines: List[Tuple[int, List[str]]] = []
+        self.method_handlers: Dict[str, str] = {}
+        self._parse_dispatch()
+        self.func_idents: Dict[str, Set[str]] = {}
+        for name, start, end in self.spans:
+            body = "\n".join(self._lines[start - 1:end])
+            self.func_idents.setdefault(name, set()).update(_IDENT_RE.findall(body))
+        self.reach: Dict[str, Set[str]] = {}  # method -> functions
+        for method, handler in self.method_handlers.items():
+            self.reach[method] = self._closure(handler)
+        self.types_by_file = self._declared_types()
+
+    def _parse_dispatch(self) -> None:
+        pending: List[str] = []
+        for i, line in enumerate(self._lines, start=1):
+            m = _CASE_RE.match(line)
+            if m:
+                methods = _METHOD_RE.findall(m.group(1))
+                if methods:
+                    self._case_lines.append((i, methods))
+                    pending = methods
+            if pending:
+                h = _HANDLER_RE.search(line)
+                if h:
+                    for method in pending:
+                        self.method_handlers.setdefault(method, h.group(1))
+                    pending = []
+                elif "return v2Ok(" in line or "return v2Error(" in line:
+                    # Inline handlers live in the dispatch function itself.
+                    for method in pending:
+                        self.method_handlers.setdefault(method, "")
+                    pending = []
+
+    def _closure(self, handler: str) -> Set[str]:
+        seen: Set[str] = set()
+        stack = [handler] if handler else []
+        while stack:
+            name = stack.pop()
+            if name in seen or name not in self.func_idents:
+                continue
+            seen.add(name)
+            stack.extend(n for n in self.func_idents[name] if n in self.func_idents and n not in seen)
+        return seen
+
+    def _declared_types(self) -> Dict[str, Set[str]]:
+        out: Dict[str, Set[str]] = {}
+        sources = os.path.join(self.repo, "Sources")
+        for dirpath, _, files in os.walk(sources):
+            for name in files:
+                if not name.endswith(".swift"):
+                    continue
+                rel = os.path.relpath(os.path.join(dirpath, name), self.repo)
+                if rel == CONTROLLER:
+                    continue
+                out[rel] = set(_TYPE_RE.findall(_read(rel, self.repo)))
+        return out
+
+    def methods(self) -> Set[str]:
+        return set(self.method_handlers)
+
+    def methods_for_file(self, path: str) -> Set[str]:
+        types = self.types_by_file.get(path)
+        if types is None:
+            types = set(_TYPE_RE.findall(_read(path, self.repo))) if os.path.exists(os.path.join(self.repo, path)) else set()
+        names = types | {_lower_first(t) for t in types}
+        out: Set[str] = set()
+        for method, funcs in self.reach.items():
+            if any(self.func_idents[f] & names for f in funcs):
+                out.add(method)
+        return out
+
+    def methods_for_controller_lines(self, lines: Iterable[int]) -> Optional[Set[str]]:
+        """Methods affected by edits on these TerminalController lines; None = can't tell."""
+        out: Set[str] = set()
+        for line in lines:
+            enclosing = [s for s in self.spans if s[1] <= line <= s[2]]
+            if not enclosing:
+                return None
+            name, start, _ = min(enclosing, key=lambda s: s[2] - s[1])
+            cases = [(i, m) for i, m in self._case_lines if start <= i <= line]
+            if cases:
+                # Inside the dispatch switch: the nearest case above owns the line.
+                out.update(cases[-1][1])
+                continue
+            out.update(m for m, funcs in self.reach.items() if name in funcs)
+        return out
+
+
+# ---------------------------------------------------------------------------
+# Python side
+# ---------------------------------------------------------------------------
+
+
+def _calls_in(tree: ast.AST) -> Tuple[Set[str], Set[str], Set[str]]:
+    """(method literals passed to _call, attribute names called, all str constants)."""
+    methods: Set[str] = set()
+    attrs: Set[str] = set()
+    strings: Set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            strings.add(node.value)
+        if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Attribute):
+            continue
+        attrs.add(node.func.attr)
+        if node.func.attr == "_call" and node.args:
+            arg = node.args[0]
+            if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                methods.add(arg.value)
+    return methods, attrs, strings
+
+
+def client_helpers(repo: str = REPO) -> Dict[str, Set[str]]:
+    """cmux client method name -> v2 methods it ends up calling."""
+    tree = ast.parse(_read(CLIENT, repo))
+    direct: Dict[str, Set[str]] = {}
+    calls: Dict[str, Set[str]] = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ClassDef) and node.name == "cmux":
+            for fn in node.body:
+                if isinstance(fn, ast.FunctionDef):
+                    methods, attrs, _ = _calls_in(fn)
+                    direct[fn.name] = methods
+                    calls[fn.name] = attrs
+    out: Dict[str, Set[str]] = {}
+    for name in direct:
+        seen: Set[str] = set()
+        stack = [name]
+        while stack:
+            cur = stack.pop()
+            if cur in seen or cur not in direct:
+                continue
+            seen.add(cur)
+            stack.extend(calls[cur])
+        out[name] = set().union(*(direct[n] for n in seen))
+    return out
+
+
+class TestInfo:
+    __test__ = False
+
+    def __init__(self, path: str, methods: Set[str], strings: Set[str], imports: Set[str], uses_cli: bool):
+        self.path = path
+        self.methods = methods
+        self.strings = strings
+        self.imports = imports
+        self.uses_cli = uses_cli
+
+    def references(self, changed: str) -> bool:
+        base = os.path.basename(changed)
+        stem = os.path.splitext(base)[0]
+        if stem in self.imports or base in self.strings or changed in self.strings:
+            return True
+        return any(len(s) >= 4 and changed.startswith(s.rstrip("/") + "/") for s in self.strings)
+
+
+def scan_tests(known_methods: Set[str], repo: str = REPO, suite: str = "tests_v2") -> Dict[str, TestInfo]:
+    helpers = client_helpers(repo)
+    suite_dir = os.path.join(repo, suite)
+    module_cache: Dict[str, Tuple[Set[str], Set[str], Set[str]]] = {}
+
+    def scan(rel: str) -> Tuple[Set[str], Set[str], Set[str]]:
+        if rel not in module_cache:
+            tree = ast.parse(_read(rel, repo))
+            methods, attrs, strings = _calls_in(tree)
+            imports = {a.name.split(".")[0] for n in ast.walk(tree) if isinstance(n, ast.Import) for a in n.names}
+            imports |= {n.module.split(".")[0] for n in ast.walk(tree) if isinstance(n, ast.ImportFrom) and n.module}
+            for attr in attrs:
+                methods |= helpers.get(attr, set())
+            methods |= strings & known_methods
+            module_cache[rel] = (methods, strings, imports)
+        return module_cache[rel]
+
+    out: Dict[str, TestInfo] = {}
+    for name in sorted(os.listdir(suite_dir)):
+        if not (name.startswith("test_") and name.endswith(".py")):
+            continue
+        rel = os.path.join(suite, name)
+        methods, strings, imports = scan(rel)
+        methods = set(methods)
+        # Local helper modules (cmux_workspace_pool, cmux_state_reset, ...).
+        for mod in imports:
+            helper = os.path.join(suite, mod + ".py")
+            if mod != "cmux" and os.path.exists(os.path.join(repo, helper)):
+                methods |= scan(helper)[0]
+        uses_cli = "_find_cli_binary" in _read(rel, repo)
+        out[rel] = TestInfo(rel, methods, strings, imports, uses_cli)
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Selection
+# ---------------------------------------------------------------------------
+
+
+def _git(args: List[str], repo: str = REPO) -> str:
+    return subprocess.run(["git", *args], cwd=repo, capture_output=True, text=True, check=True).stdout
+
+
+def changed_files(base: str, head: Optional[str] = None, repo: str = REPO) -> List[str]:
+    rev = [base, head] if head else [base]
+    out = _git(["diff", "--name-only", *rev], repo).splitlines()
+    if not head:
+        out += _git(["ls-files", "--others", "--exclude-standard"], repo).splitlines()
+    return sorted(set(p for p in out if p))
+
+
+def changed_lines(base: str, path: str, head: Optional[str] = None, repo: str = REPO) -> List[int]:
+    rev = [base, head] if head else [base]
+    lines: List[int] = []
+    for line in _git(["diff", "-U0", *rev, "--", path], repo).splitlines():
+        m = _HUNK_RE.match(line)
+        if m:
+            start, count = int(m.group(1)), int(m.group(2) or 1)
+            # A pure deletion (count 0) sits between two lines; attribute it to the next one.
+            lines.extend(range(start, start + count) if count else [start + 1])
+    return lines
+
+
+class Selection:
+    def __init__(self):
+        self.tests: Dict[str, List[str]] = {}  # test -> reasons
+        self.everything: List[str] = []
+
+    def add(self, test: str, reason: str) -> None:
+        self.tests.setdefault(test, []).append(reason)
+
+
+def select(changed: List[str], base: str, head: Optional[str] = None, repo: str = REPO,
+           suite: str = "tests_v2") -> Selection:
+    swift = SwiftIndex(repo)
+    cli_methods: Set[str] = set()
+    if os.path.exists(os.path.join(repo, "CLI", "cmux.swift")):
+        cli_methods = set(_METHOD_RE.findall(_read("CLI/cmux.swift", repo))) & swift.methods()
+    tests = scan_tests(swift.methods(), repo, suite)
+    sel = Selection()
+    touches_app = False
+
+    for path in changed:
+        if path.startswith(IGNORED_PREFIXES) or path.endswith(IGNORED_SUFFIXES):
+            continue
+        if path in tests:
+            sel.add(path, "changed")
+            continue
+        referencing = [t for t in tests.values() if t.references(path)]
+        for t in referencing:
+            sel.add(t.path, f"references {path}")
+        if path.startswith(EVERYTHING_PREFIXES):
+            sel.everything.append(path)
+            continue
+        if path == CONTROLLER:
+            touches_app = True
+            methods = swift.methods_for_controller_lines(changed_lines(base, path, head, repo))
+            if methods is None:
+                sel.everything.append(path)
+                continue
+        elif path.startswith("Sources/") and path.endswith(".swift"):
+            touches_app = True
+            methods = swift.methods_for_file(path)
+        elif path.startswith("CLI/"):
+            touches_app = True
+            for t in tests.values():
+                if t.uses_cli:
+                    sel.add(t.path, f"drives the CLI ({path})")
+            continue
+        elif path.startswith(("Sources/", "Assets.xcassets/")):
+            touches_app = True
+            continue
+        elif referencing or path.startswith((suite + "/", "scripts/")):
+            continue
+        else:
+            sel.everything.append(path)
+            continue
+        for t in tests.values():
+            hit = t.methods & methods
+            if not hit and t.uses_cli:
+                hit = cli_methods & methods
+            if hit:
+                sel.add(t.path, f"{path}: {', '.join(sorted(hit)[:3])}{' ...' if len(hit) > 3 else ''}")
+
+    if sel.everything:
+        for t in tests:
+            sel.add(t, "full suite: " + ", ".join(sel.everything[:3]))
+    if touches_app or sel.everything:
+        for t in SMOKE:
+            if t in tests:
+                sel.add(t, "smoke")
+    return sel
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Select v2 tests affected by a change")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("select", help="print affected tests, one per line")
+    p.add_argument("--base", default="origin/main", help="compare against this revision")
+    p.add_argument("--head", help="compare up to this revision (default: working tree)")
+    p.add_argument("--suite", default="tests_v2")
+    p.add_argument("--explain", action="store_true", help="print why each test was picked (stderr)")
+    p.add_argument("--json", action="store_true")
+
+    p = sub.add_parser("map", help="dump the method maps as JSON")
+    p.add_argument("--suite", default="tests_v2")
+
+    args = parser.parse_args(argv)
+
+    if args.cmd == "map":
+        swift = SwiftIndex()
+        tests = scan_tests(swift.methods(), suite=args.suite)
+        json.dump({
+            "files": {f: sorted(swift.methods_for_file(f)) for f in sorted(swift.types_by_file)},
+            "tests": {t: sorted(info.methods) for t, info in tests.items()},
+        }, sys.stdout, indent=2)
+        print()
+        return 0
+
+    changed = changed_files(args.base, args.head)
+    sel = select(changed, args.base, args.head, suite=args.suite)
+    if args.json:
+        json.dump({"changed": changed, "full_suite": bool(sel.everything), "tests": sel.tests}, sys.stdout, indent=2)
+        print()
+        return 0
+    for test in sorted(sel.tests):
+        print(test)
+        if args.explain:
+            for reason in sel.tests[test]:
+                print(f"  {reason}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
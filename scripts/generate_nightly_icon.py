@@ -2,13 +2,35 @@
 """Generate nightly app icon by recoloring the Debug icon.
 
 Takes the AppIcon-Debug icons (which have an orange "DEV" banner) and:
-1. Recolors the orange banner to purple
-2. Replaces the "DEV" text with "NIGHTLY"
+1. Recolors the orange banner to the variant's color
+2. Replaces the "DEV" text with the variant's label
 
 This preserves the exact same icon design, glow effects, and chevron
 positioning as the debug icon.
+
+Variants are configured in VARIANTS (nightly: purple "NIGHTLY"). Tagged dev
+builds get one derived from the tag, with a stable per-tag color:
+
+    python3 scripts/generate_nightly_icon.py                      # nightly
+    python3 scripts/generate_nightly_icon.py --tag my-branch --out /tmp/icons
+
+Sizes are rendered in a process pool. A manifest records the hash of each
+source icon, the variant and this script; outputs whose inputs have not
+changed are skipped (use --force to redo them). The manifest lives in
+~/.cache/cmux (or $CMUX_ICON_CACHE_DIR), keyed by the output directory, so
+nothing but icons lands in the asset catalog.
 """
+import argparse
+import hashlib
+import json
 import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 
 REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -32,122 +54,220 @@ SIZES = [
     ("512@2x.png", 1024),
 ]
 
+FONT_PATHS = [
+    "/System/Library/Fonts/SFCompact-Bold.otf",
+    "/System/Library/Fonts/Supplemental/Arial Bold.ttf",
+    "/System/Library/Fonts/Helvetica.ttc",
+]
+
+
+@dataclass(frozen=True)
+class Variant:
+    name: str
+    label: str
+    color: Tuple[int, int, int]
+    dst_dir: str
+
+
+VARIANTS: Dict[str, Variant] = {
+    "nightly": Variant("nightly", "NIGHTLY", PURPLE, DST_DIR),
+}
+
+
+def tag_variant(tag: str, dst_dir: str) -> Variant:
+    """A banner for a tagged dev build: the tag as the label, a color derived from it."""
+    label = re.sub(r"[^A-Za-z0-9]+", "-", tag).strip("-").upper()[:10] or "TAG"
+    digest = hashlib.sha1(tag.encode()).digest()
+    # Keep the banner dark enough for white text: vary the hue, fix the brightness.
+    hue = digest[0] / 255.0 * 6.0
+    k = lambda n: max(0.0, min(1.0, abs((n + hue) % 6.0 - 3.0) - 1.0))  # noqa: E731
+    color = tuple(int(40 + 160 * k(n)) for n in (0, 4, 2))
+    return Variant(f"tag-{label.lower()}", label, color, dst_dir)  # type: ignore[arg-type]
 
-def recolor_banner(img: Image.Image) -> Image.Image:
-    """Recolor the orange banner to purple and replace DEV with NIGHTLY."""
+
+def _load_font(font_size: int):
+    for font_path in FONT_PATHS:
+        if os.path.exists(font_path):
+            try:
+                return ImageFont.truetype(font_path, font_size)
+            except Exception:
+                continue
+    return ImageFont.load_default()
+
+
+def recolor_banner(img: Image.Image, label: str = "NIGHTLY", color: Tuple[int, int, int] = PURPLE) -> Image.Image:
+    """Recolor the orange banner to `color` and replace DEV with `label`."""
     img = img.convert("RGBA")
     w, h = img.size
-    pixels = img.load()
+    pixels = np.array(img)
+    r, g, b, a = (pixels[..., i].astype(np.int16) for i in range(4))
 
-    # Pass 1: Recolor orange pixels to purple.
+    # Pass 1: Recolor orange pixels.
     # The debug icon's banner is (255, 107, 0) with anti-aliased edges.
-    # We detect "orange-ish" pixels and remap them to purple, preserving
-    # the relative luminance and alpha for smooth edges.
-    for y in range(h):
-        for x in range(w):
-            r, g, b, a = pixels[x, y]
-            if a == 0:
-                continue
-            # Detect orange: high R, moderate G, very low B
-            if r > 180 and g < 180 and b < 100 and r > g and r - b > 100:
-                # How "orange" is this pixel (0-1)?
-                # Pure orange = (255,107,0), so measure closeness
-                orange_strength = min(r / 255.0, 1.0)
-                # Remap to purple, preserving the intensity
-                nr = int(PURPLE[0] * orange_strength)
-                ng = int(PURPLE[1] * orange_strength)
-                nb = int(PURPLE[2] * orange_strength)
-                pixels[x, y] = (nr, ng, nb, a)
-
-    # Pass 2: Replace the "DEV" text with "NIGHTLY".
+    # Orange-ish pixels (high R, moderate G, very low B) are remapped to the
+    # target color scaled by their red intensity, preserving alpha for
+    # smooth edges.
+    orange = (a != 0) & (r > 180) & (g < 180) & (b < 100) & (r > g) & (r - b > 100)
+    strength = np.minimum(r[orange] / 255.0, 1.0)
+    for channel in range(3):
+        pixels[..., channel][orange] = (color[channel] * strength).astype(np.uint8)
+    img = Image.fromarray(pixels, "RGBA")
+
+    # Pass 2: Replace the "DEV" text with the label.
     # First, blank out the existing text by filling the text region with
-    # the banner color, then draw "NIGHTLY" centered.
+    # the banner color, then draw the label centered.
     #
     # The banner occupies roughly the bottom 18% of the icon.
     banner_y = int(h * 0.82)
     banner_h = h - banner_y
 
-    # Find the text bounding box by looking for white/light pixels in the banner
-    # (the DEV text is white on orange, now white on purple)
-    text_pixels = []
-    for y in range(banner_y, h):
-        for x in range(w):
-            r, g, b, a = pixels[x, y]
-            # White or near-white text pixels
-            if r > 220 and g > 220 and b > 220 and a > 200:
-                text_pixels.append((x, y))
-
-    if text_pixels:
-        # Erase old text by painting over with the banner purple
-        min_x = min(p[0] for p in text_pixels)
-        max_x = max(p[0] for p in text_pixels)
-        min_y = min(p[1] for p in text_pixels)
-        max_y = max(p[1] for p in text_pixels)
-
-        # Expand slightly to catch anti-aliased edges
-        pad = max(2, int(h * 0.005))
-        min_x = max(0, min_x - pad)
-        max_x = min(w - 1, max_x + pad)
-        min_y = max(banner_y, min_y - pad)
-        max_y = min(h - 1, max_y + pad)
-
-        # Fill the text area with the banner color
-        draw = ImageDraw.Draw(img)
-        draw.rectangle([min_x, min_y, max_x, max_y], fill=(*PURPLE, 255))
-
-        # Now draw "NIGHTLY" centered in the banner
-        text = "NIGHTLY"
-        text_area_h = max_y - min_y
-        font_size = max(int(text_area_h * 0.85), 6)
-
-        font = None
-        for font_path in [
-            "/System/Library/Fonts/SFCompact-Bold.otf",
-            "/System/Library/Fonts/Supplemental/Arial Bold.ttf",
-            "/System/Library/Fonts/Helvetica.ttc",
-        ]:
-            if os.path.exists(font_path):
-                try:
-                    font = ImageFont.truetype(font_path, font_size)
-                    break
-                except Exception:
-                    continue
-        if font is None:
-            font = ImageFont.load_default()
-
-        # Center in the banner
-        bbox = draw.textbbox((0, 0), text, font=font)
-        tw = bbox[2] - bbox[0]
-        th = bbox[3] - bbox[1]
-        tx = (w - tw) // 2
-        ty = banner_y + (banner_h - th) // 2 - bbox[1]
-
-        draw.text((tx, ty), text, fill=(255, 255, 255, 255), font=font)
+    # The DEV text is the white/near-white pixels in the banner.
+    banner = pixels[banner_y:].astype(np.int16)
+    text = (banner[..., 0] > 220) & (banner[..., 1] > 220) & (banner[..., 2] > 220) & (banner[..., 3] > 200)
+    ys, xs = np.nonzero(text)
+    if not len(ys):
+        return img
+
+    # Expand slightly to catch anti-aliased edges
+    pad = max(2, int(h * 0.005))
+    min_x = max(0, int(xs.min()) - pad)
+    max_x = min(w - 1, int(xs.max()) + pad)
+    min_y = max(banner_y, banner_y + int(ys.min()) - pad)
+    max_y = min(h - 1, banner_y + int(ys.max()) + pad)
+
+    # Fill the text area with the banner color
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([min_x, min_y, max_x, max_y], fill=(*color, 255))
+
+    text_area_h = max_y - min_y
+    font = _load_font(max(int(text_area_h * 0.85), 6))
+
+    # Center in the banner
+    bbox = draw.textbbox((0, 0), label, font=font)
+    tw = bbox[2] - bbox[0]
+    th = bbox[3] - bbox[1]
+    tx = (w - tw) // 2
+    ty = banner_y + (banner_h - th) // 2 - bbox[1]
 
+    draw.text((tx, ty), label, fill=(255, 255, 255, 255), font=font)
     return img
 
 
-def main():
-    os.makedirs(DST_DIR, exist_ok=True)
+def _sha256(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
 
-    for filename, pixel_size in SIZES:
-        src_path = os.path.join(SRC_DIR, filename)
-        dst_path = os.path.join(DST_DIR, filename)
 
+def _recipe_hash() -> str:
+    """Hash of this script: any change to the recipe regenerates everything."""
+    return _sha256(os.path.abspath(__file__))[:16]
+
+
+def render_one(src_path: str, dst_path: str, pixel_size: int, label: str, color: Tuple[int, int, int]) -> str:
+    """Render one size. Process-pool entry point; returns the output's hash."""
+    img = Image.open(src_path)
+    if img.size != (pixel_size, pixel_size):
+        img = img.resize((pixel_size, pixel_size), Image.LANCZOS)
+    result = recolor_banner(img, label, color)
+    tmp = dst_path + ".tmp"
+    result.save(tmp, "PNG")
+    os.replace(tmp, dst_path)
+    return _sha256(dst_path)
+
+
+def _manifest_path(dst_dir: str) -> str:
+    cache_dir = os.environ.get("CMUX_ICON_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "cmux")
+    key = hashlib.sha1(os.path.abspath(dst_dir).encode()).hexdigest()[:12]
+    return os.path.join(cache_dir, f"icon-manifest-{key}.json")
+
+
+def _load_manifest(dst_dir: str) -> Dict[str, dict]:
+    try:
+        with open(_manifest_path(dst_dir)) as f:
+            return json.load(f).get("outputs", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(dst_dir: str, outputs: Dict[str, dict]) -> None:
+    path = _manifest_path(dst_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"outputs": outputs}, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def generate(variant: Variant, src_dir: str = SRC_DIR, force: bool = False,
+             jobs: Optional[int] = None) -> Dict[str, str]:
+    """Render every size of `variant`. Returns {filename: "generated"|"unchanged"|"missing"}."""
+    os.makedirs(variant.dst_dir, exist_ok=True)
+    manifest = {} if force else _load_manifest(variant.dst_dir)
+    recipe = _recipe_hash()
+    config = json.dumps(asdict(variant) | {"dst_dir": None}, sort_keys=True)
+
+    status: Dict[str, str] = {}
+    todo: List[Tuple[str, str, str, int, str]] = []
+    for filename, pixel_size in SIZES:
+        src_path = os.path.join(src_dir, filename)
+        dst_path = os.path.join(variant.dst_dir, filename)
         if not os.path.exists(src_path):
-            print(f"  SKIP {filename} (source not found)")
+            status[filename] = "missing"
+            continue
+        key = hashlib.sha256(f"{_sha256(src_path)}\0{pixel_size}\0{config}\0{recipe}".encode()).hexdigest()
+        entry = manifest.get(filename)
+        if (entry and entry.get("key") == key and os.path.exists(dst_path)
+                and entry.get("output") == _sha256(dst_path)):
+            status[filename] = "unchanged"
             continue
+        todo.append((filename, src_path, dst_path, pixel_size, key))
 
-        img = Image.open(src_path)
-        if img.size != (pixel_size, pixel_size):
-            img = img.resize((pixel_size, pixel_size), Image.LANCZOS)
+    if todo:
+        workers = max(1, min(jobs or os.cpu_count() or 1, len(todo)))
+        if workers == 1:
+            outputs = [render_one(s, d, n, variant.label, variant.color) for _f, s, d, n, _k in todo]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(render_one, s, d, n, variant.label, variant.color) for _f, s, d, n, _k in todo]
+                outputs = [f.result() for f in futures]
+        for (filename, _s, _d, _n, key), output in zip(todo, outputs):
+            manifest[filename] = {"key": key, "output": output}
+            status[filename] = "generated"
+        _save_manifest(variant.dst_dir, manifest)
+    return status
 
-        result = recolor_banner(img)
-        result.save(dst_path, "PNG")
-        print(f"  {filename} ({pixel_size}x{pixel_size})")
 
-    print(f"\nGenerated {len(SIZES)} icons in {DST_DIR}")
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate banner app icon variants from the Debug icon")
+    parser.add_argument("--variant", choices=sorted(VARIANTS), default="nightly")
+    parser.add_argument("--tag", help='build a variant for a tagged build, e.g. --tag "$CMUX_TAG"')
+    parser.add_argument("--out", help="output directory (default: the variant's appiconset)")
+    parser.add_argument("--force", action="store_true", help="regenerate even if inputs are unchanged")
+    parser.add_argument("--jobs", type=int)
+    args = parser.parse_args(argv)
+
+    if args.tag:
+        if not args.out:
+            parser.error("--tag needs --out (tag icons are not written into the asset catalog)")
+        variant = tag_variant(args.tag, args.out)
+    else:
+        variant = VARIANTS[args.variant]
+        if args.out:
+            variant = Variant(variant.name, variant.label, variant.color, args.out)
+
+    status = generate(variant, force=args.force, jobs=args.jobs)
+    for filename, pixel_size in SIZES:
+        state = status.get(filename)
+        if state == "missing":
+            print(f"  SKIP {filename} (source not found)")
+        else:
+            print(f"  {filename} ({pixel_size}x{pixel_size}){'' if state == 'generated' else ' unchanged'}")
+
+    generated = sum(1 for s in status.values() if s == "generated")
+    print(f"\nGenerated {generated} of {len(SIZES)} icons in {variant.dst_dir}")
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -32,6 +32,11 @@ if [ ! -d "$APP" ]; then
   exit 1
 fi
 
+# Every attempt is recorded in the local test history database; it decides
+# test order (recent failures first) and which tests get retried.
+HISTORY=(python3 scripts/cmux_test_history.py)
+RUN_ID="$("${HISTORY[@]}" start-run --suite v1 --build "$(git rev-parse --short HEAD 2>/dev/null || true)" 2>/dev/null || true)"
+
 cleanup() {
   pkill -x "cmux DEV" || true
   pkill -x "cmux" || true
@@ -195,14 +200,25 @@ if client is not None:
 PY
 }
 
+run_attempt() {
+  local f="$1"
+  local n="$2"
+  if [ -n "$RUN_ID" ]; then
+    "${HISTORY[@]}" exec "$RUN_ID" "$f" "$n" -- python3 "$f"
+  else
+    python3 "$f"
+  fi
+}
+
 run_test_with_retry() {
   local f="$1"
-  local attempts=3
+  local attempts
+  attempts="$("${HISTORY[@]}" retries "$f" 2>/dev/null || echo 3)"
   local n=1
 
   while [ "$n" -le "$attempts" ]; do
     echo "RUN  $f (attempt $n/$attempts)"
-    if python3 "$f"; then
+    if run_attempt "$f" "$n"; then
       return 0
     fi
 
@@ -221,7 +237,8 @@ run_test_with_retry() {
 
 echo "== tests (v1) =="
 fail=0
-for f in tests/test_*.py; do
+TESTS="$("${HISTORY[@]}" order --strategy recent-failures tests/test_*.py 2>/dev/null || ls tests/test_*.py)"
+for f in $TESTS; do
   base=$(basename "$f")
   if [ "$base" = "test_ctrl_interactive.py" ]; then
     echo "SKIP $f"
@@ -32,6 +32,11 @@ if [ ! -d "$APP" ]; then
   exit 1
 fi
 
+# Every attempt is recorded in the local test history database; it decides
+# test order (recent failures first) and which tests get retried.
+HISTORY=(python3 scripts/cmux_test_history.py)
+RUN_ID="$("${HISTORY[@]}" start-run --suite v2 --build "$(git rev-parse --short HEAD 2>/dev/null || true)" 2>/dev/null || true)"
+
 cleanup() {
   pkill -x "cmux DEV" || true
   pkill -x "cmux" || true
@@ -195,14 +200,25 @@ if client is not None:
 PY
 }
 
+run_attempt() {
+  local f="$1"
+  local n="$2"
+  if [ -n "$RUN_ID" ]; then
+    "${HISTORY[@]}" exec "$RUN_ID" "$f" "$n" -- python3 "$f"
+  else
+    python3 "$f"
+  fi
+}
+
 run_test_with_retry() {
   local f="$1"
-  local attempts=3
+  local attempts
+  attempts="$("${HISTORY[@]}" retries "$f" 2>/dev/null || echo 3)"
   local n=1
 
   while [ "$n" -le "$attempts" ]; do
     echo "RUN  $f (attempt $n/$attempts)"
-    if python3 "$f"; then
+    if run_attempt "$f" "$n"; then
       return 0
     fi
 
@@ -219,17 +235,45 @@ run_test_with_retry() {
   return 1
 }
 
+# The app is launched once; between tests it is reset to one window with one
+# fresh workspace over the socket (tests_v2/cmux_state_reset.py) and only
+# relaunched when that reset or its health check fails.
+# CMUX_TESTS_RELAUNCH_EACH=1 restores a full relaunch before every test.
+reset_or_relaunch() {
+  local base="$1"
+  if [ "${CMUX_TESTS_RELAUNCH_EACH:-0}" = "1" ] || [ "$LAUNCHED" = "0" ]; then
+    echo "== launch ($base) =="
+    launch_and_wait
+    LAUNCHED=1
+  elif python3 tests_v2/cmux_state_reset.py >/dev/null; then
+    echo "== reset ($base) =="
+  else
+    echo "WARN: state reset failed before $base; relaunching" >&2
+    echo "== relaunch (reset failed) =="
+    launch_and_wait
+  fi
+}
+
 echo "== tests (v2) =="
 fail=0
-for f in tests_v2/test_*.py; do
+LAUNCHED=0
+# CMUX_TEST_BASE=<rev> runs only the tests affected by changes since <rev>
+# (scripts/cmux_test_impact.py), plus its smoke set.
+if [ -n "${CMUX_TEST_BASE:-}" ]; then
+  CANDIDATES="$(python3 scripts/cmux_test_impact.py select --base "$CMUX_TEST_BASE" --explain)"
+  echo "selected $(echo "$CANDIDATES" | grep -c . || true) tests affected since $CMUX_TEST_BASE"
+else
+  CANDIDATES="$(ls tests_v2/test_*.py)"
+fi
+TESTS="$("${HISTORY[@]}" order --strategy recent-failures $CANDIDATES 2>/dev/null || echo "$CANDIDATES")"
+for f in $TESTS; do
   base=$(basename "$f")
   if [ "$base" = "test_ctrl_interactive.py" ]; then
     echo "SKIP $f"
     continue
   fi
 
-  echo "== launch ($base) =="
-  launch_and_wait
+  reset_or_relaunch "$base"
   if ! run_test_with_retry "$f"; then
     echo "FAIL $f" >&2
     fail=1
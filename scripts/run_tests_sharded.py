@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""Run the socket test suite sharded across several cmux instances.
+
+`run-tests-v2.sh` runs every test serially against one app. This launches N
+instances side by side, each with its own CMUX_TAG, socket and preferences
+home, and hands tests out longest-first (from recorded durations) to
+whichever shard is free. Results from all shards are merged into one report.
+Every attempt is recorded in the test history database
+(scripts/cmux_test_history.py), which also decides how many retries a test
+gets.
+
+Examples:
+    # Four tagged instances of a debug build:
+    ./scripts/run_tests_sharded.py --app "$APP" --shards 4
+
+    # Local stand-in servers instead of the app ({socket} is substituted):
+    ./scripts/run_tests_sharded.py --shards 2 \\
+        --instance-cmd "python3 my_stand_in.py --socket {socket}" tests_v2/test_foo.py
+
+Per shard:
+    socket  /tmp/cmux-debug-<tag>.sock       (CMUX_SOCKET_PATH / CMUX_SOCKET / CMUX_TAG)
+    state   <state dir>/<tag>/               (TMPDIR for tests, CFFIXED_USER_HOME for the app)
+    logs    <report dir>/<tag>/<test>.log
+
+A failing test is retried on the same shard after relaunching its instance,
+like run-tests-v2.sh does, up to its history-based retry budget.
+"""
+
+import argparse
+import collections
+import glob
+import json
+import os
+import re
+import shlex
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Deque, Dict, List, Optional
+
+from cmux_test_history import TestHistory
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Needs a human at the keyboard; run-tests-v2.sh skips it too.
+DEFAULT_SKIP = {"test_ctrl_interactive.py"}
+
+def _slug(raw: str) -> str:
+    # Same as _sanitize_tag_slug in tests/cmux.py.
+    return re.sub(r"-+", "-", re.sub(r"[^a-z0-9]+", "-", raw.strip().lower())).strip("-") or "agent"
+
+
+def _test_id(path: str) -> str:
+    return os.path.relpath(os.path.abspath(path), REPO)
+
+
+class Instance:
+    """One cmux (or stand-in) process serving a shard's socket."""
+
+    def __init__(self, tag: str, state_dir: str, app: Optional[str] = None, command: Optional[str] = None,
+                 ready_timeout: float = 30.0):
+        self.tag = tag
+        self.state_dir = state_dir
+        self.socket_path = f"/tmp/cmux-debug-{tag}.sock"
+        self.app = app
+        self.command = command
+        self.ready_timeout = ready_timeout
+        self._proc: Optional[subprocess.Popen] = None
+
+    def env(self) -> Dict[str, str]:
+        tmpdir = os.path.join(self.state_dir, "tmp")
+        os.makedirs(tmpdir, exist_ok=True)
+        return {
+            "CMUX_TAG": self.tag,
+            "CMUX_SOCKET_PATH": self.socket_path,
+            "CMUX_SOCKET": self.socket_path,
+            "TMPDIR": tmpdir,
+        }
+
+    def start(self) -> None:
+        self.stop()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+        env = dict(os.environ)
+        for key in ("CMUX_TAB_ID", "CMUX_PANEL_ID", "CMUX_WORKSPACE_ID", "CMUX_SURFACE_ID"):
+            env.pop(key, None)
+        env.update(self.env())
+        log = open(os.path.join(self.state_dir, "instance.log"), "ab")
+        if self.command:
+            argv = shlex.split(self.command.format(socket=shlex.quote(self.socket_path), tag=self.tag))
+        else:
+            # Own preferences/Application Support per shard so session
+            # restore and settings from one shard never leak into another.
+            home = os.path.join(self.state_dir, "home")
+            os.makedirs(home, exist_ok=True)
+            env["CFFIXED_USER_HOME"] = home
+            env["CMUX_UI_TEST_MODE"] = "1"
+            env["CMUX_DEBUG_LOG"] = os.path.join(self.state_dir, "cmux-debug.log")
+            env["CMUXD_UNIX_PATH"] = os.path.join(self.state_dir, "cmuxd.sock")
+            subprocess.run(
+                ["defaults", "write", "com.cmuxterm.app.debug", "socketControlMode", "-string", "full"],
+                env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            argv = [os.path.join(self.app, "Contents", "MacOS", "cmux DEV")]
+        self._proc = subprocess.Popen(argv, env=env, stdout=log, stderr=log, start_new_session=True)
+        log.close()
+        self._wait_ready()
+
+    def _wait_ready(self) -> None:
+        deadline = time.time() + self.ready_timeout
+        last: Optional[Exception] = None
+        while time.time() < deadline:
+            if self._proc is not None and self._proc.poll() is not None:
+                raise RuntimeError(f"{self.tag}: instance exited with {self._proc.returncode}")
+            try:
+                if self.ping():
+                    return
+            except OSError as e:
+                last = e
+            time.sleep(0.1)
+        raise RuntimeError(f"{self.tag}: socket not ready after {self.ready_timeout:.0f}s ({last})")
+
+    def ping(self) -> bool:
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            s.settimeout(2.0)
+            s.connect(self.socket_path)
+            s.sendall(b"ping\n")
+            return bool(s.recv(64))
+        finally:
+            s.close()
+
+    def stop(self) -> None:
+        if self._proc is None:
+            return
+        if self._proc.poll() is None:
+            try:
+                os.killpg(self._proc.pid, signal.SIGTERM)
+                self._proc.wait(timeout=5.0)
+            except (OSError, subprocess.TimeoutExpired):
+                try:
+                    os.killpg(self._proc.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+                self._proc.wait()
+        self._proc = None
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+
+class ShardedRunner:
+    def __init__(self, tests: List[str], instances: List[Instance], history: TestHistory, report_dir: str,
+                 attempts: int = 3, timeout: float = 600.0, fail_fast: bool = False, build: str = ""):
+        self.instances = instances
+        self.history = history
+        self.report_dir = report_dir
+        self.attempts = attempts
+        self.timeout = timeout
+        self.fail_fast = fail_fast
+        self._queue: Deque[str] = collections.deque(history.order(tests, "longest"))
+        self._run_id = history.start_run(build=build, suite="sharded")
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.results: List[dict] = []
+
+    def run(self) -> dict:
+        start = time.time()
+        threads = [threading.Thread(target=self._worker, args=(inst,), daemon=True) for inst in self.instances]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return self._report(time.time() - start)
+
+    def _next(self) -> Optional[str]:
+        with self._lock:
+            if self._stop.is_set() or not self._queue:
+                return None
+            return self._queue.popleft()
+
+    def _worker(self, inst: Instance) -> None:
+        log_dir = os.path.join(self.report_dir, inst.tag)
+        os.makedirs(log_dir, exist_ok=True)
+        try:
+            inst.start()
+        except RuntimeError as e:
+            print(f"ERROR {e}", flush=True)
+            # Leave this shard's share to the healthy ones.
+            return
+        try:
+            while True:
+                test = self._next()
+                if test is None:
+                    return
+                result = self._run_test(inst, test, log_dir)
+                with self._lock:
+                    self.results.append(result)
+                    if result["status"] != "pass" and self.fail_fast:
+                        self._stop.set()
+        finally:
+            inst.stop()
+
+    def _run_test(self, inst: Instance, test: str, log_dir: str) -> dict:
+        log_path = os.path.join(log_dir, os.path.basename(test) + ".log")
+        env = dict(os.environ)
+        env.update(inst.env())
+        with self._lock:
+            budget = self.history.retry_budget(test, self.attempts)
+        attempts: List[dict] = []
+        for n in range(1, budget + 1):
+            print(f"RUN  [{inst.tag}] {test} (attempt {n}/{budget})", flush=True)
+            started = time.time()
+            with open(log_path, "ab") as log:
+                log.write(f"== attempt {n} ==\n".encode())
+                log.flush()
+                try:
+                    proc = subprocess.run([sys.executable, test], cwd=REPO, env=env, stdout=log,
+                                          stderr=subprocess.STDOUT, timeout=self.timeout)
+                    code = proc.returncode
+                except subprocess.TimeoutExpired:
+                    code = None
+            attempts.append({"returncode": code, "duration": round(time.time() - started, 3)})
+            outcome = "pass" if code == 0 else ("timeout" if code is None else "fail")
+            with self._lock:
+                self.history.record(self._run_id, test, n, attempts[-1]["duration"], outcome,
+                                    "" if code == 0 else f"exit {code}")
+            if code == 0:
+                break
+            if n < budget:
+                print(f"WARN [{inst.tag}] {test} failed; relaunching instance and retrying", flush=True)
+                try:
+                    inst.start()
+                except RuntimeError as e:
+                    print(f"ERROR {e}", flush=True)
+                    break
+        passed = attempts[-1]["returncode"] == 0
+        status = "pass" if passed else ("timeout" if attempts[-1]["returncode"] is None else "fail")
+        print(f"{'PASS' if passed else 'FAIL'} [{inst.tag}] {test} ({attempts[-1]['duration']:.1f}s)", flush=True)
+        return {
+            "test": test,
+            "shard": inst.tag,
+            "status": status,
+            "flaky": passed and len(attempts) > 1,
+            "duration": attempts[-1]["duration"],
+            "attempts": attempts,
+            "log": os.path.relpath(log_path, self.report_dir),
+        }
+
+    def _report(self, wall: float) -> dict:
+        ran = {r["test"] for r in self.results}
+        results = sorted(self.results, key=lambda r: r["test"])
+        per_shard: Dict[str, float] = collections.defaultdict(float)
+        for r in results:
+            per_shard[r["shard"]] += sum(a["duration"] for a in r["attempts"])
+        return {
+            "wall_seconds": round(wall, 3),
+            "serial_seconds": round(sum(per_shard.values()), 3),
+            "shards": {tag: round(busy, 3) for tag, busy in sorted(per_shard.items())},
+            "passed": sum(1 for r in results if r["status"] == "pass"),
+            "failed": sum(1 for r in results if r["status"] != "pass"),
+            "flaky": sum(1 for r in results if r["flaky"]),
+            "not_run": sorted(set(self._queue) - ran),
+            "results": results,
+        }
+
+
+def discover(paths: List[str], suite: str, skip: set) -> List[str]:
+    if not paths:
+        paths = sorted(glob.glob(os.path.join(REPO, suite, "test_*.py")))
+    tests = []
+    for p in paths:
+        if os.path.basename(p) in skip:
+            continue
+        tests.append(_test_id(p))
+    return tests
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run cmux socket tests sharded across tagged instances")
+    parser.add_argument("tests", nargs="*", help="test scripts (default: every test_*.py in --suite)")
+    parser.add_argument("--suite", default="tests_v2", help="test directory when no tests are given")
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--app", help="path to the built cmux DEV.app")
+    parser.add_argument("--instance-cmd", help="launch this instead of the app ({socket}, {tag} are substituted)")
+    parser.add_argument("--tag-prefix", default="shard")
+    parser.add_argument("--history", help="test history database (default: $CMUX_TEST_HISTORY_DB or ~/.cache/cmux)")
+    parser.add_argument("--build", default=os.environ.get("CMUX_TEST_BUILD", ""), help="build label for regressions")
+    parser.add_argument("--state-dir", default=os.path.join("/tmp", "cmux-shards"), help="per-shard state root")
+    parser.add_argument("--report-dir", help="logs + report.json (default: <state-dir>/report)")
+    parser.add_argument("--attempts", type=int, default=3, help="max attempts for flaky or new tests")
+    parser.add_argument("--timeout", type=float, default=600.0, help="per-attempt timeout in seconds")
+    parser.add_argument("--skip", action="append", default=[], help="test file name to skip (repeatable)")
+    parser.add_argument("--fail-fast", action="store_true")
+    args = parser.parse_args(argv)
+
+    if bool(args.app) == bool(args.instance_cmd):
+        parser.error("pass exactly one of --app or --instance-cmd")
+    if args.app and not os.path.isdir(args.app):
+        parser.error(f"app not found: {args.app}")
+
+    tests = discover(args.tests, args.suite, DEFAULT_SKIP | set(args.skip))
+    if not tests:
+        print("No tests found.")
+        return 1
+
+    history = TestHistory(args.history)
+    args.report_dir = args.report_dir or os.path.join(args.state_dir, "report")
+    shutil.rmtree(args.report_dir, ignore_errors=True)
+    os.makedirs(args.report_dir)
+    instances = []
+    for i in range(max(1, min(args.shards, len(tests)))):
+        tag = _slug(f"{args.tag_prefix}-{i + 1}")
+        state_dir = os.path.join(args.state_dir, tag)
+        shutil.rmtree(state_dir, ignore_errors=True)
+        os.makedirs(state_dir)
+        instances.append(Instance(tag, state_dir, app=args.app, command=args.instance_cmd))
+
+    runner = ShardedRunner(tests, instances, history, args.report_dir,
+                           attempts=args.attempts, timeout=args.timeout, fail_fast=args.fail_fast, build=args.build)
+    try:
+        report = runner.run()
+    finally:
+        for inst in instances:
+            inst.stop()
+        history.close()
+
+    report_path = os.path.join(args.report_dir, "report.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print("== summary ==")
+    print(f"{report['passed']} passed, {report['failed']} failed, {report['flaky']} flaky, "
+          f"{len(report['not_run'])} not run")
+    print(f"wall {report['wall_seconds']:.1f}s vs {report['serial_seconds']:.1f}s of test time "
+          f"across {len(instances)} shards")
+    for r in report["results"]:
+        if r["status"] != "pass":
+            print(f"FAIL {r['test']} [{r['shard']}] -> {os.path.join(args.report_dir, r['log'])}")
+    print(f"report: {report_path}")
+    return 0 if report["failed"] == 0 and not report["not_run"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
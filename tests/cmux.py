@@ -572,21 +572,25 @@ class cmux:
         if not response.startswith("OK"):
             raise cmuxError(response)
 
-    def report_ports(self, *ports: int, tab: str = None) -> None:
+    def report_ports(self, *ports: int, tab: str = None, panel: str = None) -> None:
         """Report listening ports for sidebar display."""
         port_str = " ".join(str(p) for p in ports)
         cmd = f"report_ports {port_str}"
         if tab:
             cmd += f" --tab={tab}"
+        if panel:
+            cmd += f" --panel={panel}"
         response = self._send_command(cmd)
         if not response.startswith("OK"):
             raise cmuxError(response)
 
-    def clear_ports(self, tab: str = None) -> None:
+    def clear_ports(self, tab: str = None, panel: str = None) -> None:
         """Clear listening ports for sidebar display."""
         cmd = "clear_ports"
         if tab:
             cmd += f" --tab={tab}"
+        if panel:
+            cmd += f" --panel={panel}"
         response = self._send_command(cmd)
         if not response.startswith("OK"):
             raise cmuxError(response)
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+cmux sidebar logging handler
+
+A `logging.Handler` that ships log records to the cmux sidebar via the v1
+`log` command without doing socket I/O on the calling thread.
+
+Usage:
+    import logging
+    from cmux_logging import CmuxLogHandler
+
+    handler = CmuxLogHandler(source="agent")
+    logging.getLogger().addHandler(handler)
+
+    logging.info("indexing repo")
+    logging.info("done", extra={"cmux_level": "success"})
+
+    handler.close()  # flushes pending records
+
+Records are appended to a bounded ring buffer and shipped by a background
+thread in batches over one persistent connection. When the buffer is full the
+oldest records are dropped (see `dropped`), so `emit()` never blocks.
+"""
+
+import collections
+import logging
+import os
+import select
+import socket
+import threading
+import time
+from typing import Deque, List, Optional, Tuple
+
+from cmux import _default_socket_path, _quote_option_value
+
+
+# Must match SidebarLogLevel in Sources/Workspace.swift.
+CMUX_LOG_LEVELS = ("info", "progress", "success", "warning", "error")
+
+
+def cmux_level_for(levelno: int) -> str:
+    """Map a Python logging level to the closest cmux sidebar log level."""
+    if levelno >= logging.ERROR:
+        return "error"
+    if levelno >= logging.WARNING:
+        return "warning"
+    return "info"
+
+
+def _format_log_command(message: str, level: str, source: Optional[str], tab: Optional[str]) -> str:
+    # Same layout as cmux.log(): options first, then `--` so the message can
+    # contain arbitrary `--*` tokens. The v1 protocol is line-oriented, so
+    # embedded newlines (e.g. tracebacks) are flattened.
+    flat = " ".join(part for part in message.splitlines() if part.strip()) or " "
+    cmd = f"log --level={level}"
+    if source:
+        cmd += f" --source={_quote_option_value(source)}"
+    if tab:
+        cmd += f" --tab={tab}"
+    cmd += f" -- {_quote_option_value(flat)}"
+    return cmd
+
+
+class CmuxLogHandler(logging.Handler):
+    """Batched, rate-limited, non-blocking sidebar log handler."""
+
+    def __init__(
+        self,
+        socket_path: Optional[str] = None,
+        source: Optional[str] = None,
+        tab: Optional[str] = None,
+        level: int = logging.NOTSET,
+        capacity: int = 1000,
+        batch_size: int = 50,
+        flush_interval: float = 0.25,
+        max_records_per_second: float = 50.0,
+        connect_timeout: float = 1.0,
+    ):
+        super().__init__(level)
+        self.socket_path = socket_path or _default_socket_path()
+        # None means "use the logger name" per record.
+        self.source = source
+        self.tab = tab if tab is not None else os.environ.get("CMUX_TAB_ID") or None
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = max(0.01, float(flush_interval))
+        self.max_records_per_second = float(max_records_per_second)
+        self.connect_timeout = float(connect_timeout)
+
+        # deque.append/popleft are atomic, so emit() only ever touches this
+        # buffer and an Event. The sender takes the handler lock only to put a
+        # failed batch back, which is off the fast path.
+        self._queue: Deque[Tuple[str, str, Optional[str]]] = collections.deque(maxlen=max(1, int(capacity)))
+        self._wakeup = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._stopping = False
+
+        self._socket: Optional[socket.socket] = None
+        self._retry_at = 0.0
+        self._tokens = float(self.batch_size)
+        self._tokens_updated = time.monotonic()
+
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+        self.batches = 0
+        self.connections = 0
+
+        self._thread = threading.Thread(target=self._run, name="cmux-log-handler", daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------
+    # logging.Handler API
+    # ------------------------------------------------------------------
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self._stopping:
+            return
+        try:
+            message = self.format(record)
+            level = getattr(record, "cmux_level", None)
+            if level not in CMUX_LOG_LEVELS:
+                level = cmux_level_for(record.levelno)
+            source = getattr(record, "cmux_source", None) or self.source or record.name
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._idle.clear()
+            self._queue.append((message, level, source))
+            self._wakeup.set()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self, timeout: float = 2.0) -> bool:
+        """Wait (bounded) for the sender to drain the queue.
+
+        Returns True if nothing is left queued. Records stay queued (subject to
+        the ring buffer limit) while the socket is unreachable; a batch that
+        was already being written when the connection broke counts as failed.
+        """
+        if self._thread.is_alive():
+            self._idle.clear()
+            self._wakeup.set()
+            self._idle.wait(timeout)
+        return not self._queue
+
+    def close(self) -> None:
+        try:
+            if not self._stopping:
+                self.flush()
+                self._stopping = True
+                self._wakeup.set()
+                self._thread.join(timeout=2.0)
+                self._disconnect()
+        finally:
+            super().close()
+
+    # ------------------------------------------------------------------
+    # Sender thread
+    # ------------------------------------------------------------------
+
+    def _run(self) -> None:
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._drain()
+        self._idle.set()
+
+    def _drain(self) -> None:
+        while self._queue and not self._stopping:
+            batch = self._take_batch()
+            if not batch:
+                # Rate limited: wait for tokens, but stay responsive to close().
+                self._wakeup.wait(self._seconds_until_token())
+                self._wakeup.clear()
+                continue
+            if not self._ship(batch):
+                # Leave the rest queued until the reconnect backoff expires.
+                break
+        self._idle.set()
+
+    def _refill_tokens(self) -> None:
+        if self.max_records_per_second <= 0:
+            return
+        now = time.monotonic()
+        elapsed = now - self._tokens_updated
+        self._tokens_updated = now
+        self._tokens = min(float(self.batch_size), self._tokens + elapsed * self.max_records_per_second)
+
+    def _seconds_until_token(self) -> float:
+        if self.max_records_per_second <= 0:
+            return 0.0
+        return max(0.001, (1.0 - self._tokens) / self.max_records_per_second)
+
+    def _take_batch(self) -> List[Tuple[str, str, Optional[str]]]:
+        limit = self.batch_size
+        if self.max_records_per_second > 0:
+            self._refill_tokens()
+            limit = min(limit, int(self._tokens))
+        batch: List[Tuple[str, str, Optional[str]]] = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.popleft())
+            except IndexError:
+                break
+        if self.max_records_per_second > 0:
+            self._tokens -= len(batch)
+        return batch
+
+    def _ship(self, batch: List[Tuple[str, str, Optional[str]]]) -> bool:
+        sock = self._ensure_connected()
+        if sock is None:
+            self._requeue(batch)
+            return False
+
+        payload = "".join(
+            _format_log_command(message, level, source, self.tab) + "\n"
+            for message, level, source in batch
+        )
+        try:
+            sock.sendall(payload.encode("utf-8"))
+            responses = self._read_responses(sock, len(batch))
+        except OSError:
+            self.failed += len(batch)
+            self._disconnect()
+            return False
+
+        ok = sum(1 for line in responses if line.startswith("OK"))
+        self.sent += ok
+        self.failed += len(batch) - ok
+        self.batches += 1
+        return True
+
+    def _requeue(self, batch: List[Tuple[str, str, Optional[str]]]) -> None:
+        # The batch is older than anything still queued, so it goes back at the
+        # front in order. If emit() refilled the ring meanwhile, the oldest
+        # records lose out, as they would have in emit(). extendleft() on a
+        # full deque would evict from the right (the newest records), so trim
+        # the batch first, holding the handler lock so emit() can't append in
+        # between.
+        if self.max_records_per_second > 0:
+            self._tokens = min(float(self.batch_size), self._tokens + len(batch))
+        with self.lock:
+            room = self._queue.maxlen - len(self._queue)
+            keep = batch[len(batch) - room:] if room < len(batch) else batch
+            self.dropped += len(batch) - len(keep)
+            self._queue.extendleft(reversed(keep))
+
+    def _read_responses(self, sock: socket.socket, count: int) -> List[str]:
+        # The server answers each `log` line with exactly one line, in order.
+        buf = b""
+        deadline = time.monotonic() + 5.0
+        while buf.count(b"\n") < count:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise socket.timeout("Timed out waiting for log responses")
+            ready, _, _ = select.select([sock], [], [], remaining)
+            if not ready:
+                continue
+            chunk = sock.recv(8192)
+            if not chunk:
+                raise ConnectionResetError("Socket closed")
+            buf += chunk
+        return buf.decode("utf-8", errors="replace").split("\n")[:count]
+
+    def _ensure_connected(self) -> Optional[socket.socket]:
+        if self._socket is not None:
+            return self._socket
+        now = time.monotonic()
+        if now < self._retry_at:
+            return None
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            s.settimeout(self.connect_timeout)
+            s.connect(self.socket_path)
+        except OSError:
+            s.close()
+            # Back off so a missing app doesn't turn into a connect storm.
+            self._retry_at = now + 1.0
+            return None
+        self._socket = s
+        self.connections += 1
+        return s
+
+    def _disconnect(self) -> None:
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            except OSError:
+                pass
+            self._socket = None
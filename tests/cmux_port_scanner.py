@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+cmux listening-port scanner
+
+Maps listening TCP ports to the TTYs (and so the panels) that own them and
+reports them to the sidebar with `report_ports` / `clear_ports`.
+
+Usage:
+    from cmux import cmux
+    from cmux_port_scanner import PortReporter
+
+    with cmux() as client:
+        reporter = PortReporter(client)
+        reporter.watch("ttys003", tab=workspace_id, panel=surface_id)
+        reporter.scan_and_report()
+
+    # or from a shell, every 2s:
+    python3 tests/cmux_port_scanner.py --panel <tty>:<tab>:<panel> --interval 2
+
+Backends:
+- ProcPortBackend (Linux) parses /proc/net/tcp{,6} and /proc/<pid>/fd. It is
+  incremental: /proc/<pid>/stat is read once per process, and fd tables are
+  only walked for new processes on watched TTYs, or when a listening socket
+  shows up that no known process accounts for.
+- LsofPortBackend (macOS) runs one `ps` + one `lsof` per scan, restricted to
+  processes on watched TTYs, the same way Sources/PortScanner.swift does.
+
+TTY names are the basename of the device path, i.e. what the shell
+integrations send in `report_tty` (`ttys003` on macOS, `3` for /dev/pts/3).
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from cmux import cmux, cmuxError
+
+
+# /proc/net/tcp state column for TCP_LISTEN.
+_TCP_LISTEN = "0A"
+
+
+def tty_name_from_nr(tty_nr: int) -> str:
+    """Decode /proc/<pid>/stat's tty_nr into a device basename ("" for none)."""
+    if tty_nr == 0:
+        return ""
+    major = (tty_nr >> 8) & 0xFFF
+    minor = (tty_nr & 0xFF) | ((tty_nr >> 12) & 0xFFF00)
+    if 136 <= major <= 143:
+        # Unix98 pty slaves: /dev/pts/N, basename N.
+        return str((major - 136) * 256 + minor)
+    if major == 4 and minor < 64:
+        return f"tty{minor}"
+    if major == 4:
+        return f"ttyS{minor - 64}"
+    return f"{major}:{minor}"
+
+
+def parse_proc_net_tcp(text: str) -> Dict[int, int]:
+    """Return {socket inode: port} for listening sockets in /proc/net/tcp{,6}."""
+    out: Dict[int, int] = {}
+    for line in text.splitlines()[1:]:
+        fields = line.split()
+        if len(fields) < 10 or fields[3] != _TCP_LISTEN:
+            continue
+        try:
+            port = int(fields[1].rsplit(":", 1)[1], 16)
+            inode = int(fields[9])
+        except (IndexError, ValueError):
+            continue
+        if inode:
+            out[inode] = port
+    return out
+
+
+class PortBackend:
+    """Maps TTY names to the listening ports of processes on them."""
+
+    def scan(self, ttys: Optional[Set[str]] = None) -> Dict[str, List[int]]:
+        """Return {tty: sorted ports}. `ttys=None` means every TTY."""
+        raise NotImplementedError
+
+
+class ProcPortBackend(PortBackend):
+    """Incremental Linux backend reading /proc directly."""
+
+    def __init__(self, proc_root: str = "/proc"):
+        self.proc_root = proc_root
+        # pid -> (starttime, tty); starttime guards against pid reuse.
+        self._procs: Dict[int, Tuple[str, str]] = {}
+        # listening inode -> owning pid.
+        self._owner: Dict[int, int] = {}
+        # Listening inodes no watched process owned at the last full walk.
+        self._foreign: Set[int] = set()
+        self._last_ttys: Optional[frozenset] = None
+
+        # Counters, mostly for the benchmark.
+        self.stat_reads = 0
+        self.fd_walks = 0
+
+    def scan(self, ttys: Optional[Set[str]] = None) -> Dict[str, List[int]]:
+        key = frozenset(ttys) if ttys is not None else None
+        if key != self._last_ttys:
+            # A newly watched TTY may own sockets we wrote off as foreign.
+            self._foreign.clear()
+            self._last_ttys = key
+
+        listening = self._read_listening()
+        new_pids = self._refresh_procs()
+
+        def watched(pid: int) -> bool:
+            tty = self._procs[pid][1]
+            return bool(tty) and (ttys is None or tty in ttys)
+
+        for inode, pid in list(self._owner.items()):
+            if inode not in listening or pid not in self._procs:
+                del self._owner[inode]
+        self._foreign &= set(listening)
+
+        # New processes are cheap to check and are where new servers come from.
+        for pid in sorted(new_pids, reverse=True):
+            if watched(pid):
+                self._walk_fds(pid, listening)
+
+        unresolved = set(listening) - set(self._owner) - self._foreign
+        if unresolved:
+            # Something on an older process started listening (or we just
+            # started watching its TTY): walk the rest, newest first, until
+            # every listening socket is accounted for.
+            for pid in sorted(self._procs, reverse=True):
+                if pid in new_pids or not watched(pid):
+                    continue
+                self._walk_fds(pid, listening)
+                unresolved -= set(self._owner)
+                if not unresolved:
+                    break
+            self._foreign |= unresolved
+
+        result: Dict[str, Set[int]] = {}
+        for inode, pid in self._owner.items():
+            if not watched(pid):
+                continue
+            result.setdefault(self._procs[pid][1], set()).add(listening[inode])
+        return {tty: sorted(ports) for tty, ports in result.items()}
+
+    def _read_listening(self) -> Dict[int, int]:
+        listening: Dict[int, int] = {}
+        for name in ("tcp", "tcp6"):
+            try:
+                with open(os.path.join(self.proc_root, "net", name), "r", encoding="ascii") as f:
+                    listening.update(parse_proc_net_tcp(f.read()))
+            except OSError:
+                continue
+        return listening
+
+    def _refresh_procs(self) -> Set[int]:
+        try:
+            entries = os.listdir(self.proc_root)
+        except OSError:
+            return set()
+        alive: Set[int] = set()
+        new: Set[int] = set()
+        for entry in entries:
+            if not entry.isdigit():
+                continue
+            pid = int(entry)
+            alive.add(pid)
+            if pid in self._procs:
+                continue
+            info = self._read_stat(pid)
+            if info is None:
+                alive.discard(pid)
+                continue
+            self._procs[pid] = info
+            new.add(pid)
+        for pid in set(self._procs) - alive:
+            del self._procs[pid]
+        # A recycled pid shows up as alive-but-known; re-validate the ones
+        # we're about to trust for ownership.
+        for pid in set(self._owner.values()) & alive:
+            info = self._read_stat(pid)
+            if info is None or info[0] != self._procs[pid][0]:
+                if info is None:
+                    del self._procs[pid]
+                else:
+                    self._procs[pid] = info
+                    new.add(pid)
+                for inode in [i for i, p in self._owner.items() if p == pid]:
+                    del self._owner[inode]
+        return new
+
+    def _read_stat(self, pid: int) -> Optional[Tuple[str, str]]:
+        self.stat_reads += 1
+        try:
+            with open(os.path.join(self.proc_root, str(pid), "stat"), "r", encoding="utf-8", errors="replace") as f:
+                raw = f.read()
+        except OSError:
+            return None
+        # comm (field 2) may contain spaces and parens; split after the last ')'.
+        fields = raw[raw.rfind(")") + 2:].split()
+        try:
+            return fields[19], tty_name_from_nr(int(fields[4]))
+        except (IndexError, ValueError):
+            return None
+
+    def _walk_fds(self, pid: int, listening: Dict[int, int]) -> None:
+        self.fd_walks += 1
+        fd_dir = os.path.join(self.proc_root, str(pid), "fd")
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            return
+        for fd in fds:
+            try:
+                target = os.readlink(os.path.join(fd_dir, fd))
+            except OSError:
+                continue
+            if not target.startswith("socket:["):
+                continue
+            try:
+                inode = int(target[8:-1])
+            except ValueError:
+                continue
+            if inode in listening:
+                # Forked servers share the socket; keep the first owner found.
+                self._owner.setdefault(inode, pid)
+
+
+class LsofPortBackend(PortBackend):
+    """macOS backend: `ps` for TTY membership, one `lsof` for the sockets."""
+
+    def __init__(self, timeout: float = 5.0):
+        self.timeout = timeout
+
+    def scan(self, ttys: Optional[Set[str]] = None) -> Dict[str, List[int]]:
+        pid_tty = self._pids_by_tty(ttys)
+        if not pid_tty:
+            return {}
+        try:
+            out = subprocess.run(
+                ["lsof", "-nP", "-a", "-iTCP", "-sTCP:LISTEN", "-Fpn", "-p", ",".join(str(p) for p in pid_tty)],
+                capture_output=True,
+                text=True,
+                timeout=self.timeout,
+            ).stdout
+        except (OSError, subprocess.SubprocessError):
+            return {}
+        result: Dict[str, Set[int]] = {}
+        pid = 0
+        for line in out.splitlines():
+            if line.startswith("p"):
+                pid = int(line[1:]) if line[1:].isdigit() else 0
+            elif line.startswith("n") and pid in pid_tty:
+                port = line.rsplit(":", 1)[-1]
+                if port.isdigit():
+                    result.setdefault(pid_tty[pid], set()).add(int(port))
+        return {tty: sorted(ports) for tty, ports in result.items()}
+
+    def _pids_by_tty(self, ttys: Optional[Set[str]]) -> Dict[int, str]:
+        cmd = ["ps", "-o", "pid=,tty="]
+        cmd += ["-t", ",".join(sorted(ttys))] if ttys else ["-ax"]
+        try:
+            out = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout).stdout
+        except (OSError, subprocess.SubprocessError):
+            return {}
+        pids: Dict[int, str] = {}
+        for line in out.splitlines():
+            fields = line.split()
+            if len(fields) != 2 or not fields[0].isdigit() or fields[1] in ("?", "??"):
+                continue
+            tty = fields[1]
+            # ps abbreviates ttys003 to s003 on macOS.
+            if tty.startswith("s") and tty[1:].isdigit():
+                tty = "tty" + tty
+            pids[int(fields[0])] = tty.rsplit("/", 1)[-1]
+        return pids
+
+
+def default_backend() -> PortBackend:
+    if os.path.exists("/proc/net/tcp"):
+        return ProcPortBackend()
+    return LsofPortBackend()
+
+
+class PortReporter:
+    """Scans watched TTYs and reports port changes per panel."""
+
+    def __init__(self, client: cmux, backend: Optional[PortBackend] = None):
+        self.client = client
+        self.backend = backend or default_backend()
+        # tty -> (tab, panel)
+        self._panels: Dict[str, Tuple[str, str]] = {}
+        self._reported: Dict[str, List[int]] = {}
+
+    def watch(self, tty: str, tab: str, panel: str) -> None:
+        self._panels[tty] = (tab, panel)
+
+    def unwatch(self, tty: str) -> None:
+        self._panels.pop(tty, None)
+        self._reported.pop(tty, None)
+
+    def scan_and_report(self) -> Dict[str, List[int]]:
+        """Scan once; send `report_ports`/`clear_ports` only for changed panels."""
+        if not self._panels:
+            return {}
+        ports = self.backend.scan(set(self._panels))
+        for tty, (tab, panel) in self._panels.items():
+            current = ports.get(tty, [])
+            if tty in self._reported and self._reported[tty] == current:
+                continue
+            if current:
+                self.client.report_ports(*current, tab=tab, panel=panel)
+            else:
+                self.client.clear_ports(tab=tab, panel=panel)
+            self._reported[tty] = current
+        return ports
+
+
+def _parse_panel(spec: str) -> Tuple[str, str, str]:
+    parts = spec.split(":")
+    if len(parts) != 3 or not all(parts):
+        raise argparse.ArgumentTypeError(f"expected TTY:TAB:PANEL, got {spec!r}")
+    return parts[0], parts[1], parts[2]
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Report listening ports per panel to cmux")
+    parser.add_argument("--socket", help="cmux socket path")
+    parser.add_argument("--panel", action="append", type=_parse_panel, default=[], help="TTY:TAB:PANEL (repeatable)")
+    parser.add_argument("--interval", type=float, default=0.0, help="rescan every N seconds (0 = once)")
+    args = parser.parse_args(list(argv) if argv is not None else None)
+
+    if not args.panel:
+        parser.error("at least one --panel is required")
+
+    try:
+        with cmux(args.socket) as client:
+            reporter = PortReporter(client)
+            for tty, tab, panel in args.panel:
+                reporter.watch(tty, tab, panel)
+            while True:
+                for tty, ports in sorted(reporter.scan_and_report().items()):
+                    print(f"{tty}: {','.join(str(p) for p in ports)}")
+                if args.interval <= 0:
+                    return 0
+                time.sleep(args.interval)
+    except cmuxError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
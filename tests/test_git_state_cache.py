@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Tests + benchmark for the relay's shared git-state cache
+(Resources/shell-integration/cmux_git_state.py).
+
+Covers:
+- N panels in one repo cost one `git status` instead of one probe per prompt
+- branch changes (HEAD rewrite) are pushed to every panel, once
+- dirty state is picked up after the refresh interval, not before
+- detached HEAD / leaving the repo clears the branch
+- a repository created or removed in the prompt's directory is noticed
+- the relay answering `git_refresh` hints end-to-end
+- the relay resending git state that was held back or sent to a connection
+  that went away
+
+Needs `git`; does not need a running cmux instance.
+
+Usage:
+    python3 tests/test_git_state_cache.py
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+INTEGRATION_DIR = ROOT / "Resources" / "shell-integration"
+RELAY = INTEGRATION_DIR / "cmux-shell-relay.py"
+sys.path.insert(0, str(INTEGRATION_DIR))
+
+from cmux_git_state import GitStateService  # noqa: E402
+from test_shell_relay import FakeV1Server, _read_stats, _relay_file, _wait_for, _write_fifo  # noqa: E402
+
+PANELS = 10
+PROMPTS = 20
+
+
+def _git(repo: str, *args: str) -> str:
+    return subprocess.run(
+        ["git", "-C", repo, *args],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+
+def _make_repo(tmp: str) -> str:
+    repo = os.path.join(tmp, "repo")
+    os.makedirs(os.path.join(repo, "sub"))
+    _git(repo, "init", "-q", "-b", "main")
+    _git(repo, "config", "user.email", "test@example.com")
+    _git(repo, "config", "user.name", "test")
+    Path(repo, "sub", "file.txt").write_text("one\n")
+    _git(repo, "add", ".")
+    _git(repo, "commit", "-q", "-m", "init")
+    return repo
+
+
+def _panels() -> list[tuple[str, str]]:
+    return [("tab-1", f"panel-{i}") for i in range(PANELS)]
+
+
+def _per_prompt_probe(repo: str) -> str:
+    # What each shell's precmd does today without the relay.
+    branch = _git(repo, "branch", "--show-current").strip()
+    dirty = bool(_git(repo, "status", "--porcelain", "-uno").strip())
+    return f"{branch} {dirty}"
+
+
+def test_benchmark(tmp: str) -> None:
+    repo = _make_repo(tmp)
+    sub = os.path.join(repo, "sub")
+
+    start = time.perf_counter()
+    probes = 0
+    for _ in range(PROMPTS):
+        for _panel in _panels():
+            _per_prompt_probe(sub)
+            probes += 2
+    per_prompt_s = time.perf_counter() - start
+
+    service = GitStateService(min_interval_s=60.0, max_workers=0)
+    start = time.perf_counter()
+    pushed = []
+    for _ in range(PROMPTS):
+        for tab, panel in _panels():
+            service.update_panel(tab, panel, sub)
+        pushed.extend(service.poll())
+    cached_s = time.perf_counter() - start
+
+    print(
+        f"  {PANELS} panels x {PROMPTS} prompts: per-prompt {probes} git runs in {per_prompt_s * 1000:.0f} ms; "
+        f"shared cache {service.git_runs} git run(s) in {cached_s * 1000:.1f} ms"
+    )
+    assert service.git_runs == 1, f"expected one git status for the whole burst, got {service.git_runs}"
+    assert len(pushed) == PANELS, f"expected one report per panel, got {len(pushed)}"
+    assert all(line.startswith("report_git_branch main --tab=tab-1 --panel=") for line in pushed), pushed
+    assert cached_s < per_prompt_s, "shared cache should be faster than per-prompt probing"
+
+
+def test_branch_change_pushed_once(tmp: str) -> None:
+    repo = _make_repo(tmp)
+    service = GitStateService(min_interval_s=60.0, max_workers=0)
+    for tab, panel in _panels():
+        service.update_panel(tab, panel, repo)
+    assert len(service.poll()) == PANELS
+    assert service.poll() == [], "unchanged state must not be re-sent"
+
+    _git(repo, "checkout", "-q", "-b", "feature/x")
+    # HEAD mtime changes are picked up on the next poll even without a hint.
+    lines = service.poll()
+    assert len(lines) == PANELS, lines
+    assert all(line.startswith("report_git_branch feature/x --tab=") for line in lines), lines
+    assert service.poll() == []
+
+    _git(repo, "checkout", "-q", "--detach")
+    lines = service.poll()
+    assert lines and all(line.startswith("clear_git_branch --tab=") for line in lines), lines
+
+
+def test_dirty_after_interval(tmp: str) -> None:
+    repo = _make_repo(tmp)
+    service = GitStateService(min_interval_s=0.3, max_workers=0)
+    service.update_panel("tab-1", "panel-0", repo)
+    assert service.poll() == ["report_git_branch main --tab=tab-1 --panel=panel-0"]
+
+    # Working-tree edits don't touch HEAD or the index; a hint within the
+    # interval is answered from cache.
+    Path(repo, "sub", "file.txt").write_text("two\n")
+    service.update_panel("tab-1", "panel-0", repo)
+    assert service.poll() == []
+    assert service.git_runs == 1
+
+    time.sleep(0.35)
+    service.update_panel("tab-1", "panel-0", repo)
+    assert service.poll() == ["report_git_branch main --status=dirty --tab=tab-1 --panel=panel-0"]
+
+    # --force (after a `git ...` command) skips the interval.
+    _git(repo, "checkout", "-q", "--", ".")
+    service.update_panel("tab-1", "panel-0", repo, force=True)
+    assert service.poll() == ["report_git_branch main --tab=tab-1 --panel=panel-0"]
+
+    # Leaving the repo clears the entry once.
+    service.update_panel("tab-1", "panel-0", tmp)
+    assert service.poll() == ["clear_git_branch --tab=tab-1 --panel=panel-0"]
+    assert service.poll() == []
+
+
+def test_repo_created_and_removed_in_place(tmp: str) -> None:
+    plain = os.path.join(tmp, "plain")
+    os.makedirs(plain)
+    service = GitStateService(min_interval_s=60.0, max_workers=0)
+    service.update_panel("tab-1", "panel-0", plain)
+    assert service.poll() == []
+
+    # `git init` in the directory the shell is already in.
+    _git(plain, "init", "-q", "-b", "trunk")
+    service.update_panel("tab-1", "panel-0", plain)
+    assert service.poll() == ["report_git_branch trunk --tab=tab-1 --panel=panel-0"]
+
+    shutil.rmtree(os.path.join(plain, ".git"))
+    service.update_panel("tab-1", "panel-0", plain)
+    assert service.poll() == ["clear_git_branch --tab=tab-1 --panel=panel-0"]
+    assert service.poll() == []
+
+
+def test_relay_git_refresh(tmp: str) -> None:
+    repo = _make_repo(tmp)
+    sock_path = os.path.join(tmp, "cmux.sock")
+    server = FakeV1Server(sock_path)
+    relay = subprocess.Popen(
+        [sys.executable, str(RELAY), "--socket", sock_path],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        fifo = _relay_file(sock_path, ".fifo")
+        _wait_for(lambda: os.path.exists(fifo), 5.0, "relay fifo")
+        _write_fifo(fifo, [
+            f'git_refresh "{repo}/sub" --tab=tab-1 --panel=panel-{i}' for i in range(3)
+        ])
+        _wait_for(lambda: len(server.lines) >= 3, 5.0, "git reports")
+        time.sleep(0.2)
+        assert sorted(server.lines) == [
+            f"report_git_branch main --tab=tab-1 --panel=panel-{i}" for i in range(3)
+        ], server.lines
+        assert not any(line.startswith("git_refresh") for line in server.lines), "hints must stay relay-local"
+        stats = _read_stats(sock_path, relay.pid)
+        assert stats["git_hints"] == 3 and stats["git_runs"] == 1, stats
+    finally:
+        relay.send_signal(signal.SIGTERM)
+        try:
+            relay.communicate(timeout=3.0)
+        except subprocess.TimeoutExpired:
+            relay.kill()
+        server.close()
+
+
+def test_relay_resends_after_loss(tmp: str) -> None:
+    repo = _make_repo(tmp)
+    sock_path = os.path.join(tmp, "cmux.sock")
+    relay = subprocess.Popen(
+        [sys.executable, str(RELAY), "--socket", sock_path],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    server = None
+    try:
+        fifo = _relay_file(sock_path, ".fifo")
+        _wait_for(lambda: os.path.exists(fifo), 5.0, "relay fifo")
+        # No app to talk to yet: the reports wait for the connection.
+        _write_fifo(fifo, [f'git_refresh "{repo}" --tab=tab-1 --panel=panel-{i}' for i in range(2)])
+        _wait_for(lambda: _read_stats(sock_path, relay.pid).get("deferred", 0) >= 2, 5.0, "deferred reports")
+
+        server = FakeV1Server(sock_path)
+        want = [f"report_git_branch main --tab=tab-1 --panel=panel-{i}" for i in range(2)]
+        _wait_for(lambda: len(server.lines) >= 2, 5.0, "reports after the app appeared")
+        assert sorted(server.lines) == want, server.lines
+
+        # The app restarts: the same state must reach it again without a new hint.
+        server.lines.clear()
+        server.drop_connections()
+        _wait_for(lambda: len(server.lines) >= 2, 5.0, "reports after reconnecting")
+        time.sleep(0.2)
+        assert sorted(server.lines) == want, server.lines
+        assert _read_stats(sock_path, relay.pid)["git_runs"] == 1, "resending must not re-run git"
+    finally:
+        relay.send_signal(signal.SIGTERM)
+        try:
+            relay.communicate(timeout=3.0)
+        except subprocess.TimeoutExpired:
+            relay.kill()
+        if server is not None:
+            server.close()
+
+
+def main() -> int:
+    if shutil.which("git") is None:
+        print("SKIP: git not available")
+        return 0
+
+    tests = [
+        test_benchmark,
+        test_branch_change_pushed_once,
+        test_dirty_after_interval,
+        test_repo_created_and_removed_in_place,
+        test_relay_git_refresh,
+        test_relay_resends_after_loss,
+    ]
+    failures = 0
+    for test in tests:
+        tmp = tempfile.mkdtemp(prefix="cmux-git-", dir="/tmp")
+        os.environ["TMPDIR"] = tmp
+        try:
+            test(tmp)
+            print(f"PASS  {test.__name__}")
+        except (AssertionError, subprocess.SubprocessError, OSError) as e:
+            failures += 1
+            print(f"FAIL  {test.__name__}: {e}")
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    if failures:
+        print(f"Git state cache test failed ({failures} failures).")
+        return 1
+    print("Git state cache test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
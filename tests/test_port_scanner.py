@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Tests + benchmark for tests/cmux_port_scanner.py.
+
+Covers:
+- /proc/net/tcp parsing and tty_nr decoding
+- the incremental /proc backend on a synthetic /proc with thousands of
+  processes: rescans with nothing new walk no fd tables, a new server costs
+  one walk, a server on an old process is still found
+- a real listener on a real pty (Linux only)
+- PortReporter sending report_ports/clear_ports only when a panel changes
+
+Does not need a running cmux instance.
+
+Usage:
+    python3 tests/test_port_scanner.py
+"""
+
+from __future__ import annotations
+
+import os
+import pty
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cmux_port_scanner import (  # noqa: E402
+    PortBackend,
+    PortReporter,
+    ProcPortBackend,
+    parse_proc_net_tcp,
+    tty_name_from_nr,
+)
+
+PROCS = 5000
+TTYS = 50
+PROCS_PER_TTY = 4
+RESCANS = 20
+
+_TCP_HEADER = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+
+
+def _pts_nr(n: int) -> int:
+    return (136 << 8) | n
+
+
+class FakeProc:
+    """A synthetic /proc tree: stat, fd/ symlinks, net/tcp."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.listening: dict[int, int] = {}  # inode -> port
+        os.makedirs(os.path.join(root, "net"))
+        self._write_tcp()
+
+    def add_proc(self, pid: int, tty_nr: int = 0, inodes: tuple[int, ...] = ()) -> None:
+        base = os.path.join(self.root, str(pid))
+        os.makedirs(os.path.join(base, "fd"))
+        fields = ["S", "1", str(pid), str(pid), str(tty_nr)] + ["0"] * 14 + [str(1000 + pid)] + ["0"] * 10
+        with open(os.path.join(base, "stat"), "w") as f:
+            f.write(f"{pid} (my (odd) proc) " + " ".join(fields) + "\n")
+        os.symlink("/dev/null", os.path.join(base, "fd", "0"))
+        for fd, inode in enumerate(inodes, start=3):
+            os.symlink(f"socket:[{inode}]", os.path.join(base, "fd", str(fd)))
+
+    def add_socket(self, pid: int, inode: int) -> None:
+        fd_dir = os.path.join(self.root, str(pid), "fd")
+        os.symlink(f"socket:[{inode}]", os.path.join(fd_dir, str(len(os.listdir(fd_dir)) + 3)))
+
+    def listen(self, inode: int, port: int) -> None:
+        self.listening[inode] = port
+        self._write_tcp()
+
+    def _write_tcp(self) -> None:
+        rows = [_TCP_HEADER]
+        for i, (inode, port) in enumerate(sorted(self.listening.items())):
+            rows.append(
+                f"   {i}: 0100007F:{port:04X} 00000000:0000 0A 00000000:00000000 00:00000000 00000000"
+                f"   501        0 {inode} 1 0000000000000000 100 0 0 10 0\n"
+            )
+        # An established (non-listening) socket must be ignored.
+        rows.append(
+            f"   {len(rows)}: 0100007F:1F90 0100007F:D431 01 00000000:00000000 00:00000000 00000000"
+            "   501        0 999999 1 0000000000000000 20 4 30 10 -1\n"
+        )
+        with open(os.path.join(self.root, "net", "tcp"), "w") as f:
+            f.write("".join(rows))
+
+
+def test_parsing(_tmp: str) -> None:
+    text = _TCP_HEADER + (
+        "   0: 00000000:1F90 00000000:0000 0A 00000000:00000000 00:00000000 00000000   501 0 4242 1 0 100 0 0 10 0\n"
+        "   1: 0100007F:1F91 0100007F:D431 01 00000000:00000000 00:00000000 00000000   501 0 4243 1 0 20 4 30 10 -1\n"
+    )
+    assert parse_proc_net_tcp(text) == {4242: 8080}
+    assert tty_name_from_nr(0) == ""
+    assert tty_name_from_nr(_pts_nr(3)) == "3"
+    assert tty_name_from_nr((137 << 8) | 1) == "257"
+    assert tty_name_from_nr((4 << 8) | 1) == "tty1"
+
+
+def test_incremental_benchmark(tmp: str) -> None:
+    proc = FakeProc(os.path.join(tmp, "proc"))
+    inode = 10_000
+    expected: dict[str, list[int]] = {}
+    pid = 100
+    # Background noise: thousands of daemons without a TTY, some listening.
+    for _ in range(PROCS - TTYS * PROCS_PER_TTY):
+        pid += 1
+        inodes = ()
+        if pid % 50 == 0:
+            inode += 1
+            proc.listening[inode] = 20_000 + pid % 10_000
+            inodes = (inode,)
+        proc.add_proc(pid, 0, inodes)
+    # Shells and servers on watched TTYs.
+    for t in range(TTYS):
+        for j in range(PROCS_PER_TTY):
+            pid += 1
+            inodes = ()
+            if j == PROCS_PER_TTY - 1:
+                inode += 1
+                port = 3000 + t
+                proc.listening[inode] = port
+                inodes = (inode,)
+                expected[str(t)] = [port]
+            proc.add_proc(pid, _pts_nr(t), inodes)
+    proc._write_tcp()
+
+    backend = ProcPortBackend(proc.root)
+    watched = {str(t) for t in range(TTYS)}
+
+    start = time.perf_counter()
+    first = backend.scan(watched)
+    first_s = time.perf_counter() - start
+    assert first == expected, f"first scan mismatch: {first}"
+    first_walks = backend.fd_walks
+
+    start = time.perf_counter()
+    for _ in range(RESCANS):
+        assert backend.scan(watched) == expected
+    rescan_s = (time.perf_counter() - start) / RESCANS
+    assert backend.fd_walks == first_walks, f"idle rescans walked {backend.fd_walks - first_walks} fd tables"
+
+    print(
+        f"  {PROCS} procs / {TTYS} ttys: first scan {first_s * 1000:.1f} ms "
+        f"({first_walks} fd walks, {backend.stat_reads} stat reads); "
+        f"rescan {rescan_s * 1000:.2f} ms avg"
+    )
+    assert rescan_s < first_s, "incremental rescans should beat the first full scan"
+
+    # A new server on tty 7: one new process, one fd walk.
+    pid += 1
+    inode += 1
+    proc.add_proc(pid, _pts_nr(7), (inode,))
+    proc.listen(inode, 9999)
+    walks = backend.fd_walks
+    assert backend.scan(watched)["7"] == [3007, 9999]
+    assert backend.fd_walks == walks + 1, f"new server cost {backend.fd_walks - walks} walks"
+
+    # An old shell process on tty 9 starts listening: found by a targeted walk.
+    old_pid = 100 + (PROCS - TTYS * PROCS_PER_TTY) + 9 * PROCS_PER_TTY + 1
+    inode += 1
+    proc.add_socket(old_pid, inode)
+    proc.listen(inode, 7777)
+    assert backend.scan(watched)["9"] == [3009, 7777]
+
+    # Server exits: its port disappears without any walk.
+    shutil.rmtree(os.path.join(proc.root, str(pid)))
+    del proc.listening[inode - 1]
+    proc._write_tcp()
+    walks = backend.fd_walks
+    assert backend.scan(watched)["7"] == [3007]
+    assert backend.fd_walks == walks
+
+
+def test_real_pty_listener(_tmp: str) -> None:
+    if not os.path.exists("/proc/net/tcp"):
+        print("  SKIP: no /proc/net/tcp")
+        return
+    child, fd = pty.fork()
+    if child == 0:
+        import socket
+
+        s = socket.socket()
+        s.bind(("127.0.0.1", 0))
+        s.listen(1)
+        os.write(1, f"{os.ttyname(0)} {s.getsockname()[1]}\n".encode())
+        time.sleep(30)
+        os._exit(0)
+    try:
+        buf = b""
+        deadline = time.time() + 5.0
+        while b"\n" not in buf and time.time() < deadline:
+            buf += os.read(fd, 1024)
+        tty_path, port = buf.decode().split()
+        tty = tty_path.rsplit("/", 1)[-1]
+        ports = ProcPortBackend().scan({tty})
+        assert ports == {tty: [int(port)]}, f"expected {tty}: {port}, got {ports}"
+    finally:
+        os.kill(child, 9)
+        os.waitpid(child, 0)
+        os.close(fd)
+
+
+class _StubBackend(PortBackend):
+    def __init__(self):
+        self.ports: dict[str, list[int]] = {}
+
+    def scan(self, ttys=None):
+        return {t: p for t, p in self.ports.items() if ttys is None or t in ttys}
+
+
+class _RecordingClient:
+    def __init__(self):
+        self.calls: list[tuple] = []
+
+    def report_ports(self, *ports, tab=None, panel=None):
+        self.calls.append(("report", ports, tab, panel))
+
+    def clear_ports(self, tab=None, panel=None):
+        self.calls.append(("clear", tab, panel))
+
+
+def test_reporter_sends_changes_only(_tmp: str) -> None:
+    backend = _StubBackend()
+    client = _RecordingClient()
+    reporter = PortReporter(client, backend)
+    reporter.watch("ttys001", "ws-1", "panel-1")
+    reporter.watch("ttys002", "ws-1", "panel-2")
+
+    backend.ports = {"ttys001": [3000]}
+    reporter.scan_and_report()
+    assert sorted(client.calls) == [("clear", "ws-1", "panel-2"), ("report", (3000,), "ws-1", "panel-1")], client.calls
+
+    client.calls.clear()
+    reporter.scan_and_report()
+    assert client.calls == [], "unchanged ports must not be re-reported"
+
+    backend.ports = {"ttys001": [3000, 5173], "ttys002": [8000]}
+    reporter.scan_and_report()
+    assert sorted(client.calls) == [
+        ("report", (3000, 5173), "ws-1", "panel-1"),
+        ("report", (8000,), "ws-1", "panel-2"),
+    ], client.calls
+
+    client.calls.clear()
+    backend.ports = {"ttys002": [8000]}
+    reporter.scan_and_report()
+    assert client.calls == [("clear", "ws-1", "panel-1")], client.calls
+
+
+def main() -> int:
+    tests = [test_parsing, test_incremental_benchmark, test_real_pty_listener, test_reporter_sends_changes_only]
+    failures = 0
+    for test in tests:
+        tmp = tempfile.mkdtemp(prefix="cmux-ports-")
+        try:
+            test(tmp)
+            print(f"PASS  {test.__name__}")
+        except (AssertionError, OSError, ValueError) as e:
+            failures += 1
+            print(f"FAIL  {test.__name__}: {e}")
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    if failures:
+        print(f"Port scanner test failed ({failures} failures).")
+        return 1
+    print("Port scanner test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Tests for the shell-integration relay (Resources/shell-integration/cmux-shell-relay.py).
+
+Covers:
+- per-panel coalescing of report_pwd / ports_kick / report_git_branch bursts
+- dedupe of unchanged state across coalescing windows
+- dropping anything that is not a per-panel report instead of forwarding it
+- refusing a relay directory or pid file it does not own, and replacing a
+  FIFO left behind by a relay that died
+- a single persistent upstream connection for many shells
+- the bash integration starting the relay once and writing through its FIFO
+- exiting and removing the FIFO when cmux refuses the relay's connection
+
+Runs against a local stand-in v1 socket server, so it does not need a running
+cmux instance.
+
+Usage:
+    python3 tests/test_shell_relay.py
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+INTEGRATION_DIR = ROOT / "Resources" / "shell-integration"
+RELAY = INTEGRATION_DIR / "cmux-shell-relay.py"
+
+
+class FakeV1Server:
+    def __init__(self, path: str, deny: bool = False):
+        self.lines: list[str] = []
+        self.connections = 0
+        self._conns: list[socket.socket] = []
+        # Answer like cmux does for a non-descendant client in cmuxOnly mode.
+        self.deny = deny
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(path)
+        self._server.listen(16)
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self) -> None:
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            self._conns.append(conn)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: socket.socket) -> None:
+        pending = b""
+        with conn:
+            if self.deny:
+                conn.sendall("ERROR: Access denied — only processes started inside cmux can connect\n".encode("utf-8"))
+                return
+            while True:
+                try:
+                    chunk = conn.recv(65536)
+                except OSError:
+                    return
+                if not chunk:
+                    return
+                pending += chunk
+                *complete, pending = pending.split(b"\n")
+                for raw in complete:
+                    self.lines.append(raw.decode("utf-8"))
+                try:
+                    conn.sendall(b"OK\n" * len(complete))
+                except OSError:
+                    return
+
+    def drop_connections(self) -> None:
+        """Hang up on every client, like an app restart."""
+        for conn in self._conns:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._conns.clear()
+
+    def close(self) -> None:
+        self._server.close()
+
+
+def _wait_for(predicate, timeout: float, label: str):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        value = predicate()
+        if value:
+            return value
+        time.sleep(0.02)
+    raise AssertionError(f"Timed out waiting for {label}")
+
+
+def _relay_file(sock_path: str, suffix: str) -> str:
+    # main() points TMPDIR at each test's own directory.
+    name = sock_path.replace("/", "_") + suffix
+    return os.path.join(os.environ["TMPDIR"], f"cmux-relay-{os.getuid()}", name)
+
+
+def _write_fifo(fifo: str, lines: list[str]) -> None:
+    # One open per "shell prompt", like the integrations do.
+    for line in lines:
+        fd = os.open(fifo, os.O_WRONLY | os.O_NONBLOCK)
+        try:
+            os.write(fd, (line + "\n").encode("utf-8"))
+        finally:
+            os.close(fd)
+
+
+def _read_stats(sock_path: str, pid: int) -> dict:
+    stats_path = _relay_file(sock_path, ".stats")
+    try:
+        os.unlink(stats_path)
+    except FileNotFoundError:
+        pass
+    os.kill(pid, signal.SIGUSR1)
+    _wait_for(lambda: os.path.exists(stats_path), 2.0, "relay stats")
+    with open(stats_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_coalesces_and_dedupes(tmp: str) -> None:
+    sock_path = os.path.join(tmp, "cmux.sock")
+    server = FakeV1Server(sock_path)
+    relay = subprocess.Popen(
+        [sys.executable, str(RELAY), "--socket", sock_path, "--coalesce-ms", "200"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    fifo = _relay_file(sock_path, ".fifo")
+    try:
+        _wait_for(lambda: os.path.exists(fifo), 5.0, "relay fifo")
+
+        panels = [f"panel-{i}" for i in range(10)]
+        burst: list[str] = []
+        for _ in range(5):
+            for panel in panels:
+                burst.append(f'report_pwd "/tmp/a b" --tab=tab-1 --panel={panel}')
+                burst.append(f"ports_kick --tab=tab-1 --panel={panel}")
+        for panel in panels:
+            burst.append(f"report_git_branch main --tab=tab-1 --panel={panel}")
+            burst.append(f"report_git_branch main --status=dirty --tab=tab-1 --panel={panel}")
+        burst.append("log -- hello")
+        burst.append('send_text "rm -rf ~\\n" --tab=tab-1 --panel=panel-0')
+        burst.append('report_pwd "/tmp/no-panel" --tab=tab-1')
+        _write_fifo(fifo, burst)
+
+        _wait_for(lambda: len(server.lines) >= 30, 3.0, "forwarded burst")
+        time.sleep(0.3)
+        pwd_lines = [line for line in server.lines if line.startswith("report_pwd")]
+        kick_lines = [line for line in server.lines if line.startswith("ports_kick")]
+        git_lines = [line for line in server.lines if line.startswith("report_git_branch")]
+        assert len(pwd_lines) == 10, f"expected 1 report_pwd per panel, got {len(pwd_lines)}"
+        assert len(kick_lines) == 10, f"expected 1 ports_kick per panel, got {len(kick_lines)}"
+        assert len(git_lines) == 10, f"expected 1 git report per panel, got {len(git_lines)}"
+        assert all("--status=dirty" in line for line in git_lines), "newest git state must win"
+        forwarded = {line.split(" ", 1)[0] for line in server.lines}
+        assert forwarded == {"report_pwd", "ports_kick", "report_git_branch"}, f"only reports go upstream: {forwarded}"
+        assert not any("no-panel" in line for line in server.lines), "reports without a panel are not forwarded"
+
+        # Same state again in a later window: deduped. A kick is a trigger and
+        # always goes through.
+        before = len(server.lines)
+        _write_fifo(fifo, [
+            'report_pwd "/tmp/a b" --tab=tab-1 --panel=panel-0',
+            "ports_kick --tab=tab-1 --panel=panel-0",
+        ])
+        _wait_for(lambda: len(server.lines) > before, 3.0, "second window")
+        time.sleep(0.3)
+        assert server.lines[before:] == ["ports_kick --tab=tab-1 --panel=panel-0"], server.lines[before:]
+        assert server.connections == 1, f"expected 1 upstream connection, got {server.connections}"
+
+        stats = _read_stats(sock_path, relay.pid)
+        assert stats["received"] == len(burst) + 2, stats
+        assert stats["deduped"] == 1, stats
+        assert stats["rejected"] == 3, stats
+        assert stats["upstream_connects"] == 1, stats
+        print(f"  relay stats: {stats}")
+    finally:
+        relay.terminate()
+        try:
+            _, err = relay.communicate(timeout=3.0)
+        except subprocess.TimeoutExpired:
+            relay.kill()
+            err = b""
+        server.close()
+    assert relay.returncode == 0, f"relay exited {relay.returncode}: {err.decode()[-500:]}"
+    assert not os.path.exists(fifo), "relay must remove its FIFO on exit"
+
+
+def test_single_instance(tmp: str) -> None:
+    sock_path = os.path.join(tmp, "single.sock")
+    server = FakeV1Server(sock_path)
+    first = subprocess.Popen([sys.executable, str(RELAY), "--socket", sock_path])
+    try:
+        _wait_for(lambda: os.path.exists(_relay_file(sock_path, ".fifo")), 5.0, "relay fifo")
+        second = subprocess.run(
+            [sys.executable, str(RELAY), "--socket", sock_path],
+            timeout=5.0,
+        )
+        assert second.returncode == 0
+        assert first.poll() is None, "first relay must keep running"
+    finally:
+        first.terminate()
+        first.wait(timeout=3.0)
+        server.close()
+
+
+def test_exits_when_denied(tmp: str) -> None:
+    sock_path = os.path.join(tmp, "denied.sock")
+    server = FakeV1Server(sock_path, deny=True)
+    relay = subprocess.Popen(
+        [sys.executable, str(RELAY), "--socket", sock_path],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    fifo = _relay_file(sock_path, ".fifo")
+    try:
+        # Shells must not keep writing into a relay that cannot deliver:
+        # the FIFO goes away so they use their direct socket path again.
+        _, err = relay.communicate(timeout=5.0)
+        assert relay.returncode == 0, f"relay exited {relay.returncode}: {err.decode()[-500:]}"
+        assert not os.path.exists(fifo), "relay must remove its FIFO when refused"
+        with open(_relay_file(sock_path, ".stats"), encoding="utf-8") as f:
+            stats = json.load(f)
+        assert stats["denied"] == 1 and stats["forwarded"] == 0, stats
+        assert server.connections == 1, f"relay must not keep retrying, got {server.connections} connections"
+    finally:
+        if relay.poll() is None:
+            relay.kill()
+        server.close()
+
+
+def test_bash_integration_uses_relay(tmp: str) -> None:
+    if shutil.which("bash") is None:
+        print("  SKIP: bash not available")
+        return
+    sock_path = os.path.join(tmp, "bash.sock")
+    server = FakeV1Server(sock_path)
+    env = dict(os.environ)
+    env.update({
+        "CMUX_SOCKET_PATH": sock_path,
+        "CMUX_TAB_ID": "tab-1",
+        "CMUX_PANEL_ID": "panel-1",
+        "CMUX_SHELL_RELAY": "1",
+        "CMUX_SHELL_INTEGRATION_DIR": str(INTEGRATION_DIR),
+        "CMUX_SHELL_RELAY_PYTHON": sys.executable,
+        # Hide ncat/socat/nc so only the relay can deliver.
+        "PATH": "/nonexistent",
+    })
+    integration = INTEGRATION_DIR / "cmux-bash-integration.bash"
+    bash = shutil.which("bash")
+    pid_path = _relay_file(sock_path, ".pid")
+    fifo = _relay_file(sock_path, ".fifo")
+    # A FIFO left behind by a relay that was killed: shells must start a new
+    # relay instead of taking it as a sign one is running.
+    os.mkdir(os.path.dirname(fifo), 0o700)
+    os.mkfifo(fifo, 0o600)
+    try:
+        # cmux only accepts its own descendants: the relay must stay the
+        # launching shell's child rather than being reparented away.
+        script = f'source "{integration}"; _cmux_relay_start_once; read -r _'
+        shell = subprocess.Popen([bash, "--norc", "--noprofile", "-c", script], env=env, stdin=subprocess.PIPE)
+        try:
+            _wait_for(lambda: os.path.exists(pid_path) and os.path.getsize(pid_path), 5.0, "relay pid from bash")
+            with open(pid_path, encoding="utf-8") as f:
+                relay_pid = f.read().strip()
+            ppid = subprocess.run(["ps", "-o", "ppid=", "-p", relay_pid], capture_output=True, text=True).stdout.strip()
+            assert ppid == str(shell.pid), f"relay parent is {ppid}, not the launching shell {shell.pid}"
+        finally:
+            shell.communicate(b"\n", timeout=5.0)
+        assert os.path.exists(fifo), "the relay recreates its FIFO"
+
+        # Several independent "shells" in the same session share the relay.
+        for i in range(3):
+            script = (
+                f'source "{integration}"; _cmux_relay_start_once; '
+                f'_cmux_send "report_pwd \\"/tmp/dir{i}\\" --tab=tab-1 --panel=panel-{i}"'
+            )
+            subprocess.run([bash, "--norc", "--noprofile", "-c", script], env=env, check=True, timeout=5.0)
+
+        # 300 characters but 600 bytes: past PIPE_BUF, so not written to the FIFO.
+        script = f'source "{integration}"; _cmux_relay_start_once; _cmux_relay_write "report_pwd {"é" * 300}"'
+        long_write = subprocess.run([bash, "--norc", "--noprofile", "-c", script],
+                                    env=dict(env, LC_ALL="C.UTF-8"), timeout=5.0)
+        assert long_write.returncode != 0, "lines over PIPE_BUF bytes must not go through the FIFO"
+
+        _wait_for(lambda: len(server.lines) >= 3, 3.0, "lines via relay")
+        assert sorted(server.lines) == [
+            f'report_pwd "/tmp/dir{i}" --tab=tab-1 --panel=panel-{i}' for i in range(3)
+        ], server.lines
+        assert server.connections == 1, f"expected 1 upstream connection, got {server.connections}"
+    finally:
+        try:
+            with open(pid_path, encoding="utf-8") as f:
+                os.kill(int(f.read().strip()), signal.SIGTERM)
+            _wait_for(lambda: not os.path.exists(pid_path), 3.0, "relay shutdown")
+        except (OSError, ValueError):
+            pass
+        server.close()
+
+
+def test_refuses_untrusted_paths(tmp: str) -> None:
+    sock_path = os.path.join(tmp, "trust.sock")
+    relay_dir = os.path.dirname(_relay_file(sock_path, ".fifo"))
+
+    def run_relay() -> subprocess.CompletedProcess:
+        return subprocess.run([sys.executable, str(RELAY), "--socket", sock_path],
+                              capture_output=True, text=True, timeout=5.0)
+
+    # Someone else could have made the directory first in a shared /tmp.
+    os.mkdir(relay_dir, 0o700)
+    os.chmod(relay_dir, 0o777)
+    refused = run_relay()
+    assert refused.returncode == 1 and "no group/other access" in refused.stderr, refused
+    assert os.listdir(relay_dir) == [], "nothing may be created in a directory others can write to"
+    os.rmdir(relay_dir)
+
+    # A symlinked directory is not ours either.
+    elsewhere = os.path.join(tmp, "elsewhere")
+    os.mkdir(elsewhere, 0o700)
+    os.symlink(elsewhere, relay_dir)
+    assert run_relay().returncode == 1
+    os.unlink(relay_dir)
+
+    # The pid file is opened with O_NOFOLLOW: a planted symlink is not truncated.
+    os.mkdir(relay_dir, 0o700)
+    victim = os.path.join(tmp, "victim")
+    Path(victim).write_text("keep me\n", encoding="utf-8")
+    os.symlink(victim, _relay_file(sock_path, ".pid"))
+    assert run_relay().returncode == 1
+    assert Path(victim).read_text(encoding="utf-8") == "keep me\n", "pid symlink target was written"
+    assert not os.path.exists(_relay_file(sock_path, ".fifo"))
+
+
+def test_replaces_stale_fifo(tmp: str) -> None:
+    sock_path = os.path.join(tmp, "stale.sock")
+    server = FakeV1Server(sock_path)
+    fifo = _relay_file(sock_path, ".fifo")
+    os.mkdir(os.path.dirname(fifo), 0o700)
+    os.mkfifo(fifo)
+    os.chmod(fifo, 0o666)
+    relay = subprocess.Popen([sys.executable, str(RELAY), "--socket", sock_path],
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        # The relay's own FIFO is 0600; the stale one was left 0666.
+        _wait_for(lambda: _fifo_mode(fifo) == 0o600, 5.0, "fresh relay fifo")
+        _write_fifo(fifo, ["report_tty /dev/ttys001 --tab=tab-1 --panel=panel-1"])
+        _wait_for(lambda: server.lines, 3.0, "report through the new FIFO")
+    finally:
+        relay.terminate()
+        relay.wait(timeout=3.0)
+        server.close()
+
+
+def _fifo_mode(fifo: str) -> int:
+    try:
+        return os.stat(fifo).st_mode & 0o777
+    except FileNotFoundError:
+        return 0
+
+
+def test_keeps_reports_during_backoff(tmp: str) -> None:
+    sock_path = os.path.join(tmp, "late.sock")
+    relay = subprocess.Popen([sys.executable, str(RELAY), "--socket", sock_path],
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    server = None
+    try:
+        fifo = _relay_file(sock_path, ".fifo")
+        _wait_for(lambda: os.path.exists(fifo), 5.0, "relay fifo")
+        # cmux isn't listening yet: the relay backs off but keeps the reports.
+        _write_fifo(fifo, ['report_pwd "/tmp/one" --tab=tab-1 --panel=panel-1'])
+        _wait_for(lambda: _read_stats(sock_path, relay.pid)["upstream_errors"] >= 1, 3.0, "failed connect")
+        _write_fifo(fifo, [
+            'report_pwd "/tmp/two" --tab=tab-1 --panel=panel-1',
+            "report_tty /dev/ttys002 --tab=tab-1 --panel=panel-2",
+        ])
+        server = FakeV1Server(sock_path)
+        _wait_for(lambda: len(server.lines) >= 2, 5.0, "reports after cmux appeared")
+        time.sleep(0.2)
+        assert server.lines == [
+            'report_pwd "/tmp/two" --tab=tab-1 --panel=panel-1',
+            "report_tty /dev/ttys002 --tab=tab-1 --panel=panel-2",
+        ], server.lines
+        assert _read_stats(sock_path, relay.pid)["forwarded"] == 2
+    finally:
+        relay.terminate()
+        relay.wait(timeout=3.0)
+        if server is not None:
+            server.close()
+
+
+def main() -> int:
+    if not RELAY.exists():
+        print(f"SKIP: missing relay at {RELAY}")
+        return 0
+
+    tests = [
+        test_coalesces_and_dedupes,
+        test_single_instance,
+        test_exits_when_denied,
+        test_bash_integration_uses_relay,
+        test_refuses_untrusted_paths,
+        test_replaces_stale_fifo,
+        test_keeps_reports_during_backoff,
+    ]
+    failures = 0
+    for test in tests:
+        tmp = tempfile.mkdtemp(prefix="cmux-relay-", dir="/tmp")
+        os.environ["TMPDIR"] = tmp
+        try:
+            test(tmp)
+            print(f"PASS  {test.__name__}")
+        except (AssertionError, subprocess.SubprocessError, OSError) as e:
+            failures += 1
+            print(f"FAIL  {test.__name__}: {e}")
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    if failures:
+        print(f"Shell relay test failed ({failures} failures).")
+        return 1
+    print("Shell relay test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Tests for CmuxLogHandler (tests/cmux_logging.py).
+
+Runs against a local stand-in socket server that speaks just enough of the v1
+protocol (`log ...` -> `OK`), so it does not need a running cmux instance.
+
+Usage:
+    python3 tests/test_sidebar_log_handler.py
+"""
+
+import logging
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from typing import List
+
+# Add the directory containing cmux.py to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cmux_logging import CmuxLogHandler, _format_log_command  # noqa: E402
+
+
+class FakeLogServer:
+    """Accepts v1 connections and answers every line with OK."""
+
+    def __init__(self, path: str, delay_s: float = 0.0):
+        self.path = path
+        self.delay_s = delay_s
+        self.lines: List[str] = []
+        self.connections = 0
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(path)
+        self._server.listen(8)
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._thread.start()
+
+    def _accept_loop(self) -> None:
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: socket.socket) -> None:
+        pending = b""
+        with conn:
+            while True:
+                try:
+                    chunk = conn.recv(65536)
+                except OSError:
+                    return
+                if not chunk:
+                    return
+                pending += chunk
+                *complete, pending = pending.split(b"\n")
+                if self.delay_s:
+                    time.sleep(self.delay_s)
+                for raw in complete:
+                    self.lines.append(raw.decode("utf-8"))
+                if complete:
+                    conn.sendall(b"OK\n" * len(complete))
+
+    def close(self) -> None:
+        self._server.close()
+
+
+def _make_logger(name: str, handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.handlers = [handler]
+    return logger
+
+
+def test_batches_over_one_connection(sock_path: str) -> None:
+    server = FakeLogServer(sock_path)
+    handler = CmuxLogHandler(socket_path=sock_path, tab="tab-1", max_records_per_second=0)
+    logger = _make_logger("cmux.test.batch", handler)
+    try:
+        for i in range(200):
+            logger.info("record %d", i)
+        assert handler.flush(timeout=5.0), "handler did not drain"
+        assert len(server.lines) == 200, f"expected 200 lines, got {len(server.lines)}"
+        assert server.connections == 1, f"expected 1 connection, got {server.connections}"
+        assert handler.batches < 200, f"records were not batched ({handler.batches} batches)"
+        assert server.lines[0] == 'log --level=info --source="cmux.test.batch" --tab=tab-1 -- "record 0"', server.lines[0]
+        assert server.lines[-1].endswith('-- "record 199"'), server.lines[-1]
+    finally:
+        handler.close()
+        server.close()
+
+
+def test_level_mapping(sock_path: str) -> None:
+    server = FakeLogServer(sock_path)
+    handler = CmuxLogHandler(socket_path=sock_path, source="agent", max_records_per_second=0)
+    logger = _make_logger("cmux.test.levels", handler)
+    try:
+        logger.debug("d")
+        logger.info("i")
+        logger.warning("w")
+        logger.error("e")
+        logger.critical("c")
+        logger.info("ok", extra={"cmux_level": "success"})
+        assert handler.flush(timeout=5.0), "handler did not drain"
+        levels = [line.split()[1] for line in server.lines]
+        expected = ["--level=info", "--level=info", "--level=warning", "--level=error", "--level=error", "--level=success"]
+        assert levels == expected, f"unexpected levels: {levels}"
+        assert all('--source="agent"' in line for line in server.lines), server.lines
+    finally:
+        handler.close()
+        server.close()
+
+
+def test_emit_never_blocks_and_drops_oldest(sock_path: str) -> None:
+    # Slow server + tiny buffer: emit() must stay cheap and drop the oldest records.
+    server = FakeLogServer(sock_path, delay_s=0.2)
+    handler = CmuxLogHandler(socket_path=sock_path, capacity=10, batch_size=5, max_records_per_second=0)
+    logger = _make_logger("cmux.test.overload", handler)
+    try:
+        start = time.perf_counter()
+        for i in range(1000):
+            logger.info("burst %d", i)
+        elapsed = time.perf_counter() - start
+        assert elapsed < 0.5, f"emit() blocked: 1000 records took {elapsed:.3f}s"
+        assert handler.dropped > 0, "expected records to be dropped on overload"
+        assert handler.flush(timeout=10.0), "handler did not drain"
+        assert server.lines[-1].endswith('-- "burst 999"'), "newest record must survive overload"
+        assert len(server.lines) + handler.dropped == 1000, (len(server.lines), handler.dropped)
+    finally:
+        handler.close()
+        server.close()
+
+
+def test_rate_limit(sock_path: str) -> None:
+    server = FakeLogServer(sock_path)
+    handler = CmuxLogHandler(socket_path=sock_path, batch_size=10, max_records_per_second=100)
+    logger = _make_logger("cmux.test.rate", handler)
+    try:
+        start = time.monotonic()
+        for i in range(60):
+            logger.info("rate %d", i)
+        assert handler.flush(timeout=5.0), "handler did not drain"
+        elapsed = time.monotonic() - start
+        # First 10 records ride the initial burst; the remaining 50 need ~0.5s.
+        assert elapsed >= 0.35, f"rate limit not applied ({elapsed:.3f}s for 60 records)"
+        assert len(server.lines) == 60
+    finally:
+        handler.close()
+        server.close()
+
+
+def test_unreachable_socket_keeps_records(sock_path: str) -> None:
+    handler = CmuxLogHandler(socket_path=sock_path, capacity=3, max_records_per_second=0)
+    logger = _make_logger("cmux.test.unreachable", handler)
+    server = None
+    try:
+        start = time.perf_counter()
+        for i in range(5):
+            logger.info("nobody home %d", i)
+        assert not handler.flush(timeout=1.0), "records should stay queued while the socket is missing"
+        assert time.perf_counter() - start < 1.5
+        assert handler.failed == 0 and handler.dropped == 2, (handler.failed, handler.dropped)
+
+        server = FakeLogServer(sock_path)
+        time.sleep(1.0)  # reconnect backoff
+        assert handler.flush(timeout=5.0), "queued records should ship once the app is back"
+        assert [line.rsplit(" ", 1)[1] for line in server.lines] == ['2"', '3"', '4"'], server.lines
+    finally:
+        handler.close()
+        if server is not None:
+            server.close()
+
+
+def test_requeue_drops_oldest_when_full(sock_path: str) -> None:
+    # A long flush interval keeps the sender asleep; records are queued by hand
+    # so nothing wakes it.
+    handler = CmuxLogHandler(socket_path=sock_path, capacity=3, flush_interval=60.0, max_records_per_second=0)
+    try:
+        batch = [(f"old {i}", "info", None) for i in range(2)]
+        requeue = threading.Thread(target=handler._requeue, args=(batch,))
+        with handler.lock:
+            requeue.start()
+            time.sleep(0.1)
+            assert requeue.is_alive(), "_requeue should wait for the handler lock"
+            for i in range(3):
+                handler._queue.append((f"new {i}", "info", None))
+        requeue.join(timeout=2.0)
+        assert [message for message, _, _ in handler._queue] == ["new 0", "new 1", "new 2"], list(handler._queue)
+        assert handler.dropped == 2, handler.dropped
+    finally:
+        handler.close()
+
+
+def test_format_flattens_multiline_messages() -> None:
+    cmd = _format_log_command('Traceback:\n  line "1"\n--force', "error", None, None)
+    assert "\n" not in cmd, cmd
+    assert cmd == 'log --level=error -- "Traceback:   line \\"1\\" --force"', cmd
+
+
+def main() -> int:
+    tests = [
+        test_batches_over_one_connection,
+        test_level_mapping,
+        test_emit_never_blocks_and_drops_oldest,
+        test_rate_limit,
+        test_unreachable_socket_keeps_records,
+        test_requeue_drops_oldest_when_full,
+    ]
+    failures = 0
+    with tempfile.TemporaryDirectory(prefix="cmux-log-") as tmp:
+        for i, test in enumerate(tests):
+            sock_path = os.path.join(tmp, f"s{i}.sock")
+            try:
+                test(sock_path)
+                print(f"PASS  {test.__name__}")
+            except AssertionError as e:
+                failures += 1
+                print(f"FAIL  {test.__name__}: {e}")
+    try:
+        test_format_flattens_multiline_messages()
+        print("PASS  test_format_flattens_multiline_messages")
+    except AssertionError as e:
+        failures += 1
+        print(f"FAIL  test_format_flattens_multiline_messages: {e}")
+
+    if failures:
+        print(f"Sidebar log handler test failed ({failures} failures).")
+        return 1
+    print("Sidebar log handler test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -4,20 +4,14 @@ Verify update UI timing constants so update indicators are visible long enough.
 """
 
 from pathlib import Path
-import re
 import sys
 
 
 ROOT = Path(__file__).resolve().parents[1]
 TIMING_FILE = ROOT / "Sources" / "Update" / "UpdateTiming.swift"
+sys.path.insert(0, str(ROOT / "scripts"))
 
-
-def read_constants(text: str) -> dict[str, float]:
-    constants = {}
-    pattern = re.compile(r"static let (\w+): TimeInterval = ([0-9.]+)")
-    for match in pattern.finditer(text):
-        constants[match.group(1)] = float(match.group(2))
-    return constants
+from cmux_swift_scan import SwiftScanner  # noqa: E402
 
 
 def main() -> int:
@@ -25,7 +19,7 @@ def main() -> int:
         print(f"Missing {TIMING_FILE}")
         return 1
 
-    constants = read_constants(TIMING_FILE.read_text())
+    constants = SwiftScanner(str(ROOT)).file(str(TIMING_FILE.relative_to(ROOT))).constants()
     required = {
         "minimumCheckDisplayDuration": 2.0,
         "noUpdateDisplayDuration": 5.0,
@@ -195,21 +195,17 @@ class cmux:
 
         raise cmuxError("Timed out waiting for response")
 
-    def _call(self, method: str, params: Optional[Dict[str, Any]] = None, timeout_s: float = 20.0) -> Any:
-        if self._socket is None:
-            raise cmuxError("Not connected")
-
+    def _encode_request(self, method: str, params: Optional[Dict[str, Any]]) -> Tuple[int, str]:
         req_id = self._next_id
         self._next_id += 1
-
         payload = {
             "id": req_id,
             "method": method,
             "params": params or {},
         }
-        line = json.dumps(payload, separators=(",", ":")) + "\n"
-        self._socket.sendall(line.encode("utf-8"))
+        return req_id, json.dumps(payload, separators=(",", ":")) + "\n"
 
+    def _recv_response(self, req_id: int, timeout_s: float) -> Dict[str, Any]:
         resp_line = self._recv_line(timeout_s=timeout_s)
         try:
             resp = json.loads(resp_line)
@@ -221,17 +217,67 @@ class cmux:
 
         if resp.get("id") != req_id:
             raise cmuxError(f"Mismatched response id: expected {req_id}, got {resp.get('id')}")
+        return resp
 
-        if resp.get("ok") is True:
-            return resp.get("result")
-
+    @staticmethod
+    def _response_error(resp: Dict[str, Any]) -> cmuxError:
         err = resp.get("error") or {}
         code = err.get("code") or "error"
         msg = err.get("message") or "Unknown error"
         data = err.get("data")
         if data is not None:
-            raise cmuxError(f"{code}: {msg} ({data})")
-        raise cmuxError(f"{code}: {msg}")
+            return cmuxError(f"{code}: {msg} ({data})")
+        return cmuxError(f"{code}: {msg}")
+
+    def _call(self, method: str, params: Optional[Dict[str, Any]] = None, timeout_s: float = 20.0) -> Any:
+        if self._socket is None:
+            raise cmuxError("Not connected")
+
+        req_id, line = self._encode_request(method, params)
+        self._socket.sendall(line.encode("utf-8"))
+
+        resp = self._recv_response(req_id, timeout_s)
+        if resp.get("ok") is True:
+            return resp.get("result")
+        raise self._response_error(resp)
+
+    def _call_many(
+        self,
+        calls: List[Tuple[str, Optional[Dict[str, Any]]]],
+        timeout_s: float = 20.0,
+        return_exceptions: bool = False,
+    ) -> List[Any]:
+        """Send every call in one write, then read the responses in order.
+
+        The server answers a connection's requests in the order it reads
+        them, so N independent calls cost one round trip instead of N. With
+        return_exceptions=True a failed call yields its cmuxError in place of
+        a result; otherwise the first error is raised, after every response
+        has been read so the connection stays usable.
+        """
+        if self._socket is None:
+            raise cmuxError("Not connected")
+        if not calls:
+            return []
+
+        ids: List[int] = []
+        lines: List[str] = []
+        for method, params in calls:
+            req_id, line = self._encode_request(method, params)
+            ids.append(req_id)
+            lines.append(line)
+        self._socket.sendall("".join(lines).encode("utf-8"))
+
+        deadline = time.time() + timeout_s
+        results: List[Any] = []
+        for req_id in ids:
+            resp = self._recv_response(req_id, max(0.0, deadline - time.time()))
+            results.append(resp.get("result") if resp.get("ok") is True else self._response_error(resp))
+        if not return_exceptions:
+            for result in results:
+                if isinstance(result, cmuxError):
+                    raise result
+        return results
 
     # ---------------------------------------------------------------------
     # ID resolution helpers (index -> id)
@@ -384,10 +430,12 @@ class cmux:
             ))
         return out
 
-    def new_workspace(self, window_id: Optional[str] = None) -> str:
+    def new_workspace(self, window_id: Optional[str] = None, focus: bool = True) -> str:
         params: Dict[str, Any] = {}
         if window_id is not None:
             params["window_id"] = str(window_id)
+        if not focus:
+            params["focus"] = False
         res = self._call("workspace.create", params) or {}
         wsid = res.get("workspace_id")
         if not wsid:
@@ -984,11 +1032,14 @@ class cmux:
         sid = self._resolve_surface_id(panel)
         self._call("debug.panel_snapshot.reset", {"surface_id": sid})
 
-    def panel_snapshot(self, panel: Union[str, int], label: str = "") -> dict:
+    def panel_snapshot(self, panel: Union[str, int], label: str = "", raw: bool = False) -> dict:
+        """Snapshot a terminal panel; raw=True also writes premultiplied RGBA pixels (`raw_path`)."""
         sid = self._resolve_surface_id(panel)
         params: Dict[str, Any] = {"surface_id": sid}
         if label:
             params["label"] = label
+        if raw:
+            params["raw"] = True
         res = dict(self._call("debug.panel_snapshot", params) or {})
         # Normalize key to match the v1 client (panel_id).
         if "panel_id" not in res and "surface_id" in res:
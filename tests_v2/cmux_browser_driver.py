@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""Run independent browser flows in several browser surfaces at once.
+
+A `cmux` client is one socket and one request at a time, so a QA pass over
+twenty routes used to load them one after another. The app serves each
+socket connection on its own thread, so BrowserDriver gives each of K
+browser surfaces its own connection and worker thread, and feeds them flows
+from per-surface queues:
+
+    def check_route(session, url):
+        session.navigate(url)
+        session.wait_for_load()
+        with session.batch() as b:
+            title, errors = b.title(), b.count(".error")
+        return title.value, errors.value
+
+    with BrowserDriver(surfaces=4) as driver:
+        results = driver.map(check_route, [f"http://localhost:{p}/" for p in ports])
+        print(driver.timing.report())
+
+A flow is `flow(session, *args)` with a BrowserSession for its surface; flows
+on one surface run in order, flows on different surfaces run concurrently.
+submit() puts a flow on the least loaded surface (or the one named with
+`surface=`) and blocks while that surface already has `queue_size` flows
+waiting, so a producer cannot run ahead of the surfaces.
+
+Surfaces come from `browser.open_split` and are closed on exit, unless
+existing surface ids are passed in.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Union
+
+from cmux import cmux, cmuxError
+from cmux_browser_session import BrowserSession
+
+_STOP = object()
+
+
+class Timing:
+    """Thread-safe latency samples: per method, per surface, and per flow."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls: Dict[str, List[float]] = {}
+        self.flows: Dict[str, List[float]] = {}  # surface id -> flow run times
+        self.queue_waits: List[float] = []
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def record_call(self, method: str, seconds: float) -> None:
+        with self._lock:
+            self.calls.setdefault(method, []).append(seconds)
+
+    def record_flow(self, surface_id: str, queued_s: float, run_s: float) -> None:
+        with self._lock:
+            self.flows.setdefault(surface_id, []).append(run_s)
+            self.queue_waits.append(queued_s)
+
+    @property
+    def wall_s(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def busy_s(self) -> float:
+        return sum(sum(runs) for runs in self.flows.values())
+
+    @staticmethod
+    def _pct(samples: List[float], q: float) -> float:
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            methods = {
+                m: {"count": len(s), "total_ms": sum(s) * 1000, "p50_ms": self._pct(s, 0.5) * 1000,
+                    "p95_ms": self._pct(s, 0.95) * 1000, "max_ms": max(s) * 1000}
+                for m, s in sorted(self.calls.items())
+            }
+            surfaces = {sid: {"flows": len(runs), "busy_ms": sum(runs) * 1000} for sid, runs in self.flows.items()}
+            flows = sum(len(runs) for runs in self.flows.values())
+            waits = list(self.queue_waits)
+        wall = self.wall_s
+        return {
+            "flows": flows,
+            "wall_ms": wall * 1000,
+            "busy_ms": self.busy_s * 1000,
+            # How many surfaces were busy on average: 1.0 is serial, K is perfect overlap.
+            "concurrency": self.busy_s / wall if wall > 0 else 0.0,
+            "queue_wait_p95_ms": self._pct(waits, 0.95) * 1000,
+            "surfaces": surfaces,
+            "methods": methods,
+        }
+
+    def report(self) -> str:
+        s = self.summary()
+        lines = [f"{s['flows']} flows in {s['wall_ms']:.0f}ms on {len(s['surfaces'])} surfaces "
+                 f"(concurrency {s['concurrency']:.2f}, queue wait p95 {s['queue_wait_p95_ms']:.0f}ms)"]
+        for method, m in s["methods"].items():
+            lines.append(f"  {method:<24} n={m['count']:<5} p50={m['p50_ms']:.1f}ms "
+                         f"p95={m['p95_ms']:.1f}ms max={m['max_ms']:.1f}ms")
+        return "\n".join(lines)
+
+
+class _Lane:
+    """One surface: its own connection, session, worker thread and bounded queue."""
+
+    def __init__(self, driver: "BrowserDriver", surface_id: str, queue_size: int):
+        self.driver = driver
+        self.surface_id = surface_id
+        self.queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self.in_flight = 0
+        self.thread = threading.Thread(target=self._run, name=f"cmux-browser-{surface_id[:8]}", daemon=True)
+
+    @property
+    def load(self) -> int:
+        return self.queue.qsize() + self.in_flight
+
+    def _run(self) -> None:
+        driver = self.driver
+        client = cmux(driver.socket_path)
+        try:
+            client.connect()
+        except cmuxError as exc:
+            self._fail_all(exc)
+            return
+        session = BrowserSession(client, self.surface_id, timeout_ms=driver.timeout_ms,
+                                 on_call=driver.timing.record_call)
+        with client:
+            while True:
+                item = self.queue.get()
+                if item is _STOP:
+                    return
+                future, flow, args, kwargs, queued_at = item
+                self.in_flight = 1
+                started = time.perf_counter()
+                try:
+                    if future.set_running_or_notify_cancel():
+                        try:
+                            future.set_result(flow(session, *args, **kwargs))
+                        except BaseException as exc:  # noqa: BLE001 - handed to the caller
+                            future.set_exception(exc)
+                finally:
+                    driver.timing.record_flow(self.surface_id, started - queued_at, time.perf_counter() - started)
+                    self.in_flight = 0
+
+    def _fail_all(self, exc: Exception) -> None:
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            item[0].set_exception(exc)
+
+
+class BrowserDriver:
+    """Drives K browser surfaces concurrently, one connection and worker per surface."""
+
+    def __init__(self, surfaces: Union[int, Sequence[str]] = 2, socket_path: Optional[str] = None,
+                 queue_size: int = 4, url: str = "about:blank", timeout_ms: int = 5000):
+        self.socket_path = socket_path or cmux.DEFAULT_SOCKET_PATH
+        self.queue_size = max(1, queue_size)
+        self.url = url
+        self.timeout_ms = timeout_ms
+        self.timing = Timing()
+        self._requested = surfaces
+        self._opened: List[str] = []
+        self._lanes: List[_Lane] = []
+        self._lock = threading.Lock()
+
+    # -- lifecycle -----------------------------------------------------------
+
+    def start(self) -> "BrowserDriver":
+        if isinstance(self._requested, int):
+            with cmux(self.socket_path) as control:
+                for _ in range(max(1, self._requested)):
+                    res = control._call("browser.open_split", {"url": self.url}) or {}
+                    sid = res.get("surface_id")
+                    if not sid:
+                        raise cmuxError(f"browser.open_split returned no surface_id: {res}")
+                    self._opened.append(str(sid))
+            surface_ids = list(self._opened)
+        else:
+            surface_ids = [str(s) for s in self._requested]
+        self.timing = Timing()
+        self._lanes = [_Lane(self, sid, self.queue_size) for sid in surface_ids]
+        for lane in self._lanes:
+            lane.thread.start()
+        return self
+
+    def close(self) -> None:
+        for lane in self._lanes:
+            lane.queue.put(_STOP)
+        for lane in self._lanes:
+            lane.thread.join(timeout=self.timeout_ms / 1000.0 + 10.0)
+        self.timing.finished = time.perf_counter()
+        if self._opened:
+            try:
+                with cmux(self.socket_path) as control:
+                    for sid in self._opened:
+                        try:
+                            control._call("surface.close", {"surface_id": sid})
+                        except cmuxError:
+                            pass
+            except cmuxError:
+                pass
+            self._opened = []
+
+    def __enter__(self) -> "BrowserDriver":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    # -- work ----------------------------------------------------------------
+
+    @property
+    def surface_ids(self) -> List[str]:
+        return [lane.surface_id for lane in self._lanes]
+
+    def submit(self, flow: Callable[..., Any], *args: Any, surface: Optional[str] = None,
+               timeout: Optional[float] = None, **kwargs: Any) -> "Future[Any]":
+        """Queue `flow(session, *args, **kwargs)`; blocks while the target surface's queue is full."""
+        if not self._lanes:
+            raise cmuxError("driver not started")
+        with self._lock:
+            if surface is not None:
+                lane = next((l for l in self._lanes if l.surface_id == surface), None)
+                if lane is None:
+                    raise cmuxError(f"surface not driven by this driver: {surface}")
+            else:
+                lane = min(self._lanes, key=lambda l: l.load)
+        future: "Future[Any]" = Future()
+        try:
+            lane.queue.put((future, flow, args, kwargs, time.perf_counter()), timeout=timeout)
+        except queue.Full:
+            raise cmuxError(f"surface {lane.surface_id} queue stayed full for {timeout}s") from None
+        return future
+
+    def map(self, flow: Callable[..., Any], items: Iterable[Any], timeout: Optional[float] = None) -> List[Any]:
+        """Run `flow(session, item)` for every item across the surfaces; results in input order."""
+        futures = [self.submit(flow, item) for item in items]
+        return [f.result(timeout=timeout) for f in futures]
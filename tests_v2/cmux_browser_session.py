@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""One browser surface, driven with as few socket round trips as possible.
+
+Browser tests used to wait by polling `browser.eval` from Python every 50ms
+and read state one getter per call, so a flow was mostly round trips.
+BrowserSession pushes waits to the app and pipelines reads:
+
+    session = BrowserSession(client, surface_id)
+    session.navigate(url)
+    session.wait_for_text("ready")            # one browser.wait, evaluated in the app
+    with session.batch() as b:                 # one write, one read
+        status = b.text("#status")
+        hidden = b.visible("#hidden")
+        box = b.box("#status")
+    assert status.value == "cmux" and hidden.value is False
+
+Waits map onto `browser.wait` conditions (selector, text_contains,
+url_contains, load_state, function). Only when the app does not offer
+`browser.wait` does a wait fall back to polling `browser.eval`.
+
+Whether a method exists is decided once per socket: from
+`system.capabilities`, and from any call answered with `method_not_found`.
+Later calls to a missing method raise BrowserUnsupported without touching
+the socket. A `not_supported` answer also raises BrowserUnsupported but is
+not remembered: it can depend on the page (a cross-origin frame.select, say)
+and the next call may succeed.
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Union
+
+from cmux import cmux, cmuxError
+from cmux_browser_snapshot import Snapshot, SnapshotDiff, diff
+from cmux_screenshot import browser_screenshot
+
+UNSUPPORTED_CODES = ("not_supported", "method_not_found")
+MISSING_CODE = "method_not_found"  # the only answer that says the method itself is absent
+
+# Result key for each getter; everything else returns the raw result dict.
+RESULT_KEYS: Dict[str, str] = {
+    "browser.get.text": "value",
+    "browser.get.html": "value",
+    "browser.get.value": "value",
+    "browser.get.attr": "value",
+    "browser.get.box": "value",
+    "browser.get.styles": "value",
+    "browser.get.title": "title",
+    "browser.get.count": "count",
+    "browser.is.visible": "value",
+    "browser.is.enabled": "value",
+    "browser.is.checked": "value",
+    "browser.url.get": "url",
+    "browser.eval": "value",
+}
+
+# Capability knowledge per socket path: {"methods": set or None, "unsupported": set}.
+_CAPABILITIES: Dict[str, Dict[str, Any]] = {}
+
+
+class BrowserUnsupported(cmuxError):
+    """The app cannot run this browser method (here, or at all when the method is missing)."""
+
+
+def _is_unsupported(exc: Exception) -> bool:
+    return str(exc).startswith(UNSUPPORTED_CODES)
+
+
+def _is_missing(exc: Exception) -> bool:
+    return str(exc).startswith(MISSING_CODE)
+
+
+def _capabilities(client: cmux) -> Dict[str, Any]:
+    caps = _CAPABILITIES.get(client.socket_path)
+    if caps is None:
+        try:
+            methods: Optional[Set[str]] = set((client._call("system.capabilities") or {}).get("methods") or [])
+        except cmuxError:
+            methods = None  # older app: learn from not_supported answers only
+        caps = {"methods": methods or None, "unsupported": set()}
+        _CAPABILITIES[client.socket_path] = caps
+    return caps
+
+
+class Pending:
+    """A result slot filled when its batch runs."""
+
+    __slots__ = ("method", "params", "_result", "_error", "_done")
+
+    def __init__(self, method: str, params: Dict[str, Any]):
+        self.method = method
+        self.params = params
+        self._result: Any = None
+        self._error: Optional[cmuxError] = None
+        self._done = False
+
+    def _resolve(self, result: Any) -> None:
+        if isinstance(result, cmuxError):
+            self._error = result
+        else:
+            key = RESULT_KEYS.get(self.method)
+            self._result = (result or {}).get(key) if key else result
+        self._done = True
+
+    @property
+    def ok(self) -> bool:
+        return self._done and self._error is None
+
+    @property
+    def error(self) -> Optional[cmuxError]:
+        return self._error
+
+    @property
+    def value(self) -> Any:
+        if not self._done:
+            raise cmuxError(f"{self.method}: batch has not run yet")
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class Batch:
+    """Independent calls queued and sent together; see BrowserSession.batch()."""
+
+    def __init__(self, session: "BrowserSession"):
+        self.session = session
+        self.pending: List[Pending] = []
+
+    def __enter__(self) -> "Batch":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.run()
+
+    def call(self, method: str, **params: Any) -> Pending:
+        slot = Pending(method, {"surface_id": self.session.surface_id, **params})
+        self.pending.append(slot)
+        return slot
+
+    def text(self, selector: str) -> Pending:
+        return self.call("browser.get.text", selector=selector)
+
+    def value(self, selector: str) -> Pending:
+        return self.call("browser.get.value", selector=selector)
+
+    def visible(self, selector: str) -> Pending:
+        return self.call("browser.is.visible", selector=selector)
+
+    def enabled(self, selector: str) -> Pending:
+        return self.call("browser.is.enabled", selector=selector)
+
+    def checked(self, selector: str) -> Pending:
+        return self.call("browser.is.checked", selector=selector)
+
+    def box(self, selector: str) -> Pending:
+        return self.call("browser.get.box", selector=selector)
+
+    def count(self, selector: str) -> Pending:
+        return self.call("browser.get.count", selector=selector)
+
+    def title(self) -> Pending:
+        return self.call("browser.get.title")
+
+    def url(self) -> Pending:
+        return self.call("browser.url.get")
+
+    def eval(self, script: str) -> Pending:
+        return self.call("browser.eval", script=script)
+
+    def run(self) -> List[Pending]:
+        """Send every queued call in one round trip. Errors stay in their slots."""
+        todo = [p for p in self.pending if not p._done]
+        self.pending = []
+        send: List[Pending] = []
+        for slot in todo:
+            if not self.session.supports(slot.method):
+                slot._resolve(BrowserUnsupported(f"not_supported: {slot.method} (cached)"))
+            else:
+                send.append(slot)
+        if send:
+            started = time.perf_counter()
+            results = self.session.client._call_many(
+                [(p.method, p.params) for p in send], timeout_s=self.session.timeout_s, return_exceptions=True
+            )
+            self.session.round_trips += 1
+            if self.session.on_call is not None:
+                self.session.on_call("batch", time.perf_counter() - started)
+            for slot, result in zip(send, results):
+                if isinstance(result, cmuxError) and _is_unsupported(result):
+                    if _is_missing(result):
+                        self.session._mark_unsupported(slot.method)
+                    result = BrowserUnsupported(str(result))
+                slot._resolve(result)
+        return todo
+
+
+class BrowserSession:
+    """Waits, actions and pipelined reads against one browser surface."""
+
+    def __init__(self, client: cmux, surface_id: str, timeout_ms: int = 5000, poll_s: float = 0.05,
+                 on_call: Optional[Callable[[str, float], None]] = None):
+        self.client = client
+        self.surface_id = surface_id
+        self.timeout_ms = timeout_ms
+        self.poll_s = poll_s
+        self.on_call = on_call  # (method, seconds) after every round trip; "batch" for batches
+        self.round_trips = 0
+        self.last_snapshot: Optional[Snapshot] = None
+
+    @property
+    def timeout_s(self) -> float:
+        return self.timeout_ms / 1000.0 + 5.0
+
+    # -- capabilities --------------------------------------------------------
+
+    def supports(self, method: str) -> bool:
+        caps = _capabilities(self.client)
+        if method in caps["unsupported"]:
+            return False
+        return caps["methods"] is None or method in caps["methods"]
+
+    def _mark_unsupported(self, method: str) -> None:
+        _capabilities(self.client)["unsupported"].add(method)
+
+    # -- calls ---------------------------------------------------------------
+
+    def call(self, method: str, timeout_s: Optional[float] = None, **params: Any) -> Any:
+        if not self.supports(method):
+            raise BrowserUnsupported(f"not_supported: {method} (cached)")
+        self.round_trips += 1
+        started = time.perf_counter()
+        try:
+            return self.client._call(method, {"surface_id": self.surface_id, **params},
+                                     timeout_s=timeout_s or self.timeout_s)
+        except cmuxError as exc:
+            if _is_unsupported(exc):
+                if _is_missing(exc):
+                    self._mark_unsupported(method)
+                raise BrowserUnsupported(str(exc)) from None
+            raise
+        finally:
+            if self.on_call is not None:
+                self.on_call(method, time.perf_counter() - started)
+
+    def get(self, method: str, **params: Any) -> Any:
+        """Call a getter and unwrap its value (see RESULT_KEYS)."""
+        result = self.call(method, **params)
+        key = RESULT_KEYS.get(method)
+        return (result or {}).get(key) if key else result
+
+    def batch(self) -> Batch:
+        return Batch(self)
+
+    def navigate(self, url: str) -> Any:
+        return self.call("browser.navigate", url=url)
+
+    def text(self, selector: str) -> Any:
+        return self.get("browser.get.text", selector=selector)
+
+    def value(self, selector: str) -> Any:
+        return self.get("browser.get.value", selector=selector)
+
+    def visible(self, selector: str) -> bool:
+        return bool(self.get("browser.is.visible", selector=selector))
+
+    def box(self, selector: str) -> Any:
+        return self.get("browser.get.box", selector=selector)
+
+    def title(self) -> str:
+        return str(self.get("browser.get.title") or "")
+
+    def url(self) -> str:
+        return str(self.get("browser.url.get") or "")
+
+    def eval(self, script: str) -> Any:
+        return self.get("browser.eval", script=script)
+
+    def screenshot(self, path: Union[str, Path]) -> Path:
+        """Capture the surface into `path` without holding the PNG in memory."""
+        if not self.supports("browser.screenshot"):
+            raise BrowserUnsupported("not_supported: browser.screenshot (cached)")
+        self.round_trips += 1
+        started = time.perf_counter()
+        try:
+            return browser_screenshot(self.client, self.surface_id, path, timeout_s=self.timeout_s)
+        finally:
+            if self.on_call is not None:
+                self.on_call("browser.screenshot", time.perf_counter() - started)
+
+    def snapshot(self, **params: Any) -> Snapshot:
+        """Take a browser.snapshot (params as for the method, e.g. interactive=True)."""
+        self.last_snapshot = Snapshot.from_result(self.call("browser.snapshot", **params) or {})
+        return self.last_snapshot
+
+    def changes(self, **params: Any) -> SnapshotDiff:
+        """Take a snapshot and diff it against the previous one (everything is new the first time)."""
+        before = self.last_snapshot if self.last_snapshot is not None else Snapshot()
+        return diff(before, self.snapshot(**params))
+
+    # -- waits ---------------------------------------------------------------
+
+    def wait_for_selector(self, selector: str, timeout_ms: Optional[int] = None) -> None:
+        self._wait({"selector": selector}, f"document.querySelector({_js(selector)}) !== null", timeout_ms)
+
+    def wait_for_text(self, text: str, timeout_ms: Optional[int] = None) -> None:
+        self._wait({"text_contains": text},
+                   f"!!document.body && String(document.body.innerText || '').includes({_js(text)})", timeout_ms)
+
+    def wait_for_url(self, fragment: str, timeout_ms: Optional[int] = None) -> None:
+        self._wait({"url_contains": fragment}, f"String(location.href || '').includes({_js(fragment)})", timeout_ms)
+
+    def wait_for_load(self, state: str = "complete", timeout_ms: Optional[int] = None) -> None:
+        self._wait({"load_state": state},
+                   f"String(document.readyState || '').toLowerCase() === {_js(state.lower())}", timeout_ms)
+
+    def wait_for(self, expression: str, timeout_ms: Optional[int] = None) -> None:
+        """Wait until a JavaScript expression is truthy in the page."""
+        self._wait({"function": expression}, f"!!({expression})", timeout_ms)
+
+    def wait_for_title(self, fragment: str, timeout_ms: Optional[int] = None) -> None:
+        self.wait_for(f"String(document.title || '').includes({_js(fragment)})", timeout_ms)
+
+    def _wait(self, condition: Dict[str, Any], script: str, timeout_ms: Optional[int]) -> None:
+        timeout_ms = timeout_ms or self.timeout_ms
+        if self.supports("browser.wait"):
+            try:
+                self.call("browser.wait", timeout_s=timeout_ms / 1000.0 + 5.0, timeout_ms=timeout_ms, **condition)
+                return
+            except BrowserUnsupported:
+                pass
+            except cmuxError as exc:
+                if str(exc).startswith("timeout"):
+                    raise cmuxError(f"Timed out waiting for {condition}") from None
+                raise
+        self.poll(lambda: bool(self.eval(script)), timeout_ms / 1000.0, str(condition))
+
+    def poll(self, pred: Callable[[], bool], timeout_s: float, label: str) -> None:
+        """Client-side polling, for app-side state browser.wait cannot see (e.g. native focus)."""
+        deadline = time.time() + timeout_s
+        last_exc: Optional[Exception] = None
+        while time.time() < deadline:
+            try:
+                if pred():
+                    return
+            except cmuxError as exc:
+                last_exc = exc
+            time.sleep(self.poll_s)
+        suffix = f": {last_exc}" if last_exc is not None else ""
+        raise cmuxError(f"Timed out waiting for {label}{suffix}")
+
+
+def _js(value: str) -> str:
+    return json.dumps(value)
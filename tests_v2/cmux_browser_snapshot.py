@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""Compact model of `browser.snapshot` results, with diffs between snapshots.
+
+`browser.snapshot` returns the accessibility tree as indented text
+
+    - document "Title"
+      - heading "Browser Comprehensive" [ref=e1]
+      - textbox "name" [ref=e2]
+
+plus a `refs` map. Agents take a snapshot after every step and used to
+re-read the whole tree each time. Snapshot parses it once into an array of
+small `__slots__` nodes with indexes by ref and by (role, name), and diff()
+reports only what changed since the previous snapshot:
+
+    before = Snapshot.from_result(client._call("browser.snapshot", {...}))
+    ...
+    after = Snapshot.from_result(client._call("browser.snapshot", {...}))
+    delta = diff(before, after)
+    print(delta.render())        # "+ button "Save" [ref=e31]" ...
+    client._call("browser.click", {"surface_id": sid, "selector": after.find("button", "Save").ref})
+
+The app hands out fresh refs on every snapshot, so nodes are matched by
+shape instead. Under each pair of matched parents, the children are aligned
+by the longest common run of (role, name), so one item prepended to a list
+is one addition. Children left over between aligned runs are paired by
+position among those with the same role; a pair whose names differ is
+"changed". The page text is compared line by line.
+"""
+
+import difflib
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+Key = Tuple[Tuple[str, int], ...]
+
+
+class Node:
+    """One accessibility node. Parent is an index into Snapshot.nodes (-1 for top level)."""
+
+    __slots__ = ("index", "ref", "role", "name", "depth", "parent", "key")
+
+    def __init__(self, index: int, ref: str, role: str, name: str, depth: int, parent: int, key: Key):
+        self.index = index
+        self.ref = ref
+        self.role = role
+        self.name = name
+        self.depth = depth
+        self.parent = parent
+        self.key = key
+
+    def line(self) -> str:
+        name = f' "{self.name}"' if self.name else ""
+        ref = f" [ref={self.ref}]" if self.ref else ""
+        return f"{'  ' * self.depth}- {self.role}{name}{ref}"
+
+    def __repr__(self) -> str:
+        return f"Node({self.ref or '-'} {self.role} {self.name!r} depth={self.depth})"
+
+
+def _parse_line(line: str) -> Optional[Tuple[int, str, str, str]]:
+    """'  - role "name" [ref=e3]' -> (depth, role, name, ref); None for blank lines."""
+    stripped = line.lstrip(" ")
+    if not stripped.startswith("- "):
+        return None
+    depth = (len(line) - len(stripped)) // 2
+    rest = stripped[2:]
+    ref = ""
+    if rest.endswith("]"):
+        at = rest.rfind(" [ref=")
+        if at >= 0:
+            ref = rest[at + 6:-1]
+            rest = rest[:at]
+    role, _, name = rest.partition(" ")
+    if len(name) >= 2 and name[0] == '"' and name[-1] == '"':
+        name = name[1:-1]
+    return depth, role, name, ref
+
+
+class Snapshot:
+    """A parsed snapshot: flat node array plus ref and (role, name) indexes."""
+
+    __slots__ = ("title", "url", "text", "nodes", "by_ref", "by_key", "_by_role_name")
+
+    def __init__(self, title: str = "", url: str = "", text: str = ""):
+        self.title = title
+        self.url = url
+        self.text = text
+        self.nodes: List[Node] = []
+        self.by_ref: Dict[str, Node] = {}
+        self.by_key: Dict[Key, Node] = {}
+        self._by_role_name: Optional[Dict[Tuple[str, str], List[Node]]] = None
+
+    @classmethod
+    def from_result(cls, result: Dict[str, Any]) -> "Snapshot":
+        """Build from a browser.snapshot result (the `page` text is kept for text diffs)."""
+        page = result.get("page") or {}
+        snap = cls(str(result.get("title") or ""), str(result.get("url") or ""), str(page.get("text") or ""))
+        snap._load(str(result.get("snapshot") or "").splitlines())
+        return snap
+
+    @classmethod
+    def parse(cls, text: str, title: str = "", url: str = "") -> "Snapshot":
+        snap = cls(title, url)
+        snap._load(text.splitlines())
+        return snap
+
+    def _load(self, lines: Iterable[str]) -> None:
+        stack: List[Node] = []  # open ancestors, by increasing depth
+        ordinals: Dict[Tuple[int, str], int] = {}  # (parent index, role) -> siblings seen
+        for raw in lines:
+            parsed = _parse_line(raw)
+            if parsed is None:
+                continue
+            depth, role, name, ref = parsed
+            if not ref and role in ("document", "text", "(empty)"):
+                if role == "document" and not self.title:
+                    self.title = name
+                continue
+            while stack and stack[-1].depth >= depth:
+                stack.pop()
+            parent = stack[-1] if stack else None
+            pidx = parent.index if parent else -1
+            n = ordinals.get((pidx, role), 0)
+            ordinals[(pidx, role)] = n + 1
+            key = (parent.key if parent else ()) + ((role, n),)
+            node = Node(len(self.nodes), ref, role, name, depth, pidx, key)
+            self.nodes.append(node)
+            if ref:
+                self.by_ref[ref] = node
+            self.by_key[key] = node
+            stack.append(node)
+
+    # -- lookups -------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def node(self, ref: str) -> Optional[Node]:
+        return self.by_ref.get(ref.lstrip("@"))
+
+    def find_all(self, role: str, name: Optional[str] = None) -> List[Node]:
+        if self._by_role_name is None:
+            index: Dict[Tuple[str, str], List[Node]] = {}
+            for node in self.nodes:
+                index.setdefault((node.role, node.name), []).append(node)
+                index.setdefault((node.role, "\0any"), []).append(node)
+            self._by_role_name = index
+        return self._by_role_name.get((role, "\0any" if name is None else name), [])
+
+    def find(self, role: str, name: Optional[str] = None) -> Optional[Node]:
+        found = self.find_all(role, name)
+        return found[0] if found else None
+
+    def children(self, node: Node) -> List[Node]:
+        return [n for n in self.nodes[node.index + 1:] if n.parent == node.index]
+
+    def render(self, nodes: Optional[Iterable[Node]] = None) -> str:
+        return "\n".join(n.line() for n in (self.nodes if nodes is None else nodes))
+
+
+class SnapshotDiff:
+    """What changed between two snapshots."""
+
+    __slots__ = ("added", "removed", "changed", "title", "url", "text_added", "text_removed")
+
+    def __init__(self):
+        self.added: List[Node] = []
+        self.removed: List[Node] = []
+        self.changed: List[Tuple[Node, Node]] = []  # (old, new): matched nodes with different names
+        self.title: Optional[Tuple[str, str]] = None
+        self.url: Optional[Tuple[str, str]] = None
+        self.text_added: List[str] = []
+        self.text_removed: List[str] = []
+
+    @property
+    def empty(self) -> bool:
+        return not (self.added or self.removed or self.changed or self.title or self.url
+                    or self.text_added or self.text_removed)
+
+    def render(self) -> str:
+        """A compact delta for logs or a model prompt; refs are the new snapshot's."""
+        out: List[str] = []
+        if self.url:
+            out.append(f"~ url {self.url[0]} -> {self.url[1]}")
+        if self.title:
+            out.append(f'~ title "{self.title[0]}" -> "{self.title[1]}"')
+        out.extend(f"- {n.line().lstrip()[2:]}" for n in self.removed)
+        out.extend(f"+ {n.line().lstrip()[2:]}" for n in self.added)
+        out.extend(f'~ {new.role} "{old.name}" -> "{new.name}" [ref={new.ref}]' for old, new in self.changed)
+        out.extend(f"- text {line}" for line in self.text_removed)
+        out.extend(f"+ text {line}" for line in self.text_added)
+        return "\n".join(out)
+
+
+def _children(snap: Snapshot) -> Dict[int, List[Node]]:
+    kids: Dict[int, List[Node]] = {}
+    for node in snap.nodes:
+        kids.setdefault(node.parent, []).append(node)
+    return kids
+
+
+def _subtree(snap: Snapshot, node: Node) -> List[Node]:
+    end = node.index + 1
+    while end < len(snap.nodes) and snap.nodes[end].depth > node.depth:
+        end += 1
+    return snap.nodes[node.index:end]
+
+
+def _pair_leftovers(old: List[Node], new: List[Node]) -> Tuple[List[Tuple[Node, Node]], List[Node], List[Node]]:
+    """Pair unaligned siblings by position among those with the same role; return (pairs, removed, added)."""
+    by_role: Dict[str, Deque[Node]] = {}
+    for node in new:
+        by_role.setdefault(node.role, deque()).append(node)
+    pairs: List[Tuple[Node, Node]] = []
+    removed: List[Node] = []
+    for node in old:
+        queue = by_role.get(node.role)
+        if queue:
+            pairs.append((node, queue.popleft()))
+        else:
+            removed.append(node)
+    paired = {n.index for _, n in pairs}
+    return pairs, removed, [n for n in new if n.index not in paired]
+
+
+def diff(old: Snapshot, new: Snapshot, text: bool = True) -> SnapshotDiff:
+    """Structural diff aligning each parent's children; text=True also diffs the page text by line."""
+    delta = SnapshotDiff()
+    old_kids, new_kids = _children(old), _children(new)
+    todo: List[Tuple[int, int]] = [(-1, -1)]  # matched (old, new) parents; -1 is the top level
+    while todo:
+        old_parent, new_parent = todo.pop()
+        a, b = old_kids.get(old_parent, []), new_kids.get(new_parent, [])
+        matcher = difflib.SequenceMatcher(None, [(n.role, n.name) for n in a], [(n.role, n.name) for n in b],
+                                          autojunk=False)
+        for op, i1, i2, j1, j2 in matcher.get_opcodes():
+            if op == "equal":
+                pairs = list(zip(a[i1:i2], b[j1:j2]))
+            else:
+                pairs, gone, extra = _pair_leftovers(a[i1:i2], b[j1:j2])
+                for node in gone:
+                    delta.removed.extend(_subtree(old, node))
+                for node in extra:
+                    delta.added.extend(_subtree(new, node))
+            for prev, node in pairs:
+                if prev.name != node.name:
+                    delta.changed.append((prev, node))
+                todo.append((prev.index, node.index))
+    delta.added.sort(key=lambda n: n.index)
+    delta.removed.sort(key=lambda n: n.index)
+    delta.changed.sort(key=lambda pair: pair[1].index)
+    if old.title != new.title:
+        delta.title = (old.title, new.title)
+    if old.url != new.url:
+        delta.url = (old.url, new.url)
+    if text and old.text != new.text:
+        a, b = old.text.splitlines(), new.text.splitlines()
+        for op, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+            if op in ("delete", "replace"):
+                delta.text_removed.extend(a[i1:i2])
+            if op in ("insert", "replace"):
+                delta.text_added.extend(b[j1:j2])
+    return delta
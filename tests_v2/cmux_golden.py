@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""Golden-image baselines for visual tests, compared with SSIM.
+
+A store is a directory:
+
+    index.json                  scenario -> {"sha256", "width", "height", "approved_at"}
+    objects/ab/ab12....png      approved images, named by the SHA-256 of their bytes
+
+Approving an image that is already stored only touches index.json (and not
+even that if the scenario already points at it), so re-approving an
+unchanged run rewrites nothing.
+
+Comparison runs structural similarity (SSIM) on luminance, with a box window
+computed from integral images, so it is a handful of NumPy passes per image.
+A capture regresses when the mean SSIM drops below `min_ssim`, or when any
+tile drops below `min_tile_ssim` (a small, sharp change such as a blank pane
+barely moves the mean), and a heatmap PNG of where it differs is written.
+
+    store = GoldenStore()
+    result = store.compare("A2/after", screenshot_path)
+    if result.regressed:
+        fail(result.summary(), result.heatmap)
+
+CLI:
+    python3 tests_v2/cmux_golden.py compare SCENARIO IMAGE
+    python3 tests_v2/cmux_golden.py approve SCENARIO IMAGE
+    python3 tests_v2/cmux_golden.py list
+    python3 tests_v2/cmux_golden.py prune      # drop images no scenario uses
+
+CMUX_GOLDEN_DIR overrides the store location (default: tests_v2/golden).
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from cmux_pixel_diff import Frame, load_png, save_png
+
+DEFAULT_DIR = Path(__file__).parent / "golden"
+HEATMAP_DIR = Path(tempfile.gettempdir()) / "cmux-golden-heatmaps"
+
+# SSIM constants for 8-bit luminance (Wang et al. 2004).
+_C1 = (0.01 * 255) ** 2
+_C2 = (0.03 * 255) ** 2
+
+
+@dataclass
+class GoldenResult:
+    scenario: str
+    status: str  # "match", "regression", "new", "size_changed"
+    ssim: float = 1.0
+    worst_tile_ssim: float = 1.0
+    worst_tile: Optional[List[int]] = None  # [x0, y0, x1, y1] in image pixels
+    heatmap: Optional[Path] = None
+    golden: Optional[Path] = None
+
+    @property
+    def regressed(self) -> bool:
+        return self.status in ("regression", "size_changed")
+
+    def summary(self) -> str:
+        if self.status in ("match", "regression"):
+            return (f"{self.scenario}: {self.status} ssim={self.ssim:.4f} "
+                    f"worst_tile={self.worst_tile_ssim:.4f} at {self.worst_tile}")
+        return f"{self.scenario}: {self.status}"
+
+
+def luminance(pixels: np.ndarray, scale: int = 1) -> np.ndarray:
+    """Rec. 601 luma as float32, mean-pooled by `scale` to drop subpixel noise."""
+    rgb = pixels[..., :3].astype(np.float32)
+    luma = rgb[..., 0] * 0.299 + rgb[..., 1] * 0.587 + rgb[..., 2] * 0.114
+    if scale > 1:
+        h, w = (luma.shape[0] // scale) * scale, (luma.shape[1] // scale) * scale
+        luma = luma[:h, :w].reshape(h // scale, scale, w // scale, scale).mean(axis=(1, 3))
+    return luma
+
+
+def _box_mean(x: np.ndarray, win: int) -> np.ndarray:
+    """Mean over every win x win window ('valid' positions), via an integral image."""
+    s = np.zeros((x.shape[0] + 1, x.shape[1] + 1), dtype=np.float64)
+    np.cumsum(np.cumsum(x, axis=0, dtype=np.float64), axis=1, out=s[1:, 1:])
+    total = s[win:, win:] - s[:-win, win:] - s[win:, :-win] + s[:-win, :-win]
+    return (total / (win * win)).astype(np.float32)
+
+
+def ssim_map(a: np.ndarray, b: np.ndarray, win: int = 7) -> np.ndarray:
+    """Per-window SSIM of two equally sized luminance images."""
+    win = max(1, min(win, a.shape[0], a.shape[1]))
+    mu_a, mu_b = _box_mean(a, win), _box_mean(b, win)
+    var_a = _box_mean(a * a, win) - mu_a * mu_a
+    var_b = _box_mean(b * b, win) - mu_b * mu_b
+    cov = _box_mean(a * b, win) - mu_a * mu_b
+    num = (2 * mu_a * mu_b + _C1) * (2 * cov + _C2)
+    den = (mu_a * mu_a + mu_b * mu_b + _C1) * (var_a + var_b + _C2)
+    return num / den
+
+
+def tile_means(smap: np.ndarray, tile: int) -> np.ndarray:
+    """Mean SSIM per tile x tile block (partial edge tiles included)."""
+    h, w = smap.shape
+    th, tw = -(-h // tile), -(-w // tile)
+    padded = np.full((th * tile, tw * tile), np.nan, dtype=np.float32)
+    padded[:h, :w] = smap
+    return np.nanmean(padded.reshape(th, tile, tw, tile), axis=(1, 3))
+
+
+def heatmap(golden: np.ndarray, smap: np.ndarray, scale: int, win: int) -> np.ndarray:
+    """Golden image dimmed to gray, with dissimilar areas painted red."""
+    gray = luminance(golden)[..., None].repeat(3, axis=2) * 0.35
+    dissimilar = np.clip(1.0 - smap, 0.0, 1.0)
+    # Place the valid-window map back at window centers, then upsample to image pixels.
+    full = np.zeros((smap.shape[0] + win - 1, smap.shape[1] + win - 1), dtype=np.float32)
+    off = win // 2
+    full[off:off + smap.shape[0], off:off + smap.shape[1]] = dissimilar
+    full = full.repeat(scale, axis=0).repeat(scale, axis=1)
+    h, w = min(full.shape[0], gray.shape[0]), min(full.shape[1], gray.shape[1])
+    out = gray.copy()
+    heat = np.clip(full[:h, :w] * 4.0, 0.0, 1.0)
+    out[:h, :w, 0] = out[:h, :w, 0] * (1 - heat) + 255 * heat
+    out[:h, :w, 1] *= 1 - heat
+    out[:h, :w, 2] *= 1 - heat
+    return out.astype(np.uint8)
+
+
+class GoldenStore:
+    """Approved images per scenario, content-addressed on disk."""
+
+    def __init__(self, root: Optional[Union[str, Path]] = None, min_ssim: float = 0.98,
+                 min_tile_ssim: float = 0.90, tile: int = 32, scale: int = 2, window: int = 7):
+        self.root = Path(root or os.environ.get("CMUX_GOLDEN_DIR") or DEFAULT_DIR)
+        self.min_ssim = min_ssim
+        self.min_tile_ssim = min_tile_ssim
+        self.tile = tile
+        self.scale = scale
+        self.window = window
+        self._index: Optional[Dict[str, dict]] = None
+
+    # -- index -------------------------------------------------------------
+
+    @property
+    def index_path(self) -> Path:
+        return self.root / "index.json"
+
+    @property
+    def index(self) -> Dict[str, dict]:
+        if self._index is None:
+            try:
+                self._index = json.loads(self.index_path.read_text())
+            except FileNotFoundError:
+                self._index = {}
+        return self._index
+
+    def _save_index(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.index, indent=2, sort_keys=True) + "\n")
+        os.replace(tmp, self.index_path)
+
+    def object_path(self, sha: str) -> Path:
+        return self.root / "objects" / sha[:2] / f"{sha}.png"
+
+    def golden_path(self, scenario: str) -> Optional[Path]:
+        entry = self.index.get(scenario)
+        return self.object_path(entry["sha256"]) if entry else None
+
+    # -- approve / compare -------------------------------------------------
+
+    def approve(self, scenario: str, image: Union[str, Path]) -> bool:
+        """Make `image` the golden for `scenario`. Returns False if it already was."""
+        data = Path(image).read_bytes()
+        sha = hashlib.sha256(data).hexdigest()
+        if self.index.get(scenario, {}).get("sha256") == sha and self.object_path(sha).exists():
+            return False
+        target = self.object_path(sha)
+        if not target.exists():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_suffix(".tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, target)
+        frame = load_png(target)
+        self.index[scenario] = {
+            "sha256": sha,
+            "width": frame.width,
+            "height": frame.height,
+            "approved_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        self._save_index()
+        return True
+
+    def compare(self, scenario: str, image: Union[str, Path, Frame],
+                heatmap_dir: Optional[Union[str, Path]] = None) -> GoldenResult:
+        golden_path = self.golden_path(scenario)
+        if golden_path is None or not golden_path.exists():
+            return GoldenResult(scenario, "new")
+        frame = image if isinstance(image, Frame) else load_png(image)
+        if isinstance(image, (str, Path)):
+            # Byte-identical capture: nothing to compute.
+            if hashlib.sha256(Path(image).read_bytes()).hexdigest() == self.index[scenario]["sha256"]:
+                return GoldenResult(scenario, "match", golden=golden_path)
+        golden = load_png(golden_path)
+        if golden.pixels.shape != frame.pixels.shape:
+            return GoldenResult(scenario, "size_changed", ssim=0.0, worst_tile_ssim=0.0, golden=golden_path)
+
+        smap = ssim_map(luminance(golden.pixels, self.scale), luminance(frame.pixels, self.scale), self.window)
+        tiles = tile_means(smap, max(1, self.tile // self.scale))
+        ty, tx = np.unravel_index(int(np.nanargmin(tiles)), tiles.shape)
+        span = self.tile // self.scale * self.scale
+        result = GoldenResult(
+            scenario,
+            "match",
+            ssim=float(smap.mean()),
+            worst_tile_ssim=float(tiles[ty, tx]),
+            worst_tile=[int(tx * span), int(ty * span), int((tx + 1) * span), int((ty + 1) * span)],
+            golden=golden_path,
+        )
+        if result.ssim < self.min_ssim or result.worst_tile_ssim < self.min_tile_ssim:
+            result.status = "regression"
+            out_dir = Path(heatmap_dir) if heatmap_dir else HEATMAP_DIR
+            out_dir.mkdir(parents=True, exist_ok=True)
+            name = scenario.replace("/", "_").replace(" ", "_")
+            result.heatmap = save_png(out_dir / f"{name}.heatmap.png",
+                                      heatmap(golden.pixels, smap, self.scale, self.window), level=1)
+        return result
+
+    def prune(self) -> int:
+        """Delete objects no scenario points at. Returns how many were removed."""
+        live = {entry["sha256"] for entry in self.index.values()}
+        removed = 0
+        for path in (self.root / "objects").glob("*/*.png"):
+            if path.stem not in live:
+                path.unlink()
+                removed += 1
+        return removed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Golden-image baselines for visual tests")
+    parser.add_argument("--dir", help="store directory (default: $CMUX_GOLDEN_DIR or tests_v2/golden)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    for name in ("compare", "approve"):
+        p = sub.add_parser(name)
+        p.add_argument("scenario")
+        p.add_argument("image")
+    sub.add_parser("list")
+    sub.add_parser("prune")
+    args = parser.parse_args(argv)
+
+    store = GoldenStore(args.dir)
+    if args.cmd == "approve":
+        changed = store.approve(args.scenario, args.image)
+        print(f"{args.scenario}: {'approved' if changed else 'unchanged'}")
+        return 0
+    if args.cmd == "compare":
+        result = store.compare(args.scenario, args.image)
+        print(result.summary())
+        if result.heatmap:
+            print(f"heatmap: {result.heatmap}")
+        return 1 if result.regressed else 0
+    if args.cmd == "prune":
+        print(f"removed {store.prune()} unreferenced images")
+        return 0
+    for scenario, entry in sorted(store.index.items()):
+        print(f"{scenario}\t{entry['width']}x{entry['height']}\t{entry['sha256'][:12]}\t{entry['approved_at']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""Client-side mirror of every terminal's scrollback, with indexed search.
+
+Agents that want to know "which pane printed `error:`" tend to call
+`read_terminal_text` on every surface and grep the result, downloading whole
+screens and scrollbacks each time. TerminalMirror keeps a local copy
+instead and only fetches what is new:
+
+    from cmux_mirror import TerminalMirror
+
+    mirror = TerminalMirror(client)
+    mirror.sync()                               # one batched round trip for all surfaces
+    for hit in mirror.search(r"error:"):        # regex, answered locally
+        print(hit.surface_id, hit.line, hit.text)
+    mirror.find("Traceback", surfaces=[sid])    # plain substring
+
+sync() asks each surface for the last `window_lines` lines
+(`surface.read_text` with `lines`) and lines them up with what the mirror
+already holds, using the last few stored lines as an anchor. When the
+anchor isn't in the window (more output than that since the last sync) it
+asks again with a wider one. Lines more than `live_lines` from the bottom are
+treated as final and appended; the bottom ones (the visible screen, which
+programs redraw) are replaced on every sync.
+
+Each surface's final lines live in a LineRing: one bytearray of UTF-8 text
+plus an array of line offsets. Past `max_lines` or `max_bytes` the oldest
+lines are dropped, and the buffer is compacted once they make up half of
+it. A trigram index (case-folded ASCII) maps every three-byte sequence to
+the lines containing it. A search takes the literal runs its pattern
+requires, intersects their trigrams' line lists, and runs the real regex
+only on those candidates. Patterns without a usable literal fall back to
+scanning.
+
+Line numbers count every line the mirror has seen for a surface, so they
+stay stable when old lines are dropped.
+"""
+
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import re._parser as _sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse as _sre_parse  # type: ignore[no-redef]
+
+from cmux import cmux
+
+_ASCII_RUN = re.compile(rb"[\x00-\x7f]{3,}")
+
+
+class LineRing:
+    """Lines as UTF-8 in one bytearray, with an array of start offsets; drops the oldest past its caps."""
+
+    def __init__(self, max_lines: int = 100_000, max_bytes: int = 64 << 20):
+        self.max_lines = max(1, max_lines)
+        self.max_bytes = max(1, max_bytes)
+        self.first = 0  # line number of the oldest line kept
+        self._data = bytearray()
+        self._starts = array("Q")
+        self._head = 0  # index in _starts of line `first`
+
+    def __len__(self) -> int:
+        return len(self._starts) - self._head
+
+    @property
+    def next(self) -> int:
+        """Line number the next append gets."""
+        return self.first + len(self)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._data) - self._starts[self._head] if len(self) else 0
+
+    def append(self, line: bytes) -> int:
+        self._starts.append(len(self._data))
+        self._data += line
+        number = self.next - 1
+        while len(self) > self.max_lines or (len(self) > 1 and self.nbytes > self.max_bytes):
+            self._head += 1
+            self.first += 1
+        if self._head > 1024 and self._head * 2 > len(self._starts):
+            self._compact()
+        return number
+
+    def _compact(self) -> None:
+        cut = self._starts[self._head]
+        del self._data[:cut]
+        self._starts = array("Q", (start - cut for start in self._starts[self._head:]))
+        self._head = 0
+
+    def get(self, number: int) -> bytes:
+        i = self._head + number - self.first
+        if number < self.first or i >= len(self._starts):
+            raise IndexError(number)
+        end = self._starts[i + 1] if i + 1 < len(self._starts) else len(self._data)
+        return bytes(self._data[self._starts[i]:end])
+
+    def tail(self, n: int) -> List[bytes]:
+        return [self.get(number) for number in range(max(self.first, self.next - n), self.next)]
+
+    def find_all(self, needle: bytes) -> Iterator[int]:
+        """Line numbers containing `needle`, scanning the buffer directly."""
+        if not len(self):
+            return
+        data, starts = self._data, self._starts
+        pos = starts[self._head]
+        while True:
+            pos = data.find(needle, pos)
+            if pos < 0:
+                return
+            i = bisect_right(starts, pos, self._head) - 1
+            end = starts[i + 1] if i + 1 < len(starts) else len(data)
+            if pos + len(needle) <= end:
+                yield self.first + i - self._head
+                pos = end
+            else:
+                pos += 1  # straddles a line boundary
+
+
+class TrigramIndex:
+    """Case-folded ASCII trigram -> increasing line numbers containing it."""
+
+    def __init__(self):
+        self._postings: Dict[bytes, array] = {}
+        self.floor = 0  # line numbers below this have been pruned
+
+    def __len__(self) -> int:
+        return len(self._postings)
+
+    def add(self, number: int, line: bytes) -> None:
+        grams = set()
+        for run in _ASCII_RUN.findall(line.lower()):
+            grams.update(run[i:i + 3] for i in range(len(run) - 2))
+        postings = self._postings
+        for gram in grams:
+            posting = postings.get(gram)
+            if posting is None:
+                posting = postings[gram] = array("Q")
+            posting.append(number)
+
+    def prune(self, first: int) -> None:
+        """Forget line numbers below `first`."""
+        for gram in list(self._postings):
+            posting = self._postings[gram]
+            cut = bisect_left(posting, first)
+            if cut == len(posting):
+                del self._postings[gram]
+            elif cut:
+                del posting[:cut]
+        self.floor = first
+
+    def candidates(self, literals: Sequence[bytes], first: int) -> Optional[List[int]]:
+        """Lines at or after `first` that contain every literal's trigrams; None if the literals give none."""
+        grams = {lit[i:i + 3] for lit in literals for i in range(len(lit) - 2)}
+        if not grams:
+            return None
+        postings = []
+        for gram in grams:
+            posting = self._postings.get(gram)
+            if posting is None:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        start = bisect_left(postings[0], first)
+        result = postings[0][start:]
+        for posting in postings[1:]:
+            if not result:
+                break
+            keep = set(posting[bisect_left(posting, result[0]):])
+            result = array("Q", (n for n in result if n in keep))
+        return list(result)
+
+
+def required_literals(pattern: str, flags: int = 0) -> List[bytes]:
+    """Case-folded ASCII strings (3+ bytes) every match of `pattern` must contain; [] if unknown."""
+    try:
+        parsed = _sre_parse.parse(pattern, flags)
+    except Exception:
+        return []
+    out: List[bytes] = []
+
+    def walk(items: Iterable[Tuple[Any, Any]], flags: int) -> None:
+        # Unicode case-insensitive matching lets i, k and s match ı, K (Kelvin) and ſ, which the index can't see.
+        unsafe = "iksIKS" if flags & re.IGNORECASE and not flags & re.ASCII else ""
+        run: List[str] = []
+
+        def flush() -> None:
+            if len(run) >= 3:
+                out.append("".join(run).lower().encode("ascii"))
+            run.clear()
+
+        for op, arg in items:
+            name = str(op)
+            if name == "LITERAL" and arg < 128 and chr(arg) not in unsafe:
+                run.append(chr(arg))
+                continue
+            flush()
+            if name == "SUBPATTERN":
+                walk(arg[-1], (flags | arg[1]) & ~arg[2])
+            elif name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT") and arg[0] >= 1:
+                walk(arg[2], flags)
+            elif name == "ATOMIC_GROUP":
+                walk(arg, flags)
+            # Alternations, classes, optional parts and anchors require nothing we can index.
+        flush()
+
+    walk(parsed, parsed.state.flags)
+    return out
+
+
+@dataclass(frozen=True)
+class Hit:
+    """One matching line."""
+
+    surface_id: str
+    line: int  # line number within the surface's mirror
+    text: str
+    live: bool  # on the visible screen (may still change), not yet final scrollback
+
+
+class _Surface:
+    def __init__(self, surface_id: str, max_lines: int, max_bytes: int):
+        self.id = surface_id
+        self.ring = LineRing(max_lines, max_bytes)
+        self.index = TrigramIndex()
+        self.live: List[str] = []
+
+    def commit(self, lines: Iterable[str]) -> None:
+        ring = self.ring
+        for line in lines:
+            data = line.encode("utf-8", "surrogateescape")
+            self.index.add(ring.append(data), data)
+        if ring.first - self.index.floor > len(ring):
+            self.index.prune(ring.first)  # amortized: once per ring turnover
+
+    def anchor(self, n: int) -> List[str]:
+        return [line.decode("utf-8", "surrogateescape") for line in self.ring.tail(n)]
+
+
+class TerminalMirror:
+    """Local, incrementally synced copy of every terminal surface's text."""
+
+    def __init__(self, client: Optional[cmux] = None, window_lines: int = 200, live_lines: int = 50,
+                 anchor_lines: int = 8, max_fetch_lines: int = 100_000, max_lines: int = 100_000,
+                 max_bytes: int = 64 << 20):
+        self.client = client
+        self.window_lines = window_lines
+        self.live_lines = live_lines
+        self.anchor_lines = anchor_lines
+        self.max_fetch_lines = max_fetch_lines
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.stats: Dict[str, int] = {"syncs": 0, "requests": 0, "bytes_fetched": 0, "refetches": 0,
+                                      "lines_committed": 0, "resets": 0}
+        self._surfaces: Dict[str, _Surface] = {}
+
+    @property
+    def surfaces(self) -> List[str]:
+        return list(self._surfaces)
+
+    # -- feeding -------------------------------------------------------------
+
+    def _surface(self, surface_id: str) -> _Surface:
+        surface = self._surfaces.get(surface_id)
+        if surface is None:
+            surface = self._surfaces[surface_id] = _Surface(surface_id, self.max_lines, self.max_bytes)
+        return surface
+
+    def append(self, surface_id: str, lines: Iterable[str]) -> None:
+        """Add final lines (e.g. from a log stream) without alignment."""
+        surface = self._surface(surface_id)
+        before = surface.ring.next
+        surface.commit(lines)
+        self.stats["lines_committed"] += surface.ring.next - before
+
+    def feed(self, surface_id: str, text: str, complete: bool = True) -> bool:
+        """Merge a read_text result (the last lines of the surface, or all of them if `complete`).
+
+        Returns False when `text` doesn't reach back to what the mirror already
+        holds and isn't complete, so a wider read is needed.
+        """
+        surface = self._surface(surface_id)
+        lines = text.split("\n") if text else []
+        stable = max(0, len(lines) - self.live_lines)
+        start = 0
+        if not len(surface.ring) and not complete and stable:
+            return False  # first look at a long scrollback: fetch all of it once
+        if len(surface.ring):
+            anchor = surface.anchor(self.anchor_lines)
+            found = self._align(lines, anchor)
+            if found is None:
+                if not complete:
+                    return False
+                self.stats["resets"] += 1  # cleared, or scrolled past our anchor: keep what's there
+            else:
+                start = found
+        before = surface.ring.next
+        surface.commit(lines[start:stable])
+        surface.live = lines[max(start, stable):]
+        self.stats["lines_committed"] += surface.ring.next - before
+        return True
+
+    @staticmethod
+    def _align(lines: List[str], anchor: List[str]) -> Optional[int]:
+        """Index just past the last occurrence of `anchor` in `lines`."""
+        k = len(anchor)
+        last = anchor[-1]
+        for end in range(len(lines), k - 1, -1):
+            if lines[end - 1] == last and lines[end - k:end] == anchor:
+                return end
+        return None
+
+    def forget(self, surface_id: str) -> None:
+        self._surfaces.pop(surface_id, None)
+
+    # -- syncing -------------------------------------------------------------
+
+    def _list_surfaces(self) -> List[str]:
+        assert self.client is not None
+        workspaces = (self.client._call("workspace.list") or {}).get("workspaces") or []
+        results = self.client._call_many([("surface.list", {"workspace_id": ws["id"]}) for ws in workspaces])
+        self.stats["requests"] += 1 + len(workspaces)
+        return [str(s["id"]) for res in results for s in (res or {}).get("surfaces") or []
+                if s.get("type", "terminal") == "terminal"]
+
+    def sync(self, surfaces: Optional[Sequence[str]] = None) -> None:
+        """Bring the mirror up to date with the given surfaces (default: every terminal, dropping closed ones)."""
+        assert self.client is not None, "sync() needs a client; use feed() otherwise"
+        self.stats["syncs"] += 1
+        if surfaces is None:
+            surfaces = self._list_surfaces()
+            for gone in set(self._surfaces) - set(surfaces):
+                self.forget(gone)
+        window = self.window_lines
+        pending = list(surfaces)
+        while pending:
+            calls = [("surface.read_text", {"surface_id": sid, "lines": window}) for sid in pending]
+            results = self.client._call_many(calls, return_exceptions=True)
+            self.stats["requests"] += len(calls)
+            retry = []
+            for sid, res in zip(pending, results):
+                if isinstance(res, Exception):
+                    continue  # closed mid-sync, or not a terminal
+                text = str((res or {}).get("text") or "")
+                self.stats["bytes_fetched"] += len(text.encode("utf-8"))
+                complete = window >= self.max_fetch_lines or text.count("\n") + 1 < window
+                if not self.feed(sid, text, complete):
+                    retry.append(sid)
+            if retry:
+                self.stats["refetches"] += len(retry)
+                window = min(self.max_fetch_lines, window * 4)
+            pending = retry
+
+    # -- search --------------------------------------------------------------
+
+    def search(self, pattern: str, flags: int = 0, surfaces: Optional[Sequence[str]] = None,
+               limit: Optional[int] = None) -> List[Hit]:
+        """Lines matching the regex `pattern`, oldest first within each surface."""
+        regex = re.compile(pattern, flags)
+        literals = required_literals(pattern, flags)
+        return self._search(lambda text: regex.search(text) is not None, literals, None, surfaces, limit)
+
+    def find(self, needle: str, surfaces: Optional[Sequence[str]] = None, limit: Optional[int] = None) -> List[Hit]:
+        """Lines containing `needle`."""
+        literals = [run.lower() for run in _ASCII_RUN.findall(needle.encode("utf-8", "surrogateescape"))]
+        return self._search(lambda text: needle in text, literals, needle, surfaces, limit)
+
+    def _search(self, test, literals: List[bytes], needle: Optional[str], surfaces: Optional[Sequence[str]],
+                limit: Optional[int]) -> List[Hit]:
+        hits: List[Hit] = []
+        for sid in (self.surfaces if surfaces is None else surfaces):
+            surface = self._surfaces.get(sid)
+            if surface is None:
+                continue
+            ring = surface.ring
+            numbers: Iterable[int]
+            candidates = surface.index.candidates(literals, ring.first) if literals else None
+            if candidates is not None:
+                numbers = candidates
+            elif needle is not None:
+                numbers = ring.find_all(needle.encode("utf-8", "surrogateescape"))
+            else:
+                numbers = range(ring.first, ring.next)
+            for number in numbers:
+                text = ring.get(number).decode("utf-8", "surrogateescape")
+                if test(text):
+                    hits.append(Hit(sid, number, text, False))
+                    if limit is not None and len(hits) >= limit:
+                        return hits
+            for i, text in enumerate(surface.live):
+                if test(text):
+                    hits.append(Hit(sid, ring.next + i, text, True))
+                    if limit is not None and len(hits) >= limit:
+                        return hits
+        return hits
+
+    def lines(self, surface_id: str, last: Optional[int] = None) -> List[str]:
+        """The mirrored text of one surface: final lines then the live screen, optionally only the last ones."""
+        surface = self._surfaces.get(surface_id)
+        if surface is None:
+            return []
+        ring = surface.ring
+        out = [line.decode("utf-8", "surrogateescape") for line in ring.tail(len(ring) if last is None else last)]
+        out += surface.live
+        return out if last is None else out[max(0, len(out) - last):]
+
+    def footprint(self) -> Dict[str, int]:
+        """Lines, text bytes and distinct trigrams held across all surfaces."""
+        return {
+            "surfaces": len(self._surfaces),
+            "lines": sum(len(s.ring) for s in self._surfaces.values()),
+            "bytes": sum(s.ring.nbytes for s in self._surfaces.values()),
+            "trigrams": sum(len(s.index) for s in self._surfaces.values()),
+        }
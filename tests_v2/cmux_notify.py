@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Minimal, fast-start cmux notifier for agent hooks.
+
+Usage:
+    python3 cmux_notify.py TITLE [SUBTITLE] [BODY]
+
+    # or, from Python:
+    import cmux_notify
+    cmux_notify.notify("Claude", body="Waiting for input")
+
+Hooks run on every agent event, so this deliberately avoids everything the
+full clients do at import time: no json/re/glob/base64 imports, no socket
+discovery and no connect probes. It reads CMUX_SOCKET_PATH (or CMUX_SOCKET),
+writes one v2 `notification.create` line with a single sendall() and exits
+without waiting for the response.
+
+Keep the imports here to `os`, `sys` and `_socket`;
+tests_v2/test_cmux_notify_startup.py enforces the startup budget.
+"""
+
+import os
+import sys
+
+# The C module directly: `socket.py` drags in enum/selectors/array and costs
+# more than the rest of this script combined.
+import _socket
+
+_ESCAPES = {'"': '\\"', "\\": "\\\\", "\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+def _json_str(value: str) -> str:
+    # Tiny JSON string encoder so we don't pay for importing `json`.
+    out = []
+    for ch in value:
+        esc = _ESCAPES.get(ch)
+        if esc is not None:
+            out.append(esc)
+        elif ch < " ":
+            out.append("\\u%04x" % ord(ch))
+        else:
+            out.append(ch)
+    return '"' + "".join(out) + '"'
+
+
+def build_request(title: str, subtitle: str = "", body: str = "", workspace_id: str = "") -> bytes:
+    params = '"title":%s,"subtitle":%s,"body":%s' % (_json_str(title), _json_str(subtitle), _json_str(body))
+    if workspace_id:
+        params += ',"workspace_id":%s' % _json_str(workspace_id)
+    line = '{"id":1,"method":"notification.create","params":{%s}}\n' % params
+    return line.encode("utf-8")
+
+
+def notify(title: str, subtitle: str = "", body: str = "", socket_path: str = "", timeout_s: float = 1.0) -> bool:
+    """Send one notification. Returns False (never raises) if cmux is unreachable."""
+    path = socket_path or os.environ.get("CMUX_SOCKET_PATH") or os.environ.get("CMUX_SOCKET")
+    if not path:
+        return False
+    # Attribute the notification to the hook's own workspace when known.
+    workspace_id = os.environ.get("CMUX_WORKSPACE_ID") or os.environ.get("CMUX_TAB_ID") or ""
+    payload = build_request(title, subtitle, body, workspace_id)
+
+    s = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    try:
+        s.settimeout(timeout_s)
+        s.connect(path)
+        # Fire-and-forget, like the shell integration's `ncat --send-only`:
+        # the server still processes the line after we close.
+        s.sendall(payload)
+        return True
+    except OSError:
+        return False
+    finally:
+        s.close()
+
+
+def main(argv: list) -> int:
+    if not argv or argv[0] in ("-h", "--help"):
+        sys.stderr.write("usage: cmux_notify.py TITLE [SUBTITLE] [BODY]\n")
+        return 2
+    title = argv[0]
+    subtitle = argv[1] if len(argv) > 1 else ""
+    body = argv[2] if len(argv) > 2 else ""
+    return 0 if notify(title, subtitle, body) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
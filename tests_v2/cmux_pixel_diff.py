@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""Client-side pixel diffs for panel snapshots and window screenshots.
+
+`debug.panel_snapshot` only reports one number, `changed_pixels`, against the
+previous snapshot of the whole panel. This module diffs any two frames on the
+client, per region of interest, with NumPy:
+
+    from cmux_pixel_diff import Differ, Region, caret_cell, load_snapshot
+
+    differ = Differ(regions=[caret_cell(col, row, cell_w, cell_h)], tolerance=8)
+    prev = load_snapshot(c.panel_snapshot(panel_id, raw=True))
+    cur = load_snapshot(c.panel_snapshot(panel_id, raw=True))
+    d = differ.diff(prev, cur)["caret"]
+    d.changed_pixels, d.bbox, d.max_delta
+
+With `raw: true`, panel snapshots also write the raw RGBA bytes next to the
+PNG (`raw_path`), which `load_snapshot` memory-maps, so loading a frame costs
+no decode and no copy. Raw pixels have premultiplied alpha and the PNG has
+straight alpha, so wherever alpha < 255 their RGB differs: diff raw frames
+with raw frames. PNGs (window screenshots, older builds) are decoded with
+zlib and NumPy; that path is correct but much slower.
+
+Tolerance is either an int, compared against |dR|+|dG|+|dB| like the server
+does (tolerance=8 reproduces the server's `changed_pixels`), or an (r, g, b)
+tuple, where a pixel counts as changed if any channel moves by more than its
+own limit. Alpha is ignored.
+
+The Differ keeps scratch buffers per frame shape, so diffing a stream of
+same-sized frames (blink and latency probes) allocates nothing per frame.
+"""
+
+import argparse
+import json
+import struct
+import sys
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+SERVER_TOLERANCE = 8
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+Tolerance = Union[int, Tuple[int, int, int]]
+
+
+@dataclass(frozen=True)
+class Region:
+    """A named rectangle in frame pixels; (0, 0) is the top-left corner."""
+
+    name: str
+    x: int
+    y: int
+    width: int
+    height: int
+
+    def clip(self, width: int, height: int) -> "Region":
+        x0, y0 = max(0, self.x), max(0, self.y)
+        x1, y1 = min(width, self.x + self.width), min(height, self.y + self.height)
+        return Region(self.name, x0, y0, max(0, x1 - x0), max(0, y1 - y0))
+
+    @property
+    def slices(self) -> Tuple[slice, slice]:
+        return slice(self.y, self.y + self.height), slice(self.x, self.x + self.width)
+
+    @classmethod
+    def parse(cls, spec: str) -> "Region":
+        """`name:x,y,w,h`, as taken by the CLI."""
+        name, _, rect = spec.partition(":")
+        x, y, w, h = (int(v) for v in rect.split(","))
+        return cls(name, x, y, w, h)
+
+
+def caret_cell(col: int, row: int, cell_width: float, cell_height: float, pad: int = 1,
+               origin: Tuple[int, int] = (0, 0), name: str = "caret") -> Region:
+    """The terminal cell at (col, row), grown by `pad` pixels to catch antialiasing."""
+    x = int(origin[0] + col * cell_width) - pad
+    y = int(origin[1] + row * cell_height) - pad
+    return Region(name, x, y, int(round(cell_width)) + 2 * pad, int(round(cell_height)) + 2 * pad)
+
+
+def top_band(height: int, width: int = 1 << 30, name: str = "tab_bar") -> Region:
+    """A strip along the top of the frame, e.g. the tab bar of a window screenshot."""
+    return Region(name, 0, 0, width, height)
+
+
+@dataclass
+class Frame:
+    """An RGBA frame as a (height, width, 4) uint8 array. Memory-mapped when loaded from raw."""
+
+    pixels: np.ndarray
+    path: Optional[Path] = None
+
+    @property
+    def width(self) -> int:
+        return int(self.pixels.shape[1])
+
+    @property
+    def height(self) -> int:
+        return int(self.pixels.shape[0])
+
+    def crop(self, region: Region) -> np.ndarray:
+        return self.pixels[region.clip(self.width, self.height).slices]
+
+
+@dataclass
+class RegionDiff:
+    name: str
+    changed_pixels: int
+    total_pixels: int
+    bbox: Optional[Tuple[int, int, int, int]]  # (x0, y0, x1, y1), end-exclusive, frame coordinates
+    max_delta: Tuple[int, int, int] = (0, 0, 0)
+
+    @property
+    def ratio(self) -> float:
+        return self.changed_pixels / self.total_pixels if self.total_pixels else 0.0
+
+    @property
+    def changed(self) -> bool:
+        return self.changed_pixels > 0
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "changed_pixels": self.changed_pixels,
+            "total_pixels": self.total_pixels,
+            "ratio": round(self.ratio, 6),
+            "bbox": list(self.bbox) if self.bbox else None,
+            "max_delta": list(self.max_delta),
+        }
+
+
+# ---------------------------------------------------------------------------
+# Loading
+# ---------------------------------------------------------------------------
+
+
+def load_raw(path: Union[str, Path], width: int, height: int, bytes_per_row: Optional[int] = None) -> Frame:
+    """Memory-map a raw RGBA file (as written next to panel snapshot PNGs)."""
+    stride = bytes_per_row or width * 4
+    data = np.memmap(path, dtype=np.uint8, mode="r", shape=(height, stride))
+    return Frame(data[:, : width * 4].reshape(height, width, 4), Path(path))
+
+
+def load_png(path: Union[str, Path]) -> Frame:
+    """Decode an 8-bit RGB/RGBA non-interlaced PNG (what NSBitmapImageRep writes)."""
+    data = Path(path).read_bytes()
+    if not data.startswith(PNG_SIGNATURE):
+        raise ValueError(f"{path}: not a PNG")
+    pos, idat = len(PNG_SIGNATURE), []
+    width = height = color_type = 0
+    while pos < len(data):
+        length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        chunk = data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+        if kind == b"IHDR":
+            width, height, depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", chunk)
+            if depth != 8 or color_type not in (2, 6) or interlace:
+                raise ValueError(f"{path}: unsupported PNG (depth={depth} color={color_type} interlace={interlace})")
+        elif kind == b"IDAT":
+            idat.append(chunk)
+        elif kind == b"IEND":
+            break
+    bpp = 4 if color_type == 6 else 3
+    raw = np.frombuffer(zlib.decompress(b"".join(idat)), dtype=np.uint8).reshape(height, 1 + width * bpp)
+    rows = _unfilter(raw[:, 1:], raw[:, 0], bpp)
+    pixels = rows.reshape(height, width, bpp)
+    if bpp == 3:
+        pixels = np.concatenate([pixels, np.full((height, width, 1), 255, np.uint8)], axis=2)
+    return Frame(pixels, Path(path))
+
+
+def _unfilter(rows: np.ndarray, filters: np.ndarray, bpp: int) -> np.ndarray:
+    if filters.size and int(filters.max()) > 4:
+        raise ValueError(f"unknown PNG filter {int(filters.max())}")
+    if filters.size and int(filters.max()) > 2:
+        return _unfilter_diagonals(rows, filters, bpp)
+    out = np.empty_like(rows)
+    prior = np.zeros(rows.shape[1], dtype=np.uint8)
+    for y, kind in enumerate(filters):
+        line = rows[y]
+        if kind == 0:
+            out[y] = line
+        elif kind == 1:  # Sub: running sum per channel, wrapping at 256
+            out[y] = np.cumsum(line.reshape(-1, bpp), axis=0, dtype=np.uint8).reshape(-1)
+        else:  # Up
+            np.add(line, prior, out=out[y])
+        prior = out[y]
+    return out
+
+
+def _unfilter_diagonals(rows: np.ndarray, filters: np.ndarray, bpp: int) -> np.ndarray:
+    """Undo any mix of filters, one anti-diagonal of pixels at a time.
+
+    Average and Paeth predict from the reconstructed left pixel, so a row
+    cannot be done in one step. A pixel only needs its left, upper and
+    upper-left neighbours, though, so every pixel with the same x + y can be
+    reconstructed together: width + height steps instead of one per byte.
+    """
+    height, stride = rows.shape
+    width = stride // bpp
+    filtered = rows.reshape(height, width, bpp).astype(np.int16)
+    # One pixel of zero padding above and to the left stands in for "outside the image".
+    out = np.zeros((height + 1, width + 1, bpp), dtype=np.int16)
+    kinds = filters.astype(np.int16)
+    for k in range(height + width - 1):
+        ys = np.arange(max(0, k - width + 1), min(height, k + 1))
+        xs = k - ys
+        a = out[ys + 1, xs]
+        b = out[ys, xs + 1]
+        c = out[ys, xs]
+        kind = kinds[ys][:, None]
+        p = a + b - c
+        pa, pb, pc = np.abs(p - a), np.abs(p - b), np.abs(p - c)
+        pred = np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c))  # Paeth
+        pred = np.where(kind == 3, (a + b) >> 1, pred)
+        pred = np.where(kind == 2, b, pred)
+        pred = np.where(kind == 1, a, pred)
+        pred = np.where(kind == 0, 0, pred)
+        out[ys + 1, xs + 1] = (filtered[ys, xs] + pred) & 0xFF
+    return out[1:, 1:].astype(np.uint8).reshape(height, stride)
+
+
+def save_png(path: Union[str, Path], pixels: np.ndarray, level: int = 6) -> Path:
+    """Write a (height, width, 3 or 4) uint8 array as a PNG (Up filter, which suits UI captures)."""
+    height, width, channels = pixels.shape
+    if channels not in (3, 4):
+        raise ValueError(f"expected RGB or RGBA pixels, got {channels} channels")
+    rows = np.ascontiguousarray(pixels, dtype=np.uint8).reshape(height, width * channels)
+    filtered = np.empty((height, 1 + width * channels), dtype=np.uint8)
+    filtered[:, 0] = 2
+    filtered[0, 1:] = rows[0]
+    np.subtract(rows[1:], rows[:-1], out=filtered[1:, 1:])
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 6 if channels == 4 else 2, 0, 0, 0)
+    path = Path(path)
+    path.write_bytes(PNG_SIGNATURE + chunk(b"IHDR", header)
+                     + chunk(b"IDAT", zlib.compress(filtered.tobytes(), level)) + chunk(b"IEND", b""))
+    return path
+
+
+def load_frame(path: Union[str, Path], width: Optional[int] = None, height: Optional[int] = None) -> Frame:
+    """Load a .png, or a .rgba given its dimensions."""
+    path = Path(path)
+    if path.suffix == ".rgba":
+        if not width or not height:
+            raise ValueError(f"{path}: raw frames need width and height")
+        return load_raw(path, width, height)
+    return load_png(path)
+
+
+def load_snapshot(info: dict) -> Frame:
+    """Load the frame behind a `panel_snapshot` (or `screenshot`) result, preferring the raw file."""
+    raw = info.get("raw_path")
+    width, height = int(info.get("width") or 0), int(info.get("height") or 0)
+    if raw and width and height and Path(raw).exists():
+        return load_raw(raw, width, height, info.get("bytes_per_row"))
+    path = info.get("path")
+    if not path:
+        raise ValueError(f"snapshot has no path: {info}")
+    return load_png(path)
+
+
+# ---------------------------------------------------------------------------
+# Diffing
+# ---------------------------------------------------------------------------
+
+
+class Differ:
+    """Diffs frames of any size; reuses scratch buffers across frames.
+
+    Each area is first compared as whole 32-bit pixels, which is cheap, and
+    the per-channel work then only runs over the bounding box of the pixels
+    that differ at all. A blinking caret costs a cell, not a panel.
+    """
+
+    def __init__(self, regions: Sequence[Region] = (), tolerance: Tolerance = SERVER_TOLERANCE,
+                 full_frame: bool = True):
+        self.regions = list(regions)
+        self.tolerance = tolerance
+        self.full_frame = full_frame
+        self._size = 0
+        self._hi = np.empty(0, dtype=np.uint8)
+        self._lo = np.empty(0, dtype=np.uint8)
+        self._score = np.empty(0, dtype=np.uint16)
+        self._mask = np.empty(0, dtype=bool)
+
+    def _scratch(self, height: int, width: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        n = height * width
+        if n > self._size:
+            self._size = n
+            self._hi = np.empty(n * 4, dtype=np.uint8)
+            self._lo = np.empty(n * 4, dtype=np.uint8)
+            self._score = np.empty(n, dtype=np.uint16)
+            self._mask = np.empty(n, dtype=bool)
+        return (self._hi[: n * 4].reshape(height, width, 4), self._lo[: n * 4].reshape(height, width, 4),
+                self._score[:n].reshape(height, width), self._mask[:n].reshape(height, width))
+
+    def _areas(self, width: int, height: int) -> List[Region]:
+        areas = [r.clip(width, height) for r in self.regions]
+        if self.full_frame:
+            areas.insert(0, Region("full", 0, 0, width, height))
+        return areas
+
+    def diff(self, before: Union[Frame, np.ndarray], after: Union[Frame, np.ndarray]) -> Dict[str, RegionDiff]:
+        a = before.pixels if isinstance(before, Frame) else before
+        b = after.pixels if isinstance(after, Frame) else after
+        if a.shape != b.shape:
+            raise ValueError(f"frame sizes differ: {a.shape[1]}x{a.shape[0]} vs {b.shape[1]}x{b.shape[0]}")
+        height, width = a.shape[:2]
+        areas = self._areas(width, height)
+
+        # With a full-frame area, one whole-frame pixel compare serves every region.
+        touched = _pixels_differ(a, b) if self.full_frame else None
+        out: Dict[str, RegionDiff] = {}
+        for area in areas:
+            sl = area.slices
+            differs = touched[sl] if touched is not None else _pixels_differ(a[sl], b[sl])
+            rows = np.flatnonzero(differs.any(axis=1))
+            if not len(rows):
+                out[area.name] = RegionDiff(area.name, 0, area.width * area.height, None)
+                continue
+            cols = np.flatnonzero(differs.any(axis=0))
+            box = Region(area.name, area.x + int(cols[0]), area.y + int(rows[0]),
+                         int(cols[-1] - cols[0]) + 1, int(rows[-1] - rows[0]) + 1)
+            out[area.name] = self._diff_box(a[box.slices], b[box.slices], box, area.width * area.height)
+        return out
+
+    def _diff_box(self, a: np.ndarray, b: np.ndarray, box: Region, total: int) -> RegionDiff:
+        delta, lo, score, mask = self._scratch(box.height, box.width)
+        # |a - b| in uint8 without widening: max - min.
+        np.maximum(a, b, out=delta)
+        np.minimum(a, b, out=lo)
+        np.subtract(delta, lo, out=delta)
+        if isinstance(self.tolerance, int):
+            np.add(delta[..., 0], delta[..., 1], out=score, dtype=np.uint16)
+            np.add(score, delta[..., 2], out=score, dtype=np.uint16)
+            np.greater(score, self.tolerance, out=mask)
+        else:
+            np.greater(delta[..., 0], self.tolerance[0], out=mask)
+            for channel in (1, 2):
+                np.logical_or(mask, delta[..., channel] > self.tolerance[channel], out=mask)
+
+        changed = int(np.count_nonzero(mask))
+        if not changed:
+            return RegionDiff(box.name, 0, total, None)
+        rows = np.flatnonzero(mask.any(axis=1))
+        cols = np.flatnonzero(mask.any(axis=0))
+        bbox = (box.x + int(cols[0]), box.y + int(rows[0]), box.x + int(cols[-1]) + 1, box.y + int(rows[-1]) + 1)
+        max_delta = tuple(int(delta[..., c].max(initial=0, where=mask)) for c in range(3))
+        return RegionDiff(box.name, changed, total, bbox, max_delta)  # type: ignore[arg-type]
+
+    def diff_sequence(self, frames: Iterable[Union[Frame, np.ndarray]]) -> List[Dict[str, RegionDiff]]:
+        """Diffs of each frame against the one before it (e.g. a blink probe)."""
+        out: List[Dict[str, RegionDiff]] = []
+        previous = None
+        for frame in frames:
+            if previous is not None:
+                out.append(self.diff(previous, frame))
+            previous = frame
+        return out
+
+
+def _pixels_differ(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """(height, width) mask of pixels whose RGBA bytes differ at all."""
+    try:
+        return a.view(np.uint32)[..., 0] != b.view(np.uint32)[..., 0]
+    except ValueError:  # rows not contiguous enough to reinterpret
+        return np.any(a != b, axis=2)
+
+
+def changed_pixels(before: Union[Frame, np.ndarray], after: Union[Frame, np.ndarray],
+                   tolerance: int = SERVER_TOLERANCE) -> int:
+    """The server's `changed_pixels` for two frames."""
+    return Differ(tolerance=tolerance).diff(before, after)["full"].changed_pixels
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Diff two frames (.png, or .rgba with --size)")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--size", help="WxH, required for .rgba inputs")
+    parser.add_argument("--region", action="append", default=[], help="name:x,y,w,h (repeatable)")
+    parser.add_argument("--tolerance", default=str(SERVER_TOLERANCE),
+                        help="sum-of-channels threshold, or r,g,b per-channel thresholds")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    width = height = None
+    if args.size:
+        width, height = (int(v) for v in args.size.lower().split("x"))
+    tol_values = [int(v) for v in args.tolerance.split(",")]
+    tolerance: Tolerance = tol_values[0] if len(tol_values) == 1 else tuple(tol_values)  # type: ignore[assignment]
+    differ = Differ([Region.parse(r) for r in args.region], tolerance=tolerance)
+    result = differ.diff(load_frame(args.before, width, height), load_frame(args.after, width, height))
+
+    if args.json:
+        print(json.dumps({name: d.to_dict() for name, d in result.items()}, indent=2))
+    else:
+        for name, d in result.items():
+            print(f"{name}: {d.changed_pixels}/{d.total_pixels} changed ({d.ratio:.2%}) bbox={d.bbox} "
+                  f"max_delta={d.max_delta}")
+    return 1 if any(d.changed for d in result.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
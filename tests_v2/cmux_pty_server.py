@@ -0,0 +1,619 @@
+#!/usr/bin/env python3
+"""Stand-in cmux v2 socket server whose terminal surfaces are real PTYs.
+
+Every terminal surface runs a shell on a pseudo-terminal, so socket tests
+that type commands and look for marker files or screen text work without
+the app, on Linux, and with as many surfaces as the machine has PTYs:
+
+    python3 tests_v2/cmux_pty_server.py --listen /tmp/cmux-pty.sock &
+    CMUX_SOCKET_PATH=/tmp/cmux-pty.sock python3 tests_v2/test_ctrl_socket.py
+
+    # or in-process:
+    with PtyServer(path) as server:
+        with cmux(path) as c: ...
+
+It starts with one workspace holding one terminal. `workspace.create` and
+`surface.create` spawn a shell (bash --norc when available, else sh) with
+the same CMUX_* environment the app sets; `surface.send_text` and
+`surface.send_key` write to its PTY the way the app's key events would
+(newline is Return, "ctrl-c" is ^C); `surface.read_text` renders the
+screen and scrollback through cmux_vt.Screen, with the app's `scrollback`
+and `lines` parameters. One thread reads every PTY. Requests run one at a
+time, like handlers on the app's main thread; reads of the screen model
+don't block on it.
+
+Workspaces, surfaces and refs follow the app's result shapes closely enough
+for cmux.py; there is one window and one pane per workspace, and browser
+surfaces are refused with `not_supported`. Checks of app-only behavior
+(TERMINFO and resource paths, rendering, the CLI binary) still need the app.
+"""
+
+import base64
+import fcntl
+import json
+import os
+import selectors
+import shutil
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import termios
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from cmux_vt import Screen
+
+_KEYS = {
+    "ctrl-c": b"\x03", "ctrl+c": b"\x03", "sigint": b"\x03",
+    "ctrl-d": b"\x04", "ctrl+d": b"\x04", "eof": b"\x04",
+    "ctrl-z": b"\x1a", "ctrl+z": b"\x1a", "sigtstp": b"\x1a",
+    "ctrl-\\": b"\x1c", "ctrl+\\": b"\x1c", "sigquit": b"\x1c",
+    "enter": b"\r", "return": b"\r", "tab": b"\t", "escape": b"\x1b", "esc": b"\x1b", "backspace": b"\x7f",
+}
+# surface.send_text turns these into key events, as the app does.
+_TEXT_CONTROLS = {"\n": "\r", "\r": "\r", "\t": "\t", "\x1b": "\x1b", "\x7f": "\x7f"}
+# Handlers that take the main lock only for the model lookup.
+_OFF_MAIN = frozenset({"surface.read_text"})
+
+
+def key_bytes(name: str) -> Optional[bytes]:
+    key = name.lower()
+    if key in _KEYS:
+        return _KEYS[key]
+    if key[:5] in ("ctrl-", "ctrl+") and len(key) == 6 and "a" <= key[5] <= "z":
+        return bytes([ord(key[5]) - ord("a") + 1])
+    return None
+
+
+def default_shell() -> List[str]:
+    override = os.environ.get("CMUX_PTY_SHELL")
+    if override:
+        return [override]
+    bash = shutil.which("bash")
+    if bash:
+        return [bash, "--norc", "--noprofile", "-i"]
+    return ["/bin/sh", "-i"]
+
+
+def _default_job_signals() -> None:
+    """Undo SIGINT/SIGQUIT being ignored (as for `server &`), which shells would pass on to every job.
+
+    A no-op handler keeps this process ignoring them, but exec resets handled
+    signals to the default, so shells and their jobs get ^C and ^\\ again.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    for sig in (signal.SIGINT, signal.SIGQUIT):
+        if signal.getsignal(sig) == signal.SIG_IGN:
+            signal.signal(sig, lambda signum, frame: None)
+
+
+class _Error(Exception):
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+class _PtyLoop:
+    """One thread reading every PTY master and feeding its screen."""
+
+    def __init__(self):
+        self._sel = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        self._sel.register(self._wake_r, selectors.EVENT_READ, None)
+        self._added: List["PtySurface"] = []
+        self._removed: List["PtySurface"] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        threading.Thread(target=self._run, name="cmux-pty-io", daemon=True).start()
+
+    def add(self, surface: "PtySurface") -> None:
+        with self._lock:
+            self._added.append(surface)
+        os.write(self._wake_w, b"x")
+
+    def remove(self, surface: "PtySurface") -> None:
+        """Stop reading `surface` and close its master; the loop thread owns the fd from here."""
+        with self._lock:
+            self._removed.append(surface)
+        os.write(self._wake_w, b"x")
+
+    def close(self) -> None:
+        self._closed = True
+        os.write(self._wake_w, b"x")
+
+    def _drain(self) -> None:
+        with self._lock:
+            added, self._added = self._added, []
+            removed, self._removed = self._removed, []
+        for s in added:
+            self._sel.register(s.master, selectors.EVENT_READ, s)
+        for s in removed:
+            if not s.exited.is_set():
+                self._sel.unregister(s.master)
+                s.exited.set()
+            os.close(s.master)
+
+    def _run(self) -> None:
+        while not self._closed:
+            for key, _ in self._sel.select(1.0):
+                surface = key.data
+                if surface is None:
+                    try:
+                        os.read(self._wake_r, 4096)
+                    except BlockingIOError:
+                        pass
+                    self._drain()
+                    break  # the ready list may name fds just closed
+                try:
+                    data = os.read(surface.master, 65536)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    data = b""  # EIO once the shell and everything it started have exited
+                if data:
+                    surface.feed(data)
+                else:
+                    self._sel.unregister(surface.master)
+                    surface.exited.set()
+        self._drain()
+        for key in list(self._sel.get_map().values()):
+            if key.data is not None:
+                os.close(key.fileobj)
+        self._sel.close()
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+
+
+class PtySurface:
+    """A shell on a pseudo-terminal, rendered into a Screen."""
+
+    def __init__(self, loop: _PtyLoop, argv: List[str], env: Dict[str, str], cwd: Optional[str] = None,
+                 cols: int = 80, rows: int = 24, scrollback: int = 10000):
+        self.id = str(uuid.uuid4()).upper()
+        self.screen = Screen(cols, rows, scrollback)
+        self.lock = threading.Lock()
+        self.exited = threading.Event()
+        env = dict(env, CMUX_SURFACE_ID=self.id, COLUMNS=str(cols), LINES=str(rows))
+        master, slave = os.openpty()
+        fcntl.ioctl(slave, termios.TIOCSWINSZ, struct.pack("HHHH", rows, cols, 0, 0))
+
+        def controlling_tty() -> None:
+            fcntl.ioctl(0, termios.TIOCSCTTY, 0)  # so ^C reaches the foreground job
+
+        self.proc = subprocess.Popen(argv, stdin=slave, stdout=slave, stderr=slave, cwd=cwd, env=env,
+                                     start_new_session=True, preexec_fn=controlling_tty)
+        os.close(slave)
+        os.set_blocking(master, False)
+        self.master = master
+        self._loop = loop
+        loop.add(self)
+
+    def feed(self, data: bytes) -> None:
+        with self.lock:
+            self.screen.feed(data)
+            replies, self.screen.replies = self.screen.replies, []
+        for reply in replies:
+            try:
+                self.write(reply, timeout_s=0.5)
+            except _Error:
+                pass  # a program that asked and stopped reading doesn't get its answer
+
+    def write(self, data: bytes, timeout_s: float = 5.0) -> None:
+        deadline = time.monotonic() + timeout_s
+        while data:
+            try:
+                n = os.write(self.master, data)
+                data = data[n:]
+            except BlockingIOError:
+                # The program isn't reading; its input queue is full.
+                if time.monotonic() > deadline:
+                    raise _Error("timeout", "Terminal is not reading input")
+                time.sleep(0.005)
+            except OSError as e:
+                raise _Error("internal_error", f"Terminal write failed: {e}")
+
+    def text(self, scrollback: bool = False, lines: Optional[int] = None) -> str:
+        with self.lock:
+            return self.screen.text(scrollback, lines)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.screen.clear()
+
+    def close(self) -> None:
+        try:
+            os.killpg(self.proc.pid, signal.SIGHUP)
+        except OSError:
+            pass
+        try:
+            self.proc.wait(2.0)
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(self.proc.pid, signal.SIGKILL)
+            except OSError:
+                pass
+            self.proc.wait()
+        self._loop.remove(self)
+
+
+class _Workspace:
+    def __init__(self, title: str):
+        self.id = str(uuid.uuid4()).upper()
+        self.pane_id = str(uuid.uuid4()).upper()
+        self.title = title
+        self.surfaces: List[PtySurface] = []
+        self.focused: Optional[PtySurface] = None
+
+
+class PtyServer:
+    """Serves the v2 protocol on `listen_path`; terminals are shells on PTYs."""
+
+    def __init__(self, listen_path: str, shell: Optional[List[str]] = None, cwd: Optional[str] = None,
+                 cols: int = 80, rows: int = 24, scrollback: int = 10000):
+        self.listen_path = listen_path
+        self.shell = shell or default_shell()
+        self.cwd = cwd
+        self.cols = cols
+        self.rows = rows
+        self.scrollback = scrollback
+        self.window_id = str(uuid.uuid4()).upper()
+        self.workspaces: List[_Workspace] = []
+        self.selected: Optional[_Workspace] = None
+        self._main = threading.Lock()  # the app runs v2 handlers on its main thread
+        self._refs: Dict[str, str] = {}  # ref -> uuid
+        self._ref_of: Dict[str, str] = {}  # uuid -> ref
+        self._ordinals: Dict[str, int] = {}
+        self._loop: Optional[_PtyLoop] = None
+        self._srv: Optional[socket.socket] = None
+        self._methods: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+            "system.ping": lambda p: {"pong": True},
+            "system.capabilities": lambda p: {"methods": sorted(self._methods)},
+            "system.identify": self._identify,
+            "window.list": lambda p: {"windows": [dict(self._window(), index=0, focused=True,
+                                                       workspace_count=len(self.workspaces))]},
+            "window.current": lambda p: self._window(),
+            "workspace.list": self._workspace_list,
+            "workspace.create": self._workspace_create,
+            "workspace.select": self._workspace_select,
+            "workspace.current": lambda p: self._workspace_ids(self._workspace(p)),
+            "workspace.rename": self._workspace_rename,
+            "workspace.close": self._workspace_close,
+            "pane.list": self._pane_list,
+            "surface.list": self._surface_list,
+            "surface.current": self._surface_current,
+            "surface.create": self._surface_create,
+            "surface.focus": self._surface_focus,
+            "surface.close": self._surface_close,
+            "surface.send_text": self._send_text,
+            "surface.send_key": self._send_key,
+            "surface.read_text": self._read_text,
+            "surface.clear_history": self._clear_history,
+        }
+
+    # -- lifecycle -----------------------------------------------------------
+
+    def start(self) -> "PtyServer":
+        _default_job_signals()
+        self._loop = _PtyLoop()
+        with self._main:
+            self._new_workspace(select=True)
+        try:
+            os.unlink(self.listen_path)
+        except FileNotFoundError:
+            pass
+        srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Owner-only from the start: anyone who can connect can type into the shells.
+        old_umask = os.umask(0o177)
+        try:
+            srv.bind(self.listen_path)
+        finally:
+            os.umask(old_umask)
+        srv.listen(64)
+        self._srv = srv
+        threading.Thread(target=self._accept, name="cmux-pty-accept", daemon=True).start()
+        return self
+
+    def close(self) -> None:
+        if self._srv is not None:
+            self._srv.close()
+            self._srv = None
+            try:
+                os.unlink(self.listen_path)
+            except FileNotFoundError:
+                pass
+        with self._main:
+            surfaces = [s for ws in self.workspaces for s in ws.surfaces]
+            self.workspaces, self.selected = [], None
+        for surface in surfaces:
+            surface.close()
+        if self._loop is not None:
+            self._loop.close()
+            self._loop = None
+
+    def __enter__(self) -> "PtyServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def serve_forever(self) -> None:
+        self.start()
+        try:
+            while self._srv is not None:
+                time.sleep(1.0)
+        finally:
+            self.close()
+
+    # -- protocol ------------------------------------------------------------
+
+    def _accept(self) -> None:
+        while True:
+            srv = self._srv
+            if srv is None:
+                return
+            try:
+                conn, _ = srv.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: socket.socket) -> None:
+        try:
+            with conn, conn.makefile("rwb") as f:
+                for line in f:
+                    if line.strip():
+                        f.write(self.handle_line(line))
+                        f.flush()
+        except OSError:
+            pass
+
+    def handle_line(self, line: bytes) -> bytes:
+        try:
+            req = json.loads(line)
+            if not isinstance(req, dict) or not isinstance(req.get("method"), str):
+                raise ValueError
+        except ValueError:
+            return b"ERROR: This stand-in only speaks the v2 JSON protocol\n"
+        handler = self._methods.get(req["method"])
+        params = req.get("params") or {}
+        try:
+            if handler is None:
+                raise _Error("method_not_found", "Unknown method")
+            if req["method"] in _OFF_MAIN:
+                result = handler(params)
+            else:
+                with self._main:
+                    result = handler(params)
+            resp = {"id": req.get("id"), "ok": True, "result": result}
+        except _Error as e:
+            resp = {"id": req.get("id"), "ok": False, "error": {"code": e.code, "message": str(e)}}
+        return (json.dumps(resp) + "\n").encode("utf-8")
+
+    # -- model ---------------------------------------------------------------
+
+    def _ref(self, kind: str, ident: Optional[str]) -> Optional[str]:
+        if ident is None:
+            return None
+        ref = self._ref_of.get(ident)
+        if ref is None:
+            self._ordinals[kind] = self._ordinals.get(kind, 0) + 1
+            ref = f"{kind}:{self._ordinals[kind]}"
+            self._ref_of[ident], self._refs[ref] = ref, ident
+        return ref
+
+    def _uuid(self, params: Dict[str, Any], key: str) -> Optional[str]:
+        raw = params.get(key)
+        if raw in (None, ""):
+            return None
+        raw = str(raw).strip()
+        return self._refs.get(raw.lower(), raw.upper())
+
+    def _window(self) -> Dict[str, Any]:
+        return {"window_id": self.window_id, "window_ref": self._ref("window", self.window_id)}
+
+    def _workspace_ids(self, ws: _Workspace) -> Dict[str, Any]:
+        return dict(self._window(), workspace_id=ws.id, workspace_ref=self._ref("workspace", ws.id))
+
+    def _surface_ids(self, ws: _Workspace, surface: PtySurface) -> Dict[str, Any]:
+        return dict(self._workspace_ids(ws), surface_id=surface.id, surface_ref=self._ref("surface", surface.id))
+
+    def _workspace(self, params: Dict[str, Any]) -> _Workspace:
+        wsid = self._uuid(params, "workspace_id")
+        if wsid is None:
+            sid = self._uuid(params, "surface_id")
+            found = [ws for ws in self.workspaces if any(s.id == sid for s in ws.surfaces)] if sid else []
+            ws = found[0] if found else self.selected
+        else:
+            ws = next((w for w in self.workspaces if w.id == wsid), None)
+        if ws is None:
+            raise _Error("not_found", "Workspace not found")
+        return ws
+
+    def _surface(self, params: Dict[str, Any]) -> Tuple[_Workspace, PtySurface]:
+        ws = self._workspace(params)
+        sid = self._uuid(params, "surface_id")
+        surface = ws.focused if sid is None else next((s for s in ws.surfaces if s.id == sid), None)
+        if surface is None:
+            if sid is None:
+                raise _Error("not_found", "No focused surface")
+            raise _Error("invalid_params", "Surface is not a terminal")
+        return ws, surface
+
+    def _new_workspace(self, select: bool) -> _Workspace:
+        ws = _Workspace(f"Workspace {len(self.workspaces) + 1}")
+        self.workspaces.append(ws)
+        self._new_surface(ws)
+        if select or self.selected is None:
+            self.selected = ws
+        return ws
+
+    def _new_surface(self, ws: _Workspace) -> PtySurface:
+        env = dict(os.environ, TERM="xterm", PS1="$ ", HISTFILE="/dev/null",
+                   CMUX_WORKSPACE_ID=ws.id, CMUX_SOCKET_PATH=self.listen_path)
+        assert self._loop is not None
+        surface = PtySurface(self._loop, self.shell, env, self.cwd, self.cols, self.rows, self.scrollback)
+        ws.surfaces.append(surface)
+        ws.focused = surface
+        return surface
+
+    def _close_surface(self, ws: _Workspace, surface: PtySurface) -> None:
+        ws.surfaces.remove(surface)
+        if ws.focused is surface:
+            ws.focused = ws.surfaces[-1] if ws.surfaces else None
+        # Don't hold up other requests while the shell exits.
+        threading.Thread(target=surface.close, daemon=True).start()
+
+    # -- handlers ------------------------------------------------------------
+
+    def _identify(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        ws = self.selected
+        focused: Optional[Dict[str, Any]] = None
+        if ws is not None:
+            sid = ws.focused.id if ws.focused else None
+            focused = dict(self._workspace_ids(ws), pane_id=ws.pane_id, pane_ref=self._ref("pane", ws.pane_id),
+                           surface_id=sid, surface_ref=self._ref("surface", sid), surface_type="terminal")
+        return {"socket_path": self.listen_path, "focused": focused, "caller": params.get("caller")}
+
+    def _workspace_list(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        rows = [{"id": ws.id, "ref": self._ref("workspace", ws.id), "index": i, "title": ws.title,
+                 "selected": ws is self.selected, "pinned": False} for i, ws in enumerate(self.workspaces)]
+        return dict(self._window(), workspaces=rows)
+
+    def _workspace_create(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return self._workspace_ids(self._new_workspace(select=True))
+
+    def _workspace_select(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        if self._uuid(params, "workspace_id") is None:
+            raise _Error("invalid_params", "Missing or invalid workspace_id")
+        self.selected = self._workspace(params)
+        return self._workspace_ids(self.selected)
+
+    def _workspace_rename(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        ws = self._workspace(params)
+        title = str(params.get("title") or "").strip()
+        if not title:
+            raise _Error("invalid_params", "Missing title")
+        ws.title = title
+        return dict(self._workspace_ids(ws), title=title)
+
+    def _workspace_close(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        ws = self._workspace(params)
+        for surface in list(ws.surfaces):
+            self._close_surface(ws, surface)
+        index = self.workspaces.index(ws)
+        self.workspaces.remove(ws)
+        if self.selected is ws:
+            self.selected = self.workspaces[min(index, len(self.workspaces) - 1)] if self.workspaces else None
+        return self._workspace_ids(ws)
+
+    def _pane_list(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        ws = self._workspace(params)
+        pane = {"id": ws.pane_id, "ref": self._ref("pane", ws.pane_id), "index": 0, "focused": True,
+                "surface_count": len(ws.surfaces),
+                "selected_surface_id": ws.focused.id if ws.focused else None}
+        return dict(self._workspace_ids(ws), panes=[pane])
+
+    def _surface_list(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        ws = self._workspace(params)
+        rows = [{"id": s.id, "ref": self._ref("surface", s.id), "index": i, "type": "terminal",
+                 "title": "Terminal", "focused": s is ws.focused, "pane_id": ws.pane_id,
+                 "pane_ref": self._ref("pane", ws.pane_id), "index_in_pane": i, "selected_in_pane": s is ws.focused}
+                for i, s in enumerate(ws.surfaces)]
+        return dict(self._workspace_ids(ws), surfaces=rows)
+
+    def _surface_current(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        ws, surface = self._surface({"workspace_id": params.get("workspace_id")})
+        return dict(self._surface_ids(ws, surface), pane_id=ws.pane_id, pane_ref=self._ref("pane", ws.pane_id))
+
+    def _surface_create(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        if str(params.get("type") or "terminal") != "terminal":
+            raise _Error("not_supported", "This stand-in only creates terminal surfaces")
+        ws = self._workspace(params)
+        pane = self._uuid(params, "pane_id")
+        if pane is not None and pane != ws.pane_id:
+            raise _Error("not_found", "Pane not found")
+        self.selected = ws
+        surface = self._new_surface(ws)
+        return dict(self._surface_ids(ws, surface), pane_id=ws.pane_id, pane_ref=self._ref("pane", ws.pane_id),
+                    type="terminal")
+
+    def _surface_focus(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        if self._uuid(params, "surface_id") is None:
+            raise _Error("invalid_params", "Missing or invalid surface_id")
+        ws, surface = self._surface(params)
+        ws.focused = surface
+        self.selected = ws
+        return self._surface_ids(ws, surface)
+
+    def _surface_close(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        ws, surface = self._surface(params)
+        self._close_surface(ws, surface)
+        return self._surface_ids(ws, surface)
+
+    def _send_text(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        text = params.get("text")
+        if not isinstance(text, str):
+            raise _Error("invalid_params", "Missing text")
+        ws, surface = self._surface(params)
+        surface.write("".join(_TEXT_CONTROLS.get(ch, ch) for ch in text).encode("utf-8"))
+        return dict(self._surface_ids(ws, surface), queued=False)
+
+    def _send_key(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        key = params.get("key")
+        if not isinstance(key, str) or not key:
+            raise _Error("invalid_params", "Missing key")
+        ws, surface = self._surface(params)
+        data = key_bytes(key)
+        if data is None:
+            raise _Error("invalid_params", "Unknown key")
+        surface.write(data)
+        return self._surface_ids(ws, surface)
+
+    def _read_text(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        scrollback = bool(params.get("scrollback"))
+        lines = params.get("lines")
+        if lines is not None:
+            if not isinstance(lines, int) or isinstance(lines, bool):
+                raise _Error("invalid_params", "lines must be an integer")
+            if lines <= 0:
+                raise _Error("invalid_params", "lines must be greater than 0")
+            scrollback = True
+        with self._main:
+            ws, surface = self._surface(params)
+            ids = self._surface_ids(ws, surface)
+        # Rendering only takes the surface's own lock, so big reads don't stall other requests.
+        text = surface.text(scrollback, lines)
+        return dict(ids, text=text, base64=base64.b64encode(text.encode("utf-8")).decode("ascii"))
+
+    def _clear_history(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        ws, surface = self._surface(params)
+        surface.clear()
+        return self._surface_ids(ws, surface)
+
+
+def main(argv: List[str]) -> int:
+    def option(name: str, default: str) -> str:
+        return argv[argv.index(name) + 1] if name in argv and argv.index(name) + 1 < len(argv) else default
+
+    listen_path = option("--listen", "")
+    if not listen_path:
+        print("usage: cmux_pty_server.py --listen PATH [--shell PATH] [--scrollback N]", file=sys.stderr)
+        return 2
+    shell = option("--shell", "")
+    server = PtyServer(listen_path, shell=[shell] if shell else None, scrollback=int(option("--scrollback", "10000")))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
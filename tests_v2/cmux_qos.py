@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""Priority lanes in front of the cmux socket.
+
+The app runs most v2 handlers on its main thread, so one agent polling
+`surface.read_text` or `browser.snapshot` in a loop queues work ahead of the
+user's keystrokes and every other client. QosProxy is a Relay
+(cmux_relay.py) that schedules requests instead of forwarding them as they
+arrive:
+
+    python3 tests_v2/cmux_qos.py --socket /tmp/cmux.sock --listen /tmp/cmux-qos.sock
+    CMUX_SOCKET_PATH=/tmp/cmux-qos.sock my-agent
+
+Methods fall into three lanes:
+
+- interactive (focus, keys, text input): dispatched first, on upstream
+  connections that carry nothing else;
+- bulk (screen reads, snapshots, screenshots, notifications): each client
+  has a token bucket, the lane has a global one, and at most
+  `max_bulk_in_flight` bulk requests are at the app at once. Clients take
+  turns, so one flooding client cannot starve another;
+- normal: everything else, dispatched as soon as it is at the head of its
+  client's queue.
+
+A client's requests still run and answer in the order it sent them: a
+throttled read holds back that client's later requests, never anyone
+else's. A client with more than `max_queued` requests waiting stops being
+read until it drains. `relay.stats` adds per-lane queue depth, dispatch and
+throttle counts, and wait-time percentiles.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from cmux import cmux
+from cmux_relay import Relay, _Client, _Upstream
+
+INTERACTIVE: FrozenSet[str] = frozenset({
+    "surface.focus", "surface.send_key", "surface.send_text", "pane.focus",
+    "workspace.select", "window.focus", "system.ping",
+})
+BULK: FrozenSet[str] = frozenset({
+    "surface.read_text", "browser.snapshot", "browser.screenshot", "notification.create",
+    "debug.window.screenshot", "browser.eval",
+})
+LANES = ("interactive", "normal", "bulk")
+
+
+def lane_of(method: str) -> str:
+    if method in INTERACTIVE:
+        return "interactive"
+    if method in BULK:
+        return "bulk"
+    return "normal"
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def ready(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= 1.0
+
+    def take(self) -> None:
+        self.tokens -= 1.0
+
+    def wait_s(self, now: float) -> float:
+        self._refill(now)
+        return 0.0 if self.tokens >= 1.0 else (1.0 - self.tokens) / self.rate
+
+
+class _Queued:
+    __slots__ = ("client_id", "req", "lane", "enqueued", "throttled")
+
+    def __init__(self, client_id: Any, req: Dict[str, Any], lane: str):
+        self.client_id = client_id
+        self.req = req
+        self.lane = lane
+        self.enqueued = time.monotonic()
+        self.throttled = False
+
+
+class _ClientState:
+    def __init__(self, client: _Client, bucket: TokenBucket):
+        self.client = client
+        self.queue: Deque[_Queued] = deque()
+        self.bucket = bucket
+        self.reserved = 0  # picked by the dispatcher, not yet registered upstream
+        self.lanes: Deque[str] = deque()  # lanes of registered requests, oldest first
+
+
+class QosProxy(Relay):
+    """A Relay that dispatches requests by lane, rate and client turn."""
+
+    def __init__(self, socket_path: str, listen_path: str, upstreams: int = 2, interactive_upstreams: int = 1,
+                 bulk_rate: float = 20.0, bulk_burst: float = 10.0, bulk_global_rate: float = 200.0,
+                 max_bulk_in_flight: int = 1, max_queued: int = 256, password: Optional[str] = None):
+        super().__init__(socket_path, listen_path, upstreams, password)
+        self._shared = list(self._upstreams)
+        self._interactive = [_Upstream(self, len(self._shared) + i) for i in range(max(1, interactive_upstreams))]
+        self._upstreams = self._shared + self._interactive
+        self.bulk_rate = bulk_rate
+        self.bulk_burst = bulk_burst
+        self.max_bulk_in_flight = max(1, max_bulk_in_flight)
+        self.max_queued = max(1, max_queued)
+        self._global_bucket = TokenBucket(bulk_global_rate, max(bulk_burst, 1.0))
+        self._states: Dict[int, _ClientState] = {}
+        self._turn = 0
+        self._bulk_in_flight = 0  # registered upstream
+        self._bulk_reserved = 0  # picked, not yet registered
+        self._wake = threading.Condition(self._lock)
+        self._closing = False
+        self._depth = {lane: 0 for lane in LANES}
+        self._lane_stats = {lane: {"dispatched": 0, "throttled": 0, "max_depth": 0, "waits": []} for lane in LANES}
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="cmux-qos-dispatch", daemon=True)
+
+    # -- lifecycle -----------------------------------------------------------
+
+    def start(self) -> "QosProxy":
+        super().start()
+        self._dispatcher.start()
+        return self
+
+    def close(self) -> None:
+        with self._lock:
+            self._closing = True
+            self._wake.notify_all()
+        super().close()
+
+    # -- relay hooks ---------------------------------------------------------
+
+    def _state(self, client: _Client) -> _ClientState:
+        st = self._states.get(client.id)
+        if st is None:
+            st = self._states[client.id] = _ClientState(client, TokenBucket(self.bulk_rate, self.bulk_burst))
+        return st
+
+    def _forward(self, client: _Client, client_id: Any, req: Dict[str, Any]) -> None:
+        lane = lane_of(req["method"])
+        with self._lock:
+            if client.closed:
+                return
+            st = self._state(client)
+            while len(st.queue) >= self.max_queued and not client.closed and not self._closing:
+                self._wake.wait(1.0)  # stop reading this client until it drains
+            st.queue.append(_Queued(client_id, req, lane))
+            self._depth[lane] += 1
+            stats = self._lane_stats[lane]
+            stats["max_depth"] = max(stats["max_depth"], self._depth[lane])
+            self._wake.notify_all()
+
+    def _register(self, client: _Client, client_id: Any, req: Dict[str, Any], upstream: _Upstream) -> int:
+        rid = super()._register(client, client_id, req, upstream)
+        st = self._states.get(client.id)
+        if st is not None:
+            lane = lane_of(req["method"])
+            st.lanes.append(lane)
+            if lane == "bulk":
+                self._bulk_in_flight += 1
+        return rid
+
+    def _settle(self, client: _Client) -> None:
+        super()._settle(client)
+        st = self._states.get(client.id)
+        if st is not None and st.lanes and st.lanes.popleft() == "bulk":
+            self._bulk_in_flight -= 1
+        self._wake.notify_all()
+
+    def _answer_in_order(self, client: _Client) -> None:
+        with self._lock:
+            while not client.closed:
+                st = self._states.get(client.id)
+                if not client.in_flight and (st is None or (not st.queue and not st.reserved)):
+                    return
+                self._wake.wait(1.0)
+
+    def _drop(self, client: _Client) -> None:
+        super()._drop(client)
+        with self._lock:
+            st = self._states.pop(client.id, None)
+            if st is not None:
+                for item in st.queue:
+                    self._depth[item.lane] -= 1
+                # Its in-flight responses will be discarded; stop counting them against the bulk lane.
+                self._bulk_in_flight -= sum(1 for lane in st.lanes if lane == "bulk")
+            self._wake.notify_all()
+
+    # -- scheduling ----------------------------------------------------------
+
+    def _pool(self, lane: str) -> List[_Upstream]:
+        return self._interactive if lane == "interactive" else self._shared
+
+    def _target(self, st: _ClientState, lane: str) -> Optional[_Upstream]:
+        """Where the client's head request may go now, or None if it must wait for its in-flight ones."""
+        pool = self._pool(lane)
+        if st.client.in_flight or st.reserved:
+            # Stay on the connection already carrying this client's requests, or wait for them.
+            return st.client.upstream if st.client.upstream in pool else None
+        return min(pool, key=lambda u: (u.in_flight, u.requests))
+
+    def _pick(self, now: float) -> Tuple[List[Tuple[_ClientState, _Queued, _Upstream]], Optional[float]]:
+        """Choose what to dispatch now (caller holds the lock); also returns when to look again."""
+        picked: List[Tuple[_ClientState, _Queued, _Upstream]] = []
+        wake: Optional[float] = None
+        states = list(self._states.values())
+        if states:
+            self._turn = (self._turn + 1) % len(states)
+            states = states[self._turn:] + states[:self._turn]
+        served: Set[int] = set()  # clients given a bulk slot this round
+        progress = True
+        while progress:
+            progress = False
+            waiting = False  # a client was passed over because it already had its turn
+            for lane in LANES:
+                for st in states:
+                    if not st.queue or st.queue[0].lane != lane:
+                        continue
+                    target = self._target(st, lane)
+                    if target is None:
+                        continue
+                    head = st.queue[0]
+                    if lane == "bulk":
+                        if self._bulk_in_flight + self._bulk_reserved >= self.max_bulk_in_flight:
+                            continue
+                        if st.client.id in served:
+                            waiting = True
+                            continue
+                        if not (st.bucket.ready(now) and self._global_bucket.ready(now)):
+                            if not head.throttled:
+                                head.throttled = True
+                                self._lane_stats["bulk"]["throttled"] += 1
+                            delay = max(st.bucket.wait_s(now), self._global_bucket.wait_s(now))
+                            wake = delay if wake is None else min(wake, delay)
+                            continue
+                        st.bucket.take()
+                        self._global_bucket.take()
+                        self._bulk_reserved += 1
+                        served.add(st.client.id)
+                    st.queue.popleft()
+                    self._depth[lane] -= 1
+                    st.reserved += 1
+                    st.client.upstream = target
+                    stats = self._lane_stats[lane]
+                    stats["dispatched"] += 1
+                    stats["waits"].append(now - head.enqueued)
+                    if len(stats["waits"]) > 4096:
+                        del stats["waits"][:2048]
+                    picked.append((st, head, target))
+                    progress = True
+            if waiting and not progress:
+                # Every client that could take a bulk slot has had one; start the next round.
+                served.clear()
+                progress = True
+        return picked, wake
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            with self._lock:
+                if self._closing:
+                    return
+                picked, wake = self._pick(time.monotonic())
+                if not picked:
+                    self._wake.wait(min(wake, 1.0) if wake is not None else 1.0)
+                    continue
+            for st, item, upstream in picked:
+                error = self._send_upstream(st.client, item.client_id, item.req, upstream)
+                with self._lock:
+                    st.reserved -= 1
+                    if item.lane == "bulk":
+                        self._bulk_reserved -= 1
+                    self._wake.notify_all()
+                if error is not None:
+                    self._fail(st.client, item.client_id, error)
+
+    # -- stats ---------------------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        out = super().stats()
+        with self._lock:
+            depth = dict(self._depth)
+            lanes = {}
+            for lane, s in self._lane_stats.items():
+                waits = sorted(s["waits"])
+
+                def pct(q: float) -> float:
+                    return waits[min(len(waits) - 1, int(q * len(waits)))] * 1000 if waits else 0.0
+
+                lanes[lane] = {"depth": depth[lane], "max_depth": s["max_depth"], "dispatched": s["dispatched"],
+                               "throttled": s["throttled"], "wait_p50_ms": pct(0.5), "wait_p95_ms": pct(0.95),
+                               "wait_max_ms": waits[-1] * 1000 if waits else 0.0}
+            out["lanes"] = lanes
+            out["bulk_in_flight"] = self._bulk_in_flight
+        return out
+
+    def report(self) -> str:
+        s = self.stats()
+        lines = [f"{s['clients']} clients, {s['requests']} requests, bulk in flight {s['bulk_in_flight']}"]
+        for lane, l in s["lanes"].items():
+            lines.append(f"  {lane:<12} depth={l['depth']:<4} max={l['max_depth']:<4} sent={l['dispatched']:<6} "
+                         f"throttled={l['throttled']:<5} wait p50={l['wait_p50_ms']:.1f}ms "
+                         f"p95={l['wait_p95_ms']:.1f}ms max={l['wait_max_ms']:.1f}ms")
+        return "\n".join(lines)
+
+
+def main(argv: List[str]) -> int:
+    def option(name: str, default: str) -> str:
+        return argv[argv.index(name) + 1] if name in argv and argv.index(name) + 1 < len(argv) else default
+
+    listen_path = option("--listen", "")
+    if not listen_path:
+        print("usage: cmux_qos.py [--socket PATH] --listen PATH [--upstreams N] [--bulk-rate N] [--bulk-burst N]", file=sys.stderr)
+        return 2
+    proxy = QosProxy(option("--socket", cmux.DEFAULT_SOCKET_PATH), listen_path, int(option("--upstreams", "2")),
+                     bulk_rate=float(option("--bulk-rate", "20")), bulk_burst=float(option("--bulk-burst", "10")),
+                     password=os.environ.get("CMUX_SOCKET_PASSWORD") or None)
+    try:
+        proxy.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
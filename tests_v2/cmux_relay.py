@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""Multiplex many short-lived v2 clients onto a few connections to cmux.
+
+Every hook and agent process opens its own connection to the app, and the
+app runs its access check (process ancestry, or password auth) for each one.
+With hundreds of agent sessions that is hundreds of connects, checks and
+server threads for requests that take microseconds.
+
+Relay listens on its own Unix socket and forwards v2 requests over a small
+pool of upstream connections:
+
+    python3 tests_v2/cmux_relay.py --socket /tmp/cmux.sock --listen /tmp/cmux-relay.sock --upstreams 4
+    CMUX_SOCKET_PATH=/tmp/cmux-relay.sock python3 my_agent_hook.py
+
+Request ids are rewritten so responses from a shared upstream can be routed
+back, and clients keep their own ids. The app answers a connection's
+requests in order, so a client stays on one upstream while it has requests
+in flight: its requests run in the order it sent them and its responses come
+back in that order. An idle client moves to the least busy upstream.
+
+The relay answers two methods itself: `auth.login` (checked against the
+relay's own password, when it has one; the upstreams log in once with it)
+and `relay.stats`. v1 text commands are not relayed. The listening socket is
+created owner-only, since clients inherit the relay's access to the app.
+"""
+
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from cmux import cmux, cmuxError
+
+
+class _Client:
+    """One downstream connection."""
+
+    def __init__(self, conn: socket.socket, cid: int, authed: bool, lock: threading.RLock):
+        self.conn = conn
+        self.id = cid
+        self.authed = authed
+        self.upstream: Optional["_Upstream"] = None
+        self.in_flight = 0
+        self.closed = False
+        self.write_lock = threading.Lock()
+        self.idle = threading.Condition(lock)  # notified when in_flight drops to 0
+
+    def settle(self) -> None:
+        """One request fewer in flight (caller holds the relay lock)."""
+        self.in_flight -= 1
+        if self.in_flight == 0:
+            self.upstream = None
+            self.idle.notify_all()
+
+
+class _Upstream:
+    """One connection to the app; a reader thread routes its responses to clients."""
+
+    def __init__(self, relay: "Relay", index: int):
+        self.relay = relay
+        self.index = index
+        self.sock: Optional[socket.socket] = None
+        self.write_lock = threading.Lock()
+        self.next_id = 0
+        self.pending: Dict[int, Tuple[_Client, Any, float]] = {}  # relay id -> (client, client id, sent at)
+        self.requests = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self.pending)
+
+    def connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.relay.socket_path)
+        if self.relay.password:
+            sock.sendall((json.dumps({"id": 0, "method": "auth.login",
+                                      "params": {"password": self.relay.password}}) + "\n").encode())
+            with sock.makefile("rb") as f:
+                line = f.readline()
+            resp = json.loads(line or b"{}")
+            if resp.get("ok") is not True:
+                sock.close()
+                raise cmuxError(f"relay upstream auth.login failed: {resp.get('error')}")
+        self.sock = sock
+        self.relay._count("upstream_connects")
+        threading.Thread(target=self._read, args=(sock,), name=f"cmux-relay-up{self.index}", daemon=True).start()
+
+    def register(self, client: _Client, client_id: Any) -> int:
+        """Allocate a relay id for a client's request (caller holds relay._lock)."""
+        if self.sock is None:
+            self.connect()
+        self.next_id += 1
+        self.pending[self.next_id] = (client, client_id, time.perf_counter())
+        self.requests += 1
+        return self.next_id
+
+    def write(self, data: bytes) -> None:
+        sock = self.sock
+        if sock is None:
+            raise cmuxError("relay upstream not connected")
+        with self.write_lock:
+            sock.sendall(data)
+
+    def _read(self, sock: socket.socket) -> None:
+        relay = self.relay
+        with sock, sock.makefile("rb") as f:
+            for line in f:
+                try:
+                    resp = json.loads(line)
+                    rid = resp.get("id")
+                except ValueError:
+                    relay._count("dropped")
+                    continue
+                with relay._lock:
+                    entry = self.pending.pop(rid, None) if isinstance(rid, int) else None
+                    if entry is not None:
+                        relay._settle(entry[0])
+                if entry is None:
+                    relay._count("dropped")
+                    continue
+                client, client_id, sent = entry
+                relay._record_latency(time.perf_counter() - sent)
+                resp["id"] = client_id
+                relay._reply(client, resp)
+        # The app closed the connection: fail what was in flight and reconnect on next use.
+        with relay._lock:
+            if self.sock is sock:
+                self.sock = None
+            failed, self.pending = self.pending, {}
+            for client, _, _ in failed.values():
+                relay._settle(client)
+        for client, client_id, _ in failed.values():
+            relay._count("upstream_errors")
+            relay._reply(client, {"id": client_id, "ok": False,
+                                  "error": {"code": "unavailable", "message": "relay upstream connection closed"}})
+
+    def close(self) -> None:
+        sock, self.sock = self.sock, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+
+class Relay:
+    """Accepts many clients on `listen_path`, forwards over `upstreams` connections to `socket_path`."""
+
+    def __init__(self, socket_path: str, listen_path: str, upstreams: int = 2,
+                 password: Optional[str] = None, client_send_timeout_s: float = 5.0):
+        self.socket_path = socket_path
+        self.listen_path = listen_path
+        self.password = password
+        self.client_send_timeout_s = client_send_timeout_s
+        self._lock = threading.RLock()  # upstream connects count while routing holds it
+        self._upstreams = [_Upstream(self, i) for i in range(max(1, upstreams))]
+        self._clients: Dict[int, _Client] = {}
+        self._next_client = 0
+        self._counters: Dict[str, int] = {}
+        self._latencies: List[float] = []
+        self._started = time.time()
+        self._srv: Optional[socket.socket] = None
+
+    # -- lifecycle -----------------------------------------------------------
+
+    def start(self) -> "Relay":
+        try:
+            os.unlink(self.listen_path)
+        except FileNotFoundError:
+            pass
+        srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)
+        try:
+            srv.bind(self.listen_path)
+        finally:
+            os.umask(old_umask)
+        srv.listen(256)
+        self._srv = srv
+        threading.Thread(target=self._accept, name="cmux-relay-accept", daemon=True).start()
+        return self
+
+    def close(self) -> None:
+        if self._srv is not None:
+            self._srv.close()
+            self._srv = None
+            try:
+                os.unlink(self.listen_path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            clients = list(self._clients.values())
+        for client in clients:
+            self._drop(client)
+        for upstream in self._upstreams:
+            upstream.close()
+
+    def __enter__(self) -> "Relay":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def serve_forever(self) -> None:
+        self.start()
+        try:
+            while self._srv is not None:
+                time.sleep(1.0)
+        finally:
+            self.close()
+
+    # -- downstream ----------------------------------------------------------
+
+    def _accept(self) -> None:
+        while True:
+            srv = self._srv
+            if srv is None:
+                return
+            try:
+                conn, _ = srv.accept()
+            except OSError:
+                return
+            conn.settimeout(self.client_send_timeout_s)
+            with self._lock:
+                self._next_client += 1
+                client = _Client(conn, self._next_client, not self.password, self._lock)
+                self._clients[client.id] = client
+            self._count("clients_total")
+            threading.Thread(target=self._serve, args=(client,), name=f"cmux-relay-c{client.id}", daemon=True).start()
+
+    def _serve(self, client: _Client) -> None:
+        buf = b""
+        try:
+            while True:
+                try:
+                    data = client.conn.recv(65536)
+                except socket.timeout:
+                    continue
+                if not data:
+                    break
+                buf += data
+                while b"\n" in buf:
+                    line, buf = buf.split(b"\n", 1)
+                    if line.strip():
+                        self._handle_line(client, line)
+        except OSError:
+            pass
+        finally:
+            self._drop(client)
+
+    def _answer_in_order(self, client: _Client) -> None:
+        """Hold a locally answered request until the client's forwarded ones are answered."""
+        with self._lock:
+            while client.in_flight and not client.closed:
+                client.idle.wait(1.0)
+
+    def _handle_line(self, client: _Client, line: bytes) -> None:
+        try:
+            req = json.loads(line)
+            if not isinstance(req, dict) or not isinstance(req.get("method"), str):
+                raise ValueError
+        except ValueError:
+            self._count("rejected")
+            self._answer_in_order(client)
+            self._send_raw(client, b"ERROR: cmux relay only forwards v2 JSON requests\n")
+            return
+        client_id = req.get("id")
+        method = req["method"]
+        if method == "auth.login" or method == "relay.stats" or not client.authed:
+            self._answer_in_order(client)
+        if method == "auth.login":
+            ok = not self.password or (req.get("params") or {}).get("password") == self.password
+            client.authed = client.authed or ok
+            self._reply(client, {"id": client_id, "ok": True, "result": {"authenticated": True}} if ok else
+                        {"id": client_id, "ok": False, "error": {"code": "auth_failed", "message": "Invalid password"}})
+            return
+        if not client.authed:
+            self._reply(client, {"id": client_id, "ok": False,
+                                 "error": {"code": "auth_required", "message": "Authentication required"}})
+            return
+        if method == "relay.stats":
+            self._reply(client, {"id": client_id, "ok": True, "result": self.stats()})
+            return
+        self._count("requests")
+        self._forward(client, client_id, req)
+
+    def _forward(self, client: _Client, client_id: Any, req: Dict[str, Any]) -> None:
+        """Send one client request upstream (called on the client's thread, in order)."""
+        with self._lock:
+            upstream = client.upstream or min(self._upstreams, key=lambda u: (u.in_flight, u.requests))
+        error = self._send_upstream(client, client_id, req, upstream)
+        if error is not None:
+            self._answer_in_order(client)
+            self._fail(client, client_id, error)
+
+    def _send_upstream(self, client: _Client, client_id: Any, req: Dict[str, Any],
+                       upstream: _Upstream) -> Optional[Exception]:
+        """Register and write one request; returns the error when the caller must answer it."""
+        with self._lock:
+            try:
+                rid = self._register(client, client_id, req, upstream)
+            except (OSError, cmuxError) as e:
+                return e
+        # Requests for a client are written by one thread at a time, so they reach the upstream in order.
+        req["id"] = rid
+        try:
+            upstream.write((json.dumps(req, separators=(",", ":")) + "\n").encode("utf-8"))
+            return None
+        except (OSError, cmuxError) as e:
+            with self._lock:
+                mine = upstream.pending.pop(rid, None) is not None
+                if mine:
+                    self._settle(client)
+            upstream.close()
+            # Otherwise the upstream reader already failed it and replied.
+            return e if mine else None
+
+    def _register(self, client: _Client, client_id: Any, req: Dict[str, Any], upstream: _Upstream) -> int:
+        """Account for a request about to be written (caller holds the lock); returns its upstream id."""
+        rid = upstream.register(client, client_id)
+        client.upstream = upstream
+        client.in_flight += 1
+        return rid
+
+    def _settle(self, client: _Client) -> None:
+        """A forwarded request was answered or failed (caller holds the lock)."""
+        client.settle()
+
+    def _fail(self, client: _Client, client_id: Any, error: Exception) -> None:
+        self._count("upstream_errors")
+        self._reply(client, {"id": client_id, "ok": False,
+                             "error": {"code": "unavailable", "message": f"relay upstream unavailable: {error}"}})
+
+    def _reply(self, client: _Client, resp: Dict[str, Any]) -> None:
+        self._count("responses")
+        self._send_raw(client, (json.dumps(resp, separators=(",", ":")) + "\n").encode("utf-8"))
+
+    def _send_raw(self, client: _Client, data: bytes) -> None:
+        if client.closed:
+            self._count("dropped")
+            return
+        try:
+            with client.write_lock:
+                client.conn.sendall(data)
+        except OSError:
+            # Gone, or too slow to read: don't let one client stall an upstream reader.
+            self._count("dropped")
+            self._drop(client)
+
+    def _drop(self, client: _Client) -> None:
+        with self._lock:
+            if client.closed:
+                return
+            client.closed = True
+            self._clients.pop(client.id, None)
+        try:
+            client.conn.close()
+        except OSError:
+            pass
+
+    # -- stats ---------------------------------------------------------------
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def _record_latency(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+            if len(self._latencies) > 4096:
+                del self._latencies[:2048]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            counters = dict(self._counters)
+            upstreams = [{"index": u.index, "connected": u.sock is not None, "in_flight": u.in_flight,
+                          "requests": u.requests} for u in self._upstreams]
+            clients = len(self._clients)
+
+        def pct(q: float) -> float:
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+
+        return {
+            "uptime_s": time.time() - self._started,
+            "clients": clients,
+            "clients_total": counters.get("clients_total", 0),
+            "requests": counters.get("requests", 0),
+            "responses": counters.get("responses", 0),
+            "dropped": counters.get("dropped", 0),
+            "rejected": counters.get("rejected", 0),
+            "upstream_errors": counters.get("upstream_errors", 0),
+            "upstream_connects": counters.get("upstream_connects", 0),
+            "upstreams": upstreams,
+            "latency_p50_ms": pct(0.5),
+            "latency_p95_ms": pct(0.95),
+        }
+
+
+def main(argv: List[str]) -> int:
+    def option(name: str, default: str) -> str:
+        return argv[argv.index(name) + 1] if name in argv and argv.index(name) + 1 < len(argv) else default
+
+    listen_path = option("--listen", "")
+    if not listen_path:
+        print("usage: cmux_relay.py [--socket PATH] --listen PATH [--upstreams N]", file=sys.stderr)
+        return 2
+    relay = Relay(option("--socket", cmux.DEFAULT_SOCKET_PATH), listen_path, int(option("--upstreams", "2")),
+                  password=os.environ.get("CMUX_SOCKET_PASSWORD") or None)
+    try:
+        relay.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
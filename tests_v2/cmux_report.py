@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Streaming HTML reports with images stored once, next to the report.
+
+The visual reports used to base64-embed every PNG into one string, so a run
+of screenshots produced a huge file that was slow to write and slow to open.
+HtmlReport writes the document to disk as it goes and puts each image in
+`<report>_assets/`, named by a hash of its content, so an image that appears
+twice (an "after" that is the next scenario's "before") is stored once. The
+page shows a downscaled thumbnail, generated in a worker pool, and links to
+the full-size image, which the browser only fetches when it is opened.
+
+    with HtmlReport(path, "cmux Visual Test Report", css=CSS) as report:
+        report.write("<h1>...</h1>")
+        report.write(f"<figure>{report.image(shot.path, shot.label)}</figure>")
+
+The report is written to a temporary file and renamed into place on close,
+so a crashed run never leaves half a report behind the old one.
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+THUMB_WIDTH = 480
+
+
+def esc(s: object) -> str:
+    return (
+        str(s).replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace(">", "&gt;")
+        .replace('"', "&quot;")
+    )
+
+
+def _file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:20]
+
+
+def make_thumbnail(src: str, dst: str, width: int) -> bool:
+    """Downscale `src` to at most `width` pixels wide (box filter). Worker-pool entry point."""
+    try:
+        from cmux_pixel_diff import load_png, save_png
+    except ImportError:  # numpy unavailable: the page falls back to the full image
+        return False
+    try:
+        pixels = load_png(src).pixels
+    except (OSError, ValueError):
+        return False
+    factor = -(-pixels.shape[1] // width)
+    if factor > 1:
+        h, w = (pixels.shape[0] // factor) * factor, (pixels.shape[1] // factor) * factor
+        pooled = pixels[:h, :w].reshape(h // factor, factor, w // factor, factor, 4).mean(axis=(1, 3))
+        pixels = pooled.round().astype("uint8")
+    tmp = f"{dst}.tmp"
+    save_png(tmp, pixels)
+    os.replace(tmp, dst)
+    return True
+
+
+class HtmlReport:
+    """An HTML document streamed to disk, with content-addressed image assets."""
+
+    def __init__(self, path: Union[str, Path], title: str, css: str = "", thumb_width: int = THUMB_WIDTH,
+                 workers: Optional[int] = None, executor: Optional[Executor] = None):
+        self.path = Path(path)
+        self.assets = self.path.with_name(self.path.stem + "_assets")
+        self.thumb_width = thumb_width
+        self.images: Dict[str, str] = {}  # digest -> asset file name
+        self._thumbs: List[Tuple[Future, Path, Path]] = []
+        self._own_executor = executor is None
+        self._executor = executor or ProcessPoolExecutor(max_workers=workers or min(4, os.cpu_count() or 1))
+        self.assets.mkdir(parents=True, exist_ok=True)
+        self._tmp = self.path.with_name(self.path.name + ".tmp")
+        self._out = open(self._tmp, "w", encoding="utf-8")
+        self._out.write(
+            "<!DOCTYPE html>\n<html>\n<head>\n  <meta charset=\"utf-8\" />\n"
+            f"  <title>{esc(title)}</title>\n  <style>\n{css}\n  </style>\n</head>\n<body>\n"
+        )
+
+    def __enter__(self) -> "HtmlReport":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, html: str) -> None:
+        self._out.write(html)
+
+    def asset(self, image: Union[str, Path]) -> Tuple[str, str]:
+        """Store `image` once; returns (full, thumbnail) paths relative to the report."""
+        src = Path(image)
+        digest = _file_digest(src)
+        name = self.images.get(digest)
+        if name is None:
+            name = f"{digest}{src.suffix.lower() or '.png'}"
+            full = self.assets / name
+            if not full.exists():
+                shutil.copyfile(src, full)
+            thumb = self.assets / f"{digest}.w{self.thumb_width}.png"
+            if not thumb.exists():
+                future = self._executor.submit(make_thumbnail, str(full), str(thumb), self.thumb_width)
+                self._thumbs.append((future, full, thumb))
+            self.images[digest] = name
+        digest_name = Path(name).stem
+        return (f"{self.assets.name}/{name}", f"{self.assets.name}/{digest_name}.w{self.thumb_width}.png")
+
+    def image(self, image: Union[str, Path], alt: str = "") -> str:
+        """Markup for a lazily loaded thumbnail that links to the full-size image."""
+        full, thumb = self.asset(image)
+        return (f'<a href="{esc(full)}" target="_blank">'
+                f'<img src="{esc(thumb)}" alt="{esc(alt)}" loading="lazy" decoding="async" /></a>')
+
+    def close(self) -> None:
+        """Finish thumbnails (falling back to the full image), end the document, move it into place."""
+        for future, full, thumb in self._thumbs:
+            try:
+                ok = future.result()
+            except Exception:
+                ok = False
+            if not ok and not thumb.exists():
+                shutil.copyfile(full, thumb)
+        self._thumbs.clear()
+        if self._own_executor:
+            self._executor.shutdown()
+        self._out.write("\n</body>\n</html>\n")
+        self._out.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self) -> None:
+        if self._own_executor:
+            self._executor.shutdown(cancel_futures=True)
+        self._out.close()
+        try:
+            self._tmp.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def main(argv: List[str]) -> int:
+    # Quick manual check: python3 tests_v2/cmux_report.py out.html a.png b.png ...
+    if not argv:
+        print("usage: cmux_report.py OUT.html [IMAGE ...]", file=sys.stderr)
+        return 2
+    out, *images = argv
+    with HtmlReport(out, "cmux images") as report:
+        for image in images:
+            report.write(f"<figure><figcaption>{esc(image)}</figcaption>{report.image(image, image)}</figure>\n")
+    print(f"Wrote {out} ({len(images)} images, {len(report.images)} unique)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
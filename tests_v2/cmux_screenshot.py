@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""Screenshots to disk without holding the image in memory.
+
+`browser.screenshot` answers with the PNG base64-encoded inside the JSON
+response. `cmux._call` keeps the whole response line as a str, json.loads
+copies the base64 out of it, and b64decode makes the bytes: a capture sits in
+memory three or four times over before it reaches a file.
+
+    from cmux_screenshot import browser_screenshot, window_screenshot
+
+    path = browser_screenshot(client, surface_id, "/tmp/shot.png")
+    path = window_screenshot(client, "/tmp/window.png", label="monitor")
+
+browser_screenshot() first asks the app to write the file itself
+(`out_path`), in which case the response carries only the path. An app that
+does not know `out_path` ignores it and sends base64 as before; that
+response is then read straight off the socket and decoded in fixed-size
+chunks into the file, so peak memory is one socket read, not the image.
+Either way it is one round trip.
+
+`debug.window.screenshot` already answers with a path; window_screenshot()
+copies that file into place.
+
+stream_call() is the general form: any method, any base64 field, any
+writable binary file. open_mmap() maps a finished capture read-only, for
+hashing or diffing it without reading it into memory.
+"""
+
+import binascii
+import json
+import mmap
+import os
+import select
+import shutil
+import time
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional, Union
+
+from cmux import cmux, cmuxError
+
+CHUNK = 1 << 16
+
+
+class Base64Writer:
+    """Incremental base64 decoder that writes to a binary file.
+
+    JSON encoders may escape '/' as '\\/'; backslashes are dropped. Input is
+    decoded in multiples of four characters, and the remainder carried over.
+    """
+
+    def __init__(self, out: BinaryIO):
+        self.out = out
+        self.carry = b""
+        self.written = 0
+
+    def feed(self, data: bytes) -> None:
+        if b"\\" in data:
+            data = data.replace(b"\\", b"")
+        if self.carry:
+            data = self.carry + data
+        usable = len(data) - len(data) % 4
+        if usable:
+            chunk = binascii.a2b_base64(memoryview(data)[:usable])
+            self.out.write(chunk)
+            self.written += len(chunk)
+        self.carry = bytes(data[usable:])
+
+    def close(self) -> None:
+        if self.carry.strip(b"="):
+            raise cmuxError(f"truncated base64 payload ({len(self.carry)} trailing characters)")
+        self.carry = b""
+
+
+class _ResponseReader:
+    """Splits one response line into JSON text and a base64 field streamed to a writer."""
+
+    def __init__(self, field: str, writer: Base64Writer):
+        self.marker = b'"' + field.encode() + b'":"'
+        self.writer = writer
+        self.json = bytearray()  # the response without the field's value
+        self.in_field = False
+        self.seen_field = False
+
+    def feed(self, data: bytes) -> Optional[bytes]:
+        """Consume bytes; once the line is complete, returns whatever followed it."""
+        while data:
+            if self.in_field:
+                end = data.find(b'"')
+                if end < 0:
+                    self.writer.feed(data)
+                    return None
+                self.writer.feed(data[:end])
+                self.writer.close()
+                self.in_field = False
+                data = data[end:]  # the closing quote belongs to the JSON text
+                continue
+            start = len(self.json)
+            self.json.extend(data)
+            # Look for the marker from slightly before the new bytes, in case it straddles reads.
+            at = self.json.find(self.marker, max(0, start - len(self.marker))) if not self.seen_field else -1
+            nl = self.json.find(b"\n", start)
+            if at >= 0 and (nl < 0 or at < nl):
+                cut = at + len(self.marker)
+                data = bytes(self.json[cut:])
+                del self.json[cut:]
+                self.in_field = self.seen_field = True
+                continue
+            if nl >= 0:
+                rest = bytes(self.json[nl + 1:])
+                del self.json[nl:]
+                return rest
+            return None
+        return None
+
+
+def stream_call(client: cmux, method: str, params: Optional[Dict[str, Any]], field: str,
+                out: BinaryIO, timeout_s: float = 20.0) -> Dict[str, Any]:
+    """Call `method` and decode the base64 string `field` of its result into `out`.
+
+    Returns the result without `field`, plus "bytes_written" when the field
+    was present. Error responses raise cmuxError like cmux._call.
+    """
+    sock = client._socket
+    if sock is None:
+        raise cmuxError("Not connected")
+
+    req_id, line = client._encode_request(method, params)
+    sock.sendall(line.encode("utf-8"))
+
+    writer = Base64Writer(out)
+    reader = _ResponseReader(field, writer)
+    pending, client._recv_buffer = client._recv_buffer.encode("utf-8"), ""
+    leftover = reader.feed(pending) if pending else None
+    deadline = time.time() + timeout_s
+    while leftover is None:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise cmuxError("Timed out waiting for response")
+        ready, _, _ = select.select([sock], [], [], min(0.2, remaining))
+        if not ready:
+            continue
+        chunk = sock.recv(CHUNK)
+        if not chunk:
+            raise cmuxError("Socket closed")
+        leftover = reader.feed(chunk)
+    client._recv_buffer = leftover.decode("utf-8", errors="replace")
+
+    text = bytes(reader.json)
+    try:
+        resp = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise cmuxError(f"Invalid JSON response: {e}: {text[:200]!r}")
+    if not isinstance(resp, dict):
+        raise cmuxError(f"Invalid response type: {type(resp).__name__}")
+    if resp.get("id") != req_id:
+        raise cmuxError(f"Mismatched response id: expected {req_id}, got {resp.get('id')}")
+    if resp.get("ok") is not True:
+        raise client._response_error(resp)
+    result = dict(resp.get("result") or {})
+    result.pop(field, None)
+    if reader.seen_field:
+        result["bytes_written"] = writer.written
+    return result
+
+
+def browser_screenshot(client: cmux, surface_id: str, path: Union[str, Path], timeout_s: float = 20.0) -> Path:
+    """Capture a browser surface into `path` (PNG); the image is never held in memory."""
+    path = Path(path).resolve()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".part")
+    # A capture left over from an earlier run must not pass for this one.
+    path.unlink(missing_ok=True)
+    params = {"surface_id": surface_id, "out_path": str(path)}
+    try:
+        with open(tmp, "wb") as f:
+            result = stream_call(client, "browser.screenshot", params, "png_base64", f, timeout_s)
+        if "bytes_written" in result:
+            os.replace(tmp, path)  # older app: the image came inline
+        elif not result.get("path"):
+            raise cmuxError(f"browser.screenshot returned neither a file nor image data: {result}")
+        elif Path(result["path"]).resolve() != path or not path.exists():
+            raise cmuxError(f"browser.screenshot wrote {result['path']}, not {path}")
+    finally:
+        tmp.unlink(missing_ok=True)
+    return path
+
+
+def window_screenshot(client: cmux, path: Union[str, Path], label: str = "") -> Path:
+    """Capture the window via debug.window.screenshot and copy the app's file to `path`."""
+    params: Dict[str, Any] = {"label": label} if label else {}
+    result = client._call("debug.window.screenshot", params) or {}
+    src = result.get("path")
+    if not src:
+        raise cmuxError(f"debug.window.screenshot returned no path: {result}")
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(src, path)
+    return path
+
+
+def open_mmap(path: Union[str, Path]) -> mmap.mmap:
+    """Read-only memory map of a capture, e.g. to hash or diff it without reading it in."""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
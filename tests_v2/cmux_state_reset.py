@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Bring a running cmux back to a clean, single-workspace state over the v2 API.
+
+This is what run-tests-v2.sh gets by killing and relaunching the app before
+every test, without the relaunch: one window, one fresh terminal workspace
+with a focused, in-window surface, no notifications and zeroed debug
+counters.
+
+Usage:
+    from cmux import cmux
+    from cmux_state_reset import reset_app_state
+
+    with cmux() as client:
+        reset_app_state(client)   # raises StateResetError if it can't
+
+    # or from a shell (exit 1 if the app needs a relaunch instead):
+    python3 tests_v2/cmux_state_reset.py
+"""
+
+import sys
+import time
+from typing import List
+
+from cmux import cmux, cmuxError
+
+
+class StateResetError(Exception):
+    """The app could not be brought to a clean state; relaunch it."""
+
+
+def _reset_debug_counters(client: cmux) -> None:
+    client.reset_flash_counts()
+    client.reset_empty_panel_count()
+    client.reset_bonsplit_underflow_count()
+
+
+def topology_problems(client: cmux) -> List[str]:
+    """Return what differs from a clean state (empty list means clean)."""
+    problems: List[str] = []
+    windows = client.list_windows()
+    if len(windows) != 1:
+        problems.append(f"expected 1 window, found {len(windows)}")
+    workspaces = client.list_workspaces()
+    if len(workspaces) != 1:
+        problems.append(f"expected 1 workspace, found {len(workspaces)}")
+    panes = client.list_panes()
+    if len(panes) != 1:
+        problems.append(f"expected 1 pane, found {len(panes)}")
+    surfaces = client.list_surfaces()
+    if len(surfaces) != 1:
+        problems.append(f"expected 1 surface, found {len(surfaces)}")
+    if client.list_notifications():
+        problems.append("notifications not cleared")
+    if client.empty_panel_count() or client.bonsplit_underflow_count():
+        problems.append("debug counters not reset")
+    return problems
+
+
+def reset_app_state(client: cmux, timeout_s: float = 10.0) -> None:
+    """Reset to one window with one fresh workspace; raise StateResetError on failure."""
+    try:
+        if not client.ping():
+            raise StateResetError("ping failed")
+
+        windows = client.list_windows()
+        if not windows:
+            keep_window = client.new_window()
+        else:
+            keep = next((w for w in windows if w.get("key")), windows[0])
+            keep_window = str(keep["id"])
+        client.focus_window(keep_window)
+
+        # Fresh workspace first, so closing the old ones never empties the window.
+        fresh = client.new_workspace(window_id=keep_window)
+        client.select_workspace(fresh)
+        for window in client.list_windows():
+            if str(window["id"]) == keep_window:
+                continue
+            client.close_window(str(window["id"]))
+        for _, workspace_id, _, _ in client.list_workspaces(window_id=keep_window):
+            if workspace_id != fresh:
+                client.close_workspace(workspace_id)
+
+        client.clear_notifications()
+        client.set_app_focus(None)
+        _reset_debug_counters(client)
+        client.focus_surface(0)
+        try:
+            client.activate_app()
+        except cmuxError:
+            pass
+
+        deadline = time.time() + timeout_s
+        problems: List[str] = []
+        while time.time() < deadline:
+            problems = topology_problems(client)
+            in_window = any(bool(row.get("in_window")) for row in client.surface_health())
+            if not problems and in_window:
+                return
+            if not in_window:
+                problems.append("no in-window terminal surface")
+            time.sleep(0.1)
+        raise StateResetError("; ".join(problems))
+    except cmuxError as e:
+        raise StateResetError(str(e)) from e
+
+
+def main() -> int:
+    try:
+        with cmux() as client:
+            reset_app_state(client)
+    except (StateResetError, cmuxError) as e:
+        print(f"reset failed: {e}", file=sys.stderr)
+        return 1
+    print("reset ok")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
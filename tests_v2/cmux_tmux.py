@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Fast-start tmux-compatible front end for cmux.
+
+Usage:
+    python3 cmux_tmux.py [--socket PATH] [--json] COMMAND [ARGS] [\\; COMMAND ...]
+    python3 cmux_tmux.py kill-server
+
+    # e.g. as the `tmux` an agent harness shells out to:
+    python3 cmux_tmux.py send-keys -t surface:2 'make test' Enter \\; capture-pane -p -t surface:2
+
+This script only forwards argv (plus the caller's cwd, CMUX_WORKSPACE_ID and
+CMUX_SURFACE_ID) to a per-user daemon, cmux_tmux_shim.py, which keeps one
+connection to the app open and translates the commands into v2 calls. The
+first call starts the daemon; it exits after ten idle minutes, on
+`kill-server`, or when the app refuses its connection. It serves only
+callers descended from the app, as the app's default `cmuxOnly` mode does,
+so run this from inside cmux (see cmux_tmux_shim.py for the access model).
+
+Like cmux_notify.py it keeps its imports to `os`, `sys` and `_socket`, so a
+command costs an interpreter start and one local round trip.
+"""
+
+import os
+import sys
+
+import _socket
+
+PROTOCOL = b"cmux-tmux-1"
+DAEMON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cmux_tmux_shim.py")
+
+
+def _fnv1a(text: str) -> str:
+    h = 0x811C9DC5
+    for byte in text.encode("utf-8"):
+        h = ((h ^ byte) * 0x01000193) & 0xFFFFFFFF
+    return "%08x" % h
+
+
+def default_socket_path() -> str:
+    override = os.environ.get("CMUX_SOCKET_PATH") or os.environ.get("CMUX_SOCKET")
+    if override:
+        return override
+    for path in ("/tmp/cmux-debug.sock", "/tmp/cmux.sock"):
+        if os.path.exists(path):
+            return path
+    return "/tmp/cmux-debug.sock"
+
+
+def daemon_path(socket_path: str) -> str:
+    """Per-user, per-app-socket daemon address (short enough for sun_path on macOS)."""
+    tmp = os.environ.get("TMPDIR") or "/tmp"
+    return os.path.join(tmp, "cmux-tmux-%d-%s.sock" % (os.getuid(), _fnv1a(socket_path)))
+
+
+def _request(listen_path: str, payload: bytes) -> bytes:
+    s = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    try:
+        s.connect(listen_path)
+        s.sendall(payload)
+        s.shutdown(_socket.SHUT_WR)
+        chunks = []
+        while True:
+            chunk = s.recv(65536)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+    finally:
+        s.close()
+
+
+def _start_daemon(socket_path: str, listen_path: str) -> None:
+    devnull = os.devnull
+    os.posix_spawn(
+        sys.executable,
+        [sys.executable, DAEMON, "--socket", socket_path, "--listen", listen_path],
+        dict(os.environ),
+        # Detached, and off the caller's stdio so pipes capturing our output still close. Its
+        # app connection is made while this (cmux-descended) caller waits for the first reply.
+        file_actions=[
+            (os.POSIX_SPAWN_OPEN, 0, devnull, os.O_RDONLY, 0),
+            (os.POSIX_SPAWN_OPEN, 1, devnull, os.O_WRONLY, 0),
+            (os.POSIX_SPAWN_OPEN, 2, devnull, os.O_WRONLY, 0),
+        ],
+        setsid=True,
+    )
+
+
+def run(argv: list, socket_path: str = "", timeout_s: float = 5.0) -> tuple:
+    """Send one command line to the daemon; returns (exit code, stdout bytes, stderr bytes)."""
+    socket_path = socket_path or default_socket_path()
+    listen_path = daemon_path(socket_path)
+    fields = [os.getcwd(), os.environ.get("CMUX_WORKSPACE_ID", ""), os.environ.get("CMUX_SURFACE_ID", "")] + list(argv)
+    payload = b"\0".join([PROTOCOL] + [f.encode("utf-8", "surrogateescape") for f in fields])
+    try:
+        data = _request(listen_path, payload)
+    except OSError:
+        if argv == ["kill-server"]:
+            return 0, b"", b""
+        _start_daemon(socket_path, listen_path)
+        data = b""
+        import time  # only on the first call of a session
+
+        deadline = time.time() + timeout_s
+        while True:
+            try:
+                data = _request(listen_path, payload)
+                break
+            except OSError:
+                if time.time() > deadline:
+                    return 1, b"", b"Error: could not start cmux tmux daemon at %s\n" % listen_path.encode()
+                time.sleep(0.02)
+    code, size, rest = data.split(b"\0", 2)
+    size = int(size)
+    return int(code), rest[:size], rest[size:]
+
+
+def main(argv: list) -> int:
+    if not argv or argv[0] in ("-h", "--help"):
+        sys.stderr.write("usage: cmux_tmux.py [--socket PATH] [--json] COMMAND [ARGS] [\\; COMMAND ...]\n")
+        return 2
+    socket_path = ""
+    if argv[0] == "--socket" and len(argv) > 1:
+        socket_path, argv = argv[1], argv[2:]
+    code, out, err = run(argv, socket_path)
+    if out:
+        sys.stdout.buffer.write(out)
+        sys.stdout.flush()
+    if err:
+        sys.stderr.buffer.write(err)
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,901 @@
+#!/usr/bin/env python3
+"""tmux compatibility commands over one persistent v2 connection.
+
+The Swift CLI answers tmux-style commands (`cmux capture-pane`, `cmux
+swap-pane`, ...) but every call is a process spawn, a socket connect and a
+handful of requests. A harness that drives panes through `tmux send-keys` and
+`tmux capture-pane` pays that hundreds of times per run.
+
+This module is the daemon half of the shim: it translates the same command
+matrix into v2 calls and runs them over a single long-lived `cmux`
+connection. `cmux_tmux.py` is the client half, a fast-start script that
+forwards argv to the daemon over a per-user Unix socket and starts the
+daemon the first time it is needed:
+
+    python3 tests_v2/cmux_tmux.py send-keys -t surface:2 'make test' Enter
+    python3 tests_v2/cmux_tmux.py capture-pane -p -t surface:2 -S -
+
+Commands may be chained with `\\;` as in tmux. Consecutive commands that
+are plain v2 calls go out as one pipelined batch (one write, one round
+trip); commands that need a result first (find-window, pipe-pane, index
+handles) or touch local state (buffers, hooks, wait-for) run in order
+between batches. As in tmux the chain stops at the first error, but calls
+already sent in the same batch have run.
+
+Flags follow the Swift CLI (`--workspace`, `--surface`, `--pane`,
+`--target-pane`, ...), plus the tmux spellings harnesses use: `-t`, `-s`,
+`-S -`, `-b`, `-d`, `-l`, `-p`. Buffers and hooks share the CLI's
+~/.cmuxterm/tmux-compat-store.json, and wait-for uses the CLI's signal
+files, so both front ends interoperate. `--json` prints v2 results as-is.
+
+Access: in its default `cmuxOnly` mode the app only accepts connections
+from processes it started, and it checks that once, when a connection is
+made. The daemon is spawned by a CLI call made inside cmux, so its own
+connection passes, but it outlives that call. Its 0600 listen socket would
+then let any process of the same user drive the app through an already
+authenticated connection. So the daemon applies the same rule to its own
+clients: each client's pid (LOCAL_PEERPID, SO_PEERCRED on Linux) must
+descend from the process at the other end of the app connection, or the
+request is refused without reaching the app. If the app refuses the
+daemon, for example when a reconnect after an app relaunch comes from the
+now-orphaned daemon, it exits at once. The next CLI call from inside cmux
+starts a fresh one.
+
+Shim can also be used in-process:
+
+    with cmux(path) as client:
+        code, out, err = Shim(client).run(["capture-pane", "-p", "-t", "surface:1"])
+"""
+
+import json
+import os
+import re
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from cmux import cmux, cmuxError
+
+STORE_PATH = os.path.expanduser("~/.cmuxterm/tmux-compat-store.json")
+COMMANDS = (
+    "capture-pane", "send-keys", "rename-window", "resize-pane", "pipe-pane", "wait-for",
+    "swap-pane", "break-pane", "join-pane", "last-window", "next-window", "previous-window",
+    "last-pane", "clear-history", "find-window", "set-hook", "set-buffer", "list-buffers",
+    "paste-buffer", "respawn-pane", "display-message",
+)
+NOT_SUPPORTED = {"popup", "display-popup", "bind-key", "unbind-key", "copy-mode"}
+PROTOCOL = b"cmux-tmux-1"
+# How the app answers a connection it refuses (TerminalController.handleClient).
+_REFUSALS = ("ERROR: Access denied", "ERROR: Unable to verify client process")
+
+# tmux key names -> surface.send_key names
+_KEYS = {
+    "enter": "enter", "c-m": "enter", "kpenter": "enter",
+    "tab": "tab", "c-i": "tab",
+    "escape": "escape", "c-[": "escape",
+    "bspace": "backspace",
+    "c-\\": "ctrl+\\",
+}
+_CTRL_KEY = re.compile(r"^[cC]-([a-zA-Z])$")
+
+
+def split_chain(argv: Sequence[str]) -> List[List[str]]:
+    """Split argv on tmux's `;` separators (`\\;` in a shell, or a trailing `\\;`)."""
+    commands: List[List[str]] = [[]]
+    for arg in argv:
+        if arg in (";", "\\;"):
+            commands.append([])
+        elif arg.endswith("\\;"):
+            commands[-1].append(arg[:-2])
+            commands.append([])
+        else:
+            commands[-1].append(arg)
+    return [c for c in commands if c]
+
+
+def _take(args: List[str], *names: str) -> Optional[str]:
+    """Remove the first `name value` pair for any of `names`; returns the value."""
+    for i, arg in enumerate(args):
+        if arg in names and i + 1 < len(args):
+            value = args[i + 1]
+            del args[i:i + 2]
+            return value
+    return None
+
+
+def _flag(args: List[str], *names: str) -> bool:
+    """Remove every occurrence of the boolean flags `names`; True if any was present."""
+    found = False
+    for name in names:
+        while name in args:
+            args.remove(name)
+            found = True
+    return found
+
+
+def _rest(args: List[str]) -> List[str]:
+    return args[1:] if args[:1] == ["--"] else args
+
+
+def _is_handle(raw: str) -> bool:
+    if re.fullmatch(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}", raw):
+        return True
+    return re.fullmatch(r"(window|workspace|pane|surface):\d+", raw, re.IGNORECASE) is not None
+
+
+def _signal_path(name: str) -> str:
+    # Same file the Swift CLI's wait-for uses.
+    return "/tmp/cmux-wait-for-" + re.sub(r"[^A-Za-z0-9._-]", "_", name) + ".sig"
+
+
+class Call:
+    """Independent v2 calls for one command, and how to print their results."""
+
+    def __init__(self, calls: List[Tuple[str, Dict[str, Any]]], render: Callable[[List[Any]], str]):
+        self.calls = calls
+        self.render = render
+
+
+class Action:
+    """A command that needs earlier results or local state; runs on its own, in order."""
+
+    def __init__(self, run: Callable[[], str]):
+        self.run = run
+
+
+class _Context:
+    """Per-invocation options: global flags and the caller's environment."""
+
+    def __init__(self, json_output: bool, id_format: str, env: Dict[str, str], cwd: Optional[str]):
+        self.json = json_output
+        self.id_format = id_format
+        self.env = env
+        self.cwd = cwd
+
+
+class Shim:
+    """Translates tmux-compatible commands into v2 calls on one client."""
+
+    def __init__(self, client: cmux, store_path: str = STORE_PATH, on_round_trip: Optional[Callable[[int], None]] = None):
+        self.client = client
+        self.store_path = store_path
+        self.on_round_trip = on_round_trip
+        self.round_trips = 0
+        self.refused = ""  # the app's refusal, once it has turned this client away
+        self._client_lock = threading.Lock()
+        self._store_lock = threading.Lock()
+
+    # -- running -------------------------------------------------------------
+
+    def run(self, argv: Sequence[str], env: Optional[Dict[str, str]] = None,
+            cwd: Optional[str] = None) -> Tuple[int, str, str]:
+        """Run one command line (possibly `\\;`-chained); returns (exit code, stdout, stderr)."""
+        args = list(argv)
+        ctx = _Context(False, "refs", dict(os.environ if env is None else env), cwd)
+        while args and args[0].startswith("--"):
+            if args[0] == "--json":
+                ctx.json = True
+                args.pop(0)
+            elif args[0] in ("--id-format", "--socket") and len(args) > 1:
+                if args[0] == "--id-format":
+                    ctx.id_format = args[1]
+                del args[:2]
+            else:
+                break
+        commands = split_chain(args)
+        if not commands:
+            return 1, "", "Error: no command\n"
+
+        # One Shim may serve several daemon clients; each run keeps its own queue.
+        runner = _Run(self, ctx)
+        try:
+            for command in commands:
+                step = runner.plan(command)
+                if isinstance(step, Call):
+                    runner.pending.append(step)
+                else:
+                    runner.flush()
+                    runner.out.append(step.run())
+            runner.flush()
+        except (cmuxError, OSError) as e:
+            return 1, "".join(runner.out), f"Error: {e}\n"
+        return 0, "".join(runner.out), ""
+
+    def call_many(self, calls: List[Tuple[str, Dict[str, Any]]]) -> List[Any]:
+        """One pipelined round trip; failed calls come back as cmuxError."""
+        with self._client_lock:
+            if self.client._socket is None:
+                self.client.connect()
+            try:
+                results = self.client._call_many(calls, return_exceptions=True)
+            except (cmuxError, OSError) as e:
+                refusal = self._refusal(e)
+                # The connection is in an unknown state; reconnect on the next call.
+                self.client.close()
+                self.client._recv_buffer = ""
+                if refusal:
+                    self.refused = refusal
+                    raise cmuxError(refusal) from e
+                raise
+            self.round_trips += 1
+        if self.on_round_trip is not None:
+            self.on_round_trip(len(calls))
+        return results
+
+    def _refusal(self, error: Exception) -> str:
+        """The app's access-denied line if that is why a call failed, else ""."""
+        text = f"{error}\n{self.client._recv_buffer}"
+        sock = self.client._socket
+        if sock is not None:
+            # A write to a socket the app already closed fails before its reply is read.
+            try:
+                sock.setblocking(False)
+                text += sock.recv(65536).decode("utf-8", errors="replace")
+            except OSError:
+                pass
+        for prefix in _REFUSALS:
+            start = text.find(prefix)
+            if start >= 0:
+                return text[start + len("ERROR: "):].split("\n", 1)[0].strip()
+        return ""
+
+    def call(self, method: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        result = self.call_many([(method, params or {})])[0]
+        if isinstance(result, cmuxError):
+            raise result
+        return result or {}
+
+    # -- tmux compat store (shared with the Swift CLI) ----------------------
+
+    def load_store(self) -> Dict[str, Dict[str, str]]:
+        try:
+            with open(self.store_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        return {"buffers": dict(data.get("buffers") or {}), "hooks": dict(data.get("hooks") or {})}
+
+    def update_store(self, update: Callable[[Dict[str, Dict[str, str]]], None]) -> None:
+        with self._store_lock:
+            store = self.load_store()
+            update(store)
+            os.makedirs(os.path.dirname(self.store_path), exist_ok=True)
+            tmp = f"{self.store_path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(store, f)
+            os.replace(tmp, self.store_path)
+
+
+class _Run:
+    """Plans and executes one command line; consecutive Calls share a round trip."""
+
+    def __init__(self, shim: Shim, ctx: _Context):
+        self.shim = shim
+        self.ctx = ctx
+        self.pending: List[Call] = []
+        self.out: List[str] = []
+
+    def flush(self) -> None:
+        pending, self.pending = self.pending, []
+        calls = [c for step in pending for c in step.calls]
+        if not calls:
+            return
+        results = self.shim.call_many(calls)
+        at = 0
+        for step in pending:
+            chunk = results[at:at + len(step.calls)]
+            at += len(step.calls)
+            for result in chunk:
+                if isinstance(result, cmuxError):
+                    raise result
+            self.out.append(step.render([r or {} for r in chunk]))
+
+    def call(self, method: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """A call whose result planning needs: earlier queued calls go first."""
+        self.flush()
+        return self.shim.call(method, params)
+
+    # -- output --------------------------------------------------------------
+
+    def _handle_text(self, payload: Dict[str, Any], kind: str) -> Optional[str]:
+        ident, ref = payload.get(f"{kind}_id"), payload.get(f"{kind}_ref")
+        if self.ctx.id_format == "uuids":
+            return ident or ref
+        if self.ctx.id_format == "both" and ident and ref:
+            return f"{ref} ({ident})"
+        return ref or ident
+
+    def ok_summary(self, kinds: Sequence[str] = ("surface", "workspace")) -> Callable[[List[Any]], str]:
+        def render(results: List[Any]) -> str:
+            payload = results[-1]
+            if self.ctx.json:
+                return json.dumps(payload, indent=2) + "\n"
+            parts = ["OK"] + [h for h in (self._handle_text(payload, k) for k in kinds) if h]
+            return " ".join(parts) + "\n"
+        return render
+
+    def ok(self, results: List[Any]) -> str:
+        return json.dumps(results[-1], indent=2) + "\n" if self.ctx.json else "OK\n"
+
+    # -- handles -------------------------------------------------------------
+
+    def handle(self, kind: str, raw: Optional[str], workspace: Optional[str] = None) -> Optional[str]:
+        """UUIDs and refs pass through (the app resolves refs); an index is looked up."""
+        if raw is None or not raw.strip():
+            return None
+        raw = raw.strip()
+        if _is_handle(raw):
+            return raw
+        if not raw.isdigit():
+            raise cmuxError(f"Invalid {kind} handle: {raw} (expected UUID, ref like {kind}:1, or index)")
+        params = {"workspace_id": workspace} if workspace and kind != "workspace" else {}
+        listed = self.call(f"{kind}.list", params).get(f"{kind}s") or []
+        for item in listed:
+            if str(item.get("index")) == raw:
+                return item.get("ref") or item.get("id")
+        raise cmuxError(f"{kind.capitalize()} index not found")
+
+    def target(self, args: List[str], surface_flags: Sequence[str] = ("--surface", "-t"),
+               env_surface: bool = False) -> Dict[str, Any]:
+        """workspace_id/surface_id params; the app defaults to the focused surface when omitted."""
+        ws_arg = _take(args, "--workspace")
+        sf_arg = _take(args, *surface_flags)
+        if ws_arg is None:
+            ws_arg = self.ctx.env.get("CMUX_WORKSPACE_ID") or None
+        if sf_arg is None and env_surface and "--workspace" not in args:
+            sf_arg = self.ctx.env.get("CMUX_SURFACE_ID") or None
+        params: Dict[str, Any] = {}
+        ws = self.handle("workspace", ws_arg)
+        if ws:
+            params["workspace_id"] = ws
+        sf = self.handle("surface", sf_arg, ws)
+        if sf:
+            params["surface_id"] = sf
+        return params
+
+    # -- commands ------------------------------------------------------------
+
+    def plan(self, command: List[str]):
+        name, args = command[0], list(command[1:])
+        if name in NOT_SUPPORTED:
+            raise cmuxError(f"{name} is not supported yet in cmux CLI parity mode")
+        if name not in COMMANDS:
+            raise cmuxError(f"Unsupported tmux compatibility command: {name}")
+        return getattr(self, "_" + name.replace("-", "_"))(args)
+
+    def _capture_pane(self, args: List[str]) -> Call:
+        explicit_ws = "--workspace" in args
+        lines = _take(args, "--lines")
+        start = _take(args, "-S")
+        scrollback = _flag(args, "--scrollback")
+        _flag(args, "-p", "-J", "-e")
+        params = self.target(args, env_surface=not explicit_ws)
+        if scrollback or start is not None:
+            params["scrollback"] = True
+        if start not in (None, "-") and lines is None and start.lstrip("-").isdigit():
+            lines = start.lstrip("-")
+        if lines is not None:
+            if not lines.isdigit() or int(lines) <= 0:
+                raise cmuxError("--lines must be greater than 0")
+            params["lines"] = int(lines)
+            params["scrollback"] = True
+
+        def render(results: List[Any]) -> str:
+            if self.ctx.json:
+                return json.dumps(results[0], indent=2) + "\n"
+            return str(results[0].get("text") or "") + "\n"
+        return Call([("surface.read_text", params)], render)
+
+    def _send_keys(self, args: List[str]) -> Call:
+        explicit_ws = "--workspace" in args
+        literal = _flag(args, "-l")
+        params = self.target(args, env_surface=not explicit_ws)
+        calls: List[Tuple[str, Dict[str, Any]]] = []
+        text: List[str] = []
+        for arg in _rest(args):
+            key = None if literal else _KEYS.get(arg.lower())
+            match = None if literal else _CTRL_KEY.match(arg)
+            if match:
+                key = "ctrl+" + match.group(1).lower()
+            if key is None:
+                text.append(arg)
+                continue
+            if text:
+                calls.append(("surface.send_text", dict(params, text="".join(text))))
+                text = []
+            calls.append(("surface.send_key", dict(params, key=key)))
+        if text:
+            calls.append(("surface.send_text", dict(params, text="".join(text))))
+        if not calls:
+            raise cmuxError("send-keys requires keys")
+        return Call(calls, lambda results: json.dumps(results[-1], indent=2) + "\n" if self.ctx.json else "")
+
+    def _rename_window(self, args: List[str]) -> Call:
+        ws_arg = _take(args, "--workspace", "-t") or self.ctx.env.get("CMUX_WORKSPACE_ID") or None
+        title = " ".join(_rest(args)).strip()
+        if not title:
+            raise cmuxError("rename-window requires a title")
+        ws = self.handle("workspace", ws_arg) or self.call("workspace.current").get("workspace_id")
+        return Call([("workspace.rename", {"workspace_id": ws, "title": title})], self.ok_summary(["workspace"]))
+
+    def _resize_pane(self, args: List[str]) -> Call:
+        ws = self.handle("workspace", _take(args, "--workspace") or self.ctx.env.get("CMUX_WORKSPACE_ID") or None)
+        pane_arg = _take(args, "--pane", "-t")
+        amount_arg = _take(args, "--amount")
+        direction = "right"
+        for flag, name in (("-L", "left"), ("-R", "right"), ("-U", "up"), ("-D", "down")):
+            if flag in args:
+                direction = name
+                break
+        _flag(args, "-L", "-R", "-U", "-D")
+        if amount_arg is None and args and args[-1].isdigit():
+            amount_arg = args[-1]  # tmux: resize-pane -R 5
+        try:
+            amount = int(amount_arg or "1")
+        except ValueError:
+            amount = 1
+        if amount <= 0:
+            raise cmuxError("--amount must be greater than 0")
+        params: Dict[str, Any] = {"direction": direction, "amount": amount}
+        if ws:
+            params["workspace_id"] = ws
+        pane = self.handle("pane", pane_arg, ws)
+        if pane:
+            params["pane_id"] = pane
+        return Call([("pane.resize", params)], self.ok_summary(["pane"]))
+
+    def _pipe_pane(self, args: List[str]) -> Action:
+        command = _take(args, "--command")
+        params = self.target(args)
+        if command is None:
+            _flag(args, "-o", "-I", "-O")
+            command = " ".join(_rest(args)).strip()
+        if not command:
+            raise cmuxError("pipe-pane requires --command <shell-command>")
+        params["scrollback"] = True
+
+        def run() -> str:
+            text = str(self.shim.call("surface.read_text", params).get("text") or "")
+            shell = "/bin/zsh" if os.path.exists("/bin/zsh") else "/bin/sh"
+            proc = subprocess.run([shell, "-lc", command], input=text, capture_output=True, text=True,
+                                  cwd=self.ctx.cwd, env=self.ctx.env)
+            if proc.returncode != 0:
+                raise cmuxError(f"pipe-pane command failed ({proc.returncode}): {proc.stderr}")
+            if self.ctx.json:
+                return json.dumps({"ok": True, "status": proc.returncode, "stdout": proc.stdout,
+                                   "stderr": proc.stderr}, indent=2) + "\n"
+            return proc.stdout + "OK\n"
+        return Action(run)
+
+    def _wait_for(self, args: List[str]) -> Action:
+        signal = _flag(args, "-S", "--signal")
+        timeout_arg = _take(args, "--timeout")
+        try:
+            timeout = float(timeout_arg) if timeout_arg is not None else 30.0
+        except ValueError:
+            timeout = 30.0
+        name = next((a for a in args if not a.startswith("-")), "")
+        if not name:
+            raise cmuxError("wait-for requires a name")
+        path = _signal_path(name)
+
+        def run() -> str:
+            if signal:
+                open(path, "ab").close()
+                return "OK\n"
+            deadline = time.time() + timeout
+            while time.time() < deadline:
+                try:
+                    os.unlink(path)
+                    return "OK\n"
+                except FileNotFoundError:
+                    time.sleep(0.05)
+            raise cmuxError(f"wait-for timed out waiting for '{name}'")
+        return Action(run)
+
+    def _pane_params(self, args: List[str]) -> Tuple[Optional[str], Dict[str, Any]]:
+        ws = self.handle("workspace", _take(args, "--workspace") or self.ctx.env.get("CMUX_WORKSPACE_ID") or None)
+        return ws, ({"workspace_id": ws} if ws else {})
+
+    def _swap_pane(self, args: List[str]) -> Call:
+        ws, params = self._pane_params(args)
+        source = _take(args, "--pane", "-s")
+        target = _take(args, "--target-pane", "-t")
+        if source is None:
+            raise cmuxError("swap-pane requires --pane")
+        if target is None:
+            raise cmuxError("swap-pane requires --target-pane")
+        params["pane_id"] = self.handle("pane", source, ws)
+        params["target_pane_id"] = self.handle("pane", target, ws)
+        return Call([("pane.swap", params)], self.ok)
+
+    def _break_pane(self, args: List[str]) -> Call:
+        ws, params = self._pane_params(args)
+        params["focus"] = not _flag(args, "--no-focus", "-d")
+        pane = self.handle("pane", _take(args, "--pane"), ws)
+        surface = self.handle("surface", _take(args, "--surface", "-s"), ws)
+        if pane:
+            params["pane_id"] = pane
+        if surface:
+            params["surface_id"] = surface
+        return Call([("pane.break", params)], self.ok)
+
+    def _join_pane(self, args: List[str]) -> Call:
+        ws, params = self._pane_params(args)
+        params["focus"] = not _flag(args, "--no-focus", "-d")
+        pane = self.handle("pane", _take(args, "--pane"), ws)
+        surface = self.handle("surface", _take(args, "--surface", "-s"), ws)
+        target = _take(args, "--target-pane", "-t")
+        if target is None:
+            raise cmuxError("join-pane requires --target-pane")
+        if pane:
+            params["pane_id"] = pane
+        if surface:
+            params["surface_id"] = surface
+        params["target_pane_id"] = self.handle("pane", target, ws)
+        return Call([("pane.join", params)], self.ok)
+
+    def _last_window(self, args: List[str]) -> Call:
+        return Call([("workspace.last", {})], self.ok_summary(["workspace"]))
+
+    def _next_window(self, args: List[str]) -> Call:
+        return Call([("workspace.next", {})], self.ok_summary(["workspace"]))
+
+    def _previous_window(self, args: List[str]) -> Call:
+        return Call([("workspace.previous", {})], self.ok_summary(["workspace"]))
+
+    def _last_pane(self, args: List[str]) -> Call:
+        _, params = self._pane_params(args)
+        return Call([("pane.last", params)], self.ok_summary(["pane"]))
+
+    def _clear_history(self, args: List[str]) -> Call:
+        return Call([("surface.clear_history", self.target(args))], self.ok_summary())
+
+    def _find_window(self, args: List[str]) -> Action:
+        content = _flag(args, "--content")
+        select = _flag(args, "--select")
+        query = " ".join(a for a in args if not a.startswith("-")).strip().lower()
+
+        def run() -> str:
+            workspaces = self.shim.call("workspace.list").get("workspaces") or []
+            texts: List[Any] = [None] * len(workspaces)
+            if content and query:
+                # Every workspace's text in one round trip instead of one per workspace.
+                texts = self.shim.call_many([("surface.read_text", {"workspace_id": ws.get("id")}) for ws in workspaces])
+            matches = []
+            for ws, text in zip(workspaces, texts):
+                title = str(ws.get("title") or "")
+                body = str(text.get("text") or "") if isinstance(text, dict) else ""
+                if not query or query in title.lower() or query in body.lower():
+                    matches.append(ws)
+            if select and matches:
+                self.shim.call("workspace.select", {"workspace_id": matches[0].get("id")})
+            if self.ctx.json:
+                return json.dumps({"matches": matches}, indent=2) + "\n"
+            if not matches:
+                return "No matches\n"
+            handle = {"uuids": "id"}.get(self.ctx.id_format, "ref")
+            return "".join(f"{ws.get(handle) or ws.get('id')}  \"{ws.get('title') or ''}\"\n" for ws in matches)
+        return Action(run)
+
+    def _set_hook(self, args: List[str]) -> Action:
+        def run() -> str:
+            if "--list" in args:
+                hooks = self.shim.load_store()["hooks"]
+                if self.ctx.json:
+                    return json.dumps({"hooks": hooks}, indent=2) + "\n"
+                if not hooks:
+                    return "No hooks configured\n"
+                return "".join(f"{event} -> {cmd}\n" for event, cmd in sorted(hooks.items()))
+            if "--unset" in args:
+                if args[-1] == "--unset":
+                    raise cmuxError("set-hook --unset requires an event name")
+                self.shim.update_store(lambda s: s["hooks"].pop(args[-1], None))
+                return "OK\n"
+            event = next((a for a in args if not a.startswith("-")), None)
+            command = " ".join(args[args.index(event) + 1:]).strip() if event else ""
+            if not command:
+                raise cmuxError("set-hook requires <event> <command>")
+            self.shim.update_store(lambda s: s["hooks"].__setitem__(event, command))
+            return "OK\n"
+        return Action(run)
+
+    def _set_buffer(self, args: List[str]) -> Action:
+        name = (_take(args, "--name", "-b") or "").strip() or "default"
+        content = " ".join(_rest(args)).strip()
+        if not content:
+            raise cmuxError("set-buffer requires text")
+
+        def run() -> str:
+            self.shim.update_store(lambda s: s["buffers"].__setitem__(name, content))
+            return "OK\n"
+        return Action(run)
+
+    def _list_buffers(self, args: List[str]) -> Action:
+        def run() -> str:
+            buffers = self.shim.load_store()["buffers"]
+            if self.ctx.json:
+                listed = [{"name": k, "size": len(v)} for k, v in sorted(buffers.items())]
+                return json.dumps({"buffers": listed}, indent=2) + "\n"
+            if not buffers:
+                return "No buffers\n"
+            return "".join(f"{k}\t{len(v)}\n" for k, v in sorted(buffers.items()))
+        return Action(run)
+
+    def _paste_buffer(self, args: List[str]) -> Call:
+        name = _take(args, "--name", "-b") or "default"
+        params = self.target(args)
+        # Buffers are local; set-buffer earlier in the chain has already run.
+        buffer = self.shim.load_store()["buffers"].get(name)
+        if buffer is None:
+            raise cmuxError(f"Buffer not found: {name}")
+        return Call([("surface.send_text", dict(params, text=buffer))], self.ok)
+
+    def _respawn_pane(self, args: List[str]) -> Call:
+        command = _take(args, "--command")
+        _flag(args, "-k")
+        params = self.target(args)
+        text = (command if command is not None else " ".join(_rest(args))).strip()
+        params["text"] = (text or "exec ${SHELL:-/bin/zsh} -l") + "\n"
+        return Call([("surface.send_text", params)], self.ok)
+
+    def _display_message(self, args: List[str]) -> Any:
+        print_only = _flag(args, "-p", "--print")
+        message = " ".join(a for a in args if not a.startswith("-")).strip()
+        if not message:
+            raise cmuxError("display-message requires text")
+        if print_only:
+            return Action(lambda: message + "\n")
+
+        def render(results: List[Any]) -> str:
+            return json.dumps(results[0], indent=2) + "\n" if self.ctx.json else message + "\n"
+        return Call([("notification.create", {"title": "cmux", "body": message})], render)
+
+
+# -- daemon --------------------------------------------------------------------
+
+
+def peer_pid(sock: socket.socket) -> Optional[int]:
+    """Pid of the process at the other end of a connected Unix socket (the listener's, from the client side)."""
+    try:
+        if sys.platform == "darwin":
+            return sock.getsockopt(0, 0x002)  # SOL_LOCAL, LOCAL_PEERPID
+        pid, _uid, _gid = struct.unpack("3i", sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                                                              struct.calcsize("3i")))
+        return pid
+    except (OSError, AttributeError):
+        return None
+
+
+_libsystem: Any = None
+
+
+def parent_pid(pid: int) -> Optional[int]:
+    if sys.platform == "darwin":
+        global _libsystem
+        import ctypes
+
+        if _libsystem is None:
+            _libsystem = ctypes.CDLL("/usr/lib/libSystem.B.dylib")
+        info = ctypes.create_string_buffer(136)  # struct proc_bsdinfo
+        if _libsystem.proc_pidinfo(pid, 3, ctypes.c_uint64(0), info, 136) != 136:  # PROC_PIDTBSDINFO
+            return None
+        return struct.unpack_from("I", info.raw, 16)[0]  # pbi_ppid, after flags, status, xstatus, pid
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The command name may hold spaces or parentheses; fields resume after the last ')'.
+    return int(stat.rsplit(b")", 1)[1].split()[1])
+
+
+def is_descendant(pid: int, ancestor: int) -> bool:
+    """Same walk as the app's cmuxOnly check (TerminalController.isDescendant)."""
+    current: Optional[int] = pid
+    for _ in range(128):
+        if current == ancestor:
+            return True
+        if current is None or current <= 1:
+            return False
+        parent = parent_pid(current)
+        if parent == current:
+            return False
+        current = parent
+    return False
+
+
+def _decode_request(data: bytes) -> Tuple[str, Dict[str, str], List[str]]:
+    fields = data.split(b"\0")
+    if len(fields) < 4 or fields[0] != PROTOCOL:
+        raise cmuxError("bad shim request")
+    text = [f.decode("utf-8", errors="replace") for f in fields[1:]]
+    cwd, workspace, surface, argv = text[0], text[1], text[2], text[3:]
+    env = {k: v for k, v in os.environ.items() if k not in ("CMUX_WORKSPACE_ID", "CMUX_SURFACE_ID")}
+    if workspace:
+        env["CMUX_WORKSPACE_ID"] = workspace
+    if surface:
+        env["CMUX_SURFACE_ID"] = surface
+    return cwd, env, argv
+
+
+def encode_response(code: int, out: str, err: str) -> bytes:
+    body = out.encode("utf-8")
+    return b"%d\0%d\0" % (code, len(body)) + body + err.encode("utf-8")
+
+
+class Daemon:
+    """Serves shim clients on `listen_path` over one persistent connection to `socket_path`."""
+
+    def __init__(self, socket_path: str, listen_path: str, idle_exit_s: float = 600.0):
+        self.socket_path = socket_path
+        self.listen_path = listen_path
+        self.idle_exit_s = idle_exit_s
+        self.shim = Shim(cmux(socket_path))
+        self.active = 0
+        self.last_active = time.time()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._srv: Optional[socket.socket] = None
+        self._listen_ino = 0
+
+    def bind(self) -> bool:
+        """Claim listen_path; False when another live daemon already holds it."""
+        tmp = f"{self.listen_path}.{os.getpid()}"
+        srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        srv.bind(tmp)
+        os.chmod(tmp, 0o600)
+        srv.listen(64)
+        try:
+            # link() refuses to replace an existing path, so two racing daemons cannot both win.
+            for _ in range(2):
+                try:
+                    os.link(tmp, self.listen_path)
+                    break
+                except FileExistsError:
+                    if _alive(self.listen_path):
+                        srv.close()
+                        return False
+                    os.unlink(self.listen_path)  # stale socket from a daemon that died
+            else:
+                srv.close()
+                return False
+        finally:
+            os.unlink(tmp)
+        self._srv = srv
+        self._listen_ino = os.stat(self.listen_path).st_ino
+        return True
+
+    def serve_forever(self) -> None:
+        srv = self._srv
+        if srv is None:
+            raise cmuxError("daemon not bound")
+        srv.settimeout(0.5)
+        try:
+            while not self._stop.is_set():
+                try:
+                    conn, _ = srv.accept()
+                except socket.timeout:
+                    with self._lock:
+                        idle = self.active == 0 and time.time() - self.last_active > self.idle_exit_s
+                    if idle:
+                        return
+                    continue
+                except OSError:
+                    return
+                with self._lock:
+                    self.active += 1
+                threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+        finally:
+            self.close()
+
+    def _app_pid(self) -> Optional[int]:
+        with self.shim._client_lock:
+            client = self.shim.client
+            if client._socket is None:
+                client.connect()
+            return peer_pid(client._socket)
+
+    def _allowed(self, conn: socket.socket) -> bool:
+        """The app's cmuxOnly rule, applied to our own clients: they must descend from the app."""
+        pid = peer_pid(conn)
+        app = self._app_pid()
+        return pid is not None and app is not None and is_descendant(pid, app)
+
+    def _serve(self, conn: socket.socket) -> None:
+        served = False
+        try:
+            with conn:
+                chunks = []
+                while True:
+                    chunk = conn.recv(65536)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                try:
+                    cwd, env, argv = _decode_request(b"".join(chunks))
+                except cmuxError as e:
+                    conn.sendall(encode_response(1, "", f"Error: {e}\n"))
+                    return
+                if argv == ["kill-server"]:
+                    conn.sendall(encode_response(0, "", ""))
+                    self._stop.set()
+                    return
+                try:
+                    allowed = self._allowed(conn)
+                except (cmuxError, OSError) as e:
+                    conn.sendall(encode_response(1, "", f"Error: {e}\n"))
+                    return
+                if not allowed:
+                    conn.sendall(encode_response(
+                        1, "", "Error: Access denied — only processes started inside cmux can use this daemon\n"))
+                    return
+                served = True
+                code, out, err = self.shim.run(argv, env=env, cwd=cwd or None)
+                if self.shim.refused:
+                    # Orphaned and no longer welcome: step aside so the next call from cmux respawns us.
+                    self._release()
+                    self._stop.set()
+                conn.sendall(encode_response(code, out, err))
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                self.active -= 1
+                if served:
+                    self.last_active = time.time()
+
+    def _release(self) -> None:
+        """Remove listen_path if it is still ours (a newer daemon may have replaced it)."""
+        try:
+            if os.stat(self.listen_path).st_ino == self._listen_ino:
+                os.unlink(self.listen_path)
+        except FileNotFoundError:
+            pass
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._srv is not None:
+            self._srv.close()
+            self._srv = None
+            self._release()
+        self.shim.client.close()
+
+
+def _alive(path: str) -> bool:
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        probe.close()
+
+
+def main(argv: List[str]) -> int:
+    def option(name: str, default: str) -> str:
+        return argv[argv.index(name) + 1] if name in argv and argv.index(name) + 1 < len(argv) else default
+
+    socket_path = option("--socket", cmux.DEFAULT_SOCKET_PATH)
+    listen_path = option("--listen", "")
+    if not listen_path:
+        print("usage: cmux_tmux_shim.py --socket PATH --listen PATH [--idle-exit SECONDS]", file=sys.stderr)
+        return 2
+    daemon = Daemon(socket_path, listen_path, float(option("--idle-exit", "600")))
+    if not daemon.bind():
+        return 0
+    daemon.serve_forever()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
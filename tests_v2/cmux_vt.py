@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""A small VT100/xterm screen model for rendering PTY output as text.
+
+Screen.feed() takes raw bytes from a terminal program (split anywhere, even
+inside a UTF-8 character or an escape sequence) and keeps the visible grid,
+the cursor and a scrollback of lines that scrolled off the top. text()
+renders them the way `surface.read_text` does: one line per row, trailing
+blanks trimmed, optionally with scrollback and a tail limit.
+
+It covers what shells, readline and common CLI tools emit: printable text
+with deferred autowrap, CR/LF/BS/TAB, cursor movement, erase and
+insert/delete of characters and lines, scroll regions, save/restore cursor,
+the alternate screen (which never adds to scrollback) and cursor-position
+reports. Colors and other attributes are parsed and ignored; every character
+is one cell wide.
+
+Scrollback is a ring: past `scrollback` lines the oldest are discarded.
+"""
+
+import codecs
+import re
+from collections import deque
+from typing import Deque, List, Optional
+
+_TOKEN = re.compile(
+    r"(?P<text>[^\x00-\x1f\x7f-\x9f]+)"
+    r"|\x1b\[(?P<priv>[?>=!<]?)(?P<args>[0-9;:]*)[ -/]*(?P<final>[@-~])"
+    r"|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)"
+    r"|\x1b[PX^_][^\x1b]*\x1b\\"
+    r"|\x1b(?P<inter>[ -/]*)(?P<esc>[0-OQ-WYZ\\`-~])"
+    r"|(?P<ctl>[\x00-\x1a\x1c-\x1f\x7f-\x9f])"
+)
+# Complete CRLF-terminated lines of plain text: the bulk of command output.
+_LINES = re.compile(r"(?:[^\x00-\x1f\x7f-\x9f]*\r\n)+")
+# An escape sequence cut off by the end of the data so far.
+_PARTIAL = re.compile(r"\x1b(?:\[[?>=!<]?[0-9;:]*[ -/]*|\][^\x07\x1b]*\x1b?|[PX^_][^\x1b]*\x1b?|[ -/]*)?\Z")
+_MAX_PENDING = 4096
+
+
+class Screen:
+    """Visible grid plus ring-buffered scrollback, fed with raw terminal output."""
+
+    def __init__(self, cols: int = 80, rows: int = 24, scrollback: int = 10000):
+        self.cols = cols
+        self.rows = rows
+        self.history: Deque[str] = deque(maxlen=scrollback)
+        self.replies: List[bytes] = []  # answers to queries (e.g. cursor position) owed to the program
+        self.bytes_fed = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._pending = ""
+        self.reset()
+
+    def reset(self) -> None:
+        self.grid = self._blank_grid()
+        self.x = 0
+        self.y = 0
+        self.top = 0
+        self.bottom = self.rows - 1
+        self.wrap_pending = False
+        self.saved = (0, 0)
+        self.alt: Optional[List[List[str]]] = None  # main grid while the alternate screen is shown
+
+    def _blank_grid(self) -> List[List[str]]:
+        return [[" "] * self.cols for _ in range(self.rows)]
+
+    # -- input ---------------------------------------------------------------
+
+    def feed(self, data: bytes) -> None:
+        self.bytes_fed += len(data)
+        text = self._pending + self._decoder.decode(data)
+        self._pending = ""
+        pos, end = 0, len(text)
+        match, lines = _TOKEN.match, _LINES.match
+        while pos < end:
+            if self.x == 0 and not self.wrap_pending:
+                m = lines(text, pos)
+                if m is not None:
+                    self._print_lines(m.group())
+                    pos = m.end()
+                    continue
+            m = match(text, pos)
+            if m is None:
+                # A lone ESC: wait for the rest of the sequence, or drop it if it can't be one.
+                if _PARTIAL.match(text, pos) and end - pos < _MAX_PENDING:
+                    self._pending = text[pos:]
+                    return
+                pos += 1
+                continue
+            pos = m.end()
+            kind = m.lastgroup
+            if kind == "text":
+                self._print(m.group("text"))
+            elif kind == "ctl":
+                ch = m.group("ctl")
+                if ch == "\r":
+                    self.x = 0
+                    self.wrap_pending = False
+                elif ch == "\n":
+                    self._linefeed()
+                else:
+                    self._control(ch)
+            elif kind == "final":
+                self._csi(m.group("priv"), m.group("args"), m.group("final"))
+            elif kind == "esc":
+                self._esc(m.group("inter"), m.group("esc"))
+            # OSC / DCS strings (titles, hyperlinks, ...) don't change the text.
+
+    def _print(self, run: str) -> None:
+        cols = self.cols
+        while run:
+            if self.wrap_pending:
+                self.x = 0
+                self._linefeed()
+                self.wrap_pending = False
+            n = min(len(run), cols - self.x)
+            self.grid[self.y][self.x:self.x + n] = run[:n]
+            self.x += n
+            if self.x >= cols:
+                self.x = cols - 1
+                self.wrap_pending = True
+            run = run[n:]
+
+    def _print_lines(self, block: str) -> None:
+        """`block` is whole lines ending in CRLF, starting at column 0: print and wrap each, then line feed."""
+        cols, grid = self.cols, self.grid
+        for line in block.split("\r\n")[:-1]:
+            for i in range(0, len(line) or 1, cols):
+                piece = line[i:i + cols]
+                if piece:
+                    grid[self.y][:len(piece)] = piece
+                self._linefeed()
+
+    def _control(self, ch: str) -> None:
+        if ch == "\n" or ch == "\x0b" or ch == "\x0c":
+            self._linefeed()
+        elif ch == "\r":
+            self.x = 0
+            self.wrap_pending = False
+        elif ch == "\x08":
+            self.x = max(0, self.x - 1)
+            self.wrap_pending = False
+        elif ch == "\t":
+            self.x = min(self.cols - 1, (self.x // 8 + 1) * 8)
+
+    def _linefeed(self) -> None:
+        if self.y == self.bottom:
+            self._scroll_up(1)
+        elif self.y < self.rows - 1:
+            self.y += 1
+
+    def _scroll_up(self, n: int) -> None:
+        grid = self.grid
+        if n == 1:
+            row = grid.pop(self.top)
+            if self.top == 0 and self.alt is None:
+                self.history.append("".join(row).rstrip())
+            grid.insert(self.bottom, [" "] * self.cols)
+            return
+        n = min(n, self.bottom - self.top + 1)
+        removed = self.grid[self.top:self.top + n]
+        del self.grid[self.top:self.top + n]
+        if self.top == 0 and self.alt is None:
+            self.history.extend("".join(row).rstrip() for row in removed)
+        for _ in range(n):
+            self.grid.insert(self.bottom - n + 1, [" "] * self.cols)
+
+    def _scroll_down(self, n: int) -> None:
+        n = min(n, self.bottom - self.top + 1)
+        del self.grid[self.bottom - n + 1:self.bottom + 1]
+        for _ in range(n):
+            self.grid.insert(self.top, [" "] * self.cols)
+
+    def _esc(self, inter: str, final: str) -> None:
+        if inter:
+            return  # charset designations
+        if final == "7":
+            self.saved = (self.x, self.y)
+        elif final == "8":
+            self.x, self.y = self.saved
+            self.wrap_pending = False
+        elif final == "D":
+            self._linefeed()
+        elif final == "E":
+            self.x = 0
+            self._linefeed()
+        elif final == "M":
+            if self.y == self.top:
+                self._scroll_down(1)
+            elif self.y > 0:
+                self.y -= 1
+        elif final == "c":
+            self.reset()
+
+    def _csi(self, priv: str, args: str, final: str) -> None:
+        params = [int(p) if p.isdigit() else 0 for p in args.replace(":", ";").split(";")] if args else []
+
+        def arg(i: int, default: int = 1) -> int:
+            return params[i] if i < len(params) and params[i] else default
+
+        if priv == "?":
+            if final in "hl" and any(p in (47, 1047, 1049) for p in params):
+                self._alternate(final == "h")
+            return
+        if priv:
+            return
+        self.wrap_pending = False
+        grid, rows, cols = self.grid, self.rows, self.cols
+        if final == "A":
+            self.y = max(self.top if self.y >= self.top else 0, self.y - arg(0))
+        elif final in "Be":
+            self.y = min(self.bottom if self.y <= self.bottom else rows - 1, self.y + arg(0))
+        elif final in "Ca":
+            self.x = min(cols - 1, self.x + arg(0))
+        elif final == "D":
+            self.x = max(0, self.x - arg(0))
+        elif final == "E":
+            self.x, self.y = 0, min(rows - 1, self.y + arg(0))
+        elif final == "F":
+            self.x, self.y = 0, max(0, self.y - arg(0))
+        elif final in "G`":
+            self.x = min(cols - 1, arg(0) - 1)
+        elif final in "Hf":
+            self.y, self.x = min(rows - 1, arg(0) - 1), min(cols - 1, arg(1) - 1)
+        elif final == "d":
+            self.y = min(rows - 1, arg(0) - 1)
+        elif final == "J":
+            mode = arg(0, 0)
+            if mode == 0:
+                grid[self.y][self.x:] = " " * (cols - self.x)
+                for r in range(self.y + 1, rows):
+                    grid[r] = [" "] * cols
+            elif mode == 1:
+                grid[self.y][:self.x + 1] = " " * (self.x + 1)
+                for r in range(self.y):
+                    grid[r] = [" "] * cols
+            elif mode == 2:
+                self.grid = self._blank_grid()
+            elif mode == 3:
+                self.history.clear()
+        elif final == "K":
+            mode = arg(0, 0)
+            row = grid[self.y]
+            if mode == 0:
+                row[self.x:] = " " * (cols - self.x)
+            elif mode == 1:
+                row[:self.x + 1] = " " * (self.x + 1)
+            else:
+                grid[self.y] = [" "] * cols
+        elif final == "X":
+            n = min(arg(0), cols - self.x)
+            grid[self.y][self.x:self.x + n] = " " * n
+        elif final == "P":
+            row = grid[self.y]
+            n = min(arg(0), cols - self.x)
+            del row[self.x:self.x + n]
+            row.extend(" " * n)
+        elif final == "@":
+            row = grid[self.y]
+            n = min(arg(0), cols - self.x)
+            row[self.x:self.x] = " " * n
+            del row[cols:]
+        elif final in "LM" and self.top <= self.y <= self.bottom:
+            top = self.top
+            self.top = self.y
+            if final == "L":
+                self._scroll_down(arg(0))
+            else:
+                # Deleted lines are gone, not scrolled into history.
+                n = min(arg(0), self.bottom - self.y + 1)
+                del grid[self.y:self.y + n]
+                for _ in range(n):
+                    grid.insert(self.bottom - n + 1, [" "] * cols)
+            self.top = top
+            self.x = 0
+        elif final == "S":
+            self._scroll_up(arg(0))
+        elif final == "T":
+            self._scroll_down(arg(0))
+        elif final == "r":
+            top, bottom = arg(0) - 1, min(rows, arg(1, rows)) - 1
+            if top < bottom:
+                self.top, self.bottom = top, bottom
+                self.x, self.y = 0, 0
+        elif final == "s":
+            self.saved = (self.x, self.y)
+        elif final == "u":
+            self.x, self.y = self.saved
+        elif final == "n":
+            if arg(0) == 6:
+                self.replies.append(b"\x1b[%d;%dR" % (self.y + 1, self.x + 1))
+            elif arg(0) == 5:
+                self.replies.append(b"\x1b[0n")
+        elif final == "c":
+            self.replies.append(b"\x1b[?1;2c")
+
+    def _alternate(self, on: bool) -> None:
+        if on and self.alt is None:
+            self.alt = self.grid
+            self.saved = (self.x, self.y)
+            self.grid = self._blank_grid()
+        elif not on and self.alt is not None:
+            self.grid, self.alt = self.alt, None
+            self.x, self.y = self.saved
+        self.wrap_pending = False
+
+    # -- output --------------------------------------------------------------
+
+    def lines(self) -> List[str]:
+        return ["".join(row).rstrip() for row in self.grid]
+
+    def text(self, scrollback: bool = False, lines: Optional[int] = None) -> str:
+        """Visible rows (plus scrollback when asked), trailing blank rows dropped, last `lines` only."""
+        out = (list(self.history) if scrollback and self.alt is None else []) + self.lines()
+        while out and not out[-1]:
+            out.pop()
+        if lines is not None:
+            out = out[-lines:] if lines > 0 else []
+        return "\n".join(out)
+
+    def clear(self) -> None:
+        """Drop scrollback and everything above the cursor row, which moves to the top."""
+        self.history.clear()
+        row = self.grid[self.y]
+        self.grid = self._blank_grid()
+        self.grid[0] = row
+        self.y = 0
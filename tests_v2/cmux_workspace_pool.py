@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""Pool of pre-created, shell-ready workspaces for tests.
+
+Most tests start with `new_workspace()` and then poll a marker file until the
+new terminal's shell has started. The pool keeps `size` spare workspaces
+whose shells are already known to be running, so a test only pays for a
+`workspace.select`:
+
+    from cmux_workspace_pool import WorkspacePool
+
+    with WorkspacePool(size=2) as pool:
+        for test in tests:
+            with pool.lease() as workspace_id:   # selected, terminal focused
+                test(client)
+
+acquire() only takes a spare off the list. A background thread on its own
+connection does the rest: it creates spares with workspace.create
+focus=false, so the selection a test is using never moves. It types
+`touch <marker>` into each spare's terminal by surface id, which changes no
+focus either, and watches for the marker.
+
+A released workspace is closed and replaced, unless the caller passes
+recycle=True and it still holds a single terminal surface, in which case its
+shell is interrupted and it goes back into the pool.
+"""
+
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from cmux import cmux, cmuxError
+
+
+class _Spare:
+    def __init__(self, workspace_id: str, surface_id: str, marker: Path):
+        self.workspace_id = workspace_id
+        self.surface_id = surface_id
+        self.marker = marker
+        self.probe_sent = False
+        self.ready = False
+
+
+class WorkspacePool:
+    """Keeps `size` shell-ready workspaces around and hands them out one at a time."""
+
+    def __init__(self, size: int = 2, socket_path: Optional[str] = None, ready_timeout: float = 15.0):
+        self.size = max(1, size)
+        self.socket_path = socket_path
+        self.ready_timeout = ready_timeout
+        self.stats: Dict[str, float] = {"created": 0, "recycled": 0, "replaced": 0, "acquire_wait_s": 0.0}
+        self._client: Optional[cmux] = None
+        self._probe: Optional[cmux] = None
+        self._spares: List[_Spare] = []
+        self._leased: Dict[str, _Spare] = {}
+        self._current: Optional[str] = None
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._marker_dir = Path(tempfile.mkdtemp(prefix="cmux-pool-"))
+        self._seq = 0
+        self._wake = threading.Event()
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self) -> "WorkspacePool":
+        self._client = cmux(self.socket_path)
+        self._client.connect()
+        # The background thread gets its own connection; the client is not thread-safe.
+        self._probe = cmux(self.socket_path)
+        self._probe.connect()
+        self._thread = threading.Thread(target=self._watch, name="cmux-workspace-pool", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        with self._cond:
+            spares, self._spares = self._spares, []
+        if self._client is not None:
+            for spare in spares:
+                try:
+                    self._client.close_workspace(spare.workspace_id)
+                except cmuxError:
+                    pass
+        for conn in (self._client, self._probe):
+            if conn is not None:
+                conn.close()
+        shutil.rmtree(self._marker_dir, ignore_errors=True)
+
+    def __enter__(self) -> "WorkspacePool":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    # ------------------------------------------------------------------
+    # Leasing
+    # ------------------------------------------------------------------
+
+    def acquire(self, timeout: Optional[float] = None) -> str:
+        """Select a shell-ready workspace, focus its terminal and return its id."""
+        assert self._client is not None, "pool not started"
+        timeout = self.ready_timeout if timeout is None else timeout
+        started = time.time()
+        with self._cond:
+            self._cond.wait_for(lambda: any(s.ready for s in self._spares), timeout=timeout)
+            spare = next((s for s in self._spares if s.ready), None)
+            if spare is None and self._spares:
+                # Shells in never-displayed workspaces may not start until shown;
+                # take the oldest and wait for it in the foreground.
+                spare = self._spares[0]
+            if spare is None:
+                raise cmuxError("workspace pool is empty")
+            self._spares.remove(spare)
+
+        self._wake.set()  # refill in the background
+
+        self._client.select_workspace(spare.workspace_id)
+        self._client.focus_surface(spare.surface_id)
+        if not spare.ready:
+            self._send_probe(self._client, spare)
+            deadline = time.time() + self.ready_timeout
+            while not spare.marker.exists():
+                if time.time() > deadline:
+                    raise cmuxError(f"shell in workspace {spare.workspace_id} did not start")
+                time.sleep(0.05)
+            spare.ready = True
+        spare.marker.unlink(missing_ok=True)
+        # Drop the probe command from the scrollback so tests see a clean screen.
+        self._client.clear_history(surface=spare.surface_id)
+        self.stats["acquire_wait_s"] += time.time() - started
+        self._leased[spare.workspace_id] = spare
+        return spare.workspace_id
+
+    def release(self, workspace_id: str, recycle: bool = False) -> None:
+        """Return a leased workspace: recycle it into the pool or close and replace it."""
+        assert self._client is not None, "pool not started"
+        spare = self._leased.pop(workspace_id, None)
+        if spare is None:
+            raise cmuxError(f"workspace {workspace_id} was not leased from this pool")
+        if recycle and self._pristine(spare):
+            self._client.send_key_surface(spare.surface_id, "ctrl-c")
+            marker = self._next_marker()
+            with self._cond:
+                spare.ready = False
+                spare.probe_sent = False
+                spare.marker = marker
+                self._spares.append(spare)
+            self.stats["recycled"] += 1
+            return
+        try:
+            self._client.close_workspace(workspace_id)
+        except cmuxError:
+            pass
+        self.stats["replaced"] += 1
+        self._wake.set()
+
+    def fresh(self) -> str:
+        """Lease a new workspace and close the one from the previous fresh() call."""
+        previous = self._current
+        # Acquire first so the old workspace is no longer selected when it closes.
+        self._current = self.acquire()
+        if previous is not None:
+            self.release(previous)
+        return self._current
+
+    @contextlib.contextmanager
+    def lease(self, recycle: bool = False) -> Iterator[str]:
+        workspace_id = self.acquire()
+        try:
+            yield workspace_id
+        finally:
+            self.release(workspace_id, recycle=recycle)
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _next_marker(self) -> Path:
+        with self._cond:
+            self._seq += 1
+            return self._marker_dir / f"ready-{self._seq}"
+
+    def _pristine(self, spare: _Spare) -> bool:
+        try:
+            health = self._client.surface_health(spare.workspace_id)
+        except cmuxError:
+            return False
+        return len(health) == 1 and health[0].get("type") == "terminal"
+
+    def _fill(self) -> None:
+        """Top the pool up to `size` spares. Runs on the background thread only."""
+        client = self._probe
+        while not self._stop.is_set():
+            with self._cond:
+                if len(self._spares) >= self.size:
+                    return
+            # focus=False: the workspace a test is using stays selected.
+            workspace_id = client.new_workspace(focus=False)
+            surfaces = client.list_surfaces(workspace_id)
+            if not surfaces:
+                client.close_workspace(workspace_id)
+                return
+            spare = _Spare(workspace_id, surfaces[0][1], self._next_marker())
+            with self._cond:
+                self._spares.append(spare)
+                self.stats["created"] += 1
+                self._cond.notify_all()
+
+    def _send_probe(self, client: cmux, spare: _Spare) -> None:
+        """Type the readiness probe once per spare, whichever thread gets there first."""
+        with self._cond:
+            if spare.probe_sent:
+                return
+            spare.probe_sent = True
+            marker = spare.marker
+        try:
+            client.send_surface(spare.surface_id, f"touch {marker}\n")
+        except cmuxError:
+            with self._cond:
+                spare.probe_sent = False
+            raise
+
+    def _watch(self) -> None:
+        self._wake.set()
+        while not self._stop.is_set():
+            if self._wake.is_set():
+                self._wake.clear()
+                try:
+                    self._fill()
+                except cmuxError:
+                    pass  # retried on the next acquire/release
+            with self._cond:
+                pending = [s for s in self._spares if not s.ready]
+            for spare in pending:
+                try:
+                    self._send_probe(self._probe, spare)
+                except cmuxError:
+                    continue
+                if spare.marker.exists():
+                    with self._cond:
+                        spare.ready = True
+                        self._cond.notify_all()
+            self._wake.wait(0.05)
+
+
+def main() -> int:
+    # Quick manual check: warm a pool and time a few leases.
+    size = int(os.environ.get("CMUX_POOL_SIZE", "2"))
+    with WorkspacePool(size=size) as pool:
+        for i in range(3):
+            started = time.time()
+            with pool.lease() as workspace_id:
+                print(f"lease {i}: {workspace_id} after {time.time() - started:.3f}s")
+    print(f"stats: {pool.stats}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
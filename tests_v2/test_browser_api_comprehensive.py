@@ -3,12 +3,14 @@
 
 import os
 import sys
-import time
+import tempfile
 import urllib.parse
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent))
 from cmux import cmux, cmuxError
+from cmux_browser_session import BrowserSession
+from cmux_browser_snapshot import Snapshot, diff
 
 
 SOCKET_PATH = os.environ.get("CMUX_SOCKET", "/tmp/cmux-debug.sock")
@@ -23,21 +25,6 @@ def _data_url(html: str) -> str:
     return "data:text/html;charset=utf-8," + urllib.parse.quote(html)
 
 
-def _wait_until(pred, timeout_s: float, label: str) -> None:
-    deadline = time.time() + timeout_s
-    last_exc = None
-    while time.time() < deadline:
-        try:
-            if pred():
-                return
-        except Exception as exc:  # noqa: BLE001
-            last_exc = exc
-        time.sleep(0.05)
-    if last_exc is not None:
-        raise cmuxError(f"Timed out waiting for {label}: {last_exc}")
-    raise cmuxError(f"Timed out waiting for {label}")
-
-
 def _expect_error(label: str, fn, code_substr: str) -> None:
     try:
         fn()
@@ -65,18 +52,6 @@ def _value(res: dict, key: str = "value"):
 
 
 
-def _wait_with_fallback(c: cmux, surface_id: str, params: dict, pred, timeout_s: float, label: str) -> None:
-    call_params = dict(params)
-    call_params["surface_id"] = surface_id
-    try:
-        c._call("browser.wait", call_params)
-        return
-    except cmuxError as exc:
-        if "timeout" not in str(exc):
-            raise
-    _wait_until(pred, timeout_s=timeout_s, label=f"{label} fallback")
-
-
 def _build_pages() -> tuple[str, str]:
     page1 = """
 <!doctype html>
@@ -154,64 +129,26 @@ def main() -> int:
         if sref:
             _ = c._call("browser.url.get", {"surface_id": sref})
 
-        probe_url = _data_url("<!doctype html><html><body><button id='probe'>P</button></body></html>")
-        c._call("browser.navigate", {"surface_id": target, "url": probe_url})
-        _wait_with_fallback(
-            c,
-            target,
-            {"selector": "#probe", "timeout_ms": 3000},
-            lambda: bool((c._call("browser.eval", {"surface_id": target, "script": "document.querySelector('#probe') !== null"}) or {}).get("value")),
-            timeout_s=4.0,
-            label="browser.wait selector #probe",
-        )
+        session = BrowserSession(c, target)
 
-        c._call("browser.navigate", {"surface_id": target, "url": page1_url})
-        _wait_with_fallback(
-            c,
-            target,
-            {"text_contains": "ready", "timeout_ms": 3000},
-            lambda: "ready" in str((c._call("browser.eval", {"surface_id": target, "script": "document.body ? (document.body.innerText || '') : ''"}) or {}).get("value") or ""),
-            timeout_s=4.0,
-            label="browser.wait text_contains ready",
-        )
-        _wait_with_fallback(
-            c,
-            target,
-            {"function": "document.querySelector('#hdr') !== null", "timeout_ms": 3000},
-            lambda: bool((c._call("browser.eval", {"surface_id": target, "script": "document.querySelector('#hdr') !== null"}) or {}).get("value")),
-            timeout_s=4.0,
-            label="browser.wait function hdr",
-        )
-        _wait_with_fallback(
-            c,
-            target,
-            {"load_state": "complete", "timeout_ms": 5000},
-            lambda: str((c._call("browser.eval", {"surface_id": target, "script": "document.readyState"}) or {}).get("value") or "").lower() == "complete",
-            timeout_s=6.0,
-            label="browser.wait load_state complete",
-        )
-        _wait_with_fallback(
-            c,
-            target,
-            {"url_contains": "data:text/html", "timeout_ms": 3000},
-            lambda: "data:text/html" in str((c._call("browser.url.get", {"surface_id": target}) or {}).get("url") or ""),
-            timeout_s=4.0,
-            label="browser.wait url_contains data:text/html",
-        )
-
-        _wait_until(
-            lambda: "cmux-browser-comprehensive-1"
-            in str((c._call("browser.get.title", {"surface_id": target}) or {}).get("title") or ""),
-            timeout_s=3.0,
-            label="browser.get.title page1",
-        )
+        probe_url = _data_url("<!doctype html><html><body><button id='probe'>P</button></body></html>")
+        session.navigate(probe_url)
+        session.wait_for_selector("#probe", timeout_ms=3000)
+
+        session.navigate(page1_url)
+        session.wait_for_text("ready", timeout_ms=3000)
+        session.wait_for("document.querySelector('#hdr') !== null", timeout_ms=3000)
+        session.wait_for_load("complete", timeout_ms=5000)
+        session.wait_for_url("data:text/html", timeout_ms=3000)
+        session.wait_for_title("cmux-browser-comprehensive-1", timeout_ms=3000)
+        _must("cmux-browser-comprehensive-1" in session.title(), "Expected page1 title from browser.get.title")
         url_payload = c._call("browser.url.get", {"surface_id": target}) or {}
         _must("data:text/html" in str(url_payload.get("url") or ""), f"Expected data URL from browser.url.get: {url_payload}")
 
         c._call("browser.fill", {"surface_id": target, "selector": "#name", "text": "cmux"})
         c._call("browser.click", {"surface_id": target, "selector": "#btn"})
-        out_text = c._call("browser.get.text", {"surface_id": target, "selector": "#status"}) or {}
-        _must(str(_value(out_text)) == "cmux", f"Expected status text to be cmux: {out_text}")
+        out_text = session.text("#status")
+        _must(str(out_text) == "cmux", f"Expected status text to be cmux: {out_text!r}")
 
         cleared = c._call("browser.fill", {"surface_id": target, "selector": "#name", "text": "", "snapshot_after": True}) or {}
         _must(bool(cleared.get("post_action_snapshot")), f"Expected post_action_snapshot from fill(snapshot_after): {cleared}")
@@ -272,11 +209,6 @@ def main() -> int:
         cnt_val = c._call("browser.get.count", {"surface_id": target, "selector": "option"}) or {}
         _must(int((cnt_val or {}).get("count") or 0) == 2, f"Expected option count=2: {cnt_val}")
 
-        box_val = c._call("browser.get.box", {"surface_id": target, "selector": "#status"}) or {}
-        box = _value(box_val)
-        _must(isinstance(box, dict), f"Expected box dict: {box_val}")
-        _must(float(box.get("width") or 0.0) > 0.0, f"Expected positive box width: {box_val}")
-
         style_prop = c._call(
             "browser.get.styles",
             {"surface_id": target, "selector": "#style-target", "property": "color"},
@@ -287,15 +219,24 @@ def main() -> int:
         _must(isinstance(_value(style_all), dict), f"Expected style dictionary: {style_all}")
         _must("display" in (_value(style_all) or {}), f"Expected display in style dictionary: {style_all}")
 
-        visible_status = c._call("browser.is.visible", {"surface_id": target, "selector": "#status"}) or {}
-        visible_hidden = c._call("browser.is.visible", {"surface_id": target, "selector": "#hidden"}) or {}
-        _must(bool(_value(visible_status)) is True, f"Expected #status visible: {visible_status}")
-        _must(bool(_value(visible_hidden)) is False, f"Expected #hidden not visible: {visible_hidden}")
-
-        enabled_btn = c._call("browser.is.enabled", {"surface_id": target, "selector": "#btn"}) or {}
-        enabled_disabled = c._call("browser.is.enabled", {"surface_id": target, "selector": "#disabled"}) or {}
-        _must(bool(_value(enabled_btn)) is True, f"Expected #btn enabled: {enabled_btn}")
-        _must(bool(_value(enabled_disabled)) is False, f"Expected #disabled not enabled: {enabled_disabled}")
+        # Independent reads go out in one round trip.
+        before = session.round_trips
+        with session.batch() as b:
+            box_val = b.box("#status")
+            visible_status = b.visible("#status")
+            visible_hidden = b.visible("#hidden")
+            enabled_btn = b.enabled("#btn")
+            enabled_disabled = b.enabled("#disabled")
+            status_again = b.text("#status")
+        _must(session.round_trips - before <= 1, f"Expected one round trip for the batch, got {session.round_trips - before}")
+        box = box_val.value
+        _must(isinstance(box, dict), f"Expected box dict: {box!r}")
+        _must(float(box.get("width") or 0.0) > 0.0, f"Expected positive box width: {box!r}")
+        _must(visible_status.value is True, f"Expected #status visible: {visible_status.value!r}")
+        _must(visible_hidden.value is False, f"Expected #hidden not visible: {visible_hidden.value!r}")
+        _must(enabled_btn.value is True, f"Expected #btn enabled: {enabled_btn.value!r}")
+        _must(enabled_disabled.value is False, f"Expected #disabled not enabled: {enabled_disabled.value!r}")
+        _must(str(status_again.value) == "cmux", f"Expected batched status text cmux: {status_again.value!r}")
 
         c._call("browser.scroll", {"surface_id": target, "selector": "#scroller", "dx": 0, "dy": 160})
         scrolled = c._call(
@@ -317,6 +258,10 @@ def main() -> int:
 
         shot = c._call("browser.screenshot", {"surface_id": target}) or {}
         _must(len(str((shot or {}).get("png_base64") or "")) > 100, f"Expected screenshot payload: {shot}")
+        with tempfile.TemporaryDirectory(prefix="cmux-browser-shot-") as shot_dir:
+            shot_path = session.screenshot(Path(shot_dir) / "page1.png")
+            with open(shot_path, "rb") as f:
+                _must(f.read(8) == b"\x89PNG\r\n\x1a\n", f"Expected a PNG file at {shot_path}")
 
         snap = c._call("browser.snapshot", {"surface_id": target}) or {}
         snapshot_text = str((snap or {}).get("snapshot") or "")
@@ -324,54 +269,25 @@ def main() -> int:
         refs = (snap or {}).get("refs") or {}
         _must(isinstance(refs, dict), f"Expected snapshot refs dict: {snap}")
         _must(any(str(key).startswith("e") for key in refs.keys()), f"Expected eN refs from snapshot: {snap}")
+        parsed = Snapshot.from_result(snap)
+        _must(set(parsed.by_ref) == set(refs), f"Parsed snapshot refs differ from payload refs: {sorted(parsed.by_ref)}")
+        _must(diff(parsed, Snapshot.from_result(session.call("browser.snapshot") or {})).empty,
+              "Expected no structural change between back-to-back snapshots")
 
-        c._call("browser.navigate", {"surface_id": target, "url": page2_url})
-        _wait_with_fallback(
-            c,
-            target,
-            {"text_contains": "page-two", "timeout_ms": 4000},
-            lambda: "page-two" in str((c._call("browser.eval", {"surface_id": target, "script": "document.body ? (document.body.innerText || '') : ''"}) or {}).get("value") or ""),
-            timeout_s=5.0,
-            label="browser.wait text_contains page-two",
-        )
-        _wait_until(
-            lambda: "cmux-browser-comprehensive-2"
-            in str((c._call("browser.get.title", {"surface_id": target}) or {}).get("title") or ""),
-            timeout_s=3.0,
-            label="browser.get.title page2",
-        )
+        session.navigate(page2_url)
+        session.wait_for_text("page-two", timeout_ms=4000)
+        session.wait_for_title("cmux-browser-comprehensive-2", timeout_ms=3000)
 
         c._call("browser.back", {"surface_id": target})
-        _wait_with_fallback(
-            c,
-            target,
-            {"url_contains": "cmux-browser-comprehensive-1", "timeout_ms": 4000},
-            lambda: "cmux-browser-comprehensive-1" in str((c._call("browser.url.get", {"surface_id": target}) or {}).get("url") or ""),
-            timeout_s=5.0,
-            label="browser.wait url_contains page1 (history)",
-        )
+        session.wait_for_url("cmux-browser-comprehensive-1", timeout_ms=4000)
         c._call("browser.forward", {"surface_id": target})
-        _wait_with_fallback(
-            c,
-            target,
-            {"url_contains": "cmux-browser-comprehensive-2", "timeout_ms": 4000},
-            lambda: "cmux-browser-comprehensive-2" in str((c._call("browser.url.get", {"surface_id": target}) or {}).get("url") or ""),
-            timeout_s=5.0,
-            label="browser.wait url_contains page2 (history)",
-        )
+        session.wait_for_url("cmux-browser-comprehensive-2", timeout_ms=4000)
         c._call("browser.reload", {"surface_id": target})
-        _wait_with_fallback(
-            c,
-            target,
-            {"url_contains": "cmux-browser-comprehensive-2", "timeout_ms": 4000},
-            lambda: "cmux-browser-comprehensive-2" in str((c._call("browser.url.get", {"surface_id": target}) or {}).get("url") or ""),
-            timeout_s=5.0,
-            label="browser.wait url_contains page2 (reload)",
-        )
+        session.wait_for_url("cmux-browser-comprehensive-2", timeout_ms=4000)
 
         c._call("browser.focus_webview", {"surface_id": target})
-        _wait_until(
-            lambda: bool((c._call("browser.is_webview_focused", {"surface_id": target}) or {}).get("focused")),
+        session.poll(
+            lambda: bool((session.call("browser.is_webview_focused") or {}).get("focused")),
             timeout_s=2.5,
             label="browser.is_webview_focused",
         )
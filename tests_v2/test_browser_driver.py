@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Tests for tests_v2/cmux_browser_driver.py against a stand-in v2 socket server.
+
+Checks that:
+- flows on different surfaces overlap (each surface has its own connection),
+  so K surfaces finish K slow page checks in about the time of one
+- flows pinned to one surface run in submission order, one at a time
+- submit() blocks once a surface's queue is full, and gives up after `timeout`
+- flow exceptions come back through the future; the driver keeps going
+- surfaces opened with browser.open_split are closed on exit
+- timing aggregates per-method latency and reports the achieved concurrency
+
+Does not need a running cmux instance.
+
+Usage:
+    python3 tests_v2/test_browser_driver.py
+"""
+
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from cmux import cmuxError  # noqa: E402
+from cmux_browser_driver import BrowserDriver  # noqa: E402
+
+LOAD_S = 0.15  # simulated page load, served by browser.wait
+
+
+class FakeApp:
+    """Browser surfaces whose pages take LOAD_S to load; one thread per connection like the app."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.urls: Dict[str, str] = {}
+        self.closed: List[str] = []
+        self.active: Dict[str, int] = {}  # surface -> calls in progress
+        self.max_overlap_per_surface = 0
+
+    def handle(self, method: str, params: dict) -> dict:
+        if method == "system.capabilities":
+            return {"methods": ["browser.open_split", "browser.navigate", "browser.wait",
+                                "browser.url.get", "browser.get.title", "surface.close"]}
+        if method == "browser.open_split":
+            sid = str(uuid.uuid4())
+            with self.lock:
+                self.urls[sid] = params.get("url", "about:blank")
+            return {"surface_id": sid}
+        if method == "surface.close":
+            with self.lock:
+                self.closed.append(params["surface_id"])
+            return {}
+        sid = params["surface_id"]
+        with self.lock:
+            self.active[sid] = self.active.get(sid, 0) + 1
+            self.max_overlap_per_surface = max(self.max_overlap_per_surface, self.active[sid])
+        try:
+            if method == "browser.navigate":
+                with self.lock:
+                    self.urls[sid] = params["url"]
+                return {}
+            if method == "browser.wait":
+                time.sleep(LOAD_S)
+                return {"waited": True}
+            if method == "browser.url.get":
+                return {"url": self.urls[sid]}
+            if method == "browser.get.title":
+                return {"title": f"title of {self.urls[sid]}"}
+            raise KeyError(method)
+        finally:
+            with self.lock:
+                self.active[sid] -= 1
+
+
+class StandIn:
+    def __init__(self, app: FakeApp, path: str):
+        self.app = app
+        self.path = path
+        self._srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._srv.bind(path)
+        self._srv.listen(16)
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                conn, _ = self._srv.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: socket.socket) -> None:
+        with conn, conn.makefile("rwb") as f:
+            for line in f:
+                req = json.loads(line)
+                try:
+                    resp = {"id": req["id"], "ok": True, "result": self.app.handle(req["method"], req["params"])}
+                except KeyError as e:
+                    resp = {"id": req["id"], "ok": False, "error": {"code": "method_not_found", "message": str(e)}}
+                f.write((json.dumps(resp) + "\n").encode())
+                f.flush()
+
+    def close(self) -> None:
+        self._srv.close()
+
+
+def check_route(session, url: str) -> str:
+    session.navigate(url)
+    session.wait_for_load()
+    with session.batch() as b:
+        title, current = b.title(), b.url()
+    if current.value != url:
+        raise cmuxError(f"navigated to {url} but surface shows {current.value}")
+    return title.value
+
+
+def check_concurrency(tmp: str) -> List[str]:
+    failures: List[str] = []
+    app = FakeApp()
+    server = StandIn(app, os.path.join(tmp, "concurrency.sock"))
+    urls = [f"http://localhost:{3000 + i}/" for i in range(12)]
+    try:
+        with BrowserDriver(surfaces=4, socket_path=server.path, queue_size=2) as driver:
+            opened = list(driver.surface_ids)
+            titles = driver.map(check_route, urls)
+            summary = driver.timing.summary()
+            print("  " + driver.timing.report().replace("\n", "\n  "))
+        if titles != [f"title of {u}" for u in urls]:
+            failures.append(f"results out of order or wrong: {titles[:3]}...")
+        serial = len(urls) * LOAD_S
+        if summary["wall_ms"] / 1000 > serial * 0.6:
+            failures.append(f"12 loads on 4 surfaces took {summary['wall_ms']:.0f}ms (serial would be {serial * 1000:.0f}ms)")
+        if summary["concurrency"] < 2.0:
+            failures.append(f"concurrency {summary['concurrency']:.2f}, expected >= 2 on 4 surfaces")
+        if summary["methods"]["browser.wait"]["count"] != len(urls) or summary["methods"]["batch"]["count"] != len(urls):
+            failures.append(f"per-method counts: {summary['methods']}")
+        if sorted(app.closed) != sorted(opened) or len(opened) != 4:
+            failures.append(f"opened {opened}, closed {app.closed}")
+        if app.max_overlap_per_surface != 1:
+            failures.append(f"a surface ran {app.max_overlap_per_surface} calls at once")
+    finally:
+        server.close()
+    return failures
+
+
+def check_pinned_order_and_errors(tmp: str) -> List[str]:
+    failures: List[str] = []
+    app = FakeApp()
+    server = StandIn(app, os.path.join(tmp, "pinned.sock"))
+    try:
+        sid = app.handle("browser.open_split", {})["surface_id"]
+        seen: List[int] = []
+
+        def step(session, n: int) -> int:
+            session.navigate(f"about:blank#{n}")
+            seen.append(n)
+            if n == 2:
+                raise ValueError("flow failed")
+            return n
+
+        with BrowserDriver(surfaces=[sid], socket_path=server.path) as driver:
+            futures = [driver.submit(step, n, surface=sid) for n in range(5)]
+            outcomes = []
+            for f in futures:
+                try:
+                    outcomes.append(f.result(timeout=5))
+                except ValueError as e:
+                    outcomes.append(str(e))
+            try:
+                driver.submit(step, 9, surface="not-a-surface")
+                failures.append("unknown surface should be rejected")
+            except cmuxError:
+                pass
+        if seen != [0, 1, 2, 3, 4] or outcomes != [0, 1, "flow failed", 3, 4]:
+            failures.append(f"pinned flows: seen={seen} outcomes={outcomes}")
+        if app.closed:
+            failures.append("surfaces passed in should not be closed by the driver")
+    finally:
+        server.close()
+    return failures
+
+
+def check_backpressure(tmp: str) -> List[str]:
+    failures: List[str] = []
+    app = FakeApp()
+    server = StandIn(app, os.path.join(tmp, "backpressure.sock"))
+    release = threading.Event()
+    try:
+        def blocked(session) -> None:
+            release.wait(5)
+
+        with BrowserDriver(surfaces=1, socket_path=server.path, queue_size=1) as driver:
+            running = driver.submit(blocked)
+            deadline = time.time() + 2
+            while driver._lanes[0].in_flight == 0 and time.time() < deadline:
+                time.sleep(0.01)
+            queued = driver.submit(blocked)  # fills the queue
+            t0 = time.perf_counter()
+            try:
+                driver.submit(blocked, timeout=0.2)
+                failures.append("submit into a full queue should time out")
+            except cmuxError as e:
+                waited = time.perf_counter() - t0
+                if "full" not in str(e) or waited < 0.15:
+                    failures.append(f"backpressure error after {waited:.2f}s: {e}")
+            release.set()
+            running.result(timeout=5)
+            queued.result(timeout=5)
+            if driver.timing.summary()["queue_wait_p95_ms"] <= 0:
+                failures.append("queued flow should report a queue wait")
+    finally:
+        release.set()
+        server.close()
+    return failures
+
+
+def main() -> int:
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="cmux-browser-driver-") as tmp:
+        for check in (check_concurrency, check_pinned_order_and_errors, check_backpressure):
+            print(f"RUN  {check.__name__}")
+            failures.extend(check(tmp))
+
+    if failures:
+        print("Browser driver test failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("Browser driver test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
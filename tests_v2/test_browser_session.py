@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Tests for tests_v2/cmux_browser_session.py against a stand-in v2 socket server.
+
+Checks that:
+- a batch of getters goes out in one write and comes back as one round trip,
+  with values unwrapped and a failing getter not affecting the others
+- waits are single browser.wait calls with the right condition, not eval polls
+- missing methods are learned once (from system.capabilities or a
+  method_not_found answer) and never sent again, while a not_supported
+  answer is not remembered
+- without browser.wait, waits fall back to polling browser.eval
+- cmux._call_many leaves the connection usable after an error
+
+Does not need a running cmux instance.
+
+Usage:
+    python3 tests_v2/test_browser_session.py
+"""
+
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from cmux import cmux, cmuxError  # noqa: E402
+from cmux_browser_session import BrowserSession, BrowserUnsupported  # noqa: E402
+
+SURFACE = "11111111-2222-3333-4444-555555555555"
+
+
+class MethodNotFound(Exception):
+    pass
+
+
+class FakeBrowser:
+    """A page with a few elements, served through the v2 browser.* methods."""
+
+    def __init__(self, methods: Optional[List[str]] = None, not_supported: tuple = (), missing: tuple = ()):
+        self.methods = methods
+        self.not_supported = set(not_supported)
+        self.missing = set(missing)
+        self.calls: List[str] = []
+        self.waits: List[Dict[str, Any]] = []
+        self.elements = {
+            "#status": {"text": "cmux", "visible": True, "box": {"x": 8, "y": 40, "width": 120, "height": 18}},
+            "#hidden": {"text": "", "visible": False, "box": {"x": 0, "y": 0, "width": 0, "height": 0}},
+            "#name": {"value": "cmux-v2", "visible": True},
+        }
+        self.url = "data:text/html,page-one"
+        self.body = "Browser Comprehensive ready"
+        self.evals_until_true = 0
+
+    def handle(self, method: str, params: dict) -> Any:
+        self.calls.append(method)
+        if method == "system.capabilities":
+            if self.methods is None:
+                raise MethodNotFound(method)
+            return {"methods": self.methods}
+        if method in self.not_supported:
+            raise NotImplementedError(method)
+        if method in self.missing:
+            raise MethodNotFound(method)
+        if params.get("surface_id") != SURFACE:
+            raise KeyError("surface")
+        selector = params.get("selector")
+        if method == "browser.wait":
+            self.waits.append({k: v for k, v in params.items() if k != "surface_id"})
+            if selector is not None and selector not in self.elements:
+                raise TimeoutError(params.get("timeout_ms"))
+            if "text_contains" in params and params["text_contains"] not in self.body:
+                raise TimeoutError(params.get("timeout_ms"))
+            return {"surface_id": SURFACE, "waited": True}
+        if method == "browser.eval":
+            if self.evals_until_true > 0:
+                self.evals_until_true -= 1
+                return {"value": False}
+            return {"value": True}
+        if method == "browser.url.get":
+            return {"url": self.url}
+        if method == "browser.get.title":
+            return {"title": "cmux-browser-comprehensive-1"}
+        if selector not in self.elements:
+            raise KeyError(selector)
+        el = self.elements[selector]
+        if method == "browser.get.text":
+            return {"value": el.get("text", "")}
+        if method == "browser.get.value":
+            return {"value": el.get("value", "")}
+        if method == "browser.is.visible":
+            return {"value": el["visible"]}
+        if method == "browser.get.box":
+            return {"value": el.get("box")}
+        raise MethodNotFound(method)
+
+
+class StandIn:
+    def __init__(self, app: FakeBrowser, path: str):
+        self.app = app
+        self.path = path
+        self.chunks: List[int] = []  # request lines per read
+        self._srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._srv.bind(path)
+        self._srv.listen(4)
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                conn, _ = self._srv.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: socket.socket) -> None:
+        pending = b""
+        with conn:
+            while True:
+                data = conn.recv(65536)
+                if not data:
+                    return
+                pending += data
+                *lines, pending = pending.split(b"\n")
+                self.chunks.append(len(lines))
+                out = [json.dumps(self._respond(json.loads(line))) + "\n" for line in lines if line.strip()]
+                conn.sendall("".join(out).encode())
+
+    def _respond(self, req: dict) -> dict:
+        try:
+            return {"id": req["id"], "ok": True, "result": self.app.handle(req["method"], req["params"])}
+        except TimeoutError as e:
+            error = {"code": "timeout", "message": "Condition not met before timeout", "data": {"timeout_ms": e.args[0]}}
+        except NotImplementedError as e:
+            error = {"code": "not_supported", "message": f"{e} is not supported on WKWebView"}
+        except MethodNotFound as e:
+            error = {"code": "method_not_found", "message": f"Unknown method {e}"}
+        except KeyError as e:
+            error = {"code": "not_found", "message": f"No element or surface {e}"}
+        return {"id": req["id"], "ok": False, "error": error}
+
+    def close(self) -> None:
+        self._srv.close()
+
+
+ALL_METHODS = [
+    "system.capabilities", "browser.wait", "browser.eval", "browser.url.get", "browser.get.title",
+    "browser.get.text", "browser.get.value", "browser.is.visible", "browser.get.box",
+]
+
+
+def check_pipelined_batch(tmp: str) -> List[str]:
+    failures: List[str] = []
+    app = FakeBrowser(ALL_METHODS)
+    server = StandIn(app, os.path.join(tmp, "batch.sock"))
+    try:
+        with cmux(server.path) as client:
+            session = BrowserSession(client, SURFACE)
+            session.supports("browser.get.text")  # fetch capabilities outside the measured batch
+            server.chunks.clear()
+            with session.batch() as b:
+                text = b.text("#status")
+                value = b.value("#name")
+                shown = b.visible("#status")
+                hidden = b.visible("#hidden")
+                box = b.box("#status")
+                missing = b.text("#nope")
+            if session.round_trips != 1:
+                failures.append(f"batch took {session.round_trips} round trips, expected 1")
+            if server.chunks != [6]:
+                failures.append(f"server read the batch as {server.chunks}, expected one read of 6 requests")
+            got = (text.value, value.value, shown.value, hidden.value, box.value["width"])
+            if got != ("cmux", "cmux-v2", True, False, 120):
+                failures.append(f"batched values: {got}")
+            if missing.ok or "not_found" not in str(missing.error):
+                failures.append(f"missing element should fail only its own slot: {missing.error}")
+            # The connection is still in sync for plain calls.
+            if session.title() != "cmux-browser-comprehensive-1":
+                failures.append("call after batch returned the wrong response")
+    finally:
+        server.close()
+    return failures
+
+
+def check_server_side_waits(tmp: str) -> List[str]:
+    failures: List[str] = []
+    app = FakeBrowser(ALL_METHODS)
+    server = StandIn(app, os.path.join(tmp, "wait.sock"))
+    try:
+        with cmux(server.path) as client:
+            session = BrowserSession(client, SURFACE)
+            session.wait_for_selector("#status", timeout_ms=3000)
+            session.wait_for_text("ready")
+            session.wait_for_url("page-one")
+            session.wait_for_load()
+            session.wait_for("window.__ready === true")
+            try:
+                session.wait_for_selector("#never", timeout_ms=100)
+                failures.append("wait for a missing selector should time out")
+            except BrowserUnsupported:
+                failures.append("a timeout is not an unsupported method")
+            except cmuxError as e:
+                if "Timed out" not in str(e):
+                    failures.append(f"unexpected wait error: {e}")
+        expected = [
+            {"selector": "#status", "timeout_ms": 3000},
+            {"text_contains": "ready", "timeout_ms": 5000},
+            {"url_contains": "page-one", "timeout_ms": 5000},
+            {"load_state": "complete", "timeout_ms": 5000},
+            {"function": "window.__ready === true", "timeout_ms": 5000},
+            {"selector": "#never", "timeout_ms": 100},
+        ]
+        if app.waits != expected:
+            failures.append(f"browser.wait conditions: {app.waits}")
+        if "browser.eval" in app.calls:
+            failures.append("waits should not poll browser.eval when browser.wait exists")
+    finally:
+        server.close()
+    return failures
+
+
+def check_unsupported_cache(tmp: str) -> List[str]:
+    failures: List[str] = []
+    methods = [m for m in ALL_METHODS if m != "browser.get.box"]
+    app = FakeBrowser(methods, not_supported=("browser.get.value",), missing=("browser.is.visible",))
+    server = StandIn(app, os.path.join(tmp, "caps.sock"))
+    try:
+        with cmux(server.path) as client:
+            for _ in range(2):
+                session = BrowserSession(client, SURFACE)
+                with session.batch() as b:
+                    box = b.box("#status")
+                    value = b.value("#name")
+                    visible = b.visible("#status")
+                    text = b.text("#status")
+                errors = (box.error, value.error, visible.error)
+                if not all(isinstance(e, BrowserUnsupported) for e in errors):
+                    failures.append(f"expected BrowserUnsupported, got {errors!r}")
+                if text.value != "cmux":
+                    failures.append(f"supported getter in the same batch: {text.error}")
+                for call in (lambda: session.value("#name"), lambda: session.visible("#status")):
+                    try:
+                        call()
+                        failures.append("unsupported method should raise")
+                    except BrowserUnsupported:
+                        pass
+        counts = {m: app.calls.count(m) for m in ("system.capabilities", "browser.get.box", "browser.is.visible",
+                                                   "browser.get.value")}
+        # not_supported can depend on the page, so browser.get.value is asked every time.
+        want = {"system.capabilities": 1, "browser.get.box": 0, "browser.is.visible": 1, "browser.get.value": 4}
+        if counts != want:
+            failures.append(f"only missing methods should be cached: {counts}")
+    finally:
+        server.close()
+    return failures
+
+
+def check_wait_fallback(tmp: str) -> List[str]:
+    failures: List[str] = []
+    app = FakeBrowser(methods=None, missing=("browser.wait",))
+    app.evals_until_true = 3
+    server = StandIn(app, os.path.join(tmp, "fallback.sock"))
+    try:
+        with cmux(server.path) as client:
+            session = BrowserSession(client, SURFACE, poll_s=0.01)
+            session.wait_for_selector("#status", timeout_ms=2000)
+            session.wait_for_text("ready", timeout_ms=2000)
+        if app.calls.count("browser.wait") != 1:
+            failures.append(f"browser.wait should be tried once, then cached: {app.calls}")
+        if app.calls.count("browser.eval") != 5:
+            failures.append(f"expected 4 + 1 eval polls, got {app.calls.count('browser.eval')}")
+    finally:
+        server.close()
+    return failures
+
+
+def check_call_many_errors(tmp: str) -> List[str]:
+    failures: List[str] = []
+    app = FakeBrowser(ALL_METHODS)
+    server = StandIn(app, os.path.join(tmp, "many.sock"))
+    try:
+        with cmux(server.path) as client:
+            calls = [
+                ("browser.get.text", {"surface_id": SURFACE, "selector": "#nope"}),
+                ("browser.get.text", {"surface_id": SURFACE, "selector": "#status"}),
+            ]
+            try:
+                client._call_many(calls)
+                failures.append("_call_many should raise the first error")
+            except cmuxError as e:
+                if "not_found" not in str(e):
+                    failures.append(f"unexpected error: {e}")
+            res = client._call("browser.url.get", {"surface_id": SURFACE})
+            if (res or {}).get("url") != app.url:
+                failures.append(f"connection out of sync after a failed batch: {res}")
+            if client._call_many([]) != []:
+                failures.append("empty batch should return []")
+    finally:
+        server.close()
+    return failures
+
+
+def main() -> int:
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="cmux-browser-session-") as tmp:
+        for check in (check_pipelined_batch, check_server_side_waits, check_unsupported_cache,
+                      check_wait_fallback, check_call_many_errors):
+            print(f"RUN  {check.__name__}")
+            failures.extend(check(tmp))
+
+    if failures:
+        print("Browser session test failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("Browser session test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Tests for tests_v2/cmux_browser_snapshot.py.
+
+Checks that:
+- browser.snapshot text parses into nodes with depth, parent and ref indexes
+  (including names with spaces and brackets, and skipped depth levels)
+- diff() matches nodes by shape, so fresh refs alone are not a change,
+  and reports added, removed and renamed nodes plus page-text changes
+- an item inserted into a list is one addition, not a cascade of renames
+- parsing and diffing a large tree is fast enough to run after every step
+
+Does not need a running cmux instance.
+
+Usage:
+    python3 tests_v2/test_browser_snapshot.py
+"""
+
+import os
+import sys
+import time
+from typing import List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from cmux_browser_snapshot import Snapshot, diff  # noqa: E402
+
+PAGE = """- document "cmux-browser-comprehensive-1"
+- heading "Browser Comprehensive" [ref=e1]
+- textbox [ref=e2]
+- button "Go" [ref=e3]
+- navigation "Main menu" [ref=e4]
+    - link "Home [beta]" [ref=e5]
+    - link "Docs" [ref=e6]
+  - listitem "Nested" [ref=e7]
+- checkbox [ref=e8]"""
+
+
+def _result(tree: str, text: str = "ready", url: str = "data:text/html,1") -> dict:
+    return {"snapshot": tree, "title": "cmux-browser-comprehensive-1", "url": url, "page": {"text": text}}
+
+
+def _renumber(tree: str, offset: int) -> str:
+    """The app hands out fresh refs on every snapshot."""
+    out = []
+    for line in tree.splitlines():
+        at = line.rfind("[ref=e")
+        if at >= 0:
+            n = int(line[at + 6:-1])
+            line = f"{line[:at]}[ref=e{n + offset}]"
+        out.append(line)
+    return "\n".join(out)
+
+
+def check_parse(tmp: str) -> List[str]:
+    failures: List[str] = []
+    snap = Snapshot.from_result(_result(PAGE))
+    if len(snap) != 8 or snap.title != "cmux-browser-comprehensive-1":
+        failures.append(f"expected 8 nodes and the title, got {len(snap)} / {snap.title!r}")
+    home = snap.node("@e5")
+    if home is None or home.name != "Home [beta]" or home.role != "link" or home.depth != 2:
+        failures.append(f"ref lookup: {home!r}")
+    nav = snap.node("e4")
+    if home is not None and nav is not None and home.parent != nav.index:
+        failures.append("link should hang off the navigation node despite the skipped level")
+    nested = snap.node("e7")
+    if nested is None or nested.parent != nav.index:
+        failures.append(f"shallower sibling should pop back to the navigation node: {nested!r}")
+    if [n.ref for n in snap.children(nav)] != ["e5", "e6", "e7"]:
+        failures.append(f"children: {[n.ref for n in snap.children(nav)]}")
+    textbox = snap.find("textbox")
+    if textbox is None or textbox.name != "" or textbox.ref != "e2":
+        failures.append(f"unnamed node: {textbox!r}")
+    if (snap.find("button", "Go") or textbox).ref != "e3":
+        failures.append("find by role and name")
+    if snap.render() != "\n".join(PAGE.splitlines()[1:]):
+        failures.append("render() should round-trip the node lines")
+    empty = Snapshot.parse('- document "blank"\n- text "only text"')
+    if len(empty) or empty.title != "blank":
+        failures.append("fallback text line should not become a node")
+    return failures
+
+
+def check_diff(tmp: str) -> List[str]:
+    failures: List[str] = []
+    before = Snapshot.from_result(_result(PAGE, text="Browser Comprehensive\nready"))
+    same = Snapshot.from_result(_result(_renumber(PAGE, 100), text="Browser Comprehensive\nready"))
+    if not diff(before, same).empty:
+        failures.append(f"new refs alone should not be a change: {diff(before, same).render()}")
+
+    changed_tree = (_renumber(PAGE, 100)
+                    .replace('button "Go"', 'button "Going"')
+                    .replace('    - link "Docs" [ref=e106]\n', "")
+                    + '\n- status "cmux" [ref=e109]')
+    after = Snapshot.from_result(_result(changed_tree, text="Browser Comprehensive\ncmux", url="data:text/html,2"))
+    delta = diff(before, after)
+    if [n.ref for n in delta.added] != ["e109"]:
+        failures.append(f"added: {delta.added}")
+    if [n.ref for n in delta.removed] != ["e6"]:
+        failures.append(f"removed: {delta.removed}")
+    if [(o.name, n.name, n.ref) for o, n in delta.changed] != [("Go", "Going", "e103")]:
+        failures.append(f"changed: {delta.changed}")
+    if delta.text_removed != ["ready"] or delta.text_added != ["cmux"]:
+        failures.append(f"text: -{delta.text_removed} +{delta.text_added}")
+    if delta.url != ("data:text/html,1", "data:text/html,2") or delta.title is not None:
+        failures.append(f"url/title: {delta.url} {delta.title}")
+    rendered = delta.render().splitlines()
+    expected = [
+        "~ url data:text/html,1 -> data:text/html,2",
+        '- link "Docs" [ref=e6]',
+        '+ status "cmux" [ref=e109]',
+        '~ button "Go" -> "Going" [ref=e103]',
+        "- text ready",
+        "+ text cmux",
+    ]
+    if rendered != expected:
+        failures.append(f"render: {rendered}")
+    return failures
+
+
+def check_list_insert(tmp: str) -> List[str]:
+    failures: List[str] = []
+
+    def page(items: List[str], ref: int) -> Snapshot:
+        lines = ['- document "list"', f'- list "Results" [ref=e{ref}]']
+        for i, item in enumerate(items):
+            lines.append(f'  - listitem "{item}" [ref=e{ref + 2 * i + 1}]')
+            lines.append(f'    - link "open {item}" [ref=e{ref + 2 * i + 2}]')
+        return Snapshot.parse("\n".join(lines))
+
+    items = ["alpha", "beta", "gamma", "delta", "epsilon"]
+    before = page(items, 1)
+    delta = diff(before, page(["new"] + items, 100))
+    if [n.name for n in delta.added] != ["new", "open new"] or delta.removed or delta.changed:
+        failures.append(f"prepend should be one added item: {delta.render()}")
+
+    delta = diff(before, page(["alpha", "beta", "inserted", "gamma", "delta", "epsilon"], 100))
+    if [n.name for n in delta.added] != ["inserted", "open inserted"] or delta.removed or delta.changed:
+        failures.append(f"insert in the middle should be one added item: {delta.render()}")
+
+    delta = diff(before, page(["alpha", "gamma", "DELTA", "epsilon"], 100))
+    removed = [n.name for n in delta.removed]
+    changed = [(o.name, n.name) for o, n in delta.changed]
+    if removed != ["beta", "open beta"] or changed != [("delta", "DELTA"), ("open delta", "open DELTA")] or delta.added:
+        failures.append(f"removal plus rename: {delta.render()}")
+    return failures
+
+
+def check_speed(tmp: str) -> List[str]:
+    failures: List[str] = []
+    lines = ['- document "big"']
+    for i in range(500):
+        lines.append(f'- listitem "row {i}" [ref=e{i * 10}]')
+        for j in range(9):
+            lines.append(f'  - button "action {j}" [ref=e{i * 10 + j + 1}]')
+    tree = "\n".join(lines)
+    t0 = time.perf_counter()
+    a = Snapshot.parse(tree)
+    b = Snapshot.parse(_renumber(tree, 5000).replace('"action 3" [ref=e5004]', '"done" [ref=e5004]'))
+    t1 = time.perf_counter()
+    delta = diff(a, b)
+    t2 = time.perf_counter()
+    a.find("button", "action 7")
+    t3 = time.perf_counter()
+    print(f"  {len(a)} nodes: parse {(t1 - t0) / 2 * 1000:.1f}ms, diff {(t2 - t1) * 1000:.1f}ms, "
+          f"first find {(t3 - t2) * 1000:.1f}ms")
+    if len(a) != 5000 or len(delta.changed) != 1 or delta.added or delta.removed:
+        failures.append(f"large diff: {len(a)} nodes, {delta.render()}")
+    if t2 - t0 > 2.0:
+        failures.append(f"parse + diff of 5000 nodes took {t2 - t0:.2f}s")
+    return failures
+
+
+def main() -> int:
+    failures: List[str] = []
+    for check in (check_parse, check_diff, check_list_insert, check_speed):
+        print(f"RUN  {check.__name__}")
+        failures.extend(check(""))
+
+    if failures:
+        print("Browser snapshot test failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("Browser snapshot test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark for tests_v2/cmux_notify.py.
+
+Hooks call cmux_notify on every agent event, so it has to stay cheap:
+1. `python3 -X importtime` must show no heavy modules and a small cumulative
+   import time for cmux_notify itself.
+2. Running the script end-to-end against a local stand-in socket must stay
+   under a fixed wall-clock budget, and deliver exactly one valid
+   `notification.create` request.
+
+This does not need a running cmux instance.
+
+Usage:
+    python3 tests_v2/test_cmux_notify_startup.py
+"""
+
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+NOTIFY_SCRIPT = os.path.join(HERE, "cmux_notify.py")
+
+# Budgets. Deliberately loose enough for a loaded CI VM; the point is to catch
+# someone adding `import json` or socket discovery back, which blows well past
+# these.
+IMPORT_BUDGET_US = 15_000
+WALL_BUDGET_S = 0.25
+RUNS = 10
+
+FORBIDDEN_MODULES = {"json", "re", "glob", "base64", "select", "uuid", "typing", "socket"}
+
+
+def _importtime(module: str) -> Dict[str, int]:
+    """Return {module: cumulative_us} for modules imported by `import <module>`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=HERE,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": HERE},
+    )
+    if proc.returncode != 0:
+        raise AssertionError(f"import {module} failed: {proc.stderr[-500:]}")
+
+    baseline = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "pass"],
+        capture_output=True,
+        text=True,
+    )
+    startup = {_importtime_name(line) for line in baseline.stderr.splitlines()}
+
+    out: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        name = _importtime_name(line)
+        if not name or name in startup:
+            continue
+        fields = line.split("|")
+        try:
+            out[name] = int(fields[1].strip())
+        except (IndexError, ValueError):
+            continue
+    return out
+
+
+def _importtime_name(line: str) -> str:
+    if not line.startswith("import time:") or "|" not in line:
+        return ""
+    name = line.rsplit("|", 1)[1].strip()
+    return "" if name == "package" else name
+
+
+class _StandInServer:
+    def __init__(self, path: str):
+        self.requests: List[str] = []
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(path)
+        self._server.listen(16)
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self) -> None:
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            with conn:
+                data = b""
+                while True:
+                    chunk = conn.recv(8192)
+                    if not chunk:
+                        break
+                    data += chunk
+            self.requests.extend(line for line in data.decode("utf-8").split("\n") if line)
+
+    def close(self) -> None:
+        self._server.close()
+
+
+def check_imports() -> List[str]:
+    failures: List[str] = []
+    imported = _importtime("cmux_notify")
+    heavy = sorted(FORBIDDEN_MODULES & set(imported))
+    if heavy:
+        failures.append(f"cmux_notify imports heavy modules: {', '.join(heavy)}")
+    cumulative = imported.get("cmux_notify")
+    if cumulative is None:
+        failures.append("cmux_notify missing from -X importtime output")
+    else:
+        print(f"  import cmux_notify: {cumulative / 1000:.2f} ms cumulative (budget {IMPORT_BUDGET_US / 1000:.0f} ms)")
+        if cumulative > IMPORT_BUDGET_US:
+            failures.append(f"import cmux_notify took {cumulative}us (> {IMPORT_BUDGET_US}us)")
+    return failures
+
+
+def check_wall_clock() -> List[str]:
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="cmux-notify-") as tmp:
+        sock_path = os.path.join(tmp, "cmux.sock")
+        server = _StandInServer(sock_path)
+        env = {k: v for k, v in os.environ.items() if k not in ("CMUX_WORKSPACE_ID", "CMUX_TAB_ID")}
+        env["CMUX_SOCKET_PATH"] = sock_path
+        env["CMUX_WORKSPACE_ID"] = "00000000-0000-0000-0000-000000000001"
+        try:
+            durations: List[float] = []
+            for i in range(RUNS):
+                start = time.perf_counter()
+                proc = subprocess.run(
+                    [sys.executable, NOTIFY_SCRIPT, "Claude", "hook", f'line "{i}"\nnext'],
+                    env=env,
+                    capture_output=True,
+                )
+                durations.append(time.perf_counter() - start)
+                if proc.returncode != 0:
+                    failures.append(f"cmux_notify exited {proc.returncode}: {proc.stderr.decode()[-300:]}")
+                    return failures
+
+            deadline = time.time() + 2.0
+            while len(server.requests) < RUNS and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            server.close()
+
+    median = statistics.median(durations)
+    print(f"  cmux_notify end-to-end: median {median * 1000:.1f} ms over {RUNS} runs (budget {WALL_BUDGET_S * 1000:.0f} ms)")
+    if median > WALL_BUDGET_S:
+        failures.append(f"median wall clock {median:.3f}s exceeds {WALL_BUDGET_S}s")
+
+    if len(server.requests) != RUNS:
+        failures.append(f"expected {RUNS} requests, server saw {len(server.requests)}")
+        return failures
+    req = json.loads(server.requests[-1])
+    expected_params = {
+        "title": "Claude",
+        "subtitle": "hook",
+        "body": f'line "{RUNS - 1}"\nnext',
+        "workspace_id": "00000000-0000-0000-0000-000000000001",
+    }
+    if req.get("method") != "notification.create" or req.get("params") != expected_params:
+        failures.append(f"unexpected request: {req}")
+    return failures
+
+
+def check_unreachable_socket() -> List[str]:
+    env = dict(os.environ)
+    env["CMUX_SOCKET_PATH"] = "/tmp/cmux-notify-test-missing.sock"
+    proc = subprocess.run([sys.executable, NOTIFY_SCRIPT, "x"], env=env, capture_output=True)
+    if proc.returncode != 1 or proc.stderr:
+        return [f"missing socket should exit 1 quietly, got {proc.returncode}: {proc.stderr[-200:]!r}"]
+    return []
+
+
+def main() -> int:
+    failures: List[str] = []
+    for check in (check_imports, check_wall_clock, check_unreachable_socket):
+        print(f"RUN  {check.__name__}")
+        failures.extend(check())
+
+    if failures:
+        print("cmux_notify startup test failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+
+    print("cmux_notify startup test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
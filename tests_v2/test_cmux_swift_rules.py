@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Tests for the CPU-burn rule pack in scripts/cmux_swift_rules.py.
+
+Checks that:
+- each rule fires on a small Swift fixture and stays quiet on the fixed version
+- main-queue hops in update passes are flagged at any depth unless a pending
+  flag or a compare-before-write in the closure stops the re-dispatch loop
+- onReceive of timers, geometry publishers and per-frame notifications is
+  flagged unless the chain throttles, debounces or drops duplicates
+- `// cmux-lint: disable=` suppressions work on the same line, the line
+  above, and file-wide, and only for the rules they name
+- findings carry the rule's severity, and the JSON/SARIF reports have the
+  shape code-scanning tools expect
+- the real Sources/ tree has no error or warning findings
+
+Does not need a running cmux instance.
+
+Usage:
+    python3 tests_v2/test_cmux_swift_rules.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+
+import cmux_swift_scan as scan  # noqa: E402
+
+# rule id -> (bad fixture, lines expected to be flagged, fixed fixture)
+CASES: Dict[str, Tuple[str, List[int], str]] = {
+    "unguarded-main-async-in-update": ('''
+struct Reader: NSViewRepresentable {
+    @Binding var inset: CGFloat
+    func updateNSView(_ nsView: NSView, context: Context) {
+        DispatchQueue.main.async {
+            inset = nsView.frame.width
+        }
+    }
+}
+''', [5], '''
+struct Reader: NSViewRepresentable {
+    @Binding var inset: CGFloat
+    func updateNSView(_ nsView: NSView, context: Context) {
+        guard context.coordinator.pending != true else { return }
+        if nsView.frame.width != inset {
+            context.coordinator.pending = true
+            DispatchQueue.main.async { inset = nsView.frame.width }
+        }
+    }
+}
+'''),
+    "body-allocation": ('''
+struct Row: View {
+    var body: some View {
+        let formatter = DateFormatter()
+        Text(formatter.string(from: date))
+    }
+}
+''', [4], '''
+struct Row: View {
+    private static let formatter = DateFormatter()
+    var body: some View {
+        Text(Self.formatter.string(from: date))
+    }
+}
+'''),
+    "timer-without-invalidate": ('''
+final class Poller {
+    func start() {
+        timer = Timer.scheduledTimer(withTimeInterval: 5, repeats: true) { _ in self.poll() }
+    }
+}
+''', [4], '''
+final class Poller {
+    func start() {
+        timer = Timer.scheduledTimer(withTimeInterval: 5, repeats: true) { _ in self.poll() }
+    }
+    func stop() { timer?.invalidate() }
+}
+'''),
+    "high-frequency-callback": ('''
+let t = Timer.scheduledTimer(withTimeInterval: 1.0 / 60.0, repeats: true) { _ in tick() }
+''', [2], '''
+let t = Timer.scheduledTimer(withTimeInterval: 0.5, repeats: true) { _ in tick() }
+'''),
+    "high-frequency-on-receive": ('''
+struct Ruler: View {
+    var body: some View {
+        Canvas { _, _ in }
+            .onReceive(NotificationCenter.default.publisher(for: NSScrollView.didLiveScrollNotification)) { _ in
+                width = currentWidth()
+            }
+    }
+}
+''', [5], '''
+struct Ruler: View {
+    var body: some View {
+        Canvas { _, _ in }
+            .onReceive(NotificationCenter.default.publisher(for: NSScrollView.didLiveScrollNotification)
+                .throttle(for: .milliseconds(100), scheduler: RunLoop.main, latest: true)) { _ in
+                width = currentWidth()
+            }
+    }
+}
+'''),
+    "unpaused-timeline-view": ('''
+struct Spinner: View {
+    var body: some View {
+        TimelineView(.animation) { context in Circle() }
+    }
+}
+''', [4], '''
+struct Spinner: View {
+    var body: some View {
+        TimelineView(.animation(minimumInterval: nil, paused: !isLoading)) { context in Circle() }
+    }
+}
+'''),
+    "repeat-forever-animation": ('''
+Circle().animation(.linear(duration: 1).repeatForever(autoreverses: false), value: on)
+''', [2], '''
+Circle().animation(.linear(duration: 1), value: on)
+'''),
+    "autoupdating-text-style": ('''
+Text(date, style: .relative)
+''', [2], '''
+Text(date.formatted(date: .omitted, time: .shortened))
+'''),
+}
+
+# More unguarded-main-async-in-update shapes: (fixture, lines expected to be flagged)
+MAIN_ASYNC_CASES: Dict[str, Tuple[str, List[int]]] = {
+    # The omnibar bug: the `if` reads state only the hop changes, so it never stops the loop.
+    "hop nested in an if": ('''
+struct Field: NSViewRepresentable {
+    var isFocused: Bool
+    func updateNSView(_ nsView: NSTextField, context: Context) {
+        if let window = nsView.window {
+            if isFocused, window.firstResponder !== nsView {
+                DispatchQueue.main.async {
+                    window.makeFirstResponder(nsView)
+                }
+            }
+        }
+    }
+}
+''', [7]),
+    "pending flag tested and set before the hop": ('''
+struct Field: NSViewRepresentable {
+    func updateNSView(_ nsView: NSTextField, context: Context) {
+        if isFocused, context.coordinator.pendingFocusRequest != true {
+            context.coordinator.pendingFocusRequest = true
+            DispatchQueue.main.async { [weak coordinator = context.coordinator] in
+                coordinator?.pendingFocusRequest = nil
+                nsView.window?.makeFirstResponder(nsView)
+            }
+        }
+    }
+}
+''', []),
+    "closure writes only when the value changes": ('''
+struct Reader: NSViewRepresentable {
+    @Binding var inset: CGFloat
+    func updateNSView(_ nsView: NSView, context: Context) {
+        DispatchQueue.main.async {
+            guard let window = nsView.window else { return }
+            let next = window.frame.maxX + 14
+            if abs(next - inset) > 0.5 {
+                inset = next
+            }
+        }
+    }
+}
+''', []),
+    "closure only touches AppKit views": ('''
+struct Clearer: NSViewRepresentable {
+    func updateNSView(_ nsView: NSView, context: Context) {
+        DispatchQueue.main.async {
+            guard let scrollView = nsView.enclosingScrollView else { return }
+            scrollView.drawsBackground = false
+        }
+    }
+}
+''', []),
+    "unchecked write at depth 3 in layout": ('''
+final class Host: NSView {
+    @Published var width: CGFloat = 0
+    override func layout() {
+        super.layout()
+        if let window {
+            for child in subviews where child.isHidden == false {
+                DispatchQueue.main.async { self.width = window.frame.width }
+            }
+        }
+    }
+}
+''', [8]),
+}
+
+# More high-frequency-on-receive shapes: (fixture, lines expected to be flagged)
+ON_RECEIVE_CASES: Dict[str, Tuple[str, List[int]]] = {
+    "fast timer": ('''
+Text(clock).onReceive(Timer.publish(every: 1.0 / 30.0, on: .main, in: .common).autoconnect()) { now = $0 }
+''', [2]),
+    "slow timer": ('''
+Text(clock).onReceive(Timer.publish(every: 60, on: .main, in: .common).autoconnect()) { now = $0 }
+''', []),
+    "scroll geometry over several lines": ('''
+List(items) { Row($0) }
+    .onReceive(
+        scrollView.contentView
+            .publisher(for: \\.bounds)
+    ) { bounds in
+        offset = bounds.origin.y
+    }
+''', [3]),
+    "geometry with removeDuplicates": ('''
+List(items) { Row($0) }
+    .onReceive(scrollView.contentView.publisher(for: \\.bounds).map(\\.origin.y).removeDuplicates()) { offset = $0 }
+''', []),
+    "window update firehose": ('''
+view.onReceive(NotificationCenter.default.publisher(for: NSWindow.didUpdateNotification)) { _ in refresh() }
+''', [2]),
+    "ordinary notification": ('''
+view.onReceive(NotificationCenter.default.publisher(for: NSWindow.didEnterFullScreenNotification)) { _ in refresh() }
+''', []),
+}
+
+SEVERITY = {"autoupdating-text-style": "error", "high-frequency-callback": "note"}
+
+
+def _lines(rule_id: str, text: str) -> List[int]:
+    rules = scan.load_rules(("cmux_swift_rules",))
+    return [f.line for f in rules[rule_id].check(scan.parse_source("Fixture.swift", text))]
+
+
+def check_rules(tmp: str) -> List[str]:
+    failures: List[str] = []
+    rules = scan.load_rules(("cmux_swift_rules",))
+    missing = set(rules) - set(CASES)
+    if missing:
+        failures.append(f"rules without a fixture: {sorted(missing)}")
+    for rule_id, (bad, expected, good) in CASES.items():
+        got = _lines(rule_id, bad)
+        if got != expected:
+            failures.append(f"{rule_id}: expected lines {expected}, got {got}")
+        if _lines(rule_id, good):
+            failures.append(f"{rule_id}: fixed fixture still flagged: {_lines(rule_id, good)}")
+        want = SEVERITY.get(rule_id, "warning")
+        if rules[rule_id].severity != want:
+            failures.append(f"{rule_id}: severity {rules[rule_id].severity}, expected {want}")
+    # Intervals are evaluated without eval(): exponentiation is not arithmetic we accept.
+    hostile = "let t = Timer.scheduledTimer(withTimeInterval: 9**9**9, repeats: true) { _ in tick() }\n"
+    if _lines("high-frequency-callback", hostile):
+        failures.append("high-frequency-callback: non-literal interval should be ignored")
+    return failures
+
+
+def check_main_async_guards(tmp: str) -> List[str]:
+    failures: List[str] = []
+    for label, (text, expected) in MAIN_ASYNC_CASES.items():
+        got = _lines("unguarded-main-async-in-update", text)
+        if got != expected:
+            failures.append(f"unguarded-main-async-in-update ({label}): expected {expected}, got {got}")
+    return failures
+
+
+def check_on_receive(tmp: str) -> List[str]:
+    failures: List[str] = []
+    for label, (text, expected) in ON_RECEIVE_CASES.items():
+        got = _lines("high-frequency-on-receive", text)
+        if got != expected:
+            failures.append(f"high-frequency-on-receive ({label}): expected {expected}, got {got}")
+    return failures
+
+
+def check_suppressions(tmp: str) -> List[str]:
+    failures: List[str] = []
+    same_line = "Circle().animation(.linear.repeatForever())  // cmux-lint: disable=repeat-forever-animation (demo)\n"
+    line_above = "// cmux-lint: disable=body-allocation,repeat-forever-animation\nCircle().animation(.linear.repeatForever())\n"
+    two_above = "// cmux-lint: disable=repeat-forever-animation\n\nCircle().animation(.linear.repeatForever())\n"
+    other_rule = "Circle().animation(.linear.repeatForever())  // cmux-lint: disable=body-allocation\n"
+    trailing_above = "let x = 1  // cmux-lint: disable=repeat-forever-animation\nCircle().animation(.linear.repeatForever())\n"
+    file_wide = "// cmux-lint: disable-file=*\n\nCircle().animation(.linear.repeatForever())\n"
+    cases = [
+        ("same line", same_line, []),
+        ("line above", line_above, []),
+        ("two lines above", two_above, [3]),
+        ("other rule", other_rule, [1]),
+        ("trailing comment on the line above", trailing_above, [2]),
+        ("file-wide wildcard", file_wide, []),
+    ]
+    for label, text, expected in cases:
+        got = _lines("repeat-forever-animation", text)
+        if got != expected:
+            failures.append(f"suppression ({label}): expected {expected}, got {got}")
+    return failures
+
+
+def check_reports(tmp: str) -> List[str]:
+    failures: List[str] = []
+    root = Path(tmp, "tree")
+    for rule_id, (bad, _, _) in CASES.items():
+        path = root / "Sources" / f"{rule_id}.swift"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(bad)
+    out = os.path.join(tmp, "lint.sarif")
+    rc = scan.main(["--root", str(root), "--no-cache", "--format", "sarif", "--output", out])
+    if rc != 1:
+        failures.append(f"scanner should exit 1 on warnings, got {rc}")
+    sarif = json.loads(Path(out).read_text())
+    run = sarif["runs"][0]
+    if sarif["version"] != "2.1.0" or run["tool"]["driver"]["name"] != "cmux-swift-lint":
+        failures.append("SARIF header is wrong")
+    rules = [r["id"] for r in run["tool"]["driver"]["rules"]]
+    for result in run["results"]:
+        if rules[result["ruleIndex"]] != result["ruleId"]:
+            failures.append(f"ruleIndex mismatch for {result['ruleId']}")
+        loc = result["locations"][0]["physicalLocation"]
+        if not loc["artifactLocation"]["uri"].startswith("Sources/") or loc["region"]["startLine"] < 1:
+            failures.append(f"bad location: {loc}")
+    if {r["ruleId"] for r in run["results"]} != set(CASES):
+        failures.append(f"SARIF results: {sorted(r['ruleId'] for r in run['results'])}")
+
+    json_out = os.path.join(tmp, "lint.json")
+    scan.main(["--root", str(root), "--no-cache", "--format", "json", "--output", json_out,
+               "--rules", "high-frequency-callback"])
+    counts = json.loads(Path(json_out).read_text())["counts"]
+    if counts != {"error": 0, "warning": 0, "note": 1}:
+        failures.append(f"JSON counts: {counts}")
+    if scan.main(["--root", str(root), "--no-cache", "--output", os.devnull,
+                  "--rules", "high-frequency-callback"]) != 0:
+        failures.append("notes alone should not fail the scan")
+    return failures
+
+
+def check_real_sources(tmp: str) -> List[str]:
+    scanner = scan.SwiftScanner(str(ROOT), cache_path=os.path.join(tmp, "real.pickle"))
+    blocking = [f for f in scanner.run() if f.severity != "note"]
+    return [f"{f.path}:{f.line}: [{f.rule}] {f.message}" for f in blocking]
+
+
+def main() -> int:
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="cmux-swift-rules-") as tmp:
+        for check in (check_rules, check_main_async_guards, check_on_receive, check_suppressions, check_reports, check_real_sources):
+            print(f"RUN  {check.__name__}")
+            failures.extend(check(tmp))
+
+    if failures:
+        print("Swift rule pack test failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("Swift rule pack test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
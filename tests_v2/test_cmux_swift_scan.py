@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Tests for scripts/cmux_swift_scan.py (the cached Swift scanner behind the lint tests).
+
+Checks that:
+- comments (including nested block comments) are ignored, string literals are not
+- a second run over unchanged files executes no rules and returns the same findings
+- touching a file without changing it costs a hash, not a re-check
+- editing one file re-checks only that file
+- the process pool gives the same findings as the serial path
+- `constants()` reads `let`/`static let` literals
+
+Does not need a running cmux instance.
+
+Usage:
+    python3 tests_v2/test_cmux_swift_scan.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+
+from cmux_swift_scan import SwiftScanner, parse_source  # noqa: E402
+
+RULES_MODULE = '''
+from cmux_swift_scan import Finding, rule
+
+@rule("test-repeat-forever", needles=("repeatForever",))
+def repeat_forever(src):
+    for n, line in enumerate(src.code_lines, start=1):
+        if ".repeatForever(" in line:
+            yield Finding("test-repeat-forever", src.path, n, "runaway animation", line.strip())
+'''
+
+CLEAN = "struct View{n} {{\n    let width = {n}\n}}\n"
+DIRTY = '''struct Spinner{n} {{
+    // withAnimation(.linear.repeatForever()) is fine in a comment
+    /* and in a /* nested */ .repeatForever( block */
+    let label = "call .repeatForever( later"
+    var body: some View {{ Circle().animation(.linear.repeatForever(autoreverses: false)) }}
+}}
+'''
+
+
+def _make_tree(tmp: str, count: int) -> str:
+    root = os.path.join(tmp, "tree")
+    for n in range(count):
+        body = DIRTY if n % 10 == 0 else CLEAN
+        path = Path(root, "Sources", f"sub{n % 3}", f"File{n}.swift")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(body.format(n=n))
+    Path(tmp, "cmux_test_rules.py").write_text(RULES_MODULE)
+    return root
+
+
+def _scanner(root: str, tmp: str, jobs: int = 1, cache: str = "cache.pickle") -> SwiftScanner:
+    return SwiftScanner(root, cache_path=os.path.join(tmp, cache), rule_modules=("cmux_test_rules",), jobs=jobs)
+
+
+def check_incremental(tmp: str) -> List[str]:
+    failures: List[str] = []
+    root = _make_tree(tmp, 40)
+    sys.path.insert(0, tmp)
+
+    first = _scanner(root, tmp, jobs=2)
+    findings = first.run(["test-repeat-forever"])
+    lines = sorted((f.path, f.line) for f in findings)
+    expected = sorted((os.path.join("Sources", f"sub{n % 3}", f"File{n}.swift"), 4) for n in range(0, 40, 10))
+    expected += sorted((os.path.join("Sources", f"sub{n % 3}", f"File{n}.swift"), 5) for n in range(0, 40, 10))
+    if lines != sorted(expected):
+        failures.append(f"findings: {lines}")
+    if first.stats["checked"] != 40:
+        failures.append(f"cold run should check every file: {first.stats}")
+
+    serial = _scanner(root, tmp, jobs=1, cache="serial.pickle").run(["test-repeat-forever"])
+    if sorted((f.path, f.line) for f in serial) != lines:
+        failures.append("serial and parallel runs disagree")
+
+    warm = _scanner(root, tmp)
+    again = warm.run(["test-repeat-forever"])
+    if warm.stats["checked"] or warm.stats["cached"] != 40 or len(again) != len(findings):
+        failures.append(f"warm run should come entirely from cache: {warm.stats}")
+
+    touched = Path(root, "Sources", "sub1", "File1.swift")
+    os.utime(touched, ns=(time.time_ns(), time.time_ns() + 5_000_000_000))
+    after_touch = _scanner(root, tmp)
+    after_touch.run(["test-repeat-forever"])
+    if after_touch.stats["checked"] or after_touch.stats["parsed"]:
+        failures.append(f"an mtime-only change should not re-check: {after_touch.stats}")
+
+    touched.write_text(DIRTY.format(n=1))
+    after_edit = _scanner(root, tmp)
+    edited = after_edit.run(["test-repeat-forever"])
+    if after_edit.stats["checked"] != 1:
+        failures.append(f"one edited file should mean one re-check: {after_edit.stats}")
+    if len(edited) != len(findings) + 2:
+        failures.append(f"edit should add 2 findings: {len(findings)} -> {len(edited)}")
+    return failures
+
+
+def check_constants(tmp: str) -> List[str]:
+    src = parse_source("X.swift", '''
+enum UpdateTiming {
+    static let minimumCheckDisplayDuration: TimeInterval = 2.0
+    // static let commentedOut: TimeInterval = 9.0
+    static let retries = 3
+    static let label: String = "nightly"
+    static let enabled = true
+}
+''')
+    constants = src.constants()
+    expected = {"minimumCheckDisplayDuration": 2.0, "retries": 3, "label": "nightly", "enabled": True}
+    return [] if constants == expected else [f"constants: {constants}"]
+
+
+def check_real_sources(tmp: str) -> List[str]:
+    failures: List[str] = []
+    cache = os.path.join(tmp, "real.pickle")
+    started = time.time()
+    cold = SwiftScanner(str(ROOT), cache_path=cache)
+    cold_findings = cold.run()
+    cold_s = time.time() - started
+    started = time.time()
+    warm = SwiftScanner(str(ROOT), cache_path=cache)
+    warm_findings = warm.run()
+    warm_s = time.time() - started
+    print(f"  Sources/: {cold.stats['files']} files, cold {cold_s * 1000:.0f}ms, warm {warm_s * 1000:.0f}ms")
+    if warm.stats["checked"] or len(warm_findings) != len(cold_findings):
+        failures.append(f"warm run over real Sources/ should be fully cached: {warm.stats}")
+    return failures
+
+
+def main() -> int:
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="cmux-swift-scan-") as tmp:
+        for check in (check_incremental, check_constants, check_real_sources):
+            print(f"RUN  {check.__name__}")
+            failures.extend(check(tmp))
+
+    if failures:
+        print("Swift scanner test failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("Swift scanner test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Tests for scripts/cmux_test_history.py (the test duration/flakiness database).
+
+Does not need a running cmux instance.
+
+Usage:
+    python3 tests_v2/test_cmux_test_history.py
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import List
+
+ROOT = Path(__file__).resolve().parents[1]
+HISTORY_CLI = ROOT / "scripts" / "cmux_test_history.py"
+sys.path.insert(0, str(ROOT / "scripts"))
+
+from cmux_test_history import TestHistory, error_signature  # noqa: E402
+
+
+def _seed(history: TestHistory) -> None:
+    # 6 runs on build "a", then 1 on build "b" where test_slow got slower.
+    for i in range(6):
+        run = history.start_run(build="a")
+        history.record(run, "test_slow.py", 1, 10.0 + i * 0.1, "pass")
+        history.record(run, "test_fast.py", 1, 1.0, "pass")
+        if i % 2 == 0:
+            history.record(run, "test_flaky.py", 1, 2.0, "fail", f"VIEW_DETACHED: pane {i} 0x7f{i}")
+            history.record(run, "test_flaky.py", 2, 2.0, "pass")
+        else:
+            history.record(run, "test_flaky.py", 1, 2.0, "pass")
+        # Passed for a while, then broke for good: fails the same way on every attempt.
+        if i < 4:
+            history.record(run, "test_regressed.py", 1, 1.0, "pass")
+        else:
+            history.record(run, "test_regressed.py", 1, 1.0, "fail", f"AssertionError: title {i}")
+            history.record(run, "test_regressed.py", 2, 1.0, "fail", f"AssertionError: title {i}")
+    run = history.start_run(build="b")
+    history.record(run, "test_slow.py", 1, 20.0, "pass")
+    history.record(run, "test_fast.py", 1, 1.05, "pass")
+    history.record(run, "test_broken.py", 1, 3.0, "fail", "AssertionError: expected 2 panes")
+
+
+def check_queries(tmp: str) -> List[str]:
+    failures: List[str] = []
+    history = TestHistory(os.path.join(tmp, "h.sqlite3"))
+    _seed(history)
+
+    slowest = [t for t, _ in history.slowest(2)]
+    if slowest != ["test_slow.py", "test_flaky.py"]:
+        failures.append(f"slowest: {slowest}")
+
+    flaky = history.flakiest()
+    if [t for t, _, _ in flaky] != ["test_flaky.py"] or abs(flaky[0][1] - 0.5) > 1e-9:
+        failures.append(f"flakiest: {flaky}")
+
+    regressions = history.regressions("b")
+    if [t for t, _, _ in regressions] != ["test_slow.py"]:
+        failures.append(f"regressions: {regressions}")
+
+    if history.retry_budget("test_flaky.py", 3) != 3:
+        failures.append("flaky tests should keep their retries")
+    if history.retry_budget("test_fast.py", 3) != 2:
+        failures.append("tests with a long clean record should get exactly one retry")
+    if history.retry_budget("test_new.py", 3) != 3:
+        failures.append("unknown tests should keep their retries")
+
+    if not history.is_known_flake("test_flaky.py", "VIEW_DETACHED: pane 9 0x7f99"):
+        failures.append("recurring signature on a mostly-passing test should be a known flake")
+    if history.is_known_flake("test_flaky.py", "BLANK: surface did not render"):
+        failures.append("a new signature must not be treated as a known flake")
+    if history.is_known_flake("test_broken.py", "AssertionError: expected 2 panes"):
+        failures.append("a test that never passes must not be treated as a known flake")
+    if history.is_known_flake("test_regressed.py", "AssertionError: title 9"):
+        failures.append("a failure that never passed on retry must not be treated as a known flake")
+
+    # The flaky test's last run ended failing: the next failure blocks too.
+    run = history.start_run(build="b")
+    history.record(run, "test_flaky.py", 1, 2.0, "fail", "VIEW_DETACHED: pane 7 0x7f7")
+    history.record(run, "test_flaky.py", 2, 2.0, "fail", "VIEW_DETACHED: pane 7 0x7f7")
+    if history.is_known_flake("test_flaky.py", "VIEW_DETACHED: pane 8 0x7f8"):
+        failures.append("consecutive failures must block even with a known signature")
+
+    order = history.order(["test_fast.py", "test_new.py", "test_slow.py", "test_flaky.py"], "longest")
+    if order[0] != "test_slow.py" or order[-1] != "test_fast.py":
+        failures.append(f"longest-first order: {order}")
+    order = history.order(["test_fast.py", "test_broken.py"], "recent-failures")
+    if order[0] != "test_broken.py":
+        failures.append(f"recent-failures order: {order}")
+
+    if error_signature("pane 3 at 0xdeadbeef id 8a1c6f3e-1111-2222-3333-444455556666") != "pane # at # id <id>":
+        failures.append(f"signature: {error_signature('pane 3 at 0xdeadbeef')}")
+    history.close()
+    return failures
+
+
+def check_cli_exec(tmp: str) -> List[str]:
+    failures: List[str] = []
+    db = os.path.join(tmp, "cli.sqlite3")
+    run_id = subprocess.run(
+        [sys.executable, str(HISTORY_CLI), "--db", db, "start-run", "--suite", "v2"],
+        capture_output=True, text=True, check=True,
+    ).stdout.strip()
+    proc = subprocess.run(
+        [sys.executable, str(HISTORY_CLI), "--db", db, "exec", run_id, "tests_v2/test_x.py", "1", "--",
+         sys.executable, "-c", "print('working'); print('FAIL: widget missing'); raise SystemExit(3)"],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 3:
+        failures.append(f"exec should propagate the exit code, got {proc.returncode}")
+    if "FAIL: widget missing" not in proc.stdout:
+        failures.append("exec should stream the test's output")
+    history = TestHistory(db)
+    rows = history._db.execute("SELECT outcome, error_signature FROM attempts").fetchall()
+    if rows != [("fail", "FAIL: widget missing")]:
+        failures.append(f"exec should record the attempt: {rows}")
+    history.close()
+
+    # The test clobbers the database, so recording its attempt fails.
+    proc = subprocess.run(
+        [sys.executable, str(HISTORY_CLI), "--db", db, "exec", run_id, "tests_v2/test_x.py", "2", "--",
+         sys.executable, "-c", f"open({db!r}, 'r+b').write(b'garbage' * 2000); raise SystemExit(3)"],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 3 or "could not record tests_v2/test_x.py" not in proc.stderr:
+        failures.append(f"a failed record should warn and keep the test's exit code: {proc.returncode} "
+                        f"{proc.stderr[-300:]!r}")
+    return failures
+
+
+def main() -> int:
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="cmux-history-") as tmp:
+        for check in (check_queries, check_cli_exec):
+            print(f"RUN  {check.__name__}")
+            failures.extend(check(tmp))
+
+    if failures:
+        print("Test history test failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("Test history test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
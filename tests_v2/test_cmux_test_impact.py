@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Tests for scripts/cmux_test_impact.py (change-impact test selection).
+
+Builds a tiny git repo shaped like this one (a TerminalController dispatch
+switch, a couple of Sources/ files, a client with helpers, some tests), edits
+it, and checks which tests get selected. Also checks the maps built from
+the real tree.
+
+Does not need a running cmux instance.
+
+Usage:
+    python3 tests_v2/test_cmux_test_impact.py
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Set
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+
+import cmux_test_impact as impact  # noqa: E402
+
+FILES: Dict[str, str] = {
+    "Sources/TerminalController.swift": '''
+class TerminalController {
+    func handleV2(method: String, params: [String: Any]) -> String {
+        switch method {
+        case "system.ping":
+            return v2Ok(id: id, result: ["pong": true])
+        case "workspace.create":
+            return v2Result(id: id, self.v2WorkspaceCreate(params: params))
+        case "pane.list", "pane.focus":
+            return v2Result(id: id, self.v2PaneList(params: params))
+        case "browser.navigate":
+            return v2Result(id: id, self.v2BrowserNavigate(params: params))
+        default:
+            return v2Error(id: id, code: "method_not_found", message: "Unknown method")
+        }
+    }
+
+    private func v2ResolveTabManager(params: [String: Any]) -> TabManager? {
+        return nil
+    }
+
+    private func v2WorkspaceCreate(params: [String: Any]) -> V2CallResult {
+        guard let tabManager = v2ResolveTabManager(params: params) else { return .err }
+        let ws = tabManager.addWorkspace(select: true)
+        return .ok(["workspace_id": ws.id])
+    }
+
+    private func v2PaneList(params: [String: Any]) -> V2CallResult {
+        guard let tabManager = v2ResolveTabManager(params: params) else { return .err }
+        return .ok(["panes": tabManager.panes])
+    }
+
+    private func v2BrowserNavigate(params: [String: Any]) -> V2CallResult {
+        let panel: BrowserPanel? = nil
+        return .ok(["url": panel?.url ?? ""])
+    }
+}
+''',
+    "Sources/TabManager.swift": "final class TabManager {\n    func addWorkspace(select: Bool) -> Workspace { Workspace() }\n}\n",
+    "Sources/BrowserPanel.swift": "final class BrowserPanel {\n    var url: String = \"\"\n}\n",
+    "Sources/SidebarView.swift": "struct SidebarView {\n    var width = 200\n}\n",
+    "CLI/cmux.swift": 'let methods = ["workspace.create"]\n',
+    "README.md": "cmux\n",
+    "tests_v2/cmux.py": '''
+class cmux:
+    def _call(self, method, params=None):
+        pass
+
+    def _resolve_workspace_id(self, ws):
+        return self._call("workspace.current")
+
+    def new_workspace(self):
+        return self._call("workspace.create")
+
+    def list_panes(self):
+        return self._call("pane.list")
+
+    def navigate(self, panel_id, url):
+        self._call("browser.navigate", {"url": url})
+''',
+    "tests_v2/test_windows_api.py": "def main(c):\n    c._call(\"system.ping\")\n",
+    "tests_v2/test_workspaces.py": "def main(c):\n    c.new_workspace()\n",
+    "tests_v2/test_panes.py": "def main(c):\n    c.list_panes()\n",
+    "tests_v2/test_browser.py": "def main(c):\n    c.navigate('p', 'https://example.com')\n",
+    "tests_v2/test_matrix.py": "METHODS = [\"pane.focus\"]\n",
+    "tests_v2/test_cli.py": "def _find_cli_binary():\n    return 'cmux'\n",
+    "tests_v2/test_lint.py": "from pathlib import Path\nROOT = Path('.') / \"Sources\"\n",
+}
+
+
+def _git(repo: str, *args: str) -> None:
+    subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True)
+
+
+def _make_repo(tmp: str) -> str:
+    repo = os.path.join(tmp, "repo")
+    for rel, text in FILES.items():
+        path = Path(repo, rel)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+    _git(repo, "init", "-q")
+    _git(repo, "-c", "user.name=t", "-c", "user.email=t@t", "add", ".")
+    _git(repo, "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "-m", "base")
+    return repo
+
+
+def _selected(repo: str, edit: Dict[str, str]) -> Set[str]:
+    _git(repo, "checkout", "-q", "--", ".")
+    for rel, (old, new) in edit.items():
+        path = Path(repo, rel)
+        text = path.read_text()
+        if old not in text:
+            raise AssertionError(f"{old!r} not in {rel}")
+        path.write_text(text.replace(old, new))
+    changed = impact.changed_files("HEAD", repo=repo)
+    sel = impact.select(changed, "HEAD", repo=repo)
+    return {os.path.basename(t) for t in sel.tests}
+
+
+def check_fixture(tmp: str) -> List[str]:
+    failures: List[str] = []
+    repo = _make_repo(tmp)
+    smoke = {"test_windows_api.py"}
+    lint = {"test_lint.py"}  # references Sources/ itself
+    cases = [
+        ("edit inside one handler",
+         {"Sources/TerminalController.swift": ("addWorkspace(select: true)", "addWorkspace(select: false)")},
+         {"test_workspaces.py", "test_cli.py"} | smoke | lint),
+        ("edit in a shared helper",
+         {"Sources/TerminalController.swift": ("        return nil\n", "        return TabManager()\n")},
+         {"test_workspaces.py", "test_panes.py", "test_matrix.py", "test_cli.py"} | smoke | lint),
+        ("edit in the dispatch case",
+         {"Sources/TerminalController.swift": ('["pong": true]', '["pong": false]')},
+         {"test_windows_api.py"} | lint),
+        ("type used by handlers",
+         {"Sources/BrowserPanel.swift": ('var url: String = ""', 'var url: String = "about:blank"')},
+         {"test_browser.py"} | smoke | lint),
+        ("sidebar-only change",
+         {"Sources/SidebarView.swift": ("200", "220")},
+         smoke | lint),
+        ("CLI change",
+         {"CLI/cmux.swift": ("workspace.create", "workspace.create\", \"workspace.list")},
+         {"test_cli.py"} | smoke),
+        ("shared client change",
+         {"tests_v2/cmux.py": ("pass", "return None")},
+         {Path(t).name for t in FILES if "/test_" in t}),
+        ("docs only",
+         {"README.md": ("cmux", "cmux terminal")},
+         set()),
+        ("a test itself",
+         {"tests_v2/test_panes.py": ("list_panes()", "list_panes()  # again")},
+         {"test_panes.py"}),
+    ]
+    for label, edit, expected in cases:
+        got = _selected(repo, edit)
+        if got != expected:
+            failures.append(f"{label}: expected {sorted(expected)}, got {sorted(got)}")
+    return failures
+
+
+def check_real_tree(tmp: str) -> List[str]:
+    failures: List[str] = []
+    swift = impact.SwiftIndex()
+    methods = swift.methods()
+    for method in ("system.ping", "workspace.create", "pane.list", "browser.navigate"):
+        if method not in methods:
+            failures.append(f"dispatch parse missed {method}")
+    if "workspace.create" not in swift.methods_for_file("Sources/TabManager.swift"):
+        failures.append("TabManager.swift should reach workspace.create")
+
+    tests = impact.scan_tests(methods)
+    if "workspace.create" not in tests["tests_v2/test_tab_dragging.py"].methods:
+        failures.append("client helper calls (new_workspace) should resolve to workspace.create")
+
+    sel = impact.select(["Sources/SidebarSelectionState.swift"], "HEAD")
+    picked = set(sel.tests)
+    heavy = {"tests_v2/test_visual_screenshots.py", "tests_v2/test_tab_dragging.py"} & picked
+    if heavy:
+        failures.append(f"a sidebar-only change should not pick the visual/drag suites: {sorted(heavy)}")
+    if not set(impact.SMOKE) <= picked:
+        failures.append("a Sources/ change should always include the smoke set")
+    print(f"  sidebar-only change selects {len(picked)}/{len(tests)} tests")
+    return failures
+
+
+def main() -> int:
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="cmux-impact-") as tmp:
+        for check in (check_fixture, check_real_tree):
+            print(f"RUN  {check.__name__}")
+            failures.extend(check(tmp))
+
+    if failures:
+        print("Test impact test failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("Test impact test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Tests for tests_v2/cmux_golden.py (golden-image baselines compared with SSIM).
+
+Checks that:
+- an identical or lightly re-antialiased capture matches
+- a blanked pane (a small, sharp change) regresses, with a heatmap and the
+  worst tile located on the pane
+- a size change regresses, a scenario without a golden is "new"
+- approving is content-addressed: identical images are stored once and
+  re-approving an unchanged image writes nothing
+
+Does not need a running cmux instance.
+
+Usage:
+    python3 tests_v2/test_golden_store.py
+"""
+
+from __future__ import annotations
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+try:
+    import numpy as np  # noqa: E402
+
+    from cmux_golden import GoldenStore  # noqa: E402
+    from cmux_pixel_diff import load_png, save_png  # noqa: E402
+except ImportError as e:  # NumPy missing
+    SKIP_REASON = str(e)
+else:
+    SKIP_REASON = ""
+
+
+def _window(width: int = 640, height: int = 400, seed: int = 0) -> np.ndarray:
+    """A fake window: tab bar, two terminal panes with rows of glyph-like noise."""
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width, 4), 30, np.uint8)
+    img[..., 3] = 255
+    img[:28, :, :3] = 60
+    img[28:, width // 2 - 1:width // 2 + 1, :3] = 90
+    for x0 in (8, width // 2 + 8):
+        for row in range(36, height - 16, 18):
+            glyphs = rng.random((12, width // 2 - 24)) > 0.6
+            img[row:row + 12, x0:x0 + width // 2 - 24, :3][glyphs] = 220
+    return img
+
+
+def check_compare(tmp: Path) -> List[str]:
+    failures: List[str] = []
+    store = GoldenStore(tmp / "store")
+    base = _window()
+    golden_png = save_png(tmp / "golden.png", base)
+    store.approve("A2/after", golden_png)
+
+    same = store.compare("A2/after", save_png(tmp / "same.png", base))
+    if same.status != "match":
+        failures.append(f"identical capture: {same.summary()}")
+
+    jitter = base.copy()
+    noise = np.random.default_rng(1).integers(-3, 4, size=jitter.shape[:2] + (3,))
+    jitter[..., :3] = np.clip(jitter[..., :3].astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    near = store.compare("A2/after", save_png(tmp / "near.png", jitter))
+    if near.status != "match":
+        failures.append(f"antialiasing-level noise should match: {near.summary()}")
+
+    blank = base.copy()
+    blank[100:160, 340:420, :3] = 30  # part of the right pane stops rendering
+    broken = store.compare("A2/after", save_png(tmp / "blank.png", blank), heatmap_dir=tmp / "heat")
+    if broken.status != "regression":
+        failures.append(f"blanked pane should regress: {broken.summary()}")
+    elif broken.ssim < store.min_ssim and broken.worst_tile_ssim >= store.min_tile_ssim:
+        failures.append("expected the tile check, not the mean, to catch a small blank area")
+    if broken.worst_tile:
+        x0, y0, x1, y1 = broken.worst_tile
+        if not (x0 < 420 and x1 > 340 and y0 < 160 and y1 > 100):
+            failures.append(f"worst tile {broken.worst_tile} is not on the blanked area")
+    if not broken.heatmap or not broken.heatmap.exists():
+        failures.append("regression should write a heatmap")
+    else:
+        heat = load_png(broken.heatmap).pixels
+        if heat.shape[:2] != base.shape[:2] or heat[130, 380, 0] <= heat[130, 380, 1]:
+            failures.append("heatmap should be image-sized and red over the blanked area")
+
+    resized = store.compare("A2/after", save_png(tmp / "small.png", base[:-10]))
+    if resized.status != "size_changed" or not resized.regressed:
+        failures.append(f"size change: {resized.summary()}")
+    if store.compare("Z9/after", golden_png).status != "new":
+        failures.append("unknown scenario should be new")
+    return failures
+
+
+def check_content_addressed(tmp: Path) -> List[str]:
+    failures: List[str] = []
+    store = GoldenStore(tmp / "cas")
+    a = save_png(tmp / "a.png", _window(seed=3))
+    b = save_png(tmp / "b.png", _window(seed=4))
+
+    if not store.approve("A1/before", a) or not store.approve("A1/after", a):
+        failures.append("first approvals should report a change")
+    objects = list((store.root / "objects").glob("*/*.png"))
+    if len(objects) != 1:
+        failures.append(f"identical images should be stored once, found {len(objects)}")
+
+    index_mtime = store.index_path.stat().st_mtime_ns
+    object_mtime = objects[0].stat().st_mtime_ns
+    time.sleep(0.01)
+    reopened = GoldenStore(store.root)
+    if reopened.approve("A1/before", a):
+        failures.append("re-approving an unchanged image should be a no-op")
+    if store.index_path.stat().st_mtime_ns != index_mtime or objects[0].stat().st_mtime_ns != object_mtime:
+        failures.append("re-approving an unchanged image rewrote files")
+
+    reopened.approve("A1/after", b)
+    if reopened.prune() != 0:
+        failures.append("prune removed an image still in use")
+    reopened.approve("A1/before", b)
+    if reopened.prune() != 1:
+        failures.append("prune should remove the now-unreferenced image")
+    return failures
+
+
+def check_speed(tmp: Path) -> List[str]:
+    store = GoldenStore(tmp / "speed")
+    big = _window(2400, 1600, seed=5)
+    store.approve("big", save_png(tmp / "big.png", big))
+    shifted = big.copy()
+    shifted[800:820, 1300:1400, :3] = 0
+    frame_path = save_png(tmp / "big2.png", shifted)
+    started = time.perf_counter()
+    result = store.compare("big", frame_path, heatmap_dir=tmp / "heat")
+    print(f"  2400x1600 compare: {(time.perf_counter() - started) * 1000:.0f}ms ({result.summary()})")
+    return [] if result.regressed else ["a blacked-out strip on a large capture should regress"]
+
+
+def main() -> int:
+    if SKIP_REASON:
+        print(f"SKIP: {SKIP_REASON}")
+        return 0
+
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="cmux-golden-") as tmp:
+        for check in (check_compare, check_content_addressed, check_speed):
+            print(f"RUN  {check.__name__}")
+            failures.extend(check(Path(tmp)))
+
+    if failures:
+        print("Golden store test failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("Golden store test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Tests for tests_v2/cmux_report.py (streaming HTML reports with image assets).
+
+Checks that:
+- images are stored once per content in <report>_assets/, never inlined
+- thumbnails are downscaled in the worker pool and lazily loaded, linking to
+  the full-size image
+- text is escaped, and a failed run leaves the previous report in place
+- the report stays small where the base64 version grew with every image
+
+Does not need a running cmux instance.
+
+Usage:
+    python3 tests_v2/test_html_report.py
+"""
+
+import base64
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+try:
+    import numpy as np  # noqa: E402
+
+    from cmux_pixel_diff import load_png, save_png  # noqa: E402
+    from cmux_report import HtmlReport, esc  # noqa: E402
+except ImportError as e:  # NumPy missing
+    SKIP_REASON = str(e)
+else:
+    SKIP_REASON = ""
+
+
+def _shots(tmp: Path, count: int, width: int = 1600, height: int = 1000) -> List[Path]:
+    paths = []
+    for n in range(count):
+        img = np.full((height, width, 4), 20 + n * 10, np.uint8)
+        img[..., 3] = 255
+        img[100:300, 100 + n * 40:400 + n * 40, :3] = 200
+        paths.append(save_png(tmp / f"shot{n}.png", img, level=1))
+    return paths
+
+
+def check_assets(tmp: Path) -> List[str]:
+    failures: List[str] = []
+    shots = _shots(tmp, 3)
+    dup = tmp / "copy_of_shot0.png"
+    dup.write_bytes(shots[0].read_bytes())
+    path = tmp / "report.html"
+
+    with HtmlReport(path, "t <1>", css="body { color: red; }") as report:
+        report.write(f"<h1>{esc('<script>alert(1)</script>')}</h1>\n")
+        for shot in shots + [dup]:
+            report.write(f"<figure>{report.image(shot, shot.name)}</figure>\n")
+
+    html = path.read_text()
+    if "data:image" in html:
+        failures.append("images should not be inlined")
+    if "<script>alert" in html or "&lt;script&gt;" not in html or "<title>t &lt;1&gt;</title>" not in html:
+        failures.append("text was not escaped")
+    assets = report.assets
+    full = sorted(p.name for p in assets.iterdir() if ".w" not in p.name)
+    thumbs = sorted(p for p in assets.iterdir() if ".w480." in p.name)
+    if len(full) != 3 or len(thumbs) != 3:
+        failures.append(f"expected 3 unique images and 3 thumbnails, got {full} / {[t.name for t in thumbs]}")
+    for thumb in thumbs:
+        w = load_png(thumb).width
+        if w > 480:
+            failures.append(f"thumbnail {thumb.name} is {w}px wide")
+    imgs = re.findall(r'<a href="([^"]+)" target="_blank"><img src="([^"]+)" [^>]*loading="lazy"', html)
+    if len(imgs) != 4 or imgs[0] != imgs[3]:
+        failures.append(f"expected 4 lazy thumbnails linking to full images, duplicates sharing one: {imgs}")
+    for full_ref, thumb_ref in imgs:
+        if not (path.parent / full_ref).exists() or not (path.parent / thumb_ref).exists():
+            failures.append(f"dangling reference {full_ref} / {thumb_ref}")
+    return failures
+
+
+def check_abort(tmp: Path) -> List[str]:
+    path = tmp / "keep.html"
+    path.write_text("previous report")
+    try:
+        with HtmlReport(path, "t") as report:
+            report.write("<p>partial</p>")
+            raise RuntimeError("scenario crashed")
+    except RuntimeError:
+        pass
+    failures = []
+    if path.read_text() != "previous report":
+        failures.append("a failed run replaced the previous report")
+    if list(tmp.glob("keep.html.tmp")):
+        failures.append("a failed run left its temp file")
+    return failures
+
+
+def check_size(tmp: Path) -> List[str]:
+    (tmp / "many").mkdir(exist_ok=True)
+    shots = _shots(tmp / "many", 12)
+    started = time.perf_counter()
+    path = tmp / "many.html"
+    with HtmlReport(path, "many") as report:
+        for shot in shots:
+            report.write(f"<figure>{report.image(shot, shot.name)}</figure>\n")
+    elapsed = time.perf_counter() - started
+    inline = sum(len(base64.b64encode(s.read_bytes())) for s in shots)
+    size = path.stat().st_size
+    print(f"  12 screenshots: report {size} bytes (inline would be {inline}), written in {elapsed * 1000:.0f}ms")
+    return [] if size < 10_000 else [f"report should stay small without inline images: {size} bytes"]
+
+
+def main() -> int:
+    if SKIP_REASON:
+        print(f"SKIP: {SKIP_REASON}")
+        return 0
+
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="cmux-report-") as tmp:
+        for check in (check_assets, check_abort, check_size):
+            print(f"RUN  {check.__name__}")
+            failures.extend(check(Path(tmp)))
+
+    if failures:
+        print("HTML report test failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("HTML report test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
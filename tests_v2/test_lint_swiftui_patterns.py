@@ -5,16 +5,36 @@ Lint test to catch SwiftUI patterns that cause performance issues.
 This test checks for:
 1. Text(_:style:) with auto-updating date styles (.time, .timer, .relative)
    These cause continuous view updates and can lead to high CPU usage.
+2. The CPU-burn catalogue in scripts/cmux_swift_rules.py (unguarded async
+   hops in updateNSView, allocations in body, timers that never stop,
+   unpaused TimelineViews, repeatForever animations). Warnings fail the
+   lint unless suppressed in the Swift source with a reason:
+       // cmux-lint: disable=<rule-id> (why)
+   Notes are printed but never fail.
+
+Set CMUX_LINT_SARIF=path to also write the findings as SARIF 2.1.0.
+
+Sources are read through scripts/cmux_swift_scan.py, which caches parsed
+files and per-rule findings, so reruns only re-check files that changed.
+Rules live in scripts/cmux_swift_rules.py.
 """
 
 from __future__ import annotations
 
+import json
+import os
 import re
 import subprocess
 import sys
 from pathlib import Path
 from typing import List, Tuple
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+from cmux_swift_scan import Finding, SwiftScanner, load_rules, to_sarif  # noqa: E402
+
+TEXT_STYLE_RULE = "autoupdating-text-style"
+
 
 def get_repo_root():
     """Get the repository root directory."""
@@ -38,15 +58,7 @@ def get_repo_root():
     return cwd
 
 
-def find_swift_files(repo_root: Path) -> List[Path]:
-    """Find all Swift files in Sources directory (excluding vendored code)."""
-    sources_dir = repo_root / "Sources"
-    if not sources_dir.exists():
-        return []
-    return list(sources_dir.rglob("*.swift"))
-
-
-def check_autoupdating_text_styles(files: List[Path]) -> List[Tuple[Path, int, str]]:
+def check_autoupdating_text_styles(scanner: SwiftScanner) -> List[Tuple[str, int, str]]:
     """
     Check for Text(_:style:) with auto-updating date styles.
 
@@ -59,50 +71,23 @@ def check_autoupdating_text_styles(files: List[Path]) -> List[Tuple[Path, int, s
     Instead, use static formatting:
     - Text(date.formatted(date: .omitted, time: .shortened))
     """
-    violations = []
-
-    # Patterns that indicate auto-updating Text with Date
-    # The key patterns are: Text(something, style: .time/timer/relative/offset)
-    problematic_patterns = [
-        "style: .time",
-        "style: .timer",
-        "style: .relative",
-        "style: .offset",
-        "style:.time",
-        "style:.timer",
-        "style:.relative",
-        "style:.offset",
-    ]
-
-    for file_path in files:
-        try:
-            content = file_path.read_text()
-            lines = content.split('\n')
-
-            for line_num, line in enumerate(lines, start=1):
-                # Skip comments
-                stripped = line.strip()
-                if stripped.startswith("//"):
-                    continue
+    return [(f.path, f.line, f.snippet) for f in scanner.run([TEXT_STYLE_RULE])]
 
-                for pattern in problematic_patterns:
-                    if pattern in line:
-                        violations.append((file_path, line_num, line.strip()))
-                        break
-        except Exception as e:
-            print(f"Warning: Could not read {file_path}: {e}", file=sys.stderr)
 
-    return violations
+def check_cpu_antipatterns(scanner: SwiftScanner) -> List[Finding]:
+    """Findings from every other rule in scripts/cmux_swift_rules.py."""
+    rules = [rid for rid in load_rules(scanner.rule_modules) if rid != TEXT_STYLE_RULE]
+    return scanner.run(rules)
 
 
-def check_command_palette_caret_tint(repo_root: Path) -> List[str]:
+def check_command_palette_caret_tint(scanner: SwiftScanner) -> List[str]:
     """Ensure command palette text inputs keep a white caret tint."""
-    content_view = repo_root / "Sources" / "ContentView.swift"
+    content_view = Path(scanner.root) / "Sources" / "ContentView.swift"
     if not content_view.exists():
         return [f"Missing expected file: {content_view}"]
 
     try:
-        content = content_view.read_text()
+        content = scanner.file("Sources/ContentView.swift").text
     except Exception as e:
         return [f"Could not read {content_view}: {e}"]
 
@@ -140,15 +125,23 @@ def check_command_palette_caret_tint(repo_root: Path) -> List[str]:
 def main():
     """Run the lint checks."""
     repo_root = get_repo_root()
-    swift_files = find_swift_files(repo_root)
+    scanner = SwiftScanner(str(repo_root))
 
-    print(f"Checking {len(swift_files)} Swift files for performance issues...")
+    print(f"Checking {len(scanner.paths())} Swift files for performance issues...")
 
     # Check for auto-updating Text styles
-    style_violations = check_autoupdating_text_styles(swift_files)
-    tint_violations = check_command_palette_caret_tint(repo_root)
+    style_violations = check_autoupdating_text_styles(scanner)
+    tint_violations = check_command_palette_caret_tint(scanner)
+    cpu_findings = check_cpu_antipatterns(scanner)
     has_failures = False
 
+    sarif_path = os.environ.get("CMUX_LINT_SARIF")
+    if sarif_path:
+        rules = load_rules(scanner.rule_modules)
+        with open(sarif_path, "w", encoding="utf-8") as f:
+            json.dump(to_sarif(scanner.run(list(rules)), rules), f, indent=2)
+        print(f"Wrote SARIF report to {sarif_path}")
+
     if style_violations:
         has_failures = True
         print("\n❌ LINT FAILURES: Auto-updating Text styles found")
@@ -156,8 +149,7 @@ def main():
         print("These patterns cause continuous SwiftUI view updates and high CPU usage:")
         print()
 
-        for file_path, line_num, line in style_violations:
-            rel_path = file_path.relative_to(repo_root)
+        for rel_path, line_num, line in style_violations:
             print(f"  {rel_path}:{line_num}")
             print(f"    {line}")
             print()
@@ -179,6 +171,30 @@ def main():
         print("FIX: Set command palette TextField tint modifiers to `.white`.")
         print()
 
+    blocking = [f for f in cpu_findings if f.severity in ("error", "warning")]
+    if blocking:
+        has_failures = True
+        rules = load_rules(scanner.rule_modules)
+        print("\n❌ LINT FAILURES: CPU-burn patterns found")
+        print("=" * 60)
+        for rule_id in sorted({f.rule for f in blocking}):
+            print(f"[{rule_id}] {rules[rule_id].description}")
+            for f in blocking:
+                if f.rule == rule_id:
+                    print(f"  {f.path}:{f.line} ({f.severity})")
+                    print(f"    {f.snippet}")
+            print()
+        print("FIX: Follow the rule's advice in scripts/cmux_swift_rules.py, or if the")
+        print("pattern is deliberate, suppress it on that line with a reason:")
+        print("  // cmux-lint: disable=<rule-id> (why this is fine)")
+        print()
+
+    notes = [f for f in cpu_findings if f.severity == "note"]
+    if notes:
+        print(f"\nNotes ({len(notes)}, not failures):")
+        for f in notes:
+            print(f"  {f.path}:{f.line}: [{f.rule}] {f.message}")
+
     if has_failures:
         return 1
 
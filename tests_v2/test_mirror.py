@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Tests for tests_v2/cmux_mirror.py.
+
+Checks that:
+- LineRing keeps stable line numbers while dropping the oldest lines past
+  its caps, and compacts its buffer
+- indexed regex and substring search return exactly what a full scan does
+- feed() lines up overlapping reads without losing or repeating lines, and
+  asks for a wider read when output outran the window
+- sync() against real shells (cmux_pty_server) finds which surface printed
+  a line, and later syncs only fetch the tail
+- indexed search over many surfaces is much faster than scanning
+
+Needs a POSIX shell, not a running cmux instance.
+
+Usage:
+    python3 tests_v2/test_mirror.py
+"""
+
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from typing import Callable, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from cmux import cmux  # noqa: E402
+from cmux_mirror import LineRing, TerminalMirror  # noqa: E402
+from cmux_pty_server import PtyServer  # noqa: E402
+
+WORDS = ["error:", "warning", "Traceback", "build", "ok", "FAILED", "test_", "café", "passed", "ERROR", "x"]
+
+
+def _random_line(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) + str(rng.randint(0, 99)) for _ in range(rng.randint(0, 6)))
+
+
+def _wait_for(pred: Callable[[], bool], timeout_s: float = 10.0) -> bool:
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        if pred():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def check_ring(tmp: str) -> List[str]:
+    failures: List[str] = []
+    ring = LineRing(max_lines=5000)
+    for i in range(20000):
+        ring.append(b"line %d" % i)
+    if (ring.first, ring.next, len(ring)) != (15000, 20000, 5000):
+        failures.append(f"ring bounds: first={ring.first} next={ring.next} len={len(ring)}")
+    if ring.get(15000) != b"line 15000" or ring.get(19999) != b"line 19999":
+        failures.append("line numbers should survive eviction")
+    if len(ring._data) > 2 * ring.nbytes + 16:
+        failures.append(f"buffer should be compacted: {len(ring._data)} bytes for {ring.nbytes} live")
+    if list(ring.find_all(b"line 1999")) != list(range(19990, 20000)):
+        failures.append(f"find_all: {list(ring.find_all(b'line 1999'))}")
+    if list(ring.find_all(b"9line")) != []:
+        failures.append("find_all should not match across line boundaries")
+
+    small = LineRing(max_lines=100, max_bytes=1000)
+    for i in range(50):
+        small.append(b"y" * 100)
+    if small.nbytes > 1000 or len(small) != 10:
+        failures.append(f"byte cap: {small.nbytes} bytes in {len(small)} lines")
+    return failures
+
+
+def check_search_matches_scan(tmp: str) -> List[str]:
+    failures: List[str] = []
+    rng = random.Random(7)
+    mirror = TerminalMirror(max_lines=3000)
+    expected = {}
+    for sid in ("A", "B", "C"):
+        lines = [_random_line(rng) for _ in range(5000)]
+        mirror.append(sid, lines)
+        expected[sid] = (5000 - 3000, lines[-3000:])
+    patterns = [r"error:\d+", r"(?i)traceback", r"FAILED\d ok", r"build(1|2)", r"caf\w", r"^warning\d+$",
+                r"test_4\d \w+", r"(?i:error)7", r"xx", r"passed[0-9]{2} (build|ok)"]
+    for pattern in patterns:
+        regex = re.compile(pattern)
+        want = [(sid, first + i) for sid, (first, lines) in expected.items()
+                for i, line in enumerate(lines) if regex.search(line)]
+        got = [(h.surface_id, h.line) for h in mirror.search(pattern)]
+        if got != want:
+            failures.append(f"search {pattern!r}: {len(got)} hits, scan found {len(want)}")
+    for needle in ("error:1", "café", "ok", "FAILED42 test_", "é"):
+        want = [(sid, first + i) for sid, (first, lines) in expected.items()
+                for i, line in enumerate(lines) if needle in line]
+        got = [(h.surface_id, h.line) for h in mirror.find(needle)]
+        if got != want:
+            failures.append(f"find {needle!r}: {len(got)} hits, scan found {len(want)}")
+    if len(mirror.search("error:", limit=3)) != 3 or mirror.search("error:", surfaces=["B"])[0].surface_id != "B":
+        failures.append("limit / surfaces filters")
+    return failures
+
+
+def check_feed_alignment(tmp: str) -> List[str]:
+    failures: List[str] = []
+    rng = random.Random(3)
+    mirror = TerminalMirror(window_lines=60, live_lines=10, anchor_lines=4)
+    printed: List[str] = []
+    widened = 0
+    for step in range(300):
+        printed.extend(f"out {len(printed)} {_random_line(rng)}" for _ in range(rng.choice([0, 1, 5, 20, 45, 120])))
+        screen = printed + [f"$ typing {step}"]  # the prompt line changes on every read
+        window = 60
+        while not mirror.feed("s", "\n".join(screen[-window:]), complete=window >= len(screen)):
+            widened += 1
+            window *= 4
+    got = mirror.lines("s")
+    if got[:-1] != printed[:len(got) - 1] or len(got) != len(printed) + 1 or got[-1] != "$ typing 299":
+        failures.append(f"mirror diverged: {len(got)} lines for {len(printed)} printed")
+    if widened == 0:
+        failures.append("bursts longer than the window should have asked for a wider read")
+    if mirror.stats["resets"]:
+        failures.append(f"unexpected resets: {mirror.stats}")
+    return failures
+
+
+def check_sync_with_shells(tmp: str) -> List[str]:
+    failures: List[str] = []
+    path = os.path.join(tmp, "mirror.sock")
+    with PtyServer(path, cwd=tmp), cmux(path) as c:
+        surfaces = [c._call("surface.list")["surfaces"][0]["id"]]
+        for _ in range(3):
+            ws = c._call("workspace.create")["workspace_id"]
+            surfaces.append(c._call("surface.list", {"workspace_id": ws})["surfaces"][0]["id"])
+
+        def run_everywhere(command: Callable[[int], str], marker: str) -> None:
+            c._call_many([("surface.send_text", {"surface_id": sid, "text": command(i) + f"; echo {marker}\n"})
+                          for i, sid in enumerate(surfaces)])
+            ok = _wait_for(lambda: all(f"\n{marker}" in c._call("surface.read_text", {"surface_id": sid})["text"]
+                                       for sid in surfaces))
+            if not ok:
+                failures.append(f"shells did not finish {marker}")
+
+        run_everywhere(lambda i: f"seq 1 500; echo 'error: disk {i} full'" if i == 2 else "seq 1 500", "FIRST")
+        mirror = TerminalMirror(c, window_lines=100, live_lines=30)
+        mirror.sync()
+        first_fetch = mirror.stats["bytes_fetched"]
+        hits = mirror.search(r"^error: disk \d")
+        if [(h.surface_id, h.text) for h in hits] != [(surfaces[2], "error: disk 2 full")]:
+            failures.append(f"error line should be found on surface 3 only: {hits}")
+        if set(mirror.surfaces) != set(surfaces):
+            failures.append(f"mirrored surfaces: {mirror.surfaces}")
+
+        run_everywhere(lambda i: "seq 1000 1030", "SECOND")
+        mirror.sync()
+        second_fetch = mirror.stats["bytes_fetched"] - first_fetch
+        run_everywhere(lambda i: f"seq 5000 {5000 + 300 * (i + 1)}", "THIRD")
+        refetches = mirror.stats["refetches"]
+        mirror.sync()
+        for i, sid in enumerate(surfaces):
+            numbers = [line for line in mirror.lines(sid) if line.isdigit()]
+            want = [str(n) for n in list(range(1, 501)) + list(range(1000, 1031)) + list(range(5000, 5001 + 300 * (i + 1)))]
+            if numbers != want:
+                failures.append(f"surface {i + 1} mirror lost or repeated lines: {len(numbers)} vs {len(want)}")
+                break
+        if mirror.stats["refetches"] == refetches:
+            failures.append("output longer than the window should have triggered a wider read")
+        if len(mirror.find("THIRD")) != 2 * len(surfaces):
+            failures.append(f"command and output lines: {mirror.find('THIRD')}")
+
+        c._call("workspace.close", {"workspace_id": c._call("workspace.list")["workspaces"][-1]["id"]})
+        mirror.sync()
+        if len(mirror.surfaces) != len(surfaces) - 1:
+            failures.append("closed surfaces should be dropped from the mirror")
+    print(f"  first sync fetched {first_fetch} bytes for {len(surfaces)} surfaces, the next {second_fetch}")
+    if second_fetch * 2 > first_fetch:
+        failures.append("a sync after a little output should fetch much less than the first")
+    return failures
+
+
+def check_search_speed(tmp: str) -> List[str]:
+    failures: List[str] = []
+    rng = random.Random(11)
+    mirror = TerminalMirror()
+    all_lines = []
+    for n in range(16):
+        lines = [f"[{n}:{i}] " + _random_line(rng) for i in range(20000)]
+        lines[rng.randrange(len(lines))] = f"fatal: segfault in worker {n}"
+        mirror.append(f"s{n}", lines)
+        all_lines.append(lines)
+    t0 = time.perf_counter()
+    for _ in range(20):
+        hits = mirror.search(r"fatal: segfault in worker \d+")
+    index_s = (time.perf_counter() - t0) / 20
+    regex = re.compile(r"fatal: segfault in worker \d+")
+    t0 = time.perf_counter()
+    scanned = [line for lines in all_lines for line in lines if regex.search(line)]
+    scan_s = time.perf_counter() - t0
+    footprint = mirror.footprint()
+    print(f"  {footprint['lines']} lines ({footprint['bytes'] / 1e6:.1f}MB, {footprint['trigrams']} trigrams): "
+          f"indexed search {index_s * 1000:.2f}ms vs scan {scan_s * 1000:.1f}ms")
+    if len(hits) != 16 or len(scanned) != 16:
+        failures.append(f"expected one hit per surface: {len(hits)} indexed, {len(scanned)} scanned")
+    if index_s * 10 > scan_s:
+        failures.append(f"indexed search should be far faster than scanning: {index_s:.4f}s vs {scan_s:.4f}s")
+    return failures
+
+
+def main() -> int:
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="cmux-mirror-") as tmp:
+        for check in (check_ring, check_search_matches_scan, check_feed_alignment, check_sync_with_shells,
+                      check_search_speed):
+            print(f"RUN  {check.__name__}")
+            failures.extend(check(tmp))
+
+    if failures:
+        print("Mirror test failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("Mirror test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
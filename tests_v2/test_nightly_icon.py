@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Tests for scripts/generate_nightly_icon.py (banner icon variants).
+
+Checks that:
+- the NumPy recolor gives the same pixels as the per-pixel loop it replaced
+- a second run with unchanged inputs skips every size, and editing one
+  source icon (or the output) regenerates just that size
+- the manifest is kept out of the output directory (an asset catalog)
+- tag variants get their own label and a stable color
+
+Does not need a running cmux instance. Needs Pillow and NumPy.
+
+Usage:
+    python3 tests_v2/test_nightly_icon.py
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+
+
+def _reference_recolor(img, color):
+    """Pass 1 of the original implementation, pixel by pixel."""
+    img = img.convert("RGBA")
+    pixels = img.load()
+    w, h = img.size
+    for y in range(h):
+        for x in range(w):
+            r, g, b, a = pixels[x, y]
+            if a == 0:
+                continue
+            if r > 180 and g < 180 and b < 100 and r > g and r - b > 100:
+                s = min(r / 255.0, 1.0)
+                pixels[x, y] = (int(color[0] * s), int(color[1] * s), int(color[2] * s), a)
+    return img
+
+
+def check_recolor_matches_reference(icon, tmp: Path) -> List[str]:
+    import numpy as np
+    from PIL import Image
+
+    failures: List[str] = []
+    for filename, size in (("32@2x.png", 64), ("256@2x.png", 512)):
+        img = Image.open(os.path.join(icon.SRC_DIR, filename))
+        # Compare pass 1 only: blank the banner text so pass 2 has nothing to redraw.
+        arr = np.array(img.convert("RGBA"))
+        banner_y = int(arr.shape[0] * 0.82)
+        white = (arr[banner_y:, :, :3] > 220).all(axis=2)
+        arr[banner_y:][white] = (255, 107, 0, 255)
+        img = Image.fromarray(arr, "RGBA")
+        expected = np.array(_reference_recolor(img, icon.PURPLE))
+        got = np.array(icon.recolor_banner(img, "NIGHTLY", icon.PURPLE))
+        if not np.array_equal(expected, got):
+            failures.append(f"{filename}: vectorized recolor differs in {int((expected != got).any(axis=2).sum())} px")
+    return failures
+
+
+def check_manifest(icon, tmp: Path) -> List[str]:
+    failures: List[str] = []
+    src = tmp / "src"
+    shutil.copytree(icon.SRC_DIR, src)
+    os.environ["CMUX_ICON_CACHE_DIR"] = str(tmp / "cache")
+    variant = icon.Variant("nightly", "NIGHTLY", icon.PURPLE, str(tmp / "out"))
+
+    started = time.perf_counter()
+    first = icon.generate(variant, src_dir=str(src), jobs=2)
+    cold = time.perf_counter() - started
+    if set(first.values()) != {"generated"}:
+        failures.append(f"first run should generate everything: {first}")
+    # The output directory is an asset catalog in the real build: icons only.
+    extra = sorted(set(os.listdir(tmp / "out")) - {name for name, _ in icon.SIZES})
+    if extra or not list((tmp / "cache").glob("*.json")):
+        failures.append(f"the manifest belongs in the cache dir, not next to the icons: {extra}")
+
+    started = time.perf_counter()
+    second = icon.generate(variant, src_dir=str(src))
+    warm = time.perf_counter() - started
+    if set(second.values()) != {"unchanged"}:
+        failures.append(f"unchanged inputs should skip every size: {second}")
+    print(f"  {len(first)} sizes: cold {cold * 1000:.0f}ms, warm {warm * 1000:.0f}ms")
+
+    from PIL import Image
+    img = Image.open(src / "128.png").convert("RGBA")
+    img.putpixel((0, 0), (1, 2, 3, 255))
+    img.save(src / "128.png")
+    (tmp / "out" / "16.png").write_bytes(b"hand-edited")
+    third = icon.generate(variant, src_dir=str(src))
+    changed = sorted(name for name, state in third.items() if state == "generated")
+    if changed != ["128.png", "16.png"]:
+        failures.append(f"only the edited source and the clobbered output should regenerate: {changed}")
+
+    relabeled = icon.Variant("nightly", "CANARY", icon.PURPLE, str(tmp / "out"))
+    if set(icon.generate(relabeled, src_dir=str(src)).values()) != {"generated"}:
+        failures.append("changing the variant config should regenerate everything")
+    return failures
+
+
+def check_tag_variant(icon, tmp: Path) -> List[str]:
+    failures: List[str] = []
+    a = icon.tag_variant("feature/split-drag", str(tmp))
+    again = icon.tag_variant("feature/split-drag", str(tmp))
+    other = icon.tag_variant("fix-blank-pane", str(tmp))
+    if a.label != "FEATURE-SP" or a != again:
+        failures.append(f"tag variant should be stable and label-safe: {a}")
+    if a.color == other.color and a.label == other.label:
+        failures.append("different tags should look different")
+    if not all(40 <= c <= 200 for c in a.color + other.color):
+        failures.append(f"tag colors should stay dark enough for white text: {a.color} {other.color}")
+    return failures
+
+
+def main() -> int:
+    try:
+        import generate_nightly_icon as icon
+    except ImportError as e:
+        print(f"SKIP: {e}")
+        return 0
+
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="cmux-icon-") as tmp:
+        for check in (check_recolor_matches_reference, check_manifest, check_tag_variant):
+            print(f"RUN  {check.__name__}")
+            failures.extend(check(icon, Path(tmp) / check.__name__))
+
+    if failures:
+        print("Nightly icon test failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("Nightly icon test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
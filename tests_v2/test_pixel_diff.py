@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Tests for tests_v2/cmux_pixel_diff.py (client-side frame diffs).
+
+Checks that:
+- the default tolerance reproduces the server's `changed_pixels` rule
+- per-region counts, bounding boxes and per-channel tolerances are right
+- raw RGBA files are memory-mapped, and PNGs with every filter type decode
+- diffing panel-sized frames runs at hundreds of frames per second
+
+Does not need a running cmux instance.
+
+Usage:
+    python3 tests_v2/test_pixel_diff.py
+"""
+
+from __future__ import annotations
+
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from pathlib import Path
+from typing import List, Sequence
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+try:
+    import numpy as np  # noqa: E402
+
+    from cmux_pixel_diff import (  # noqa: E402
+        Differ,
+        Region,
+        caret_cell,
+        changed_pixels,
+        load_png,
+        load_snapshot,
+        top_band,
+    )
+except ImportError as e:  # NumPy missing
+    SKIP_REASON = str(e)
+else:
+    SKIP_REASON = ""
+
+MIN_DIFFS_PER_SECOND = 200
+
+
+def _frame(width: int = 64, height: int = 48, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(height, width, 4), dtype=np.uint8)
+    pixels[..., 3] = 255
+    return pixels
+
+
+def _server_changed_pixels(a: np.ndarray, b: np.ndarray, threshold: int = 8) -> int:
+    """Straight port of TerminalController.countChangedPixels."""
+    changed = 0
+    flat_a, flat_b = a.reshape(-1).tolist(), b.reshape(-1).tolist()
+    for i in range(0, len(flat_a), 4):
+        d = sum(abs(flat_a[i + k] - flat_b[i + k]) for k in range(3))
+        if d > threshold:
+            changed += 1
+    return changed
+
+
+def _write_png(path: Path, pixels: np.ndarray, filters: Sequence[int] = (0, 1, 2, 3, 4)) -> None:
+    """PNG writer that cycles through the given filter types (all five by default), one per row."""
+    height, width, _ = pixels.shape
+    bpp, stride = 4, width * 4
+    rows = pixels.reshape(height, stride).astype(np.int32)
+    out = bytearray()
+    for y in range(height):
+        kind = filters[y % len(filters)]
+        cur = rows[y]
+        prior = rows[y - 1] if y else np.zeros(stride, np.int32)
+        left = np.concatenate([np.zeros(bpp, np.int32), cur[:-bpp]])
+        upleft = np.concatenate([np.zeros(bpp, np.int32), prior[:-bpp]])
+        if kind == 0:
+            pred = np.zeros(stride, np.int32)
+        elif kind == 1:
+            pred = left
+        elif kind == 2:
+            pred = prior
+        elif kind == 3:
+            pred = (left + prior) >> 1
+        else:
+            p = left + prior - upleft
+            pa, pb, pc = abs(p - left), abs(p - prior), abs(p - upleft)
+            pred = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, prior, upleft))
+        out.append(kind)
+        out += ((cur - pred) & 0xFF).astype(np.uint8).tobytes()
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    path.write_bytes(b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+                     + chunk(b"IDAT", zlib.compress(bytes(out))) + chunk(b"IEND", b""))
+
+
+def check_server_parity(tmp: Path) -> List[str]:
+    a = _frame(40, 30, seed=1)
+    b = a.copy()
+    noise = np.random.default_rng(2).integers(-6, 7, size=b.shape)
+    b = np.clip(b.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    expected = _server_changed_pixels(a, b)
+    got = changed_pixels(a, b)
+    return [] if got == expected else [f"changed_pixels {got} != server rule {expected}"]
+
+
+def check_regions(tmp: Path) -> List[str]:
+    failures: List[str] = []
+    a = np.zeros((100, 200, 4), np.uint8)
+    b = a.copy()
+    b[2:6, 150:160, 0] = 200          # inside the tab bar
+    b[40:44, 21:24, :3] = 30          # caret cell (col 2, row 4 of a 10x10 grid)
+    b[80, 5, 2] = 5                   # below tolerance
+
+    caret = caret_cell(2, 4, 10, 10, pad=0)
+    differ = Differ(regions=[top_band(20), caret, Region("empty", 500, 500, 10, 10)])
+    result = differ.diff(a, b)
+    if result["full"].changed_pixels != 40 + 12:
+        failures.append(f"full: {result['full']}")
+    if result["tab_bar"].bbox != (150, 2, 160, 6) or result["tab_bar"].changed_pixels != 40:
+        failures.append(f"tab_bar: {result['tab_bar']}")
+    if result["caret"].bbox != (21, 40, 24, 44) or result["caret"].max_delta != (30, 30, 30):
+        failures.append(f"caret: {result['caret']}")
+    if result["empty"].total_pixels != 0 or result["empty"].changed:
+        failures.append(f"off-frame region should be empty: {result['empty']}")
+
+    regions_only = Differ(regions=[caret], full_frame=False).diff(a, b)
+    if set(regions_only) != {"caret"} or regions_only["caret"].changed_pixels != 12:
+        failures.append(f"regions-only diff: {regions_only}")
+
+    per_channel = Differ(tolerance=(250, 255, 255)).diff(a, b)["full"]
+    if per_channel.changed_pixels != 0:
+        failures.append(f"per-channel tolerance should hide every change: {per_channel}")
+    blue = Differ(tolerance=(255, 255, 4)).diff(a, b)["full"]
+    if blue.changed_pixels != 13:
+        failures.append(f"per-channel blue tolerance: {blue}")
+
+    seq = Differ().diff_sequence([a, b, b, a])
+    if [d["full"].changed_pixels for d in seq] != [52, 0, 52]:
+        failures.append(f"sequence: {[d['full'].changed_pixels for d in seq]}")
+    return failures
+
+
+def check_loading(tmp: Path) -> List[str]:
+    failures: List[str] = []
+    pixels = _frame(37, 23, seed=3)
+    png = tmp / "snap.png"
+    raw = tmp / "snap.rgba"
+    _write_png(png, pixels)
+    raw.write_bytes(pixels.tobytes())
+
+    decoded = load_png(png)
+    if not np.array_equal(decoded.pixels, pixels):
+        failures.append("PNG decode does not round-trip (all five filter types)")
+
+    # Panel-sized and all Paeth, like an adaptively filtered capture; these rows used to go byte by byte.
+    big = _frame(1440, 900, seed=4)
+    big_png = tmp / "big.png"
+    _write_png(big_png, big, filters=(4,))
+    t0 = time.perf_counter()
+    decoded = load_png(big_png)
+    decode_s = time.perf_counter() - t0
+    print(f"  1440x900 Paeth-filtered PNG decoded in {decode_s * 1000:.0f}ms")
+    if not np.array_equal(decoded.pixels, big):
+        failures.append("large PNG decode does not round-trip")
+    if decode_s > 1.5:
+        failures.append(f"decoding a 1440x900 PNG took {decode_s:.2f}s")
+
+    info = {"path": str(png), "raw_path": str(raw), "width": 37, "height": 23, "bytes_per_row": 37 * 4}
+    frame = load_snapshot(info)
+    if not isinstance(frame.pixels.base, np.memmap) and not isinstance(frame.pixels, np.memmap):
+        failures.append("raw snapshot should be memory-mapped")
+    if not np.array_equal(frame.pixels, pixels):
+        failures.append("raw snapshot pixels differ")
+
+    fallback = load_snapshot({**info, "raw_path": None})
+    if fallback.path != png:
+        failures.append("snapshot without raw_path should fall back to the PNG")
+    return failures
+
+
+def check_throughput(tmp: Path) -> List[str]:
+    """Blink/latency probes: consecutive frames that differ in a few cells."""
+    width, height = 1200, 800  # a typical terminal panel at 2x
+    base = _frame(width, height, seed=0)
+    for n in range(4):
+        frame = base.copy()
+        frame[320:352, 160 + 16 * n:176 + 16 * n, :3] ^= 0xFF  # caret moves one cell per frame
+        frame[10:40, 40 * n:40 * n + 30, 1] ^= 0x40             # a tab title repaints
+        frame.tofile(tmp / f"f{n}.rgba")
+    mapped = [load_snapshot({"raw_path": str(tmp / f"f{n}.rgba"), "width": width, "height": height,
+                             "path": "unused"}) for n in range(4)]
+    noise = [_frame(width, height, seed=s) for s in (1, 2)]
+
+    caret = Differ(regions=[caret_cell(10, 10, 16, 32)], full_frame=False)
+    full = Differ(regions=[top_band(60), caret_cell(10, 10, 16, 32)])
+    rates = {}
+    for label, differ, frames, rounds in (("caret region", caret, mapped, 2000),
+                                          ("full frame + regions", full, mapped, 500),
+                                          ("every pixel changed", full, noise, 20)):
+        started = time.perf_counter()
+        for i in range(rounds):
+            differ.diff(frames[i % len(frames)], frames[(i + 1) % len(frames)])
+        rates[label] = rounds / (time.perf_counter() - started)
+    print("  " + ", ".join(f"{label}: {rate:.0f}/s" for label, rate in rates.items()) + f" ({width}x{height})")
+    slow = [label for label in ("caret region", "full frame + regions") if rates[label] < MIN_DIFFS_PER_SECOND]
+    return [f"{label} diffs too slow: {rates[label]:.0f}/s" for label in slow]
+
+
+def main() -> int:
+    if SKIP_REASON:
+        print(f"SKIP: {SKIP_REASON}")
+        return 0
+
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="cmux-pixel-diff-") as tmp:
+        for check in (check_server_parity, check_regions, check_loading, check_throughput):
+            print(f"RUN  {check.__name__}")
+            failures.extend(check(Path(tmp)))
+
+    if failures:
+        print("Pixel diff test failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("Pixel diff test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
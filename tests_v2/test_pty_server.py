@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Tests for tests_v2/cmux_vt.py and tests_v2/cmux_pty_server.py.
+
+Checks that:
+- the screen model wraps, scrolls into a capped scrollback, erases, moves the
+  cursor, keeps the alternate screen out of scrollback, answers cursor
+  position queries, and copes with UTF-8 and escapes split across reads
+- surfaces created over the socket run real shells: typed commands create
+  marker files, ctrl-c interrupts `sleep`, ctrl-d ends `cat`
+- surface.read_text matches the app's contract: screen text, workspace-only
+  lookup, `scrollback`/`lines`, and `lines: 0` refused
+- many shells printing at once are all rendered (throughput benchmark)
+
+Needs a POSIX shell, not a running cmux instance.
+
+Usage:
+    python3 tests_v2/test_pty_server.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from cmux import cmux, cmuxError  # noqa: E402
+from cmux_pty_server import PtyServer  # noqa: E402
+from cmux_vt import Screen  # noqa: E402
+
+
+def _wait_for(pred: Callable[[], bool], timeout_s: float = 10.0, step_s: float = 0.05) -> bool:
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        if pred():
+            return True
+        time.sleep(step_s)
+    return False
+
+
+def check_screen_model(tmp: str) -> List[str]:
+    failures: List[str] = []
+
+    s = Screen(cols=10, rows=3, scrollback=5)
+    s.feed(b"abcdefghijKL\r\n")
+    if s.lines() != ["abcdefghij", "KL", ""]:
+        failures.append(f"autowrap: {s.lines()}")
+    for i in range(10):
+        s.feed(b"line %d\r\n" % i)
+    if list(s.history) != ["line 3", "line 4", "line 5", "line 6", "line 7"]:
+        failures.append(f"scrollback should keep the last 5 lines: {list(s.history)}")
+    if s.text() != "line 8\nline 9" or s.text(lines=1) != "line 9":
+        failures.append(f"text: {s.text()!r}")
+    if s.text(scrollback=True).split("\n")[0] != "line 3":
+        failures.append(f"text with scrollback: {s.text(scrollback=True)!r}")
+
+    s = Screen(cols=20, rows=4)
+    s.feed(b"hello world\x1b[1;7H\x1b[K\x1b[2;3Hxy\x1b[Az")
+    if s.lines()[:2] != ["hellz", "  xy"]:
+        failures.append(f"cursor moves and erase: {s.lines()}")
+    s.feed(b"\x1b[2J\x1b[Hprompt$ ls\x1b[3D\x1b[P\x1b[@L")
+    if s.lines()[0] != "prompt$Lls":
+        failures.append(f"delete/insert characters: {s.lines()}")
+    s.feed(b"\x1b]0;window title\x07\x1b[1;31mred\x1b[0m")
+    if "title" in s.text() or "red" not in s.text():
+        failures.append(f"OSC and SGR should not render: {s.text()!r}")
+
+    s = Screen(cols=20, rows=3, scrollback=100)
+    s.feed(b"$ vim\r\n\x1b[?1049h\x1b[H\x1b[2J")
+    for i in range(10):
+        s.feed(b"~ %d\r\n" % i)
+    s.feed(b"\x1b[?1049l")
+    if s.history or s.lines()[0] != "$ vim":
+        failures.append(f"alternate screen leaked into scrollback or did not restore: {list(s.history)} {s.lines()}")
+
+    s = Screen(cols=20, rows=3)
+    data = "café ☃\x1b[31mok\x1b]2;t\x1b\\!".encode("utf-8")
+    for i in range(len(data)):
+        s.feed(data[i:i + 1])
+    if s.lines()[0] != "café ☃ok!":
+        failures.append(f"byte-at-a-time UTF-8 and escapes: {s.lines()!r}")
+    s.feed(b"\x1b[6n")
+    if s.replies != [b"\x1b[1;10R"]:
+        failures.append(f"cursor position report: {s.replies}")
+    return failures
+
+
+def check_shell_surfaces(tmp: str) -> List[str]:
+    failures: List[str] = []
+    path = os.path.join(tmp, "pty.sock")
+    with PtyServer(path, cwd=tmp) as server, cmux(path) as c:
+        if not c.ping():
+            failures.append("ping failed")
+        if oct(os.stat(path).st_mode & 0o777) != "0o600":
+            failures.append("pty server socket should be owner-only")
+
+        marker = Path(tmp) / "typed"
+        c.send(f"touch {marker}\n")
+        if not _wait_for(marker.exists):
+            failures.append("typed command did not create the marker file")
+
+        ctrlc = Path(tmp) / "ctrlc"
+        c.send("sleep 30\n")
+        time.sleep(0.3)
+        c.send_ctrl_c()
+        c.send(f"touch {ctrlc}\n")
+        if not _wait_for(ctrlc.exists, timeout_s=5.0):
+            failures.append("ctrl-c did not interrupt sleep")
+
+        ctrld = Path(tmp) / "ctrld"
+        c.send("cat\n")
+        time.sleep(0.3)
+        c.send_ctrl_d()
+        c.send(f"touch {ctrld}\n")
+        if not _wait_for(ctrld.exists, timeout_s=5.0):
+            failures.append("ctrl-d did not end cat")
+
+        ws_target = c._call("workspace.create")["workspace_id"]
+        surface_target = c._call("surface.list", {"workspace_id": ws_target})["surfaces"][0]["id"]
+        env_file = Path(tmp) / "env"
+        c._call("surface.send_text", {"surface_id": surface_target,
+                                      "text": f"echo $CMUX_WORKSPACE_ID $CMUX_SURFACE_ID > {env_file}\n"})
+        if not _wait_for(lambda: env_file.exists() and env_file.read_text().strip()):
+            failures.append("shell in the new workspace did not run the command")
+        elif env_file.read_text().split() != [ws_target, surface_target]:
+            failures.append(f"CMUX_* environment: {env_file.read_text()!r}")
+
+        c._call("workspace.create")  # selection moves away from the target, as in the parity test
+        token = f"CMUX_READ_SCREEN_{int(time.time() * 1000)}"
+        c._call("surface.send_text", {"workspace_id": ws_target, "surface_id": surface_target,
+                                      "text": f"echo {token}\n"})
+
+        def read(**params) -> str:
+            return c._call("surface.read_text", dict(params, workspace_id=ws_target))["text"]
+
+        if not _wait_for(lambda: f"\n{token}" in read(surface_id=surface_target)):
+            failures.append(f"read_text missing token output: {read(surface_id=surface_target)!r}")
+        if token not in read():
+            failures.append("workspace-only read_text should read the workspace's focused terminal")
+
+        c._call("surface.send_text", {"surface_id": surface_target, "text": "seq 1 200; echo SEQ_DONE\n"})
+        if not _wait_for(lambda: read(lines=1) == "$" and "SEQ_DONE" in read(lines=3)):
+            failures.append(f"seq output: {read(lines=5)!r}")
+        if "\n1\n2\n3\n" not in read(scrollback=True) or "\n1\n" in "\n" + read():
+            failures.append("scrollback should hold what scrolled off the screen")
+        if len(read(lines=5).split("\n")) != 5:
+            failures.append(f"lines=5: {read(lines=5)!r}")
+        try:
+            c._call("surface.read_text", {"surface_id": surface_target, "lines": 0})
+            failures.append("lines=0 should be refused")
+        except cmuxError as e:
+            if "lines must be greater than 0" not in str(e):
+                failures.append(f"lines=0 error: {e}")
+
+        c._call("surface.clear_history", {"surface_id": surface_target})
+        if token in read(scrollback=True):
+            failures.append("clear_history should drop scrollback")
+
+        for method, params, code in (("surface.send_key", {"key": "f13"}, "invalid_params"),
+                                     ("surface.create", {"type": "browser"}, "not_supported"),
+                                     ("browser.snapshot", {}, "method_not_found")):
+            try:
+                c._call(method, params)
+                failures.append(f"{method} {params} should fail")
+            except cmuxError as e:
+                if code not in str(e):
+                    failures.append(f"{method}: expected {code}, got {e}")
+
+        c._call("workspace.close", {"workspace_id": ws_target})
+        pids = [s.proc.pid for ws in server.workspaces for s in ws.surfaces]
+    for pid in pids:
+        try:
+            os.kill(pid, 0)
+            failures.append(f"shell {pid} still running after close")
+        except ProcessLookupError:
+            pass
+    return failures
+
+
+def check_throughput(tmp: str) -> List[str]:
+    failures: List[str] = []
+    path = os.path.join(tmp, "bench.sock")
+    n_surfaces, n_lines = 16, 20000
+    with PtyServer(path, cwd=tmp, scrollback=5000) as server, cmux(path) as c:
+        surfaces = [c._call("surface.list")["surfaces"][0]["id"]]
+        for _ in range(n_surfaces - 1):
+            surfaces.append(c._call("surface.create")["surface_id"])
+        ready = _wait_for(lambda: all(c._call("surface.read_text", {"surface_id": sid})["text"].endswith("$")
+                                      for sid in surfaces))
+        if not ready:
+            failures.append("shells did not start")
+            return failures
+
+        t0 = time.perf_counter()
+        c._call_many([("surface.send_text", {"surface_id": sid, "text": f"seq 1 {n_lines}; echo BENCH_DONE\n"})
+                      for sid in surfaces])
+        read_latencies: List[float] = []
+        stop = threading.Event()
+
+        def reader() -> None:
+            with cmux(path) as r:
+                while not stop.is_set():
+                    t = time.perf_counter()
+                    r._call("surface.read_text", {"surface_id": surfaces[0], "scrollback": True})
+                    read_latencies.append(time.perf_counter() - t)
+
+        t = threading.Thread(target=reader)
+        t.start()
+        done = _wait_for(lambda: all("\nBENCH_DONE" in c._call("surface.read_text", {"surface_id": sid, "lines": 3})["text"]
+                                     for sid in surfaces), timeout_s=60.0, step_s=0.1)
+        elapsed = time.perf_counter() - t0
+        stop.set()
+        t.join(10)
+        rendered = sum(s.screen.bytes_fed for ws in server.workspaces for s in ws.surfaces)
+        history = [len(s.screen.history) for ws in server.workspaces for s in ws.surfaces]
+        last = c._call("surface.read_text", {"surface_id": surfaces[-1], "lines": 3})["text"]
+
+    read_latencies.sort()
+    p95 = read_latencies[int(0.95 * (len(read_latencies) - 1))] * 1000 if read_latencies else 0.0
+    print(f"  {n_surfaces} shells x {n_lines} lines: {rendered / 1e6:.1f}MB rendered in {elapsed:.2f}s "
+          f"({rendered / 1e6 / elapsed:.1f}MB/s); read_text with scrollback p95 {p95:.1f}ms")
+    if not done:
+        failures.append(f"not every shell finished printing: {last!r}")
+    if max(history) != 5000:
+        failures.append(f"scrollback should be capped at 5000 lines: {history}")
+    if last.split("\n")[0] != str(n_lines):
+        failures.append(f"last lines of output: {last!r}")
+    return failures
+
+
+def main() -> int:
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="cmux-pty-") as tmp:
+        for check in (check_screen_model, check_shell_surfaces, check_throughput):
+            print(f"RUN  {check.__name__}")
+            failures.extend(check(tmp))
+
+    if failures:
+        print("PTY server test failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("PTY server test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Tests for tests_v2/cmux_qos.py against a stand-in v2 socket server.
+
+Checks that:
+- keystrokes stay fast while other clients flood surface.read_text, compared
+  with the same load sent straight to the app
+- a client's bulk requests are rate limited by its token bucket
+- clients take turns in the bulk lane, so a late client is not stuck behind
+  a flooding one, and free bulk slots are shared out one per client per round
+- a client's mixed-lane requests still run and answer in the order it sent them
+- relay.stats reports per-lane queue depth, throttling and wait times
+
+Does not need a running cmux instance.
+
+Usage:
+    python3 tests_v2/test_qos.py
+"""
+
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from cmux import cmux, cmuxError  # noqa: E402
+from cmux_qos import QosProxy, lane_of  # noqa: E402
+from cmux_relay import _Client  # noqa: E402
+
+
+class StandIn:
+    """Serves each connection on its own thread, but runs every request on one "main thread" lock, like the app."""
+
+    def __init__(self, path: str, bulk_s: float = 0.005):
+        self.path = path
+        self.bulk_s = bulk_s
+        self.main = threading.Lock()
+        self.lock = threading.Lock()
+        self.executed: Dict[str, List[int]] = {}  # client tag -> seq numbers in execution order
+        self.finished: List[str] = []  # client tag of each bulk request, in completion order
+        self._srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._srv.bind(path)
+        self._srv.listen(64)
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                conn, _ = self._srv.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: socket.socket) -> None:
+        with conn, conn.makefile("rwb") as f:
+            for line in f:
+                req = json.loads(line)
+                params = req.get("params") or {}
+                with self.main:
+                    if lane_of(req["method"]) == "bulk":
+                        time.sleep(self.bulk_s)
+                    with self.lock:
+                        if "tag" in params:
+                            self.executed.setdefault(params["tag"], []).append(params["seq"])
+                        if lane_of(req["method"]) == "bulk":
+                            self.finished.append(params.get("tag", ""))
+                resp = {"id": req["id"], "ok": True, "result": {"method": req["method"], "echo": params}}
+                f.write((json.dumps(resp) + "\n").encode())
+                f.flush()
+
+    def close(self) -> None:
+        self._srv.close()
+
+
+def _keystroke_latencies(path: str, stop: threading.Event, n: int = 40) -> List[float]:
+    latencies = []
+    with cmux(path) as c:
+        for _ in range(n):
+            t0 = time.perf_counter()
+            c._call("surface.send_key", {"surface_id": "surface:1", "key": "a"})
+            latencies.append(time.perf_counter() - t0)
+            time.sleep(0.01)
+    stop.set()
+    return sorted(latencies)
+
+
+def _flood(path: str, stop: threading.Event, errors: List[str]) -> None:
+    try:
+        with cmux(path) as c:
+            while not stop.is_set():
+                c._call_many([("surface.read_text", {"surface_id": "surface:2"})] * 8)
+    except (cmuxError, OSError) as e:
+        if not stop.is_set():
+            errors.append(f"flooder: {e}")
+
+
+def _p95(values: List[float]) -> float:
+    return values[min(len(values) - 1, int(0.95 * len(values)))] * 1000
+
+
+def check_keystrokes_under_flood(tmp: str) -> List[str]:
+    failures: List[str] = []
+    errors: List[str] = []
+    server = StandIn(os.path.join(tmp, "flood.sock"))
+
+    def measure(path: str) -> List[float]:
+        stop = threading.Event()
+        flooders = [threading.Thread(target=_flood, args=(path, stop, errors)) for _ in range(6)]
+        for t in flooders:
+            t.start()
+        time.sleep(0.05)
+        latencies = _keystroke_latencies(path, stop)
+        for t in flooders:
+            t.join(10)
+        return latencies
+
+    direct = measure(server.path)
+    with QosProxy(server.path, os.path.join(tmp, "flood-qos.sock"), upstreams=6, bulk_rate=1000, bulk_burst=8,
+                  bulk_global_rate=1000) as proxy:
+        proxied = measure(proxy.listen_path)
+        stats = proxy.stats()
+    server.close()
+
+    print(f"  send_key p95 under read_text flood: direct {_p95(direct):.1f}ms, via proxy {_p95(proxied):.1f}ms "
+          f"(bulk wait p95 {stats['lanes']['bulk']['wait_p95_ms']:.1f}ms)")
+    failures.extend(errors[:3])
+    if _p95(proxied) * 2 > _p95(direct):
+        failures.append(f"proxy should cut keystroke latency: direct p95 {_p95(direct):.1f}ms, "
+                        f"proxied {_p95(proxied):.1f}ms")
+    if stats["lanes"]["interactive"]["dispatched"] != len(proxied):
+        failures.append(f"keystrokes should go through the interactive lane: {stats['lanes']}")
+    return failures
+
+
+def check_rate_limit(tmp: str) -> List[str]:
+    failures: List[str] = []
+    server = StandIn(os.path.join(tmp, "rate.sock"), bulk_s=0.0)
+    with QosProxy(server.path, os.path.join(tmp, "rate-qos.sock"), bulk_rate=50, bulk_burst=5) as proxy:
+        with cmux(proxy.listen_path) as c:
+            t0 = time.perf_counter()
+            c._call_many([("surface.read_text", {})] * 30)
+            elapsed = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            for _ in range(10):
+                c._call("surface.list")
+            normal = time.perf_counter() - t0
+            stats = c._call("relay.stats")
+    server.close()
+
+    # 5 from the burst, then 25 at 50/s.
+    if not 0.4 <= elapsed < 2.0:
+        failures.append(f"30 reads at 50/s with a burst of 5 took {elapsed:.2f}s")
+    if normal > 0.5:
+        failures.append(f"normal requests should not be rate limited: {normal:.2f}s for 10")
+    bulk = stats["lanes"]["bulk"]
+    if bulk["dispatched"] != 30 or bulk["throttled"] < 20 or bulk["max_depth"] < 20 or bulk["wait_max_ms"] < 300:
+        failures.append(f"bulk lane stats: {bulk}")
+    if bulk["depth"] != 0 or stats["bulk_in_flight"] != 0:
+        failures.append(f"bulk lane should be empty when idle: {stats}")
+    return failures
+
+
+def check_fair_turns(tmp: str) -> List[str]:
+    failures: List[str] = []
+    server = StandIn(os.path.join(tmp, "fair.sock"), bulk_s=0.002)
+    with QosProxy(server.path, os.path.join(tmp, "fair-qos.sock"), bulk_rate=1000, bulk_burst=10,
+                  bulk_global_rate=100) as proxy:
+        hog_done = threading.Event()
+
+        def hog() -> None:
+            with cmux(proxy.listen_path) as c:
+                c._call_many([("surface.read_text", {"tag": "hog", "seq": i}) for i in range(60)], timeout_s=30)
+            hog_done.set()
+
+        t = threading.Thread(target=hog)
+        t.start()
+        time.sleep(0.1)
+        with cmux(proxy.listen_path) as c:
+            t0 = time.perf_counter()
+            c._call_many([("surface.read_text", {"tag": "late", "seq": i}) for i in range(5)], timeout_s=30)
+            late = time.perf_counter() - t0
+        hog_was_done = hog_done.is_set()
+        t.join(30)
+    server.close()
+
+    # Alone, the hog's 60 reads take about 0.6s at 100/s; taking turns, the late client needs about 0.1s.
+    if hog_was_done or late > 0.3:
+        failures.append(f"late client should not wait for the hog: {late:.2f}s (hog finished first: {hog_was_done})")
+    order = server.finished
+    if "late" not in order or order.index("late") > order.index("hog") + 30:
+        failures.append(f"bulk completions should interleave: {order}")
+    return failures
+
+
+def check_bulk_slots_shared(tmp: str) -> List[str]:
+    failures: List[str] = []
+    for clients, slots, want in ((2, 4, [2, 2]), (3, 4, [2, 1, 1]), (3, 6, [2, 2, 2]), (1, 3, [3])):
+        proxy = QosProxy(os.path.join(tmp, "none.sock"), os.path.join(tmp, "slots-qos.sock"), bulk_rate=1000,
+                         bulk_burst=100, bulk_global_rate=1000, max_bulk_in_flight=slots)
+        for cid in range(clients):
+            client = _Client(None, cid, True, proxy._lock)
+            for seq in range(10):
+                proxy._forward(client, seq, {"method": "surface.read_text", "params": {}})
+        picked, _ = proxy._pick(time.monotonic())
+        order = [st.client.id for st, _, _ in picked]
+        counts = sorted((order.count(cid) for cid in range(clients)), reverse=True)
+        if len(order) != slots or counts != want or len(set(order[:clients])) != clients:
+            failures.append(f"{clients} clients, {slots} bulk slots: picked {order}")
+    return failures
+
+
+def check_client_order(tmp: str) -> List[str]:
+    failures: List[str] = []
+    server = StandIn(os.path.join(tmp, "order.sock"), bulk_s=0.02)
+    with QosProxy(server.path, os.path.join(tmp, "order-qos.sock"), bulk_rate=20, bulk_burst=1) as proxy:
+        with cmux(proxy.listen_path) as c:
+            methods = ["surface.read_text", "surface.send_key", "surface.list", "surface.read_text",
+                       "surface.focus", "browser.snapshot", "workspace.list", "surface.send_text"]
+            results = c._call_many([(m, {"tag": "x", "seq": i}) for i, m in enumerate(methods)])
+            if [(r["method"], r["echo"]["seq"]) for r in results] != list(zip(methods, range(len(methods)))):
+                failures.append(f"responses reordered: {results}")
+            raw = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            raw.connect(proxy.listen_path)
+            with raw, raw.makefile("rwb") as f:
+                f.write(b'{"id":"a","method":"surface.read_text","params":{}}\n'
+                        b'{"id":"b","method":"relay.stats","params":{}}\n'
+                        b'{"id":"c","method":"surface.focus","params":{}}\n')
+                f.flush()
+                ids = [json.loads(f.readline()).get("id") for _ in range(3)]
+            if ids != ["a", "b", "c"]:
+                failures.append(f"local replies should wait for queued requests: {ids}")
+    if server.executed.get("x") != list(range(len(methods))):
+        failures.append(f"execution order: {server.executed.get('x')}")
+    server.close()
+    return failures
+
+
+def main() -> int:
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="cmux-qos-") as tmp:
+        for check in (check_keystrokes_under_flood, check_rate_limit, check_fair_turns, check_bulk_slots_shared,
+                      check_client_order):
+            print(f"RUN  {check.__name__}")
+            failures.extend(check(tmp))
+
+    if failures:
+        print("QoS test failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("QoS test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
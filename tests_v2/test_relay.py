@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Tests for tests_v2/cmux_relay.py against a stand-in v2 socket server.
+
+Checks that:
+- hundreds of concurrent clients share a handful of upstream connections and
+  every response reaches the client that asked, under the client's own id
+- a client's requests run in the order it sent them, and pipelined
+  responses come back in that order, even behind slow requests
+- password auth happens once per upstream; clients log in to the relay
+- an upstream that drops fails its in-flight requests and is reconnected
+- relay.stats reports clients, requests and upstream use
+
+Does not need a running cmux instance.
+
+Usage:
+    python3 tests_v2/test_relay.py
+"""
+
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from cmux import cmux, cmuxError  # noqa: E402
+from cmux_relay import Relay  # noqa: E402
+
+
+class StandIn:
+    """Serves each connection serially, like the app; optionally requires auth.login first."""
+
+    def __init__(self, path: str, password: str = ""):
+        self.path = path
+        self.password = password
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.logins = 0
+        self.executed: Dict[str, List[int]] = {}  # client tag -> seq numbers in execution order
+        self._srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._srv.bind(path)
+        self._srv.listen(64)
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                conn, _ = self._srv.accept()
+            except OSError:
+                return
+            with self.lock:
+                self.connections += 1
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: socket.socket) -> None:
+        authed = not self.password
+        with conn, conn.makefile("rwb") as f:
+            for line in f:
+                req = json.loads(line)
+                method, params = req["method"], req.get("params") or {}
+                if method == "auth.login":
+                    authed = params.get("password") == self.password
+                    with self.lock:
+                        self.logins += 1
+                    resp = {"id": req["id"], "ok": authed, "result": {"authenticated": authed}}
+                elif not authed:
+                    resp = {"id": req["id"], "ok": False, "error": {"code": "auth_required", "message": "Authentication required"}}
+                elif method == "test.drop":
+                    return
+                else:
+                    if method == "test.slow":
+                        time.sleep(params.get("s", 0.05))
+                    if "tag" in params:
+                        with self.lock:
+                            self.executed.setdefault(params["tag"], []).append(params["seq"])
+                    resp = {"id": req["id"], "ok": True, "result": {"echo": params}}
+                f.write((json.dumps(resp) + "\n").encode())
+                f.flush()
+
+    def close(self) -> None:
+        self._srv.close()
+
+
+def check_many_clients(tmp: str) -> List[str]:
+    failures: List[str] = []
+    server = StandIn(os.path.join(tmp, "app.sock"))
+    errors: List[str] = []
+    n_clients, n_calls = 200, 10
+    with Relay(server.path, os.path.join(tmp, "relay.sock"), upstreams=3) as relay:
+        start = threading.Barrier(n_clients)
+
+        def agent(i: int) -> None:
+            tag = f"agent-{i}"
+            try:
+                with cmux(relay.listen_path) as c:
+                    start.wait(10)
+                    for seq in range(n_calls - 4):
+                        res = c._call("test.echo", {"tag": tag, "seq": seq})
+                        if res != {"echo": {"tag": tag, "seq": seq}}:
+                            errors.append(f"{tag} got {res}")
+                    calls = [("test.slow" if seq % 2 else "test.echo", {"tag": tag, "seq": seq, "s": 0.002})
+                             for seq in range(n_calls - 4, n_calls)]
+                    results = c._call_many(calls)
+                    if [r["echo"]["seq"] for r in results] != list(range(n_calls - 4, n_calls)):
+                        errors.append(f"{tag} pipelined results out of order: {results}")
+            except (cmuxError, OSError, threading.BrokenBarrierError) as e:
+                errors.append(f"{tag}: {e}")
+
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=agent, args=(i,)) for i in range(n_clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(30)
+        elapsed = time.perf_counter() - t0
+        with cmux(relay.listen_path) as c:
+            stats = c._call("relay.stats")
+    server.close()
+
+    total = n_clients * n_calls
+    print(f"  {n_clients} clients x {n_calls} calls in {elapsed * 1000:.0f}ms over {server.connections} upstream "
+          f"connections (p95 {stats['latency_p95_ms']:.1f}ms)")
+    failures.extend(errors[:5])
+    if server.connections != 3:
+        failures.append(f"expected 3 upstream connections, app saw {server.connections}")
+    if stats["requests"] != total or stats["clients_total"] != n_clients + 1:
+        failures.append(f"stats: {stats}")
+    if sum(u["requests"] for u in stats["upstreams"]) != total or min(u["requests"] for u in stats["upstreams"]) == 0:
+        failures.append(f"requests should spread over the upstreams: {stats['upstreams']}")
+    for tag, seqs in server.executed.items():
+        if seqs != list(range(n_calls)):
+            failures.append(f"{tag} executed out of order: {seqs}")
+            break
+    return failures
+
+
+def check_order_behind_slow_request(tmp: str) -> List[str]:
+    failures: List[str] = []
+    server = StandIn(os.path.join(tmp, "order.sock"))
+    with Relay(server.path, os.path.join(tmp, "order-relay.sock"), upstreams=4) as relay:
+        with cmux(relay.listen_path) as c:
+            calls = [("test.slow", {"tag": "x", "seq": 0, "s": 0.2})] + [("test.echo", {"tag": "x", "seq": i}) for i in range(1, 6)]
+            results = c._call_many(calls)
+            if [r["echo"]["seq"] for r in results] != list(range(6)):
+                failures.append(f"responses reordered: {results}")
+            # Idle again: ids the client chooses come back unchanged.
+            raw = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            raw.connect(relay.listen_path)
+            with raw, raw.makefile("rwb") as f:
+                f.write(b'{"id":"abc","method":"test.echo","params":{}}\n{"id":7,"method":"test.echo","params":{}}\nping\n')
+                f.flush()
+                ids = [json.loads(f.readline()).get("id") for _ in range(2)]
+                v1 = f.readline()
+            if ids != ["abc", 7]:
+                failures.append(f"client ids should be preserved: {ids}")
+            if not v1.startswith(b"ERROR:"):
+                failures.append(f"v1 command should be refused: {v1!r}")
+    if server.executed["x"] != list(range(6)):
+        failures.append(f"execution order: {server.executed['x']}")
+    server.close()
+    return failures
+
+
+def check_auth(tmp: str) -> List[str]:
+    failures: List[str] = []
+    server = StandIn(os.path.join(tmp, "auth.sock"), password="s3cret")
+    with Relay(server.path, os.path.join(tmp, "auth-relay.sock"), upstreams=2, password="s3cret") as relay:
+        with cmux(relay.listen_path) as c:
+            try:
+                c._call("test.echo")
+                failures.append("request before auth.login should be refused")
+            except cmuxError as e:
+                if "auth_required" not in str(e):
+                    failures.append(f"unexpected error: {e}")
+            try:
+                c._call("auth.login", {"password": "nope"})
+                failures.append("wrong password should fail")
+            except cmuxError:
+                pass
+            c._call("auth.login", {"password": "s3cret"})
+            for i in range(20):
+                c._call("test.echo", {"i": i})
+        with cmux(relay.listen_path) as c2:
+            c2._call("auth.login", {"password": "s3cret"})
+            c2._call_many([("test.slow", {"s": 0.05}), ("test.echo", {})])
+        if oct(os.stat(relay.listen_path).st_mode & 0o777) != "0o600":
+            failures.append("relay socket should be owner-only")
+    if server.logins != server.connections or server.connections > 2:
+        failures.append(f"upstream logins {server.logins} for {server.connections} connections")
+    server.close()
+    return failures
+
+
+def check_upstream_drop(tmp: str) -> List[str]:
+    failures: List[str] = []
+    server = StandIn(os.path.join(tmp, "drop.sock"))
+    with Relay(server.path, os.path.join(tmp, "drop-relay.sock"), upstreams=1) as relay:
+        with cmux(relay.listen_path) as c:
+            c._call("test.echo")
+            results = c._call_many([("test.drop", {}), ("test.echo", {})], return_exceptions=True)
+            # The echo fails if it was already on the dropped connection, else it runs on a new one.
+            failed = [r for r in results if isinstance(r, cmuxError)]
+            if not isinstance(results[0], cmuxError) or any("unavailable" not in str(r) for r in failed):
+                failures.append(f"in-flight requests on a dropped upstream should fail: {results}")
+            if c._call("test.echo", {"after": True}) != {"echo": {"after": True}}:
+                failures.append("relay should reconnect after an upstream drops")
+            stats = c._call("relay.stats")
+        if stats["upstream_connects"] != 2 or stats["upstream_errors"] != len(failed):
+            failures.append(f"stats after drop: {stats}")
+    server.close()
+    return failures
+
+
+def main() -> int:
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="cmux-relay-") as tmp:
+        for check in (check_many_clients, check_order_behind_slow_request, check_auth, check_upstream_drop):
+            print(f"RUN  {check.__name__}")
+            failures.extend(check(tmp))
+
+    if failures:
+        print("Relay test failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("Relay test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
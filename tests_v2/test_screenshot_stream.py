@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Tests for tests_v2/cmux_screenshot.py against a stand-in v2 socket server.
+
+Checks that:
+- an inline `png_base64` response is decoded into the file byte-for-byte,
+  whatever the field order, read sizes and JSON slash escaping
+- decoding it takes a small fraction of the memory `cmux._call` needs
+- when the app honours `out_path`, the response's path is used and nothing
+  is decoded; a response naming another path fails, even if an old capture
+  sits at the requested one
+- error responses raise, and the connection stays in sync afterwards
+- window screenshots are copied from the path debug.window.screenshot returns
+
+Does not need a running cmux instance.
+
+Usage:
+    python3 tests_v2/test_screenshot_stream.py
+"""
+
+import base64
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import tracemalloc
+from pathlib import Path
+from typing import List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from cmux import cmux, cmuxError  # noqa: E402
+from cmux_screenshot import browser_screenshot, open_mmap, window_screenshot  # noqa: E402
+
+SURFACE = "11111111-2222-3333-4444-555555555555"
+
+
+class StandIn:
+    """Serves browser.screenshot inline (like older apps) or via out_path, in odd-sized writes."""
+
+    def __init__(self, path: str, image: bytes, honour_out_path: bool = False, write_size: Optional[int] = None,
+                 window_file: Optional[str] = None, reply_path: Optional[str] = None):
+        self.path = path
+        self.image = image
+        self.honour_out_path = honour_out_path
+        # Claim the capture went here instead of out_path (and write nothing).
+        self.reply_path = reply_path
+        self.write_size = write_size
+        self.window_file = window_file
+        # JSONSerialization escapes '/' as '\/'; build the field once, outside any measurement.
+        self.b64 = base64.b64encode(image).replace(b"/", b"\\/")
+        self._srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._srv.bind(path)
+        self._srv.listen(4)
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                conn, _ = self._srv.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _send(self, conn: socket.socket, parts: List[bytes]) -> None:
+        rng = random.Random(7)
+        for part in parts:
+            view = memoryview(part)
+            while view:
+                n = self.write_size or rng.randint(1, 70000)
+                conn.sendall(view[:n])
+                view = view[n:]
+
+    def _serve(self, conn: socket.socket) -> None:
+        with conn, conn.makefile("rb") as f:
+            for line in f:
+                req = json.loads(line)
+                method, params = req["method"], req["params"]
+                rid = str(req["id"]).encode()
+                if method == "browser.screenshot" and params.get("surface_id") != SURFACE:
+                    err = {"code": "not_found", "message": "Surface not found"}
+                    self._send(conn, [json.dumps({"id": req["id"], "ok": False, "error": err}).encode() + b"\n"])
+                elif method == "browser.screenshot" and self.honour_out_path and params.get("out_path"):
+                    if self.reply_path is None:
+                        Path(params["out_path"]).write_bytes(self.image)
+                    out = self.reply_path or params["out_path"]
+                    result = {"surface_id": SURFACE, "path": out, "byte_count": len(self.image)}
+                    self._send(conn, [json.dumps({"id": req["id"], "ok": True, "result": result}).encode() + b"\n"])
+                elif method == "browser.screenshot":
+                    # Field in the middle of the object, with keys on both sides.
+                    self._send(conn, [
+                        b'{"ok":true,"result":{"surface_id":"' + SURFACE.encode() + b'","png_base64":"',
+                        self.b64,
+                        b'","surface_ref":"surface:1"},"id":' + rid + b"}\n",
+                    ])
+                elif method == "debug.window.screenshot":
+                    result = {"screenshot_id": "abc", "path": self.window_file}
+                    self._send(conn, [json.dumps({"id": req["id"], "ok": True, "result": result}).encode() + b"\n"])
+                else:
+                    self._send(conn, [json.dumps({"id": req["id"], "ok": True, "result": {"pong": True}}).encode() + b"\n"])
+
+    def close(self) -> None:
+        self._srv.close()
+
+
+def _image(size: int) -> bytes:
+    # Incompressible bytes with plenty of '/' in the base64.
+    return b"\x89PNG\r\n\x1a\n" + random.Random(size).randbytes(size - 8)
+
+
+def check_inline_stream(tmp: str) -> List[str]:
+    failures: List[str] = []
+    for write_size in (None, 1, 7, 3):
+        image = _image(50_003)
+        server = StandIn(os.path.join(tmp, f"inline-{write_size}.sock"), image, write_size=write_size)
+        try:
+            with cmux(server.path) as client:
+                out = browser_screenshot(client, SURFACE, Path(tmp) / f"inline-{write_size}.png")
+                if out.read_bytes() != image:
+                    failures.append(f"decoded image differs (write size {write_size})")
+                if client._call("system.ping") != {"pong": True}:
+                    failures.append("connection out of sync after a streamed response")
+                with open_mmap(out) as m:
+                    if m[:8] != image[:8] or len(m) != len(image):
+                        failures.append("mmap of the capture is wrong")
+        finally:
+            server.close()
+    return failures
+
+
+def check_memory(tmp: str) -> List[str]:
+    failures: List[str] = []
+    image = _image(8 << 20)
+    server = StandIn(os.path.join(tmp, "memory.sock"), image)
+    try:
+        with cmux(server.path) as client:
+            tracemalloc.start()
+            browser_screenshot(client, SURFACE, Path(tmp) / "memory.png")
+            _, streamed = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            tracemalloc.start()
+            res = client._call("browser.screenshot", {"surface_id": SURFACE})
+            Path(tmp, "inline.png").write_bytes(base64.b64decode(res["png_base64"]))
+            _, inline = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del res
+        print(f"  8 MiB capture: streamed peak {streamed / 1e6:.2f} MB, _call + b64decode peak {inline / 1e6:.1f} MB")
+        if Path(tmp, "memory.png").read_bytes() != image:
+            failures.append("large streamed capture differs")
+        if streamed > len(image) / 8:
+            failures.append(f"streaming peaked at {streamed} bytes for a {len(image)} byte image")
+    finally:
+        server.close()
+    return failures
+
+
+def check_out_path(tmp: str) -> List[str]:
+    failures: List[str] = []
+    image = _image(20_000)
+    server = StandIn(os.path.join(tmp, "outpath.sock"), image, honour_out_path=True)
+    try:
+        with cmux(server.path) as client:
+            target = Path(tmp) / "nested" / "out.png"
+            out = browser_screenshot(client, SURFACE, target)
+            if out != target.resolve() or out.read_bytes() != image:
+                failures.append("out_path capture missing or wrong")
+            if list(target.parent.glob("*.part")):
+                failures.append("temporary file left behind")
+    finally:
+        server.close()
+
+    # An old capture at the requested path must not pass for a capture written elsewhere.
+    stale = Path(tmp) / "stale.png"
+    stale.write_bytes(b"old capture")
+    server = StandIn(os.path.join(tmp, "elsewhere.sock"), image, honour_out_path=True,
+                     reply_path=str(Path(tmp) / "elsewhere.png"))
+    try:
+        with cmux(server.path) as client:
+            try:
+                browser_screenshot(client, SURFACE, stale)
+                failures.append("a response naming another path should raise")
+            except cmuxError as e:
+                if "elsewhere.png" not in str(e):
+                    failures.append(f"unexpected error: {e}")
+            if stale.exists():
+                failures.append("the stale capture should have been removed before the call")
+    finally:
+        server.close()
+    return failures
+
+
+def check_errors(tmp: str) -> List[str]:
+    failures: List[str] = []
+    server = StandIn(os.path.join(tmp, "errors.sock"), _image(1000))
+    try:
+        with cmux(server.path) as client:
+            target = Path(tmp) / "error.png"
+            try:
+                browser_screenshot(client, "wrong-surface", target)
+                failures.append("error response should raise")
+            except cmuxError as e:
+                if "not_found" not in str(e):
+                    failures.append(f"unexpected error: {e}")
+            if target.exists() or Path(tmp, "error.png.part").exists():
+                failures.append("failed capture should leave no file")
+            if client._call("system.ping") != {"pong": True}:
+                failures.append("connection out of sync after an error")
+    finally:
+        server.close()
+    return failures
+
+
+def check_window(tmp: str) -> List[str]:
+    failures: List[str] = []
+    src = Path(tmp, "app-window.png")
+    src.write_bytes(_image(4000))
+    server = StandIn(os.path.join(tmp, "window.sock"), b"", window_file=str(src))
+    try:
+        with cmux(server.path) as client:
+            out = window_screenshot(client, Path(tmp) / "copies" / "window.png", label="monitor")
+        if out.read_bytes() != src.read_bytes():
+            failures.append("window screenshot copy differs")
+    finally:
+        server.close()
+    return failures
+
+
+def main() -> int:
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="cmux-shot-stream-") as tmp:
+        for check in (check_inline_stream, check_memory, check_out_path, check_errors, check_window):
+            print(f"RUN  {check.__name__}")
+            failures.extend(check(tmp))
+
+    if failures:
+        print("Screenshot stream test failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("Screenshot stream test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
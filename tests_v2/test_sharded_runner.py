@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Self-test for scripts/run_tests_sharded.py using stand-in socket servers.
+
+Checks that:
+- every shard gets its own instance, socket, CMUX_TAG and TMPDIR
+- tests are handed out longest-first from the recorded durations
+- a test that fails once is retried after an instance relaunch and reported as flaky
+- results from all shards land in one report, and every attempt is recorded
+  in the test history database
+- sharding actually overlaps work (wall time < summed test time)
+
+Does not need a running cmux instance.
+
+Usage:
+    python3 tests_v2/test_sharded_runner.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import List
+
+ROOT = Path(__file__).resolve().parents[1]
+RUNNER = ROOT / "scripts" / "run_tests_sharded.py"
+sys.path.insert(0, str(ROOT / "scripts"))
+
+from cmux_test_history import TestHistory  # noqa: E402
+
+STAND_IN = r'''
+import os, socket, sys, threading
+path = sys.argv[1]
+srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+srv.bind(path)
+srv.listen(16)
+def serve(conn):
+    with conn:
+        buf = b""
+        while True:
+            chunk = conn.recv(4096)
+            if not chunk:
+                return
+            buf += chunk
+            *lines, buf = buf.split(b"\n")
+            conn.sendall(b"PONG\n" * len(lines))
+while True:
+    conn, _ = srv.accept()
+    threading.Thread(target=serve, args=(conn,), daemon=True).start()
+'''
+
+FAKE_TEST = r'''
+import json, os, socket, sys, time
+name = os.path.basename(__file__)
+s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+s.connect(os.environ["CMUX_SOCKET_PATH"])
+s.sendall(b"ping\n")
+assert s.recv(16) == b"PONG\n"
+s.close()
+out = os.environ["SHARD_TEST_OUT"]
+flaky_marker = os.path.join(out, name + ".failed-once")
+with open(os.path.join(out, name + ".json"), "w") as f:
+    json.dump({k: os.environ[k] for k in ("CMUX_TAG", "CMUX_SOCKET_PATH", "CMUX_SOCKET", "TMPDIR")}, f)
+time.sleep(float(sys.argv[1]) if len(sys.argv) > 1 else %(sleep)s)
+if name == "test_flaky.py" and not os.path.exists(flaky_marker):
+    open(flaky_marker, "w").close()
+    sys.exit(1)
+'''
+
+DURATIONS = {
+    "test_long.py": 0.9,
+    "test_flaky.py": 0.3,
+    "test_a.py": 0.3,
+    "test_b.py": 0.3,
+    "test_c.py": 0.3,
+}
+
+
+def main() -> int:
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="cmux-shard-test-") as tmp:
+        suite = Path(tmp, "suite")
+        out = Path(tmp, "out")
+        suite.mkdir()
+        out.mkdir()
+        Path(tmp, "stand_in.py").write_text(STAND_IN)
+        for name, sleep in DURATIONS.items():
+            (suite / name).write_text(FAKE_TEST % {"sleep": sleep})
+
+        db_path = str(Path(tmp, "history.sqlite3"))
+        history = TestHistory(db_path)
+        seed_run = history.start_run(build="seed")
+        for name, secs in DURATIONS.items():
+            history.record(seed_run, os.path.relpath(suite / name, ROOT), 1, secs, "pass")
+        history.close()
+        report_dir = Path(tmp, "report")
+
+        env = dict(os.environ)
+        env["SHARD_TEST_OUT"] = str(out)
+        proc = subprocess.run(
+            [
+                sys.executable, str(RUNNER),
+                "--shards", "2",
+                "--tag-prefix", f"selftest-{os.getpid()}",
+                "--instance-cmd", f"{sys.executable} {Path(tmp, 'stand_in.py')} {{socket}}",
+                "--history", db_path,
+                "--state-dir", str(Path(tmp, "state")),
+                "--report-dir", str(report_dir),
+                "--attempts", "2",
+                "--suite", str(suite),
+            ],
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+        if proc.returncode != 0:
+            print(proc.stdout[-2000:])
+            print(proc.stderr[-2000:])
+            print("FAIL: runner exited non-zero")
+            return 1
+
+        report = json.loads((report_dir / "report.json").read_text())
+        if report["passed"] != len(DURATIONS) or report["failed"]:
+            failures.append(f"expected all {len(DURATIONS)} to pass: {report}")
+        if report["flaky"] != 1:
+            failures.append(f"expected exactly one flaky test, got {report['flaky']}")
+        if len(report["shards"]) != 2:
+            failures.append(f"expected 2 busy shards, got {report['shards']}")
+        if not report["wall_seconds"] < report["serial_seconds"]:
+            failures.append(f"no overlap: wall {report['wall_seconds']}s vs serial {report['serial_seconds']}s")
+
+        first_run = next(line for line in proc.stdout.splitlines() if line.startswith("RUN"))
+        if "test_long.py" not in first_run:
+            failures.append(f"longest test should be scheduled first, got: {first_run}")
+
+        seen = {}
+        for name in DURATIONS:
+            env_seen = json.loads((out / f"{name}.json").read_text())
+            tag = env_seen["CMUX_TAG"]
+            if env_seen["CMUX_SOCKET_PATH"] != f"/tmp/cmux-debug-{tag}.sock" or env_seen["CMUX_SOCKET"] != env_seen["CMUX_SOCKET_PATH"]:
+                failures.append(f"{name}: socket does not match tag: {env_seen}")
+            seen.setdefault(tag, set()).add(env_seen["TMPDIR"])
+        if len(seen) != 2 or any(len(dirs) != 1 for dirs in seen.values()):
+            failures.append(f"expected one TMPDIR per shard, got {seen}")
+
+        history = TestHistory(db_path)
+        flaky_id = os.path.relpath(suite / "test_flaky.py", ROOT)
+        rate, runs = history.flake_rate(flaky_id)
+        if runs != 2 or rate != 0.5:
+            failures.append(f"expected the retried run in history (2 runs, 50% flaky), got {runs} runs, {rate:.0%}")
+        if [t for t, _, _ in history.flakiest()] != [flaky_id]:
+            failures.append(f"flakiest() should list only {flaky_id}: {history.flakiest()}")
+        history.close()
+
+        print(f"  wall {report['wall_seconds']:.2f}s vs serial {report['serial_seconds']:.2f}s, shards {report['shards']}")
+
+    if failures:
+        print("Sharded runner test failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("Sharded runner test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Tests for tests_v2/cmux_state_reset.py against a stand-in v2 socket server.
+
+Checks that:
+- extra windows and workspaces left by a test are closed, and the kept window
+  ends up with one fresh, selected workspace
+- notifications, the focus override and the debug counters are reset
+- the CLI exits 0 on a clean reset and 1 when the app is unhealthy (no
+  in-window surface), which is what makes run-tests-v2.sh relaunch
+
+Does not need a running cmux instance.
+
+Usage:
+    python3 tests_v2/test_state_reset.py
+"""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import uuid
+from typing import Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from cmux import cmux  # noqa: E402
+from cmux_state_reset import StateResetError, reset_app_state, topology_problems  # noqa: E402
+
+
+class FakeApp:
+    """Just enough of the v2 API to model windows/workspaces/surfaces."""
+
+    def __init__(self, healthy: bool = True):
+        self.healthy = healthy
+        self.calls: List[str] = []
+        self.windows: Dict[str, List[str]] = {}
+        self.selected: Dict[str, str] = {}
+        self.key_window = ""
+        self.notifications = [{"id": str(uuid.uuid4())}]
+        self.focus_override = "active"
+        self.counters = {"empty_panel": 3, "bonsplit_underflow": 2, "flash": 5}
+        self.panes_per_workspace: Dict[str, int] = {}
+
+    def add_window(self, workspaces: int) -> str:
+        wid = str(uuid.uuid4())
+        self.windows[wid] = []
+        for _ in range(workspaces):
+            self._add_workspace(wid, panes=2)
+        self.key_window = self.key_window or wid
+        return wid
+
+    def _add_workspace(self, wid: str, panes: int = 1) -> str:
+        ws = str(uuid.uuid4())
+        self.windows[wid].append(ws)
+        self.selected[wid] = ws
+        self.panes_per_workspace[ws] = panes
+        return ws
+
+    def _current(self) -> str:
+        return self.selected[self.key_window]
+
+    def handle(self, method: str, params: dict) -> dict:
+        self.calls.append(method)
+        if method == "system.ping":
+            return {"pong": True}
+        if method == "window.list":
+            return {"windows": [
+                {"id": wid, "index": i, "key": wid == self.key_window, "workspace_count": len(ws)}
+                for i, (wid, ws) in enumerate(self.windows.items())
+            ]}
+        if method == "window.focus":
+            self.key_window = params["window_id"]
+            return {}
+        if method == "window.close":
+            self.windows.pop(params["window_id"])
+            return {}
+        if method == "workspace.list":
+            wid = params.get("window_id", self.key_window)
+            return {"workspaces": [
+                {"id": ws, "index": i, "title": "", "selected": ws == self.selected[wid]}
+                for i, ws in enumerate(self.windows[wid])
+            ]}
+        if method == "workspace.create":
+            return {"workspace_id": self._add_workspace(params.get("window_id", self.key_window))}
+        if method == "workspace.current":
+            return {"workspace_id": self._current()}
+        if method == "workspace.select":
+            self.selected[self.key_window] = params["workspace_id"]
+            return {}
+        if method == "workspace.close":
+            self.windows[self.key_window].remove(params["workspace_id"])
+            return {}
+        if method == "pane.list":
+            count = self.panes_per_workspace[self._current()]
+            return {"panes": [{"id": str(uuid.uuid4()), "index": i} for i in range(count)]}
+        if method == "surface.list":
+            count = self.panes_per_workspace[self._current()]
+            return {"surfaces": [{"id": str(uuid.uuid4()), "index": i} for i in range(count)]}
+        if method == "surface.focus":
+            return {}
+        if method == "surface.health":
+            return {"surfaces": [{"in_window": self.healthy}]}
+        if method == "notification.list":
+            return {"notifications": self.notifications}
+        if method == "notification.clear":
+            self.notifications = []
+            return {}
+        if method == "app.focus_override.set":
+            self.focus_override = params["state"]
+            return {}
+        if method == "debug.app.activate":
+            return {}
+        if method.startswith("debug.") and method.endswith(".reset"):
+            self.counters[method.split(".")[1]] = 0
+            return {}
+        if method.startswith("debug.") and method.endswith(".count"):
+            return {"count": self.counters[method.split(".")[1]]}
+        raise KeyError(method)
+
+
+class StandIn:
+    def __init__(self, app: FakeApp, path: str):
+        self.app = app
+        self.path = path
+        self._srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._srv.bind(path)
+        self._srv.listen(4)
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                conn, _ = self._srv.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: socket.socket) -> None:
+        with conn, conn.makefile("rwb") as f:
+            for line in f:
+                req = json.loads(line)
+                try:
+                    resp = {"id": req["id"], "ok": True, "result": self.app.handle(req["method"], req["params"])}
+                except KeyError as e:
+                    resp = {"id": req["id"], "ok": False, "error": {"code": "method_not_found", "message": str(e)}}
+                f.write((json.dumps(resp) + "\n").encode())
+                f.flush()
+
+    def close(self) -> None:
+        self._srv.close()
+
+
+def _dirty_app() -> FakeApp:
+    app = FakeApp()
+    app.add_window(workspaces=3)
+    app.add_window(workspaces=1)
+    return app
+
+
+def check_reset(tmp: str) -> List[str]:
+    failures: List[str] = []
+    app = _dirty_app()
+    kept = app.key_window
+    old_workspaces = list(app.windows[kept])
+    server = StandIn(app, os.path.join(tmp, "reset.sock"))
+    try:
+        with cmux(server.path) as client:
+            if not topology_problems(client):
+                failures.append("dirty state should report problems")
+            reset_app_state(client, timeout_s=2.0)
+            remaining = topology_problems(client)
+        if remaining:
+            failures.append(f"state not clean after reset: {remaining}")
+        if list(app.windows) != [kept]:
+            failures.append(f"expected only the key window to survive, got {list(app.windows)}")
+        if len(app.windows[kept]) != 1 or app.windows[kept][0] in old_workspaces:
+            failures.append(f"expected one fresh workspace, got {app.windows[kept]}")
+        if app.notifications or app.focus_override != "clear":
+            failures.append("notifications / focus override not reset")
+        if any(app.counters.values()):
+            failures.append(f"debug counters not reset: {app.counters}")
+        if "debug.app.activate" not in app.calls:
+            failures.append("reset should activate the app")
+        print(f"  reset took {len(app.calls)} socket calls")
+    finally:
+        server.close()
+    return failures
+
+
+def check_unhealthy(tmp: str) -> List[str]:
+    failures: List[str] = []
+    app = _dirty_app()
+    app.healthy = False
+    server = StandIn(app, os.path.join(tmp, "sick.sock"))
+    try:
+        with cmux(server.path) as client:
+            try:
+                reset_app_state(client, timeout_s=0.3)
+                failures.append("reset should fail without an in-window surface")
+            except StateResetError as e:
+                if "in-window" not in str(e):
+                    failures.append(f"error should name the health problem: {e}")
+    finally:
+        server.close()
+    return failures
+
+
+def check_cli(tmp: str) -> List[str]:
+    failures: List[str] = []
+    for healthy, expected in ((True, 0), (False, 1)):
+        app = _dirty_app()
+        app.healthy = healthy
+        server = StandIn(app, os.path.join(tmp, f"cli-{int(healthy)}.sock"))
+        try:
+            proc = subprocess.run(
+                [sys.executable, os.path.join(HERE, "cmux_state_reset.py")],
+                env={**os.environ, "CMUX_SOCKET_PATH": server.path},
+                capture_output=True, text=True, timeout=30,
+            )
+        finally:
+            server.close()
+        if proc.returncode != expected:
+            failures.append(f"CLI (healthy={healthy}) exited {proc.returncode}, expected {expected}: {proc.stderr[-300:]}")
+    return failures
+
+
+def main() -> int:
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="cmux-reset-") as tmp:
+        for check in (check_reset, check_unhealthy, check_cli):
+            print(f"RUN  {check.__name__}")
+            failures.extend(check(tmp))
+
+    if failures:
+        print("State reset test failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("State reset test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -24,11 +24,13 @@ import sys
 import time
 import tempfile
 from pathlib import Path
+from typing import Optional
 
 # Add the directory containing cmux.py to the path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from cmux import cmux, cmuxError
+from cmux_workspace_pool import WorkspacePool
 
 
 class TestResult:
@@ -46,13 +48,23 @@ class TestResult:
         self.message = msg
 
 
-def ensure_focused_terminal(client: cmux) -> None:
+def ensure_focused_terminal(client: cmux, pool: Optional[WorkspacePool] = None) -> None:
     """
     Make sure the currently selected workspace has a focused terminal surface.
 
     Developer sessions (and some prior tests) may leave the browser focused,
     causing send/send_key to fail with "No focused terminal".
+
+    With a pool, the workspace comes pre-warmed (shell already running) and
+    the previous test's workspace is closed.
     """
+    if pool is not None:
+        try:
+            pool.fresh()
+            return
+        except cmuxError as e:
+            print(f"  (workspace pool unavailable, creating directly: {e})")
+
     # Start from a clean workspace so indices are predictable.
     try:
         ws_id = client.new_workspace()
@@ -1085,6 +1097,7 @@ def run_tests():
         return 1
 
     results = []
+    pool: Optional[WorkspacePool] = None
 
     try:
         with cmux() as client:
@@ -1098,7 +1111,15 @@ def run_tests():
             if not results[-1].passed:
                 return 1
 
-            ensure_focused_terminal(client)
+            # Spare workspaces warm up their shells while earlier tests run.
+            pool = WorkspacePool(size=2)
+            try:
+                pool.start()
+            except cmuxError as e:
+                print(f"Workspace pool unavailable, tests will create workspaces directly: {e}")
+                pool = None
+
+            ensure_focused_terminal(client, pool)
 
             # Test initial terminal
             print("Testing initial terminal responsiveness...")
@@ -1110,7 +1131,7 @@ def run_tests():
 
             # Test horizontal split
             print("Testing horizontal split (right)...")
-            ensure_focused_terminal(client)
+            ensure_focused_terminal(client, pool)
             results.append(test_split_right_responsive(client))
             status = "✅" if results[-1].passed else "❌"
             print(f"  {status} {results[-1].message}")
@@ -1119,7 +1140,7 @@ def run_tests():
 
             # Test vertical split
             print("Testing vertical split (down)...")
-            ensure_focused_terminal(client)
+            ensure_focused_terminal(client, pool)
             results.append(test_split_down_responsive(client))
             status = "✅" if results[-1].passed else "❌"
             print(f"  {status} {results[-1].message}")
@@ -1128,7 +1149,7 @@ def run_tests():
 
             # Test multiple splits
             print("Testing multiple splits (2x2 grid)...")
-            ensure_focused_terminal(client)
+            ensure_focused_terminal(client, pool)
             results.append(test_multiple_splits_responsive(client))
             status = "✅" if results[-1].passed else "❌"
             print(f"  {status} {results[-1].message}")
@@ -1137,7 +1158,7 @@ def run_tests():
 
             # Test focus switching
             print("Testing rapid focus switching...")
-            ensure_focused_terminal(client)
+            ensure_focused_terminal(client, pool)
             results.append(test_focus_switching(client))
             status = "✅" if results[-1].passed else "❌"
             print(f"  {status} {results[-1].message}")
@@ -1146,7 +1167,7 @@ def run_tests():
 
             # Test pane commands
             print("Testing pane commands...")
-            ensure_focused_terminal(client)
+            ensure_focused_terminal(client, pool)
             results.append(test_pane_commands(client))
             status = "✅" if results[-1].passed else "❌"
             print(f"  {status} {results[-1].message}")
@@ -1155,7 +1176,7 @@ def run_tests():
 
             # Test new surfaces
             print("Testing new surfaces...")
-            ensure_focused_terminal(client)
+            ensure_focused_terminal(client, pool)
             results.append(test_new_surfaces(client))
             status = "✅" if results[-1].passed else "❌"
             print(f"  {status} {results[-1].message}")
@@ -1164,7 +1185,7 @@ def run_tests():
 
             # Test split ratio 50/50
             print("Testing split ratio 50/50...")
-            ensure_focused_terminal(client)
+            ensure_focused_terminal(client, pool)
             results.append(test_split_ratio_50_50(client))
             status = "✅" if results[-1].passed else "❌"
             print(f"  {status} {results[-1].message}")
@@ -1173,7 +1194,7 @@ def run_tests():
 
             # Test closing horizontal split
             print("Testing close horizontal split...")
-            ensure_focused_terminal(client)
+            ensure_focused_terminal(client, pool)
             results.append(test_close_horizontal_split(client))
             status = "✅" if results[-1].passed else "❌"
             print(f"  {status} {results[-1].message}")
@@ -1182,7 +1203,7 @@ def run_tests():
 
             # Test closing vertical split
             print("Testing close vertical split...")
-            ensure_focused_terminal(client)
+            ensure_focused_terminal(client, pool)
             results.append(test_close_vertical_split(client))
             status = "✅" if results[-1].passed else "❌"
             print(f"  {status} {results[-1].message}")
@@ -1191,7 +1212,7 @@ def run_tests():
 
             # Test closing first pane of vertical split (the bug case)
             print("Testing close first pane vertical split (bug case)...")
-            ensure_focused_terminal(client)
+            ensure_focused_terminal(client, pool)
             results.append(test_close_first_pane_vertical_split(client))
             status = "✅" if results[-1].passed else "❌"
             print(f"  {status} {results[-1].message}")
@@ -1200,7 +1221,7 @@ def run_tests():
 
             # Test closing nested splits
             print("Testing close nested splits...")
-            ensure_focused_terminal(client)
+            ensure_focused_terminal(client, pool)
             results.append(test_close_nested_splits(client))
             status = "✅" if results[-1].passed else "❌"
             print(f"  {status} {results[-1].message}")
@@ -1209,7 +1230,7 @@ def run_tests():
 
             # Test rapid split/close vertical
             print("Testing rapid split/close vertical...")
-            ensure_focused_terminal(client)
+            ensure_focused_terminal(client, pool)
             results.append(test_rapid_split_close_vertical(client))
             status = "✅" if results[-1].passed else "❌"
             print(f"  {status} {results[-1].message}")
@@ -1218,7 +1239,7 @@ def run_tests():
 
             # Test rapid split/close first pane
             print("Testing rapid split/close first pane...")
-            ensure_focused_terminal(client)
+            ensure_focused_terminal(client, pool)
             results.append(test_rapid_split_close_first_pane(client))
             status = "✅" if results[-1].passed else "❌"
             print(f"  {status} {results[-1].message}")
@@ -1227,6 +1248,9 @@ def run_tests():
     except cmuxError as e:
         print(f"Error: {e}")
         return 1
+    finally:
+        if pool is not None:
+            pool.close()
 
     # Summary
     print("=" * 60)
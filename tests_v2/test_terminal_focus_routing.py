@@ -10,6 +10,8 @@ This test validates:
   1) The focused terminal is actually first responder (`is_terminal_focused`).
   2) Text insertion via debug socket (`simulate_type`) lands in the expected terminal by writing
      $CMUX_SURFACE_ID to a temp file.
+  3) Switching to another workspace and back hands first responder back to the terminal without an
+     explicit focus call, every time (the terminal view only re-requests focus when it lacks it).
 """
 
 import os
@@ -147,6 +149,17 @@ def main() -> int:
         _focus_and_wait(c, right_id, total_timeout_s=8.0)
         _assert_routed_to_surface(c, right_id, right_id)
 
+        # Tab switch: coming back must refocus the terminal on its own, including when it
+        # was already first responder the last time the view updated.
+        home_ws = c.current_workspace()
+        other_ws = c.new_workspace()
+        for _ in range(3):
+            c.select_workspace(other_ws)
+            time.sleep(0.2)
+            c.select_workspace(home_ws)
+            _wait_for_terminal_focus(c, right_id, timeout_s=4.0)
+        _assert_routed_to_surface(c, right_id, right_id)
+
         # Stress: repeated split/close should never leave focus on a detached/hidden terminal.
         for _ in range(10):
             new_id = c.new_split("right")
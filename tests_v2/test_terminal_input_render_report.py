@@ -2,8 +2,8 @@
 """
 Manual visual report: terminal caret blink + single-character typing visibility.
 
-This generates a self-contained HTML report (base64-embedded PNGs) so you can
-open it locally and visually confirm:
+This generates an HTML report (thumbnails linking to the full PNGs in
+terminal_input_report_assets/) so you can open it locally and visually confirm:
   1) The caret is blinking (or not).
   2) A single typed character appears immediately (before Enter / focus toggle).
 
@@ -15,7 +15,6 @@ Environment:
   CMUX_SOCKET or CMUX_SOCKET_PATH can override the socket path.
 """
 
-import base64
 import json
 import os
 import sys
@@ -27,6 +26,7 @@ from typing import Optional
 
 sys.path.insert(0, str(Path(__file__).parent))
 from cmux import cmux, cmuxError
+from cmux_report import HtmlReport, esc
 
 
 SOCKET_PATH = os.environ.get("CMUX_SOCKET") or os.environ.get("CMUX_SOCKET_PATH") or "/tmp/cmux-debug.sock"
@@ -39,9 +39,6 @@ class Shot:
     label: str
     changed_pixels: int
 
-    def to_base64(self) -> str:
-        return base64.b64encode(self.path.read_bytes()).decode("utf-8")
-
 
 def _wait_for(pred, timeout_s: float, step_s: float = 0.05) -> None:
     start = time.time()
@@ -108,91 +105,75 @@ def _panel_sequence_blink_and_type(c: cmux, panel_id: str, prefix: str, typed_ch
     return shots, meta
 
 
-def _write_report(cases: list[dict]) -> None:
-    generated = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
-
-    def esc(s: str) -> str:
-        return (
-            s.replace("&", "&amp;")
-            .replace("<", "&lt;")
-            .replace(">", "&gt;")
-            .replace('"', "&quot;")
-        )
-
-    html = f"""<!DOCTYPE html>
-<html>
-<head>
-  <meta charset="utf-8" />
-  <title>cmux terminal input render report</title>
-  <style>
-    :root {{
+REPORT_CSS = """
+    :root {
       --bg: #0b0f14;
       --panel: #111826;
       --border: rgba(255,255,255,0.08);
       --text: rgba(255,255,255,0.92);
       --muted: rgba(255,255,255,0.68);
       --mono: ui-monospace, SFMono-Regular, Menlo, Monaco, Consolas, "Liberation Mono", "Courier New", monospace;
-    }}
-    body {{
+    }
+    body {
       margin: 0;
       padding: 24px;
       background: var(--bg);
       color: var(--text);
       font: 14px/1.45 -apple-system, BlinkMacSystemFont, "Segoe UI", Helvetica, Arial, sans-serif;
-    }}
-    h1 {{
+    }
+    h1 {
       margin: 0 0 6px 0;
       font-size: 18px;
       letter-spacing: 0.2px;
-    }}
-    .meta {{
+    }
+    .meta {
       color: var(--muted);
       font-family: var(--mono);
       font-size: 12px;
       margin-bottom: 18px;
-    }}
-    .case {{
+    }
+    .case {
       border: 1px solid var(--border);
       background: rgba(255,255,255,0.03);
       border-radius: 12px;
       padding: 14px 14px 10px 14px;
       margin: 14px 0;
-    }}
-    .case h2 {{
+    }
+    .case h2 {
       font-size: 15px;
       margin: 0 0 6px 0;
-    }}
-    .desc {{
+    }
+    .desc {
       color: var(--muted);
       margin: 0 0 10px 0;
-    }}
-    .shots {{
+    }
+    .shots {
       display: grid;
       grid-template-columns: repeat(auto-fit, minmax(320px, 1fr));
       gap: 12px;
       align-items: start;
-    }}
-    figure {{
+    }
+    figure {
       margin: 0;
       padding: 10px;
       border: 1px solid var(--border);
       background: rgba(0,0,0,0.18);
       border-radius: 10px;
-    }}
-    figcaption {{
+    }
+    figcaption {
       margin: 0 0 8px 0;
       font-family: var(--mono);
       font-size: 12px;
       color: var(--muted);
-    }}
-    img {{
+    }
+    img {
       width: 100%;
       height: auto;
       border-radius: 8px;
       border: 1px solid rgba(255,255,255,0.06);
       background: #000;
-    }}
-    pre {{
+    }
+    pre {
       margin: 10px 0 0 0;
       padding: 10px;
       border: 1px solid var(--border);
@@ -203,40 +184,39 @@ def _write_report(cases: list[dict]) -> None:
       line-height: 1.35;
       font-family: var(--mono);
       color: rgba(255,255,255,0.85);
-    }}
-  </style>
-</head>
-<body>
-  <h1>cmux terminal input render report</h1>
-  <div class="meta">generated: {esc(generated)} | socket: {esc(SOCKET_PATH)}</div>
+    }
 """
 
-    for case in cases:
-        html += f"""
+
+def _write_report(cases: list[dict]) -> None:
+    generated = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
+
+    with HtmlReport(HTML_REPORT, "cmux terminal input render report", css=REPORT_CSS) as report:
+        report.write(f"""  <h1>cmux terminal input render report</h1>
+  <div class="meta">generated: {esc(generated)} | socket: {esc(SOCKET_PATH)}</div>
+""")
+
+        for case in cases:
+            html = f"""
   <div class="case">
     <h2>{esc(case["name"])}</h2>
     <div class="desc">{esc(case["description"])}</div>
     <div class="shots">
 """
-        for shot in case["shots"]:
-            label = f'{shot.label} | changed_pixels={shot.changed_pixels}'
-            html += f"""
+            for shot in case["shots"]:
+                label = f'{shot.label} | changed_pixels={shot.changed_pixels}'
+                html += f"""
       <figure>
         <figcaption>{esc(label)}</figcaption>
-        <img src="data:image/png;base64,{shot.to_base64()}" alt="{esc(shot.label)}" />
+        {report.image(shot.path, shot.label)}
       </figure>
 """
-        html += f"""
+            html += f"""
     </div>
     <pre>{esc(json.dumps(case.get("meta", {}), indent=2))}</pre>
   </div>
 """
-
-    html += """
-</body>
-</html>
-"""
-    HTML_REPORT.write_text(html)
+            report.write(html)
 
 
 def main() -> int:
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Tests for tests_v2/cmux_tmux_shim.py and cmux_tmux.py against a stand-in v2 socket server.
+
+Checks that:
+- tmux-style commands translate into the same v2 calls as the Swift CLI's
+  compat matrix, with both the CLI's long flags and tmux's short ones
+- `\\;`-chained commands go out as one pipelined write, in order, and the
+  chain stops at the first error
+- buffers, hooks and wait-for use local state, in chain order
+- unsupported commands fail with "not supported"
+- the client starts one daemon, which reuses a single upstream connection
+  for every command, and `kill-server` stops it
+- the daemon refuses clients that don't descend from the app, and exits
+  when the app refuses its reconnect, so the next call starts a fresh one
+
+Does not need a running cmux instance.
+
+Usage:
+    python3 tests_v2/test_tmux_shim.py
+"""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from cmux import cmux  # noqa: E402
+from cmux_tmux_shim import Shim  # noqa: E402
+
+WS = "11111111-1111-1111-1111-111111111111"
+SF = "22222222-2222-2222-2222-222222222222"
+
+
+class StandIn:
+    """Answers every v2 call; records calls, the batches they arrived in, and connections."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.calls: List[tuple] = []
+        self.reads: List[List[str]] = []  # methods per socket read
+        self.connections = 0
+        self.refuse = False  # answer new connections like the app does for a non-descendant
+        self._conns: List[socket.socket] = []
+        self._srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._srv.bind(path)
+        self._srv.listen(16)
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                conn, _ = self._srv.accept()
+            except OSError:
+                return
+            with self.lock:
+                self.connections += 1
+                self._conns.append(conn)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def handle(self, method: str, params: Dict[str, Any]) -> Any:
+        if method == "surface.read_text":
+            return {"text": f"screen of {params.get('surface_id', 'focused')}\nerror: boom", "surface_id": SF}
+        if method == "surface.send_key" and params["key"] not in ("enter", "ctrl+c", "tab"):
+            return {"code": "invalid_params", "message": "Unknown key"}
+        if method == "workspace.list":
+            return {"workspaces": [{"id": WS, "ref": "workspace:1", "index": 0, "title": "build logs"},
+                                   {"id": "w2", "ref": "workspace:2", "index": 1, "title": "agent"}]}
+        if method == "workspace.current":
+            return {"workspace_id": WS}
+        if method == "pane.list":
+            return {"panes": [{"id": "p0", "ref": "pane:1", "index": 0}, {"id": "p1", "ref": "pane:2", "index": 1}]}
+        return {"workspace_id": WS, "workspace_ref": "workspace:1", "pane_ref": "pane:1",
+                "surface_id": SF, "surface_ref": "surface:1"}
+
+    def _serve(self, conn: socket.socket) -> None:
+        buf = b""
+        with conn:
+            if self.refuse:
+                conn.sendall("ERROR: Access denied — only processes started inside cmux can connect\n".encode())
+                return
+            while True:
+                try:
+                    data = conn.recv(65536)
+                except OSError:
+                    return
+                if not data:
+                    return
+                buf += data
+                *lines, buf = buf.split(b"\n")
+                out = []
+                with self.lock:
+                    self.reads.append([json.loads(l)["method"] for l in lines])
+                for line in lines:
+                    req = json.loads(line)
+                    with self.lock:
+                        self.calls.append((req["method"], req["params"]))
+                    res = self.handle(req["method"], req["params"])
+                    if "code" in res:
+                        out.append({"id": req["id"], "ok": False, "error": res})
+                    else:
+                        out.append({"id": req["id"], "ok": True, "result": res})
+                conn.sendall(b"".join(json.dumps(r).encode() + b"\n" for r in out))
+
+    def take(self) -> List[tuple]:
+        with self.lock:
+            calls, self.calls, self.reads = self.calls, [], []
+        return calls
+
+    def drop(self) -> None:
+        """Cut every open connection, as an app relaunch would."""
+        with self.lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        self._srv.close()
+
+
+def _shim(server: StandIn, tmp: str) -> Shim:
+    client = cmux(server.path)
+    client.connect()
+    return Shim(client, store_path=os.path.join(tmp, "store.json"))
+
+
+def check_translation(tmp: str) -> List[str]:
+    failures: List[str] = []
+    server = StandIn(os.path.join(tmp, "translate.sock"))
+    shim = _shim(server, tmp)
+    env = {"CMUX_WORKSPACE_ID": WS, "CMUX_SURFACE_ID": SF}
+    cases = [
+        (["capture-pane", "--workspace", WS, "--surface", "surface:3", "--scrollback"],
+         [("surface.read_text", {"workspace_id": WS, "surface_id": "surface:3", "scrollback": True})]),
+        (["capture-pane", "-p", "-t", "surface:3", "-S", "-200"],
+         [("surface.read_text", {"workspace_id": WS, "surface_id": "surface:3", "scrollback": True, "lines": 200})]),
+        (["capture-pane"], [("surface.read_text", {"workspace_id": WS, "surface_id": SF})]),
+        (["send-keys", "-t", "surface:2", "echo hi", "Enter", "C-c"],
+         [("surface.send_text", {"workspace_id": WS, "surface_id": "surface:2", "text": "echo hi"}),
+          ("surface.send_key", {"workspace_id": WS, "surface_id": "surface:2", "key": "enter"}),
+          ("surface.send_key", {"workspace_id": WS, "surface_id": "surface:2", "key": "ctrl+c"})]),
+        (["send-keys", "-l", "-t", "surface:2", "Enter"],
+         [("surface.send_text", {"workspace_id": WS, "surface_id": "surface:2", "text": "Enter"})]),
+        (["resize-pane", "--pane", "pane:2", "-D", "--amount", "80"],
+         [("pane.resize", {"direction": "down", "amount": 80, "workspace_id": WS, "pane_id": "pane:2"})]),
+        (["resize-pane", "-t", "1", "-L", "5"],
+         [("pane.list", {"workspace_id": WS}),
+          ("pane.resize", {"direction": "left", "amount": 5, "workspace_id": WS, "pane_id": "pane:2"})]),
+        (["swap-pane", "--workspace", WS, "--pane", "pane:1", "--target-pane", "pane:2"],
+         [("pane.swap", {"workspace_id": WS, "pane_id": "pane:1", "target_pane_id": "pane:2"})]),
+        (["join-pane", "-d", "-s", "surface:4", "-t", "pane:2"],
+         [("pane.join", {"workspace_id": WS, "focus": False, "surface_id": "surface:4", "target_pane_id": "pane:2"})]),
+        (["rename-window", "--workspace", WS, "agent", "run"],
+         [("workspace.rename", {"workspace_id": WS, "title": "agent run"})]),
+        (["next-window"], [("workspace.next", {})]),
+        (["respawn-pane", "-t", "surface:2"],
+         [("surface.send_text", {"workspace_id": WS, "surface_id": "surface:2", "text": "exec ${SHELL:-/bin/zsh} -l\n"})]),
+    ]
+    try:
+        for argv, expected in cases:
+            code, out, err = shim.run(argv, env=env)
+            calls = server.take()
+            if code != 0 or calls != expected:
+                failures.append(f"{' '.join(argv)}: exit {code} {err.strip()} calls {calls}")
+        code, out, _ = shim.run(["capture-pane", "-p", "-t", "surface:3"], env=env)
+        if out != "screen of surface:3\nerror: boom\n":
+            failures.append(f"capture-pane output: {out!r}")
+        code, out, _ = shim.run(["last-pane"], env={})
+        if out != "OK pane:1\n":
+            failures.append(f"last-pane summary: {out!r}")
+        code, out, _ = shim.run(["--json", "--id-format", "both", "break-pane", "--surface", "surface:2"], env={})
+        if json.loads(out).get("workspace_id") != WS:
+            failures.append(f"break-pane --json: {out!r}")
+        code, out, _ = shim.run(["find-window", "--content", "BOOM"], env={})
+        if out.splitlines() != ['workspace:1  "build logs"', 'workspace:2  "agent"']:
+            failures.append(f"find-window --content: {out!r}")
+        if server.reads[-1] != ["surface.read_text", "surface.read_text"]:
+            failures.append(f"find-window should read every workspace in one round trip: {server.reads}")
+        for argv in (["popup"], ["bind-key", "C-b", "split-window"], ["unbind-key", "C-b"], ["copy-mode"]):
+            code, out, err = shim.run(argv, env={})
+            if code == 0 or "not supported" not in err:
+                failures.append(f"{argv}: expected not supported, got {code} {err!r}")
+        code, _, err = shim.run(["new-session"], env={})
+        if code == 0 or "Unsupported tmux compatibility command" not in err:
+            failures.append(f"unknown command: {err!r}")
+    finally:
+        shim.client.close()
+        server.close()
+    return failures
+
+
+def check_chain(tmp: str) -> List[str]:
+    failures: List[str] = []
+    server = StandIn(os.path.join(tmp, "chain.sock"))
+    shim = _shim(server, tmp)
+    try:
+        code, out, err = shim.run(["send-keys", "-t", "surface:2", "make", "Enter", "\\;",
+                                   "capture-pane", "-p", "-t", "surface:2", ";",
+                                   "display-message", "-p", "done"], env={})
+        if code != 0 or out != "screen of surface:2\nerror: boom\ndone\n":
+            failures.append(f"chain output: {code} {out!r} {err!r}")
+        if server.reads != [["surface.send_text", "surface.send_key", "surface.read_text"]]:
+            failures.append(f"chain should be one pipelined write: {server.reads}")
+        server.take()
+
+        code, out, err = shim.run(["send-keys", "-t", "surface:2", "F13\\;", "capture-pane", "-p"], env={})
+        calls = [m for m, _ in server.take()]
+        if calls != ["surface.send_text", "surface.read_text"] or out.count("screen of") != 1:
+            failures.append(f"trailing \\; should split: {calls} {out!r}")
+
+        # F99 is literal text; the stand-in rejects C-z, so capture-pane's output is dropped.
+        code, out, err = shim.run(["send-keys", "F99", "\\;", "send-keys", "C-z", "\\;", "capture-pane"], env={})
+        if code != 1 or "Unknown key" not in err or out:
+            failures.append(f"chain should stop at the failing command: {code} {out!r} {err!r}")
+
+        before = shim.round_trips
+        for _ in range(50):
+            shim.run(["send-keys", "-t", "surface:2", "x", "\\;", "capture-pane", "-t", "surface:2"], env={})
+        if shim.round_trips - before != 50 or server.connections != 1:
+            failures.append(f"50 chains took {shim.round_trips - before} round trips on {server.connections} connections")
+    finally:
+        shim.client.close()
+        server.close()
+    return failures
+
+
+def check_local_state(tmp: str) -> List[str]:
+    failures: List[str] = []
+    server = StandIn(os.path.join(tmp, "local.sock"))
+    shim = _shim(server, tmp)
+    name = f"shim_{os.getpid()}_{time.time_ns()}"
+    try:
+        code, out, err = shim.run(["set-buffer", "-b", "tmuxbuf", "echo hi\\n", "\\;",
+                                   "paste-buffer", "-b", "tmuxbuf", "-t", "surface:2", "\\;",
+                                   "list-buffers"], env={})
+        if code != 0 or out != "OK\nOK\ntmuxbuf\t9\n":
+            failures.append(f"buffers: {code} {out!r} {err!r}")
+        if server.take() != [("surface.send_text", {"surface_id": "surface:2", "text": "echo hi\\n"})]:
+            failures.append("paste-buffer should send the buffer set earlier in the chain")
+        code, _, err = shim.run(["paste-buffer", "-b", "missing"], env={})
+        if code != 1 or "Buffer not found: missing" not in err:
+            failures.append(f"missing buffer: {err!r}")
+
+        shim.run(["set-hook", "workspace-created", "echo", "created"], env={})
+        _, listed, _ = shim.run(["set-hook", "--list"], env={})
+        shim.run(["set-hook", "--unset", "workspace-created"], env={})
+        _, after, _ = shim.run(["set-hook", "--list"], env={})
+        store = json.load(open(os.path.join(tmp, "store.json")))
+        if listed != "workspace-created -> echo created\n" or after != "No hooks configured\n" or "tmuxbuf" not in store["buffers"]:
+            failures.append(f"hooks: {listed!r} {after!r} {store}")
+
+        code, _, err = shim.run(["wait-for", name, "--timeout", "0.1"], env={})
+        if code == 0 or "timed out" not in err:
+            failures.append(f"wait-for without a signal should time out: {err!r}")
+        waiter: Dict[str, Any] = {}
+        t = threading.Thread(target=lambda: waiter.update(r=shim.run(["wait-for", name, "--timeout", "5"], env={})))
+        t.start()
+        time.sleep(0.1)
+        shim.run(["wait-for", "-S", name], env={})
+        t.join(5)
+        if waiter.get("r", (1,))[0] != 0:
+            failures.append(f"wait-for should wake on signal: {waiter}")
+
+        piped = os.path.join(tmp, "piped.txt")
+        code, out, err = shim.run(["pipe-pane", "-t", "surface:2", "--command", f"cat > {piped}"], env=dict(os.environ), cwd=tmp)
+        if code != 0 or "error: boom" not in open(piped).read():
+            failures.append(f"pipe-pane: {code} {err!r}")
+    finally:
+        shim.client.close()
+        server.close()
+    return failures
+
+
+def check_daemon(tmp: str) -> List[str]:
+    failures: List[str] = []
+    server = StandIn(os.path.join(tmp, "daemon.sock"))
+    env = dict(os.environ, TMPDIR=tmp, CMUX_SOCKET_PATH=server.path)
+    env.pop("CMUX_WORKSPACE_ID", None)
+    env.pop("CMUX_SURFACE_ID", None)
+    client = [sys.executable, os.path.join(HERE, "cmux_tmux.py")]
+
+    def tmux(*args: str) -> subprocess.CompletedProcess:
+        return subprocess.run(client + list(args), capture_output=True, text=True, env=env, timeout=20)
+
+    try:
+        first = tmux("capture-pane", "-p", "-t", "surface:1")
+        if first.returncode != 0 or "screen of surface:1" not in first.stdout:
+            failures.append(f"first call (starts the daemon): {first.returncode} {first.stdout!r} {first.stderr!r}")
+        n = 20
+        t0 = time.perf_counter()
+        for i in range(n):
+            proc = tmux("send-keys", "-t", "surface:1", f"echo {i}", "Enter", "\\;", "capture-pane", "-p", "-t", "surface:1")
+            if proc.returncode != 0:
+                failures.append(f"daemon call failed: {proc.stderr!r}")
+                break
+        per_call = (time.perf_counter() - t0) / n
+        print(f"  {n} chained commands via the daemon: {per_call * 1000:.1f}ms each, "
+              f"{server.connections} upstream connection(s)")
+        if server.connections != 1:
+            failures.append(f"daemon should reuse one upstream connection, saw {server.connections}")
+        proc = tmux("popup")
+        if proc.returncode == 0 or "not supported" not in proc.stderr:
+            failures.append(f"daemon not-supported path: {proc.returncode} {proc.stderr!r}")
+        if not any(name.startswith(f"cmux-tmux-{os.getuid()}-") for name in os.listdir(tmp)):
+            failures.append("daemon socket should live under TMPDIR")
+
+        # A client reparented away from the app (here: from this process) is refused by the daemon.
+        out = os.path.join(tmp, "outsider")
+        script = (f'( sleep 0.3; "$0" "$@" > "{out}.out" 2> "{out}.err"; echo $? > "{out}.rc" ) &')
+        server.take()
+        subprocess.run(["sh", "-c", script] + client + ["capture-pane", "-p", "-t", "surface:1"], env=env, timeout=20)
+        deadline = time.time() + 10
+        while not (os.path.exists(f"{out}.rc") and open(f"{out}.rc").read().strip()) and time.time() < deadline:
+            time.sleep(0.05)
+        rc = open(f"{out}.rc").read().strip() if os.path.exists(f"{out}.rc") else "?"
+        err = open(f"{out}.err").read() if os.path.exists(f"{out}.err") else ""
+        if rc != "1" or "Access denied" not in err:
+            failures.append(f"outside client should be refused by the daemon: rc={rc} {err!r}")
+        if server.take():
+            failures.append("a refused client must not reach the app")
+
+        # After an upstream drop, the app refuses the orphaned daemon's reconnect: it exits, and the
+        # next call (from a cmux descendant) starts a new daemon.
+        server.refuse = True
+        server.drop()
+        tmux("capture-pane", "-p", "-t", "surface:1")  # finds the connection gone
+        refused = tmux("capture-pane", "-p", "-t", "surface:1")
+        if refused.returncode == 0 or "Access denied" not in refused.stderr:
+            failures.append(f"app refusal should reach the caller: {refused.returncode} {refused.stderr!r}")
+        deadline = time.time() + 3
+        while any(n.startswith("cmux-tmux-") for n in os.listdir(tmp)) and time.time() < deadline:
+            time.sleep(0.05)
+        if any(n.startswith("cmux-tmux-") for n in os.listdir(tmp)):
+            failures.append("a refused daemon should exit and remove its socket")
+        server.refuse = False
+        again = tmux("capture-pane", "-p", "-t", "surface:1")
+        if again.returncode != 0 or "screen of surface:1" not in again.stdout:
+            failures.append(f"next call should start a fresh daemon: {again.returncode} {again.stderr!r}")
+        tmux("kill-server")
+        deadline = time.time() + 3
+        while any(n.startswith("cmux-tmux-") for n in os.listdir(tmp)) and time.time() < deadline:
+            time.sleep(0.05)
+        if any(n.startswith("cmux-tmux-") for n in os.listdir(tmp)):
+            failures.append("kill-server should remove the daemon socket")
+    finally:
+        subprocess.run(client + ["kill-server"], capture_output=True, env=env, timeout=20)
+        server.close()
+    return failures
+
+
+def main() -> int:
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="cmux-tmux-shim-") as tmp:
+        for check in (check_translation, check_chain, check_local_state, check_daemon):
+            print(f"RUN  {check.__name__}")
+            failures.extend(check(tmp))
+
+    if failures:
+        print("tmux shim test failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("tmux shim test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,13 +15,17 @@ Comprehensive edge-case testing with before/after screenshots for:
 
 Usage:
     python3 tests/test_visual_screenshots.py
-    # Then open tests/visual_report.html in a browser
+    # Then open tests/visual_report.html in a browser (images live in visual_report_assets/)
+
+Golden images (tests_v2/cmux_golden.py): when the store has baselines, each
+before/after screenshot is compared against its scenario's golden with SSIM
+and a regression fails the scenario (with a heatmap in the report). Approve
+the current captures with CMUX_GOLDEN_UPDATE=1.
 """
 
 import os
 import sys
 import time
-import base64
 import json
 import tempfile
 from pathlib import Path
@@ -30,7 +34,10 @@ from dataclasses import dataclass
 from typing import Optional, List
 
 sys.path.insert(0, str(Path(__file__).parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
 from cmux import cmux
+from cmux_test_history import TestHistory
+from cmux_report import HtmlReport, esc
 
 SOCKET_PATH = os.environ.get("CMUX_SOCKET", "/tmp/cmux-debug.sock")
 HTML_REPORT = Path(__file__).parent / "visual_report.html"
@@ -48,10 +55,6 @@ class Screenshot:
     label: str
     timestamp: str
 
-    def to_base64(self) -> str:
-        with open(self.path, "rb") as f:
-            return base64.b64encode(f.read()).decode("utf-8")
-
 
 @dataclass
 class StateChange:
@@ -66,6 +69,7 @@ class StateChange:
     error: str = ""
     before_state: str = ""
     after_state: str = ""
+    heatmaps: Optional[List[Path]] = None
 
 
 # ---------------------------------------------------------------------------
@@ -1115,12 +1119,7 @@ def test_i28_browser_drag_split_right_double_drag(client: cmux) -> StateChange:
 # ---------------------------------------------------------------------------
 
 
-def generate_html_report(changes: list[StateChange]) -> None:
-    html = '''<!DOCTYPE html>
-<html>
-<head>
-    <title>cmux Visual Test Report</title>
-    <style>
+REPORT_CSS = '''
         body {
             font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, sans-serif;
             background: #1a1a2e;
@@ -1175,92 +1174,9 @@ def generate_html_report(changes: list[StateChange]) -> None:
         }
         .copy-btn:hover { background: #3651d4; }
         .copy-btn.copied { background: #4cc9f0; }
-    </style>
-</head>
-<body>
-    <h1>cmux Visual Test Report</h1>
-    <p class="timestamp">Generated: ''' + datetime.now().strftime("%Y-%m-%d %H:%M:%S") + '''</p>
-
-    <div class="summary">
-        <h3>Summary</h3>
-        <p>Total tests: ''' + str(len(changes)) + '''</p>
-        <p class="passed">Passed: ''' + str(sum(1 for c in changes if c.passed)) + '''</p>
-        <p class="failed">Failed: ''' + str(sum(1 for c in changes if not c.passed)) + '''</p>
-    </div>
 '''
 
-    group_names = {
-        "A": "Group A — Basic Splits (Baseline)",
-        "B": "Group B — Close Operations",
-        "C": "Group C — Multi-Pane Close",
-        "D": "Group D — Asymmetric / Deep Nesting",
-        "E": "Group E — Browser + Terminal Mix",
-        "F": "Group F — Nested Tabs",
-        "G": "Group G — Rapid Stress Tests",
-        "H": "Group H — Workspace Interactions",
-        "I": "Group I — Browser Drag-To-Split Right",
-    }
-
-    current_group = ""
-    for i, change in enumerate(changes, 1):
-        if change.group != current_group:
-            current_group = change.group
-            gname = group_names.get(current_group, f"Group {current_group}")
-            html += f'\n    <h3 class="group">{gname}</h3>'
-
-        status_class = "passed" if change.passed else "failed"
-        html += f'''
-    <div class="state-change {status_class}">
-        <h2>{i}. {change.name}</h2>
-        <p>{change.description}</p>'''
-
-        if change.command:
-            html += f'\n        <div class="command">{change.command}</div>'
-        if change.result:
-            html += f'\n        <div class="result">Result: {change.result}</div>'
-        if change.error:
-            html += f'\n        <div class="error">Error: {change.error}</div>'
-
-        html += '\n        <div class="screenshots">'
-
-        if change.before:
-            html += f'''
-            <div class="screenshot-container">
-                <h4>Before</h4>
-                <img src="data:image/png;base64,{change.before.to_base64()}" alt="{change.before.label}">
-                <div class="meta">{change.before.timestamp}</div>
-            </div>'''
-        elif change.before_state:
-            html += f'''
-            <div class="screenshot-container">
-                <h4>Before (State)</h4>
-                <pre style="color:#888;font-size:0.85em;white-space:pre-wrap;">{change.before_state}</pre>
-            </div>'''
-
-        if change.after:
-            html += f'''
-            <div class="screenshot-container">
-                <h4>After</h4>
-                <img src="data:image/png;base64,{change.after.to_base64()}" alt="{change.after.label}">
-                <div class="meta">{change.after.timestamp}</div>
-            </div>'''
-        elif change.after_state:
-            html += f'''
-            <div class="screenshot-container">
-                <h4>After (State)</h4>
-                <pre style="color:#888;font-size:0.85em;white-space:pre-wrap;">{change.after_state}</pre>
-            </div>'''
-
-        test_id = f"test_{i}"
-        html += f'''
-        </div>
-        <div class="annotation">
-            <label>Issue? Describe what's wrong:</label>
-            <textarea id="{test_id}_notes" placeholder="e.g., 'pane is blank after close'"></textarea>
-        </div>
-    </div>'''
-
-    html += '''
+REPORT_FOOTER = '''
     <div class="copy-section">
         <button class="copy-btn" onclick="copyFeedback()">Copy Feedback</button>
         <div id="copy-status" style="margin-top:8px;font-size:0.85em;color:#888;"></div>
@@ -1298,11 +1214,94 @@ def generate_html_report(changes: list[StateChange]) -> None:
         });
     }
     </script>
-</body>
-</html>'''
+'''
+
+
+def generate_html_report(changes: list[StateChange]) -> None:
+    with HtmlReport(HTML_REPORT, "cmux Visual Test Report", css=REPORT_CSS) as report:
+        report.write('''    <h1>cmux Visual Test Report</h1>
+    <p class="timestamp">Generated: ''' + datetime.now().strftime("%Y-%m-%d %H:%M:%S") + '''</p>
+
+    <div class="summary">
+        <h3>Summary</h3>
+        <p>Total tests: ''' + str(len(changes)) + '''</p>
+        <p class="passed">Passed: ''' + str(sum(1 for c in changes if c.passed)) + '''</p>
+        <p class="failed">Failed: ''' + str(sum(1 for c in changes if not c.passed)) + '''</p>
+    </div>
+''')
+
+        group_names = {
+            "A": "Group A — Basic Splits (Baseline)",
+            "B": "Group B — Close Operations",
+            "C": "Group C — Multi-Pane Close",
+            "D": "Group D — Asymmetric / Deep Nesting",
+            "E": "Group E — Browser + Terminal Mix",
+            "F": "Group F — Nested Tabs",
+            "G": "Group G — Rapid Stress Tests",
+            "H": "Group H — Workspace Interactions",
+            "I": "Group I — Browser Drag-To-Split Right",
+        }
+
+        current_group = ""
+        for i, change in enumerate(changes, 1):
+            html = ""
+            if change.group != current_group:
+                current_group = change.group
+                gname = group_names.get(current_group, f"Group {current_group}")
+                html += f'\n    <h3 class="group">{gname}</h3>'
+
+            status_class = "passed" if change.passed else "failed"
+            html += f'''
+    <div class="state-change {status_class}">
+        <h2>{i}. {esc(change.name)}</h2>
+        <p>{esc(change.description)}</p>'''
+
+            if change.command:
+                html += f'\n        <div class="command">{esc(change.command)}</div>'
+            if change.result:
+                html += f'\n        <div class="result">Result: {esc(change.result)}</div>'
+            if change.error:
+                html += f'\n        <div class="error">Error: {esc(change.error)}</div>'
+
+            html += '\n        <div class="screenshots">'
+
+            for title, shot, state in (("Before", change.before, change.before_state),
+                                       ("After", change.after, change.after_state)):
+                if shot:
+                    html += f'''
+            <div class="screenshot-container">
+                <h4>{title}</h4>
+                {report.image(shot.path, shot.label)}
+                <div class="meta">{shot.timestamp}</div>
+            </div>'''
+                elif state:
+                    html += f'''
+            <div class="screenshot-container">
+                <h4>{title} (State)</h4>
+                <pre style="color:#888;font-size:0.85em;white-space:pre-wrap;">{esc(state)}</pre>
+            </div>'''
+
+            for heat in change.heatmaps or []:
+                html += f'''
+            <div class="screenshot-container">
+                <h4>Golden diff</h4>
+                {report.image(heat, "heatmap")}
+                <div class="meta">{esc(heat.name)}</div>
+            </div>'''
+
+            test_id = f"test_{i}"
+            html += f'''
+        </div>
+        <div class="annotation">
+            <label>Issue? Describe what's wrong:</label>
+            <textarea id="{test_id}_notes" placeholder="e.g., 'pane is blank after close'"></textarea>
+        </div>
+    </div>'''
+            report.write(html)
 
-    HTML_REPORT.write_text(html)
-    print(f"\nReport generated: {HTML_REPORT}")
+        report.write(REPORT_FOOTER)
+
+    print(f"\nReport generated: {HTML_REPORT} (images in {report.assets.name}/)")
 
 
 # ---------------------------------------------------------------------------
@@ -1310,11 +1309,57 @@ def generate_html_report(changes: list[StateChange]) -> None:
 # ---------------------------------------------------------------------------
 
 
-def _is_known_non_blocking_failure(change: StateChange) -> bool:
-    """Return True for known flaky VM-only visual failures we still report but do not gate on."""
-    if change.name == "Nested: Close Top of T-shape" and "VIEW_DETACHED" in (change.error or ""):
-        return True
-    return False
+HISTORY_TEST_PREFIX = "tests_v2/test_visual_screenshots.py::"
+
+
+def _open_history() -> Optional[TestHistory]:
+    try:
+        return TestHistory()
+    except Exception as e:
+        print(f"WARN: test history unavailable ({e}); all failures gate")
+        return None
+
+
+def _open_golden():
+    """The golden store, or None when it is unavailable (e.g. numpy missing) or empty."""
+    try:
+        from cmux_golden import GoldenStore
+        store = GoldenStore()
+    except Exception as e:
+        print(f"WARN: golden images unavailable ({e}); skipping baseline comparison")
+        return None
+    if os.environ.get("CMUX_GOLDEN_UPDATE") == "1" or store.index:
+        return store
+    return None
+
+
+def _check_golden(store, label: str, change: StateChange) -> None:
+    """Compare (or, with CMUX_GOLDEN_UPDATE=1, approve) the scenario's screenshots."""
+    update = os.environ.get("CMUX_GOLDEN_UPDATE") == "1"
+    problems = []
+    for phase, shot in (("before", change.before), ("after", change.after)):
+        if shot is None:
+            continue
+        scenario = f"{label}/{phase}"
+        if update:
+            if change.passed and store.approve(scenario, shot.path):
+                print(f"    [GOLDEN] approved {scenario}")
+            continue
+        result = store.compare(scenario, shot.path)
+        if result.regressed:
+            problems.append(result.summary())
+            if result.heatmap:
+                change.heatmaps = (change.heatmaps or []) + [result.heatmap]
+    if problems and change.passed:
+        change.passed = False
+        change.error = "GOLDEN: " + "; ".join(problems)
+
+
+def _is_known_non_blocking_failure(history: Optional[TestHistory], label: str, change: StateChange) -> bool:
+    """Return True for recurring flaky failures (per test history) we still report but do not gate on."""
+    if history is None or change.passed:
+        return False
+    return history.is_known_flake(HISTORY_TEST_PREFIX + label, change.error or "")
 
 
 def run_visual_tests():
@@ -1366,6 +1411,10 @@ def run_visual_tests():
     print()
 
     client = get_client()
+    history = _open_history()
+    golden = _open_golden()
+    run_id = history.start_run(suite="visual") if history is not None else None
+    non_blocking: set[int] = set()  # id() of changes that don't gate
 
     # Each test function that needs isolation gets a fresh workspace.
     # Tests that operate on a fresh workspace call reset_workspace themselves.
@@ -1383,7 +1432,9 @@ def run_visual_tests():
         print(f"{label}. {fn.__doc__.strip().split(':')[0] if fn.__doc__ else label}...")
 
         change = None
+        attempt_log: list[tuple[float, bool, str]] = []
         for attempt in range(2):
+            attempt_start = time.time()
             # Reset to fresh workspace before each attempt.
             client = reset_workspace(client)
             if attempt > 0:
@@ -1396,6 +1447,10 @@ def run_visual_tests():
                     name=f"{label} (CRASHED)", group=label[0],
                     description=str(e), passed=False, error=str(e),
                 )
+            # The golden comparison is part of the attempt: judge it before recording.
+            if golden is not None:
+                _check_golden(golden, label, change)
+            attempt_log.append((time.time() - attempt_start, change.passed, change.error or ""))
 
             if change.passed:
                 break
@@ -1406,6 +1461,12 @@ def run_visual_tests():
             time.sleep(0.5)
 
         changes.append(change)
+        if history is not None:
+            # Judge against past runs before this run's attempts are recorded.
+            if _is_known_non_blocking_failure(history, label, change):
+                non_blocking.add(id(change))
+            for n, (duration, ok, error) in enumerate(attempt_log, start=1):
+                history.record(run_id, HISTORY_TEST_PREFIX + label, n, duration, "pass" if ok else "fail", error)
         status = "PASS" if change.passed else "FAIL"
         print(f"  [{status}] {change.name}")
         if change.error:
@@ -1420,6 +1481,8 @@ def run_visual_tests():
         client.close()
     except Exception:
         pass
+    if history is not None:
+        history.close()
 
     # Summary
     print()
@@ -1428,8 +1491,8 @@ def run_visual_tests():
     print("=" * 60)
     passed = sum(1 for c in changes if c.passed)
     failed_changes = [c for c in changes if not c.passed]
-    non_blocking_failed = [c for c in failed_changes if _is_known_non_blocking_failure(c)]
-    blocking_failed = [c for c in failed_changes if not _is_known_non_blocking_failure(c)]
+    non_blocking_failed = [c for c in failed_changes if id(c) in non_blocking]
+    blocking_failed = [c for c in failed_changes if id(c) not in non_blocking]
 
     print(f"  Passed: {passed}")
     print(f"  Failed: {len(failed_changes)}")
@@ -1441,7 +1504,7 @@ def run_visual_tests():
         print()
         print("Failed tests:")
         for c in failed_changes:
-            marker = " (non-blocking)" if _is_known_non_blocking_failure(c) else ""
+            marker = " (non-blocking)" if id(c) in non_blocking else ""
             print(f"  - {c.name}{marker}: {c.error or 'unknown'}")
 
     print()
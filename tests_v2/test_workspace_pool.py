@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Tests for tests_v2/cmux_workspace_pool.py against a stand-in v2 socket server.
+
+The stand-in models shell startup latency: text sent to a terminal only runs
+SHELL_START seconds after its workspace was created. Checks that:
+- once warm, acquire() returns without waiting for a shell, with the leased
+  workspace selected (refilling the pool does not steal the selection)
+- acquire() doesn't wait for the refill: spares are created in the
+  background, with focus=false
+- fresh() closes the previous test's workspace and keeps the pool topped up
+- recycle=True puts a pristine workspace back, and replaces a split one
+- when shells only start once their workspace is shown, acquire() still
+  succeeds by waiting in the foreground
+- close() removes the spares
+
+Does not need a running cmux instance.
+
+Usage:
+    python3 tests_v2/test_workspace_pool.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from cmux_workspace_pool import WorkspacePool  # noqa: E402
+from test_state_reset import FakeApp, StandIn  # noqa: E402
+
+SHELL_START = 0.4
+TEST_WORK = 0.5
+
+
+class FakeShellApp(FakeApp):
+    def __init__(self, start_on_select: bool = False, create_delay: float = 0.0):
+        self.start_on_select = start_on_select
+        self.create_delay = create_delay
+        self.created_at: Dict[str, float] = {}
+        self.shown: Dict[str, float] = {}
+        self.surfaces: Dict[str, List[str]] = {}
+        self.cleared: List[str] = []
+        self.lock = threading.Lock()
+        super().__init__()
+        self.add_window(workspaces=1)
+
+    def _add_workspace(self, wid: str, panes: int = 1) -> str:
+        ws = super()._add_workspace(wid, panes=1)
+        self.created_at[ws] = time.time()
+        self.shown[ws] = time.time()
+        self.surfaces[ws] = [str(uuid.uuid4())]
+        return ws
+
+    def _workspace_of(self, surface_id: str) -> str:
+        return next(ws for ws, ids in self.surfaces.items() if surface_id in ids)
+
+    def _shell_start(self, ws: str) -> float:
+        if self.start_on_select:
+            return self.shown.get(ws, float("inf")) + SHELL_START
+        return self.created_at[ws] + SHELL_START
+
+    def _run_when_ready(self, ws: str, text: str) -> None:
+        def run() -> None:
+            while time.time() < self._shell_start(ws):
+                time.sleep(0.01)
+            for line in text.splitlines():
+                if line.startswith("touch "):
+                    try:
+                        Path(line[len("touch "):]).touch()
+                    except FileNotFoundError:
+                        pass  # pool already closed and removed its marker dir
+        threading.Thread(target=run, daemon=True).start()
+
+    def handle(self, method: str, params: dict) -> dict:
+        if method == "workspace.create":
+            time.sleep(self.create_delay)
+        with self.lock:
+            return self._handle(method, params)
+
+    def _handle(self, method: str, params: dict) -> dict:
+        if method == "workspace.select":
+            ws = params["workspace_id"]
+            self.shown[ws] = self.shown.get(ws) or time.time()
+            return super().handle(method, params)
+        if method == "workspace.create":
+            previous = self._current()
+            result = super().handle(method, params)
+            if params.get("focus") is False:
+                self.selected[self.key_window] = previous
+                if self.start_on_select:
+                    self.shown.pop(result["workspace_id"])
+            return result
+        if method == "workspace.close":
+            ws = params["workspace_id"]
+            workspaces = self.windows[self.key_window]
+            if self.selected[self.key_window] == ws:
+                rest = [w for w in workspaces if w != ws]
+                self.selected[self.key_window] = rest[-1] if rest else ""
+            workspaces.remove(ws)
+            self.calls.append(method)
+            return {}
+        if method == "surface.list":
+            self.calls.append(method)
+            ws = params.get("workspace_id") or self._current()
+            return {"surfaces": [{"id": sid, "index": i} for i, sid in enumerate(self.surfaces[ws])]}
+        if method == "surface.health":
+            self.calls.append(method)
+            ws = params.get("workspace_id") or self._current()
+            return {"surfaces": [{"index": i, "type": "terminal", "in_window": True}
+                                 for i in range(len(self.surfaces[ws]))]}
+        if method == "surface.send_text":
+            self.calls.append(method)
+            self._run_when_ready(self._workspace_of(params["surface_id"]), params["text"])
+            return {}
+        if method == "surface.send_key":
+            self.calls.append(method)
+            return {}
+        if method == "surface.clear_history":
+            self.calls.append(method)
+            self.cleared.append(params["surface_id"])
+            return {}
+        return super().handle(method, params)
+
+    def all_workspaces(self) -> List[str]:
+        return list(self.windows[self.key_window])
+
+
+def check_warm_acquire(tmp: str) -> List[str]:
+    failures: List[str] = []
+    app = FakeShellApp()
+    server = StandIn(app, os.path.join(tmp, "warm.sock"))
+    try:
+        with WorkspacePool(size=2, socket_path=server.path, ready_timeout=5.0) as pool:
+            time.sleep(SHELL_START + 0.2)
+            started = time.time()
+            ws = pool.acquire()
+            waited = time.time() - started
+            if waited > SHELL_START / 2:
+                failures.append(f"warm acquire waited {waited:.2f}s")
+            if app.selected[app.key_window] != ws:
+                failures.append("refilling the pool stole the leased workspace's selection")
+            if app.surfaces[ws][0] not in app.cleared:
+                failures.append("the probe command should be cleared from the scrollback")
+            spares = [w for w in app.all_workspaces() if w != ws]
+            if len(spares) != 3:  # the original workspace + 2 spares
+                failures.append(f"pool should be topped up to 2 spares: {app.all_workspaces()}")
+            pool.release(ws)
+            if ws in app.all_workspaces():
+                failures.append("released workspace should be closed")
+        if len(app.all_workspaces()) != 1:
+            failures.append(f"close() should remove spares, left {app.all_workspaces()}")
+        if pool._marker_dir.exists():
+            failures.append("close() should remove the marker directory")
+    finally:
+        server.close()
+    return failures
+
+
+def check_fresh_sequence(tmp: str) -> List[str]:
+    failures: List[str] = []
+
+    # Baseline: what every test pays today (create, then wait for its shell).
+    app = FakeShellApp()
+    baseline = 0.0
+    marker_dir = Path(tmp, "naive")
+    marker_dir.mkdir()
+    for i in range(4):
+        started = time.time()
+        ws = app.handle("workspace.create", {})["workspace_id"]
+        marker = marker_dir / f"m{i}"
+        app.handle("surface.send_text", {"surface_id": app.surfaces[ws][0], "text": f"touch {marker}\n"})
+        while not marker.exists():
+            time.sleep(0.01)
+        baseline += time.time() - started
+        time.sleep(TEST_WORK)
+
+    app = FakeShellApp()
+    server = StandIn(app, os.path.join(tmp, "fresh.sock"))
+    try:
+        with WorkspacePool(size=2, socket_path=server.path, ready_timeout=5.0) as pool:
+            leased = []
+            for _ in range(4):
+                leased.append(pool.fresh())
+                time.sleep(TEST_WORK)
+            waited = pool.stats["acquire_wait_s"]
+            if pool.stats["replaced"] != 3:
+                failures.append(f"expected 3 replaced workspaces, got {pool.stats}")
+            still_open = [ws for ws in leased[:-1] if ws in app.all_workspaces()]
+            if still_open:
+                failures.append(f"earlier leases should be closed: {still_open}")
+        print(f"  4 tests: {baseline:.2f}s waiting for shells without the pool, {waited:.2f}s with it")
+        # The first lease may still wait for the initial warm-up; the rest should not.
+        if waited > SHELL_START * 1.5 or waited > baseline / 2:
+            failures.append(f"pool should take shell startup off the critical path ({waited:.2f}s vs {baseline:.2f}s)")
+    finally:
+        server.close()
+    return failures
+
+
+def check_recycle(tmp: str) -> List[str]:
+    failures: List[str] = []
+    app = FakeShellApp()
+    server = StandIn(app, os.path.join(tmp, "recycle.sock"))
+    try:
+        with WorkspacePool(size=1, socket_path=server.path, ready_timeout=5.0) as pool:
+            with pool.lease(recycle=True) as ws:
+                pass
+            if pool.stats["recycled"] != 1 or ws not in app.all_workspaces():
+                failures.append(f"pristine workspace should be recycled: {pool.stats}")
+            with pool.lease(recycle=True) as ws2:
+                app.surfaces[ws2].append(str(uuid.uuid4()))  # the test split it
+            if ws2 in app.all_workspaces() or pool.stats["replaced"] != 1:
+                failures.append(f"split workspace should be replaced: {pool.stats}")
+    finally:
+        server.close()
+    return failures
+
+
+def check_refill_in_background(tmp: str) -> List[str]:
+    failures: List[str] = []
+    app = FakeShellApp(create_delay=0.3)
+    server = StandIn(app, os.path.join(tmp, "slow.sock"))
+    try:
+        with WorkspacePool(size=1, socket_path=server.path, ready_timeout=5.0) as pool:
+            time.sleep(0.3 + SHELL_START + 0.2)
+            started = time.time()
+            ws = pool.acquire()
+            waited = time.time() - started
+            if waited > 0.15:
+                failures.append(f"acquire waited {waited:.2f}s for a refill it should leave to the background")
+            deadline = time.time() + 3.0
+            while len(app.all_workspaces()) < 3 and time.time() < deadline:
+                time.sleep(0.02)
+            if len(app.all_workspaces()) != 3:  # the original workspace, the lease and a new spare
+                failures.append(f"pool should refill in the background: {app.all_workspaces()}")
+            if app.selected[app.key_window] != ws:
+                failures.append("background refill stole the leased workspace's selection")
+            pool.release(ws)
+    finally:
+        server.close()
+    return failures
+
+
+def check_start_on_select(tmp: str) -> List[str]:
+    failures: List[str] = []
+    app = FakeShellApp(start_on_select=True)
+    server = StandIn(app, os.path.join(tmp, "lazy.sock"))
+    try:
+        with WorkspacePool(size=1, socket_path=server.path, ready_timeout=5.0) as pool:
+            try:
+                ws = pool.acquire(timeout=0.2)
+            except Exception as e:
+                failures.append(f"acquire should fall back to a foreground wait: {e}")
+            else:
+                if app.selected[app.key_window] != ws:
+                    failures.append("fallback lease should be selected")
+    finally:
+        server.close()
+    return failures
+
+
+def main() -> int:
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="cmux-pool-test-") as tmp:
+        for check in (check_warm_acquire, check_fresh_sequence, check_recycle, check_refill_in_background,
+                      check_start_on_select):
+            print(f"RUN  {check.__name__}")
+            failures.extend(check(tmp))
+
+    if failures:
+        print("Workspace pool test failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("Workspace pool test passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())